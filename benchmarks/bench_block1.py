@@ -0,0 +1,62 @@
+"""
+Cost of reassembling a Block1 upload of 1, 2 and 4 MB sent in 1024 bytes blocks with Size1, through
+BlockLayer.receive_request, and the peak memory traced during the upload.
+
+Run from the repository root:
+
+    PYTHONPATH=src python benchmarks/bench_block1.py
+"""
+import time
+import tracemalloc
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.layers.block_layer import BlockLayer
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.transaction import Transaction
+
+BLOCK = 1024
+
+
+def blocks(body):
+    for num in range(0, (len(body) + BLOCK - 1) // BLOCK):
+        request = Request()
+        request.type = defines.Types['CON']
+        request.code = defines.Codes.PUT.number
+        request.token = b'\x01'
+        request._source = ('127.0.0.1', 5683)
+        request._destination = ('127.0.0.1', 5684)
+        request.scheme = 'coap'
+        request.block1 = (num, 1 if (num + 1) * BLOCK < len(body) else 0, BLOCK)
+        request.size1 = len(body)
+        request.payload = body[num * BLOCK:(num + 1) * BLOCK]
+        yield Transaction(request=request)
+
+
+def upload(body):
+    layer = BlockLayer()
+    transactions = list(blocks(body))
+    start = time.perf_counter()
+    for transaction in transactions:
+        layer.receive_request(transaction)
+    elapsed = time.perf_counter() - start
+    assert transactions[-1].request.payload == body
+    return elapsed
+
+
+def main():
+    print(f'{"upload":>8}{"time":>12}{"peak":>12}')
+    for megabytes in (1, 2, 4):
+        body = bytes(range(256)) * (megabytes * 4096)
+        elapsed = upload(body)
+        transactions = list(blocks(body))
+        layer = BlockLayer()
+        tracemalloc.start()
+        for transaction in transactions:
+            layer.receive_request(transaction)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f'{megabytes:>5} MB{elapsed * 1e3:>9.1f} ms{peak / 2 ** 20:>9.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
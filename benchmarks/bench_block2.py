@@ -0,0 +1,70 @@
+"""
+Memory held by 100 concurrent Block2 downloads of the same 2 MB resource, every download rendering the
+resource once, and the cost of serving all their blocks of 1024 bytes through BlockLayer.send_response.
+
+Run from the repository root:
+
+    PYTHONPATH=src python benchmarks/bench_block2.py
+"""
+import time
+import tracemalloc
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.layers.block_layer import BlockLayer
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.messages.response import Response
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.transaction import Transaction
+
+BODY = bytes(range(256)) * 8192
+
+
+def request(port, num=None):
+    message = Request()
+    message.type = defines.Types['CON']
+    message.code = defines.Codes.GET.number
+    message.token = b'\x01'
+    message._source = ('127.0.0.1', port)
+    message._destination = ('127.0.0.1', 5683)
+    message.scheme = 'coap'
+    if num is not None:
+        message.block2 = (num, 0, 1024)
+    return message
+
+
+def first_block(layer, resource, port):
+    transaction = Transaction(request=request(port), resource=resource)
+    layer.receive_request(transaction)
+    response = Response.init_from_request(transaction.request)
+    response.code = defines.Codes.CONTENT.number
+    response.etag = b'v1'
+    # every rendering makes its own body
+    response.payload = bytes(bytearray(BODY))
+    transaction.response = response
+    layer.send_response(transaction)
+    return transaction
+
+
+def main(downloads=100):
+    layer = BlockLayer()
+    resource = Resource('firmware')
+    tracemalloc.start()
+    transactions = [first_block(layer, resource, 10000 + index) for index in range(downloads)]
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    blocks = len(BODY) // 1024
+    start = time.perf_counter()
+    for num in range(1, blocks):
+        for index, transaction in enumerate(transactions):
+            transaction.request = request(10000 + index, num)
+            layer.receive_request(transaction)
+            layer.send_response(transaction)
+    elapsed = time.perf_counter() - start
+    assert transactions[0].response.block2[0] == blocks - 1
+    print(f'{downloads} downloads of {len(BODY) >> 20} MB in progress hold {held / 2 ** 20:8.1f} MB')
+    print(f'serve {downloads * (blocks - 1)} blocks:{elapsed * 1e3:17.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+GET requests of a client over loopback UDP, without a cache and with the client cache of the server, answering the
+requests from the responses kept while they are fresh; then the lookup of a response kept in a cache of 10000
+responses, and its storing once the oldest ones are dropped.
+
+Run from the repository root:
+
+    PYTHONPATH=src python benchmarks/bench_cache.py
+"""
+import asyncio
+import time
+from socket import AF_INET
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.layers.cache_layer import CacheLayer
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.messages.response import Response
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.server import Server
+
+SERVER_PORT = 25861
+CLIENT_PORT = 25862
+COUNT = 2000
+RESOURCES = 10000
+
+
+class Sensor(Resource):
+    def __init__(self, name):
+        super().__init__(name, observable=False)
+        self.payload = b'x' * 64
+        self.etag = b'1'
+
+    def render_GET(self, request):
+        return self
+
+
+def request(path):
+    message = Request()
+    message.type = defines.Types['CON']
+    message.code = defines.Codes.GET.number
+    message.uri_path = path
+    message._destination = ('127.0.0.1', SERVER_PORT)
+    message._source = ('127.0.0.1', CLIENT_PORT)
+    message.family = AF_INET
+    message.scheme = 'coap'
+    return message
+
+
+async def loopback(cache):
+    server = Server()
+    client = Server(cache=cache)
+    await server.add_endpoint(f'coap://127.0.0.1:{SERVER_PORT}')
+    await client.add_endpoint(f'coap://127.0.0.1:{CLIENT_PORT}')
+    for index in range(10):
+        server.add_resource(f'/sensor{index}', Sensor(str(index)))
+    start = time.perf_counter()
+    for index in range(COUNT):
+        await client.send_message(request(f'sensor{index % 10}'), timeout=10)
+    elapsed = time.perf_counter() - start
+    await client.close()
+    await server.close()
+    return elapsed / COUNT * 1e6
+
+
+def lookups():
+    layer = CacheLayer(defines.CLIENT_CACHE, RESOURCES)
+    requests = [request(f'dev{index // 100}/res{index % 100}') for index in range(2 * RESOURCES)]
+    response = Response()
+    response.code = defines.Codes.CONTENT.number
+    response.payload = b'x' * 64
+    for message in requests[:RESOURCES]:
+        layer.send_request(message)
+        layer.receive_response(message, response)
+    start = time.perf_counter()
+    for message in requests[:RESOURCES]:
+        layer.send_request(message)
+    hit = (time.perf_counter() - start) / RESOURCES * 1e6
+    start = time.perf_counter()
+    for message in requests[RESOURCES:]:
+        layer.send_request(message)
+        layer.receive_response(message, response)
+    store = (time.perf_counter() - start) / RESOURCES * 1e6
+    return hit, store
+
+
+def main():
+    print('microseconds per request')
+    print(f'{"loopback, no cache":>32}{asyncio.run(loopback(False)):>10.1f}')
+    print(f'{"loopback, client cache":>32}{asyncio.run(loopback(True)):>10.1f}')
+    hit, store = lookups()
+    print(f'{"hit of 10000 kept":>32}{hit:>10.1f}')
+    print(f'{"miss, stored, oldest dropped":>32}{store:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
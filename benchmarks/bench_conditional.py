@@ -0,0 +1,83 @@
+"""
+GET requests to a resource rendering a 1 KB JSON representation, handled and serialized: carrying a stale ETag,
+rendered and sent in full, and carrying the current one, answered 2.03 Valid without calling render_GET. The best
+of 5 runs is printed.
+
+Run from the repository root:
+
+    PYTHONPATH=src python benchmarks/bench_conditional.py
+"""
+import asyncio
+import json
+import time
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.serializer import Serializer
+from Bubot_CoAP.server import Server
+from Bubot_CoAP.transaction import Transaction
+
+COUNT = 20000
+
+
+class Table(Resource):
+    def __init__(self, name='table'):
+        super().__init__(name)
+        self.rows = {f'sensor{index}': index * 1.5 for index in range(48)}
+        self.etag = b'\x00\x01'
+        self.max_age = 60
+
+    def render_GET(self, request):
+        self.payload = (defines.Content_types['application/json'], json.dumps(self.rows).encode())
+        return self
+
+
+def request(etag):
+    message = Request()
+    message.type = defines.Types['CON']
+    message.code = defines.Codes.GET.number
+    message.mid = 1
+    message.token = b'\x01'
+    message.uri_path = 'table'
+    message._source = ('127.0.0.1', 5684)
+    message._destination = ('127.0.0.1', 5683)
+    message.scheme = 'coap'
+    message.acknowledged = True
+    message.etag = etag
+    return message
+
+
+async def run(server, etag):
+    requests = [request(etag) for _ in range(COUNT)]
+    receive_request = server.request_layer.receive_request
+    start = time.perf_counter()
+    for message in requests:
+        transaction = await receive_request(Transaction(request=message))
+        # piggybacked, as the message layer would send it
+        transaction.response.type = defines.Types['ACK']
+        transaction.response.mid = message.mid
+        Serializer.serialize(transaction.response)
+    return (time.perf_counter() - start) / COUNT * 1e6, len(Serializer.serialize(transaction.response))
+
+
+async def bench():
+    server = Server()
+    server.add_resource('/table', Table())
+    results = {b'\x00\x00': [], b'\x00\x01': []}
+    for _ in range(5):
+        for etag, times in results.items():
+            times.append(await run(server, etag))
+    await server.close()
+    return min(results[b'\x00\x00']), min(results[b'\x00\x01'])
+
+
+def main():
+    rendered, valid = asyncio.run(bench())
+    print(f'{"":>24}{"us/request":>12}{"bytes":>8}')
+    print(f'{"stale ETag, 2.05":>24}{rendered[0]:>12.1f}{rendered[1]:>8}')
+    print(f'{"current ETag, 2.03":>24}{valid[0]:>12.1f}{valid[1]:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Rendering of /.well-known/core for 100, 1000 and 10000 resources of 20 resource types, unfiltered and filtered by
+rt and by rt and if: the former rendering, visiting every resource for every request, against the cached and
+indexed document of Discovery, with and without the answers to the queries kept.
+
+Run from the repository root:
+
+    PYTHONPATH=src python benchmarks/bench_discovery.py
+"""
+import time
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.discovery import Discovery
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.utils import Tree
+
+QUERIES = ('', 'rt=oic.r.type7', 'rt=oic.r.type7&if=oic.if.a')
+
+
+class Server(object):
+    def __init__(self, count):
+        self.root = Tree()
+        self.root['/'] = Resource('root', visible=False)
+        for index in range(count):
+            resource = Resource(str(index))
+            resource.path = f'/dev{index // 100}/res{index % 100}'
+            resource.resource_type = f'oic.r.type{index % 20}'
+            resource.interface_type = 'oic.if.a' if index % 3 else 'oic.if.s'
+            self.root[resource.path] = resource
+
+
+def valid(query, attributes):
+    query = query.split("&")
+    for q in query:
+        tmp = q.split("=")
+        if len(tmp) > 1:
+            k = tmp[0]
+            v = tmp[1]
+            if k in attributes:
+                if v == attributes[k]:
+                    continue
+                else:
+                    return False
+            else:
+                return False
+    return True
+
+
+def corelinkformat(resource):
+    msg = "<" + resource.path + ">;"
+    keys = sorted(list(resource.attributes.keys()))
+    for k in keys:
+        method = getattr(resource, defines.corelinkformat[k], None)
+        if method is not None and method != "":
+            v = method
+            msg = msg[:-1] + ";" + str(v) + ","
+        else:
+            v = resource.attributes[k]
+            if v is not None:
+                msg = msg[:-1] + ";" + k + "=" + v + ","
+    return msg
+
+
+def legacy(server, query):
+    """
+    The former ResourceLayer.discover.
+    """
+    payload = ""
+    for i in sorted(server.root.dump()):
+        if i == "/":
+            continue
+        resource = server.root[i]
+        if resource.visible:
+            if valid(query, resource.attributes):
+                payload += corelinkformat(resource)
+    return payload.encode('utf-8')
+
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    print('microseconds per request')
+    print(f'{"resources":>10}{"renderer":>10}' + ''.join(f'{query or "all":>28}' for query in QUERIES))
+    for count in (100, 1000, 10000):
+        server = Server(count)
+        discovery = Discovery(server)
+        repeat = max(10000 // count, 3)
+        for query in QUERIES:
+            assert legacy(server, query) == discovery.render(query)
+        print(f'{count:>10}{"legacy":>10}' + ''.join(
+            f'{timed(lambda: legacy(server, query), repeat):>28.1f}' for query in QUERIES))
+        print(f'{count:>10}{"cached":>10}' + ''.join(
+            f'{timed(lambda: discovery.render(query), 1000):>28.1f}' for query in QUERIES))
+        # the answers to the queries forgotten, the filtered queries are answered from the index
+        print(f'{count:>10}{"indexed":>10}' + ''.join(
+            f'{timed(lambda: discovery._queries.clear() or discovery.render(query), 1000):>28.1f}'
+            for query in QUERIES))
+        # the first request after a change renders the document again
+        first = []
+        for query in QUERIES:
+            start = time.perf_counter()
+            server.root['/dev0/res0'].interface_type = 'oic.if.s'
+            discovery.render(query)
+            first.append((time.perf_counter() - start) * 1e6)
+        print(f'{count:>10}{"changed":>10}' + ''.join(f'{value:>28.1f}' for value in first))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+Dispatch of a GET to an advanced handler and of a PUT to a basic one and to an advanced one, render_PUT_advanced:
+the former dispatch, a chain of method code comparisons, getattr of the rendering methods, trying render_PUT
+first, and isinstance checks of what they returned, against the method table of the resource class, looked up
+once per request. The dispatchers take turns, the best of 5 runs is printed.
+
+Run from the repository root:
+
+    PYTHONPATH=src python benchmarks/bench_dispatch.py
+"""
+import asyncio
+import time
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.layers.resource_layer import ResourceLayer
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.messages.response import Response
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.transaction import Transaction
+
+COUNT = 200000
+
+
+class Sensor(Resource):
+    async def render_GET(self, request, response):
+        response.payload = b'21.5'
+        return self, response
+
+    async def render_PUT(self, request):
+        return self
+
+
+class Actuator(Resource):
+    async def render_PUT_advanced(self, request, response):
+        return self, response
+
+
+class Legacy(object):
+    """
+    The former dispatch of GET and PUT.
+    """
+
+    async def receive_request(self, transaction):
+        method = transaction.request.code
+        if method == defines.Codes.GET.number:
+            transaction = await self.get_resource(transaction)
+        elif method == defines.Codes.POST.number:
+            pass
+        elif method == defines.Codes.PUT.number:
+            transaction = await self.update_resource(transaction)
+        elif method == defines.Codes.DELETE.number:
+            pass
+        else:
+            transaction.response = None
+        return transaction
+
+    async def get_resource(self, transaction):
+        method = getattr(transaction.resource, "render_GET", None)
+        try:
+            ret = await method(request=transaction.request, response=transaction.response)
+            if isinstance(ret, tuple) and len(ret) == 2 and isinstance(ret[0], Resource) \
+                    and (isinstance(ret[1], Response) or ret[1] is None):
+                resource, response = ret
+                transaction.resource = resource
+                transaction.response = response
+                if transaction.response and transaction.response.code is None:
+                    transaction.response.code = defines.Codes.CONTENT.number
+                return transaction
+            else:
+                raise NotImplementedError
+        except NotImplementedError:
+            transaction.response.code = defines.Codes.METHOD_NOT_ALLOWED.number
+            return transaction
+
+    async def update_resource(self, transaction):
+        if transaction.request.if_match:
+            if None not in transaction.request.if_match and str(transaction.resource.etag) \
+                    not in transaction.request.if_match:
+                transaction.response.code = defines.Codes.PRECONDITION_FAILED.number
+                return transaction
+        if transaction.request.if_none_match:
+            transaction.response.code = defines.Codes.PRECONDITION_FAILED.number
+            return transaction
+        method = getattr(transaction.resource, "render_PUT", None)
+        try:
+            resource = await method(request=transaction.request)
+        except (NotImplementedError, TypeError):
+            # the former dispatch failed with the TypeError of render_PUT of Resource, which takes the response
+            # too, caught here to measure the fallback it meant
+            try:
+                method = getattr(transaction.resource, "render_PUT_advanced", None)
+                ret = await method(request=transaction.request, response=transaction.response)
+                if isinstance(ret, tuple) and len(ret) == 2 and isinstance(ret[1], Response) \
+                        and isinstance(ret[0], Resource):
+                    resource, response = ret
+                    resource.changed = True
+                    resource.observe_count += 1
+                    transaction.resource = resource
+                    transaction.response = response
+                    if transaction.response.code is None:
+                        transaction.response.code = defines.Codes.CHANGED.number
+                    return transaction
+                else:
+                    raise NotImplementedError
+            except NotImplementedError:
+                transaction.response.code = defines.Codes.METHOD_NOT_ALLOWED.number
+                return transaction
+        if isinstance(resource, Resource):
+            pass
+        elif isinstance(resource, tuple) and len(resource) == 2:
+            pass
+        else:
+            transaction.response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
+            return transaction
+        transaction.response.code = defines.Codes.CHANGED.number
+        transaction.response.payload = None
+        if resource.etag is not None:
+            transaction.response.etag = resource.etag
+        if resource.max_age is not None:
+            transaction.response.max_age = resource.max_age
+        resource.changed = True
+        resource.observe_count += 1
+        transaction.resource = resource
+        return transaction
+
+
+class Table(object):
+    """
+    The request layer dispatch through a dictionary of the method codes, then the method table of the resource.
+    """
+
+    def __init__(self):
+        self.layer = ResourceLayer(None)
+        self.handlers = {
+            defines.Codes.GET.number: self.layer.get_resource,
+            defines.Codes.PUT.number: self.layer.update_resource,
+        }
+
+    async def receive_request(self, transaction):
+        handler = self.handlers.get(transaction.request.code)
+        if handler is None:
+            transaction.response = None
+            return transaction
+        return await handler(transaction)
+
+
+async def run(dispatchers, code, resource):
+    request = Request()
+    request.code = code
+    transactions = []
+    for _ in range(COUNT):
+        transaction = Transaction(request=request, resource=resource)
+        transaction.response = Response()
+        transactions.append(transaction)
+    best = [None] * len(dispatchers)
+    # the dispatchers take turns, so that both see the same load of the machine
+    for _ in range(5):
+        for index, dispatcher in enumerate(dispatchers):
+            receive = dispatcher.receive_request
+            start = time.perf_counter()
+            for transaction in transactions:
+                transaction.response.code = None
+                await receive(transaction)
+            elapsed = time.perf_counter() - start
+            best[index] = elapsed if best[index] is None else min(best[index], elapsed)
+    return [elapsed / COUNT * 1e6 for elapsed in best]
+
+
+def main():
+    names = ('legacy', 'table')
+    dispatchers = (Legacy(), Table())
+    columns = (
+        ('GET', defines.Codes.GET.number, Sensor('sensor')),
+        ('PUT', defines.Codes.PUT.number, Sensor('sensor')),
+        ('PUT adv', defines.Codes.PUT.number, Actuator('actuator')),
+    )
+    results = [asyncio.run(run(dispatchers, code, resource)) for _, code, resource in columns]
+    print('microseconds per request')
+    print(f'{"dispatch":>10}' + ''.join(f'{name:>10}' for name, _, _ in columns))
+    for index, name in enumerate(names):
+        print(f'{name:>10}' + ''.join(f'{result[index]:>10.2f}' for result in results))
+
+
+if __name__ == '__main__':
+    main()
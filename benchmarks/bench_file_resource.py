@@ -0,0 +1,100 @@
+"""
+Resident memory of 1, 10 and 100 concurrent Block2 downloads of an 8 MB firmware image, served by a resource
+holding the image loaded in memory against a FileResource mapping the file. Every download renders the
+resource once and all their blocks of 1024 bytes are served in turns through BlockLayer.send_response.
+
+Every case runs in a process of its own, the anonymous and file-backed resident memory are read from
+/proc/self/status (Linux) before the downloads start and once they are over.
+
+Run from the repository root:
+
+    PYTHONPATH=src python benchmarks/bench_file_resource.py
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_block2 import request
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.layers.block_layer import BlockLayer
+from Bubot_CoAP.messages.response import Response
+from Bubot_CoAP.resources.file_resource import FileResource
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.transaction import Transaction
+
+SIZE = 8 << 20
+
+
+class Loaded(Resource):
+    def __init__(self, name, file_path):
+        super().__init__(name)
+        with open(file_path, 'rb') as file:
+            self.data = file.read()
+
+    async def render_GET(self, request, response):
+        response.payload = (defines.Content_types['application/octet-stream'], self.data)
+        response.etag = b'v1'
+        return self, response
+
+
+def rss():
+    values = {}
+    with open('/proc/self/status') as status:
+        for line in status:
+            name, _, value = line.partition(':')
+            if name in ('RssAnon', 'RssFile'):
+                values[name] = int(value.split()[0]) << 10
+    return values['RssAnon'], values['RssFile']
+
+
+def render(layer, resource, port):
+    transaction = Transaction(request=request(port), resource=resource)
+    layer.receive_request(transaction)
+    response = Response.init_from_request(transaction.request)
+    response.code = defines.Codes.CONTENT.number
+    coroutine = resource.render_GET(transaction.request, response)
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        transaction.response = stop.value[1]
+    layer.send_response(transaction)
+    return transaction
+
+
+def run(kind, file_path, downloads):
+    before = rss()
+    layer = BlockLayer()
+    resource = FileResource('firmware', file_path) if kind == 'mmap' else Loaded('firmware', file_path)
+    start = time.perf_counter()
+    transactions = [render(layer, resource, 10000 + index) for index in range(downloads)]
+    for num in range(1, SIZE // 1024):
+        for index, transaction in enumerate(transactions):
+            transaction.request = request(10000 + index, num)
+            layer.receive_request(transaction)
+            layer.send_response(transaction)
+            # the block is read, as by the serializer
+            transaction.response.payload[-1]
+    elapsed = time.perf_counter() - start
+    anon, file = (after - before for after, before in zip(rss(), before))
+    print(f'{kind:>8}{downloads:>10}{anon / 2 ** 20:>9.1f} MB{file / 2 ** 20:>9.1f} MB{elapsed:>9.1f} s')
+
+
+def main():
+    if len(sys.argv) == 4:
+        return run(sys.argv[1], sys.argv[2], int(sys.argv[3]))
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, 'firmware.bin')
+        with open(file_path, 'wb') as file:
+            file.write(os.urandom(SIZE))
+        print(f'{SIZE >> 20} MB image')
+        print(f'{"resource":>8}{"downloads":>10}{"anon":>12}{"file":>12}{"time":>11}')
+        for kind in ('loaded', 'mmap'):
+            for downloads in (1, 10, 100):
+                subprocess.run([sys.executable, __file__, kind, file_path, str(downloads)], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Per-packet cost of matching incoming messages to exchanges in MessageLayer as the number of exchanges
+in flight grows: piggybacked responses and separate ACKs to sent requests, and duplicate requests.
+
+Run from the repository root:
+
+    PYTHONPATH=src python benchmarks/bench_matching.py
+"""
+import asyncio
+import timeit
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.layers.message_layer import MessageLayer
+from Bubot_CoAP.messages.message import Message
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.messages.response import Response
+
+LOCAL = ('127.0.0.1', 5683)
+
+
+def peer(index):
+    return '127.0.0.1', 20000 + index // 65000
+
+
+def sent_request(layer, index):
+    request = Request()
+    request.type = defines.Types['CON']
+    request.code = defines.Codes.GET.number
+    request.mid = index % 65000
+    request.token = index.to_bytes(8, 'big')
+    request.destination = peer(index)
+    request.source = LOCAL
+    request.uri_path = '/oic/res'
+    return layer.send_request(request)
+
+
+def received_request(index):
+    request = Request()
+    request.type = defines.Types['CON']
+    request.code = defines.Codes.GET.number
+    request.mid = index % 65000
+    request.token = index.to_bytes(8, 'big')
+    request.source = peer(index)
+    request.uri_path = '/oic/res'
+    return request
+
+
+def piggybacked(index):
+    response = Response()
+    response.type = defines.Types['ACK']
+    response.code = defines.Codes.CONTENT.number
+    response.mid = index % 65000
+    response.token = index.to_bytes(8, 'big')
+    response.source = peer(index)
+    response._destination = LOCAL
+    return response
+
+
+def empty_ack(index):
+    message = Message()
+    message.type = defines.Types['ACK']
+    message.mid = index % 65000
+    message.source = peer(index)
+    return message
+
+
+def main(counts=(10, 100, 1000, 10000, 100000), number=2000):
+    loop = asyncio.new_event_loop()
+    print(f'{"in flight":>10}{"response":>14}{"empty ACK":>14}{"duplicate":>14}')
+    for count in counts:
+        layer = MessageLayer(None, 1)
+        for index in range(count):
+            sent_request(layer, index)
+            loop.run_until_complete(layer.receive_request(received_request(index)))
+        target = count // 2
+        response = piggybacked(target)
+        ack = empty_ack(target)
+        duplicate = received_request(target)
+        results = []
+        for func in (lambda: layer.receive_response(response),
+                     lambda: layer.receive_empty(ack),
+                     lambda: loop.run_until_complete(layer.receive_request(duplicate))):
+            best = min(timeit.repeat(func, number=number, repeat=3))
+            results.append(best / number * 1e6)
+        print(f'{count:>10}' + ''.join(f'{value:>11.2f} us' for value in results))
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Memory held by live transactions: every transaction keeps a decoded OCF request and the response
+built for it, as the server does for an exchange or an observe relation.
+
+Run from the repository root:
+
+    PYTHONPATH=src python benchmarks/bench_memory.py
+"""
+import gc
+import tracemalloc
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.messages.option import Option
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.messages.response import Response
+from Bubot_CoAP.serializer_udp import SerializerUdp
+from Bubot_CoAP.transaction import Transaction
+
+SOURCE = ('127.0.0.1', 5683)
+
+
+def ocf_datagram():
+    request = Request()
+    request.type = defines.Types['CON']
+    request.code = defines.Codes.GET.number
+    request.mid = 4242
+    request.token = b'\x01\x02\x03\x04\x05\x06\x07\x08'
+    request.uri_path = '/oic/sec/doxm'
+    request.uri_query = 'if=oic.if.baseline'
+    request.observe = 0
+    request.accept = 10000
+    request.add_option(Option(defines.OptionRegistry.OCF_ACCEPT_CONTENT_FORMAT_VERSION, 2048))
+    return bytes(SerializerUdp.serialize(request))
+
+
+def transaction(datagram, index):
+    request = SerializerUdp.deserialize(datagram, SOURCE)
+    request.mid = index & 0xFFFF
+    response = Response()
+    response.type = defines.Types['ACK']
+    response.code = defines.Codes.CONTENT.number
+    response.mid = request.mid
+    response.token = request.token
+    response.observe = 1
+    response.content_type = 10000
+    return Transaction(request=request, response=response, timestamp=0)
+
+
+def measure(count, factory):
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    items = [factory(i) for i in range(count)]
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del items
+    return size / count
+
+
+def main(count=20000):
+    datagram = ocf_datagram()
+    samples = {
+        'Option': lambda i: Option(defines.OptionRegistry.URI_PATH, 'oic'),
+        'Request (empty)': lambda i: Request(),
+        'Response (empty)': lambda i: Response(),
+        'Transaction (full)': lambda i: transaction(datagram, i),
+    }
+    print(f'{"object":<22}{"bytes per object":>18}')
+    for name, factory in samples.items():
+        print(f'{name:<22}{measure(count, factory):>18.0f}')
+
+
+if __name__ == '__main__':
+    main()
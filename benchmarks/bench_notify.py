@@ -0,0 +1,108 @@
+"""
+Cost of notifying 10k observers of one resource: the serialize-once fan-out of Server.notify against running
+the render, observe, block and message layers and a full serialization for every observer.
+
+The datagrams are counted instead of being sent.
+
+Run from the repository root:
+
+    PYTHONPATH=src python benchmarks/bench_notify.py
+"""
+import asyncio
+import logging
+import time
+from socket import AF_INET
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.messages.response import Response
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.serializer_udp_buffer import SerializerUdpBuffer
+from Bubot_CoAP.server import Server
+from Bubot_CoAP.transaction import Transaction
+
+PORT = 25783
+
+
+class Sensor(Resource):
+    async def render_GET(self, request, response):
+        response.payload = (defines.Content_types['application/json'], b'{"temperature": 21.5, "unit": "C"}')
+        return self, response
+
+
+async def per_observer(server, resource):
+    observers = server.observe_layer.notify(resource)
+    for transaction in observers:
+        notification_type = transaction.response.type
+        transaction.response = None
+        await server.request_layer.receive_request(transaction)
+        server.observe_layer.send_response(transaction)
+        await server._send_notification(transaction, notification_type)
+
+
+async def fan_out(server, resource):
+    await server.notify(resource)
+    await server.notifications.join()
+
+
+async def measure(observers, serializer, rounds):
+    server = Server()
+    await server.add_endpoint(f'coap://127.0.0.1:{PORT}', serializer=serializer)
+    endpoint = server.endpoint_layer.find_sending_endpoint(Response.init_from_request(local_request()))
+    sent = [0, 0]
+
+    def send(data, address, **kwargs):
+        sent[0] += 1
+        sent[1] += len(data)
+    endpoint.send = send
+
+    resource = Sensor('sensor', server)
+    server.add_resource('/sensor', resource)
+    for index in range(observers):
+        request = local_request()
+        request._source = ('127.0.0.1', 30000 + index)
+        request.token = index.to_bytes(4, 'big')
+        request.observe = 0
+        transaction = Transaction(request=request)
+        await server.observe_layer.receive_request(transaction)
+        await server.request_layer.receive_request(transaction)
+        server.observe_layer.send_response(transaction)
+
+    results = []
+    for notify in (per_observer, fan_out):
+        best = None
+        for _ in range(rounds):
+            resource.observe_count += 1
+            start = time.perf_counter()
+            await notify(server, resource)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results.append(best)
+    await server.close()
+    return results, sent
+
+
+def local_request():
+    request = Request()
+    request.type = defines.Types['NON']
+    request.code = defines.Codes.GET.number
+    request.uri_path = 'sensor'
+    request._destination = ('127.0.0.1', PORT)
+    request._source = ('127.0.0.1', 30000)
+    request.family = AF_INET
+    request.scheme = 'coap'
+    return request
+
+
+def main(observers=10000, rounds=3):
+    logging.getLogger('Bubot_CoAP').setLevel(logging.WARNING)
+    print(f'notify {observers} observers of one resource')
+    print(f'{"serializer":>20}{"per observer":>16}{"fan-out":>12}')
+    for serializer in (None, SerializerUdpBuffer):
+        (slow, fast), _ = asyncio.run(measure(observers, serializer, rounds))
+        name = serializer.__name__ if serializer else 'SerializerUdp'
+        print(f'{name:>20}{slow * 1e3:>13.1f} ms{fast * 1e3:>9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Cost of ObserveLayer.notify for one changed resource, with 100k observe relations spread over 10k
+resources, and of registering and deregistering a relation.
+
+Run from the repository root:
+
+    PYTHONPATH=src python benchmarks/bench_observe.py
+"""
+import asyncio
+import timeit
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.layers.observe_layer import ObserveLayer
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.messages.response import Response
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.transaction import Transaction
+
+
+def register(layer, loop, resource, index, observe=0):
+    request = Request()
+    request.type = defines.Types['CON']
+    request.code = defines.Codes.GET.number
+    request.token = index.to_bytes(8, 'big')
+    request.source = ('127.0.0.1', 20000 + index // 60000)
+    request.observe = observe
+    transaction = Transaction(request=request)
+    loop.run_until_complete(layer.receive_request(transaction))
+    transaction.resource = resource
+    transaction.response = Response()
+    transaction.response.code = defines.Codes.CONTENT.number
+    layer.send_response(transaction)
+    return transaction
+
+
+def main(relations=100000, resources=10000, number=200):
+    loop = asyncio.new_event_loop()
+    layer = ObserveLayer()
+    items = []
+    for index in range(resources):
+        resource = Resource(f'r{index}')
+        resource.path = f'/a/r{index}'
+        items.append(resource)
+    for index in range(relations):
+        register(layer, loop, items[index % resources], index)
+
+    target = items[resources // 2]
+    notified = len(layer.notify(target))
+    best = min(timeit.repeat(lambda: layer.notify(target), number=number, repeat=3))
+    print(f'{relations} relations over {resources} resources')
+    print(f'notify one resource ({notified} observers): {best / number * 1e6:10.1f} us')
+
+    def renew():
+        register(layer, loop, target, relations + 1)
+        register(layer, loop, target, relations + 1, observe=1)
+    best = min(timeit.repeat(renew, number=number, repeat=3))
+    print(f'register and deregister one relation:   {best / number * 1e6:10.1f} us')
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
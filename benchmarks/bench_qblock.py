@@ -0,0 +1,136 @@
+"""
+Completion time of a 64 KB download and upload over emulated links with a high round-trip time, block-wise
+with Block2 and Block1 one block per round trip against Q-Block2 and Q-Block1 bursts (RFC 9177).
+
+Two servers talk through an in-memory link: every datagram is serialized, queued behind the previous ones at
+the rate of the link, delayed by half the round-trip time, dropped with the given probability, and handed to
+the datagram protocol of the peer. The simulation runs on an event loop with a virtual clock.
+
+Run from the repository root:
+
+    PYTHONPATH=src python benchmarks/bench_qblock.py
+"""
+import asyncio
+import logging
+import random
+from socket import AF_INET
+from types import SimpleNamespace
+
+from bench_rto import VirtualClockLoop
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.coap_udp_protocol import CoapDatagramProtocol
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.serializer_udp import SerializerUdp
+from Bubot_CoAP.server import Server
+
+BODY = bytes(range(256)) * 256
+
+# name, round-trip time, rate in bytes per second, loss
+LINKS = (
+    ('satellite', 0.6, 125000, 0.0),
+    ('satellite', 0.6, 125000, 0.02),
+    ('nb-iot', 2.5, 2500, 0.0),
+    ('lte-m', 0.3, 40000, 0.05),
+)
+
+SERVER = ('10.0.0.1', 5683)
+CLIENT = ('10.0.0.2', 5683)
+
+
+class Firmware(Resource):
+    def __init__(self, name):
+        super().__init__(name)
+        self.data = BODY
+
+    async def render_GET(self, request, response):
+        response.payload = (defines.Content_types['application/octet-stream'], self.data)
+        response.etag = b'1'
+        return self, response
+
+    async def render_POST(self, request, response):
+        self.data = request.payload
+        response.code = defines.Codes.CHANGED.number
+        return self, response
+
+
+class Link:
+    def __init__(self, loop, rnd, rtt, rate, loss):
+        self.loop = loop
+        self.rnd = rnd
+        self.rtt = rtt
+        self.rate = rate
+        self.loss = loss
+        self.free = {}
+        self.sent = 0
+
+    def connect(self, server, address, peer, peer_address):
+        endpoint = SimpleNamespace(serializer=SerializerUdp, address=peer_address, multicast=False, scheme='coap',
+                                   family=AF_INET)
+        protocol = CoapDatagramProtocol(peer, endpoint)
+
+        async def send_datagram(message, **kwargs):
+            data = SerializerUdp.serialize(message)
+            self.sent += 1
+            # the datagrams of a direction leave one after the other at the rate of the link
+            departure = max(self.loop.time(), self.free.get(address, 0)) + len(data) / self.rate
+            self.free[address] = departure
+            if self.rnd.random() >= self.loss:
+                self.loop.call_at(departure + self.rtt / 2, protocol.datagram_received, data, address)
+
+        server.send_datagram = send_datagram
+
+
+async def exchange(client, code, payload=None):
+    request = Request()
+    request.type = defines.Types['CON']
+    request.code = code
+    request._destination = SERVER
+    request._source = CLIENT
+    request.scheme = 'coap'
+    request.family = AF_INET
+    request.uri_path = 'firmware'
+    request.payload = payload
+    return await client.send_message(request, timeout=3600)
+
+
+def simulate(rtt, rate, loss, q_block, seed):
+    loop = VirtualClockLoop()
+    asyncio.set_event_loop(loop)
+    link = Link(loop, random.Random(seed), rtt, rate, loss)
+    server = Server(loop=loop)
+    client = Server(loop=loop, q_block=q_block)
+    server.add_resource('/firmware', Firmware('firmware'))
+    link.connect(server, SERVER, client, CLIENT)
+    link.connect(client, CLIENT, server, SERVER)
+    result = []
+
+    async def run():
+        for code, payload in ((defines.Codes.GET.number, None), (defines.Codes.POST.number, BODY[::-1])):
+            start = loop.time()
+            sent = link.sent
+            response = await exchange(client, code, payload)
+            result.append((loop.time() - start, link.sent - sent))
+        assert response.code == defines.Codes.CHANGED.number and server.root['/firmware'].data == BODY[::-1]
+        await client.close()
+        await server.close()
+
+    loop.run_until_complete(run())
+    loop.close()
+    return result
+
+
+def main(seed=1):
+    logging.getLogger('Bubot_CoAP').setLevel(logging.CRITICAL)
+    print(f'{len(BODY) >> 10} KB in {len(BODY) // defines.MAX_PAYLOAD} blocks')
+    print(f'{"link":>10}{"rtt":>6}{"rate":>8}{"loss":>6}{"mode":>9}{"download":>10}{"sent":>6}{"upload":>10}{"sent":>6}')
+    for name, rtt, rate, loss in LINKS:
+        for q_block in (False, True):
+            (download, download_sent), (upload, upload_sent) = simulate(rtt, rate, loss, q_block, seed)
+            print(f'{name:>10}{rtt:>6.1f}{rate * 8 // 1000:>6}kb{loss:>6.2f}{"Q-Block" if q_block else "Block":>9}'
+                  f'{download:>9.1f}s{download_sent:>6}{upload:>9.1f}s{upload_sent:>6}')
+
+
+if __name__ == '__main__':
+    main()
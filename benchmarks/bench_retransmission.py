@@ -0,0 +1,134 @@
+"""
+Memory and CPU cost of keeping 50k confirmable exchanges waiting for their acknowledgement: one task, event
+and wait_for timer per message as Server did before, against the central RetransmissionScheduler.
+
+For each strategy the benchmark schedules the retransmissions, measures the memory they hold, lets one
+round of retransmissions fire, then acknowledges every message.
+
+Run from the repository root:
+
+    PYTHONPATH=src python benchmarks/bench_retransmission.py
+"""
+import asyncio
+import gc
+import time
+import tracemalloc
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.retransmission import RetransmissionScheduler
+from Bubot_CoAP.transaction import Transaction
+
+TIMEOUT = 0.5
+
+
+class FakeServer:
+    def __init__(self, loop):
+        self.loop = loop
+        self.stopped = asyncio.Event()
+        self.sent = 0
+
+    async def send_datagram(self, message):
+        self.sent += 1
+
+
+class TaskPerMessage:
+    """
+    The former strategy: a task sleeping in wait_for on a per-message event.
+    """
+
+    def __init__(self, server):
+        self._server = server
+        self._stop = {}
+
+    def start(self, transaction, message):
+        stop = asyncio.Event()
+        self._stop[transaction] = stop
+        self._server.loop.create_task(self._retransmit(transaction, message, TIMEOUT, stop))
+
+    def stop(self, transaction):
+        self._stop.pop(transaction).set()
+
+    async def _retransmit(self, transaction, message, future_time, stop):
+        retransmit_count = 0
+        while retransmit_count < defines.MAX_RETRANSMIT and not message.acknowledged:
+            try:
+                await asyncio.wait_for(stop.wait(), future_time)
+            except asyncio.TimeoutError:
+                pass
+            if not message.acknowledged:
+                retransmit_count += 1
+                future_time *= 2
+                if retransmit_count < defines.MAX_RETRANSMIT:
+                    await self._server.send_datagram(message)
+
+
+def exchanges(count):
+    result = []
+    for index in range(count):
+        request = Request()
+        request.type = defines.Types['CON']
+        request.code = defines.Codes.GET.number
+        request.mid = index % 65000
+        request.destination = ('127.0.0.1', 20000 + index // 65000)
+        result.append(Transaction(request=request))
+    return result
+
+
+async def measure(factory, transactions, trace):
+    server = FakeServer(asyncio.get_running_loop())
+    scheduler = factory(server)
+    runner = None
+    if isinstance(scheduler, RetransmissionScheduler):
+        runner = asyncio.create_task(scheduler.run())
+    for transaction in transactions:
+        transaction.request.acknowledged = False
+    gc.collect()
+
+    if trace:
+        tracemalloc.start()
+    cpu = time.process_time()
+    for transaction in transactions:
+        scheduler.start(transaction, transaction.request)
+    # let the tasks of the former strategy reach their wait_for
+    for _ in range(3):
+        await asyncio.sleep(0)
+    start_cpu = time.process_time() - cpu
+    memory = tracemalloc.get_traced_memory()[0] if trace else 0
+    tracemalloc.stop()
+
+    cpu = time.process_time()
+    while server.sent < len(transactions):
+        await asyncio.sleep(0.01)
+    fire_cpu = time.process_time() - cpu
+
+    cpu = time.process_time()
+    for transaction in transactions:
+        transaction.request.acknowledged = True
+        scheduler.stop(transaction)
+    for _ in range(3):
+        await asyncio.sleep(0)
+    ack_cpu = time.process_time() - cpu
+
+    if runner is not None:
+        server.stopped.set()
+        scheduler.close()
+        await runner
+    return memory, start_cpu, fire_cpu, ack_cpu
+
+
+def main(count=50000):
+    transactions = exchanges(count)
+    print(f'{count} confirmable exchanges in flight, CPU time of each phase')
+    print(f'{"strategy":>18}{"memory":>12}{"start":>12}{"1st retransmit":>18}{"ack all":>12}')
+    strategies = (('task per message', TaskPerMessage),
+                  ('deadline heap', lambda server: RetransmissionScheduler(server, ack_timeout=TIMEOUT, adaptive=False)))
+    for name, factory in strategies:
+        memory = asyncio.run(measure(factory, transactions, True))[0]
+        _, start_cpu, fire_cpu, ack_cpu = asyncio.run(measure(factory, transactions, False))
+        print(f'{name:>18}{memory / 2 ** 20:>9.1f} MB{start_cpu * 1e3:>9.0f} ms{fire_cpu * 1e3:>15.0f} ms'
+              f'{ack_cpu * 1e3:>9.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Option access on the request routing path: a decoded OCF request goes through the option reads done
+by the message, block, observe, request and resource layers, and a response is built and encoded.
+
+Run from the repository root:
+
+    PYTHONPATH=src python benchmarks/bench_routing.py
+"""
+import timeit
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.messages.option import Option
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.messages.response import Response
+from Bubot_CoAP.serializer_udp import SerializerUdp
+
+SOURCE = ('127.0.0.1', 5683)
+
+
+def ocf_request():
+    request = Request()
+    request.type = defines.Types['CON']
+    request.code = defines.Codes.GET.number
+    request.mid = 4242
+    request.token = b'\x01\x02\x03\x04\x05\x06\x07\x08'
+    request.uri_path = '/oic/sec/doxm'
+    request.uri_query = 'if=oic.if.baseline&rt=oic.r.doxm'
+    request.observe = 0
+    request.accept = 10000
+    request.add_option(Option(defines.OptionRegistry.OCF_ACCEPT_CONTENT_FORMAT_VERSION, 2048))
+    request.block2 = (0, 0, 1024)
+    return request
+
+
+def route(request):
+    # block layer
+    request.block1
+    request.block2
+    request.size2
+    # observe layer
+    request.observe
+    request.observe
+    # request layer
+    request.uri_path
+    request.uri_path
+    # resource layer
+    request.if_match
+    request.if_none_match
+    request.etag
+    request.uri_query
+    request.content_type
+    request.accept
+
+
+def respond(request):
+    response = Response()
+    response.type = defines.Types['ACK']
+    response.code = defines.Codes.CONTENT.number
+    response.mid = request.mid
+    response.token = request.token
+    response.observe = 3
+    response.etag = b'\x9a\x1c\x03\x7f'
+    response.content_type = 10000
+    response.add_option(Option(defines.OptionRegistry.OCF_CONTENT_FORMAT_VERSION, 2048))
+    response.block2 = (0, 1, 1024)
+    response.size2 = 4096
+    response.payload = bytes(1024)
+    return SerializerUdp.serialize(response)
+
+
+def receive(datagram):
+    request = SerializerUdp.deserialize(datagram, SOURCE)
+    route(request)
+    return respond(request)
+
+
+def main(number=20000):
+    request = ocf_request()
+    datagram = bytes(SerializerUdp.serialize(request))
+    samples = {
+        'option reads': lambda: route(request),
+        'build response': lambda: respond(request),
+        'full request': lambda: receive(datagram),
+    }
+    print(f'{"step":<20}{"time":>12}')
+    for name, func in samples.items():
+        best = min(timeit.repeat(func, number=number, repeat=3))
+        print(f'{name:<20}{best / number * 1e6:>9.2f} us')
+
+
+if __name__ == '__main__':
+    main()
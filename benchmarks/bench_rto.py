@@ -0,0 +1,142 @@
+"""
+Completion time of confirmable exchanges over simulated lossy links, with the fixed ACK_TIMEOUT against
+the adaptive per-peer RTO of RetransmissionScheduler.
+
+Each peer is polled by one client sending its requests back to back. A link drops every datagram with
+the given probability and delays the rest by half the round-trip time plus jitter. The simulation runs on
+an event loop with a virtual clock, so it takes seconds of CPU time, not hours.
+
+Run from the repository root:
+
+    PYTHONPATH=src python benchmarks/bench_rto.py
+"""
+import asyncio
+import logging
+import random
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.retransmission import RetransmissionScheduler
+from Bubot_CoAP.transaction import Transaction
+
+# name, round-trip time, jitter, loss
+LINKS = (
+    ('lan', 0.005, 0.002, 0.05),
+    ('wifi', 0.05, 0.03, 0.15),
+    ('cellular', 0.8, 0.6, 0.1),
+    ('nb-iot', 2.5, 0.5, 0.05),
+)
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop that jumps to the next timer instead of sleeping.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._now = 0.0
+        select = self._selector.select
+
+        def jump(timeout=None):
+            if timeout:
+                self._now += timeout
+            return select(0)
+
+        self._selector.select = jump
+
+    def time(self):
+        return self._now
+
+
+class LossyLink:
+    def __init__(self, loop, rnd, rtt, jitter, loss):
+        self.loop = loop
+        self.rnd = rnd
+        self.rtt = rtt
+        self.jitter = jitter
+        self.loss = loss
+        self.scheduler = None
+        self.stopped = asyncio.Event()
+        self.sent = 0
+        self.spurious = 0
+        # stands for the block layer of a server, told about the requests given up
+        self.block_layer = self
+
+    def give_up(self, request):
+        pass
+
+    def delay(self):
+        return self.rtt / 2 + self.rnd.uniform(0, self.jitter)
+
+    async def send_datagram(self, message):
+        self.sent += 1
+        if self.rnd.random() < self.loss:
+            return
+        self.loop.call_later(self.delay(), self.receive, message)
+
+    def receive(self, message):
+        if self.rnd.random() < self.loss:
+            return
+        self.loop.call_later(self.delay(), self.acknowledge, message)
+
+    def acknowledge(self, message):
+        transaction = message.transaction
+        if message.acknowledged:
+            self.spurious += 1
+            return
+        message.acknowledged = True
+        self.scheduler.stop(transaction)
+        message.done.set_result(True)
+
+
+class Exchange(Request):
+    __slots__ = ('transaction', 'done')
+
+
+async def poll(link, requests):
+    completed = 0
+    for mid in range(requests):
+        message = Exchange()
+        message.type = defines.Types['CON']
+        message.code = defines.Codes.GET.number
+        message.mid = mid
+        message.destination = ('127.0.0.1', 5683)
+        transaction = message.transaction = Transaction(request=message)
+        message.done = link.loop.create_future()
+        await link.send_datagram(message)
+        link.scheduler.start(transaction, message)
+        while not message.done.done() and not message.timeouted:
+            await asyncio.wait((message.done,), timeout=1)
+        completed += message.done.done()
+    return completed
+
+
+def simulate(rtt, jitter, loss, adaptive, requests, seed):
+    loop = VirtualClockLoop()
+    link = LossyLink(loop, random.Random(seed), rtt, jitter, loss)
+    link.scheduler = RetransmissionScheduler(link, adaptive=adaptive)
+    runner = loop.create_task(link.scheduler.run())
+    random.seed(seed)
+    completed = loop.run_until_complete(poll(link, requests))
+    elapsed = loop.time()
+    link.stopped.set()
+    link.scheduler.close()
+    loop.run_until_complete(runner)
+    loop.close()
+    return elapsed, completed, link.sent - requests, link.spurious
+
+
+def main(requests=500, seed=1):
+    logging.getLogger('Bubot_CoAP').setLevel(logging.ERROR)
+    print(f'{requests} sequential CON requests per link')
+    print(f'{"link":>10}{"rtt":>8}{"loss":>6}{"rto":>10}{"time":>10}{"done":>6}{"retransmit":>12}{"spurious":>10}')
+    for name, rtt, jitter, loss in LINKS:
+        for adaptive in (False, True):
+            elapsed, completed, retransmitted, spurious = simulate(rtt, jitter, loss, adaptive, requests, seed)
+            print(f'{name:>10}{rtt:>8.3f}{loss:>6.2f}{"adaptive" if adaptive else "fixed":>10}{elapsed:>9.0f}s'
+                  f'{completed:>6}{retransmitted:>12}{spurious:>10}')
+
+
+if __name__ == '__main__':
+    main()
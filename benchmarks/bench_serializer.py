@@ -0,0 +1,92 @@
+"""
+Compare SerializerUdp with SerializerUdpBuffer on typical OCF/CBOR messages:
+encoding of responses and decoding of a request that is only matched as a duplicate.
+
+Run from the repository root:
+
+    PYTHONPATH=src python benchmarks/bench_serializer.py
+"""
+import timeit
+
+import cbor2
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.messages.option import Option
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.messages.response import Response
+from Bubot_CoAP.serializer_udp import SerializerUdp
+from Bubot_CoAP.serializer_udp_buffer import SerializerUdpBuffer
+
+DOXM = {
+    "rt": ["oic.r.doxm"],
+    "if": ["oic.if.rw", "oic.if.baseline"],
+    "p": {"bm": 1},
+    "oxms": [0],
+    "oxmsel": 0,
+    "sct": 1,
+    "owned": False,
+    "devowneruuid": "00000000-0000-0000-0000-000000000000",
+    "deviceuuid": "10000000-0000-0000-0000-000000000001",
+    "rowneruuid": "00000000-0000-0000-0000-000000000000"
+}
+
+
+def ocf_response(payload, observe=None, block2=None):
+    response = Response()
+    response.type = defines.Types['NON']
+    response.code = defines.Codes.CONTENT.number
+    response.mid = 4242
+    response.token = b'\x01\x02\x03\x04\x05\x06\x07\x08'
+    if observe is not None:
+        response.observe = observe
+    response.etag = b'\x9a\x1c\x03\x7f'
+    response.content_type = 10000
+    response.add_option(Option(defines.OptionRegistry.OCF_CONTENT_FORMAT_VERSION, 2048))
+    if block2 is not None:
+        response.block2 = block2
+        response.size2 = 4096
+    response.payload = payload
+    return response
+
+
+def ocf_request():
+    request = Request()
+    request.type = defines.Types['CON']
+    request.code = defines.Codes.GET.number
+    request.mid = 4242
+    request.token = b'\x01\x02\x03\x04\x05\x06\x07\x08'
+    request.uri_path = '/oic/sec/doxm'
+    request.uri_query = 'if=oic.if.baseline'
+    request.accept = 10000
+    request.add_option(Option(defines.OptionRegistry.OCF_ACCEPT_CONTENT_FORMAT_VERSION, 2048))
+    return request
+
+
+def duplicate_check(serializer, datagram):
+    message = serializer.deserialize(datagram, ('127.0.0.1', 5683))
+    return message.mid, message.token
+
+
+def main(number=20000):
+    doxm = cbor2.dumps(DOXM)
+    samples = {
+        'doxm GET': ocf_response(doxm),
+        'doxm notification': ocf_response(doxm, observe=17),
+        'block2 1024': ocf_response(bytes(1024), block2=(1, 1, 1024)),
+    }
+    print(f'{"message":<20}{"SerializerUdp":>16}{"SerializerUdpBuffer":>22}{"speedup":>10}')
+    for name, message in samples.items():
+        assert bytes(SerializerUdp.serialize(message)) == bytes(SerializerUdpBuffer.serialize(message))
+        old = min(timeit.repeat(lambda: SerializerUdp.serialize(message), number=number, repeat=3))
+        new = min(timeit.repeat(lambda: SerializerUdpBuffer.serialize(message), number=number, repeat=3))
+        print(f'{name:<20}{old / number * 1e6:>13.2f} us{new / number * 1e6:>19.2f} us{old / new:>9.2f}x')
+
+    datagram = bytes(SerializerUdp.serialize(ocf_request()))
+    old = min(timeit.repeat(lambda: duplicate_check(SerializerUdp, datagram), number=number, repeat=3))
+    new = min(timeit.repeat(lambda: duplicate_check(SerializerUdpBuffer, datagram), number=number, repeat=3))
+    name = 'duplicate request'
+    print(f'{name:<20}{old / number * 1e6:>13.2f} us{new / number * 1e6:>19.2f} us{old / new:>9.2f}x')
+
+
+if __name__ == '__main__':
+    main()
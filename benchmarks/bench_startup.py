@@ -0,0 +1,62 @@
+"""
+Startup of a host registering 100 000 and 300 000 resources, /dev{i // 100}/res{i % 100} of 20 resource types:
+Server.add_resource called for each resource against Server.add_resources with the whole batch, sorted and
+shuffled, each followed by the first request of /.well-known/core. The resources are created beforehand.
+
+Run from the repository root:
+
+    PYTHONPATH=src python benchmarks/bench_startup.py
+"""
+import asyncio
+import gc
+import random
+import time
+
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.server import Server
+
+
+def resources(count):
+    pairs = []
+    for index in range(count):
+        resource = Resource(str(index))
+        resource.resource_type = f'oic.r.type{index % 20}'
+        pairs.append((f'/dev{index // 100}/res{index % 100}', resource))
+    return pairs
+
+
+def one_by_one(server, pairs):
+    for path, resource in pairs:
+        server.add_resource(path, resource)
+
+
+async def run(mode, pairs):
+    server = Server()
+    if mode == 'shuffled':
+        pairs = pairs[:]
+        random.Random(1).shuffle(pairs)
+    gc.collect()
+    start = time.perf_counter()
+    if mode == 'each':
+        one_by_one(server, pairs)
+    else:
+        server.add_resources(pairs)
+    registered = time.perf_counter() - start
+    start = time.perf_counter()
+    server.discovery.render()
+    discovered = time.perf_counter() - start
+    await server.close()
+    return registered, discovered
+
+
+def main():
+    print(f'{"resources":>10}{"mode":>10}{"register":>12}{"discovery":>12}')
+    for count in (100000, 300000):
+        pairs = resources(count)
+        for mode in ('each', 'sorted', 'shuffled'):
+            registered, discovered = asyncio.run(run(mode, pairs))
+            print(f'{count:>10}{mode:>10}{registered:>11.3f}s{discovered:>11.3f}s')
+
+
+if __name__ == '__main__':
+    main()
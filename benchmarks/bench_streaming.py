@@ -0,0 +1,126 @@
+"""
+Peak memory traced while downloading and uploading bodies of 1, 4 and 8 MB block-wise, reassembled whole
+against streamed: the server reads the download from an async generator and the client iterates over its
+blocks, the upload is handed to the resource block by block.
+
+The client and the server talk through the in-memory link of bench_qblock, on an event loop with a virtual
+clock.
+
+Run from the repository root:
+
+    PYTHONPATH=src python benchmarks/bench_streaming.py
+"""
+import asyncio
+import logging
+import random
+import time
+import tracemalloc
+from socket import AF_INET
+
+from bench_qblock import CLIENT, SERVER, Link
+from bench_rto import VirtualClockLoop
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.server import Server
+
+CHUNK = bytes(range(256)) * 64
+
+
+class Log(Resource):
+    def __init__(self, name, size, streaming):
+        super().__init__(name, streaming=streaming)
+        self.size = size
+        self.received = 0
+
+    async def chunks(self):
+        for _ in range(self.size // len(CHUNK)):
+            yield CHUNK
+
+    async def render_GET(self, request, response):
+        if self.streaming:
+            payload = self.chunks()
+        else:
+            payload = CHUNK * (self.size // len(CHUNK))
+        response.payload = (defines.Content_types['application/octet-stream'], payload)
+        return self, response
+
+    async def render_POST(self, request, response):
+        if self.streaming:
+            self.received = 0
+            async for block in request.payload:
+                self.received += len(block)
+        else:
+            self.received = len(request.payload)
+        response.code = defines.Codes.CHANGED.number
+        return self, response
+
+
+async def exchange(client, code, payload=None, stream=False):
+    request = Request()
+    request.type = defines.Types['CON']
+    request.code = code
+    request._destination = SERVER
+    request._source = CLIENT
+    request.scheme = 'coap'
+    request.family = AF_INET
+    request.uri_path = 'firmware'
+    request.payload = payload
+    return await client.send_message(request, stream=stream, timeout=3600)
+
+
+def simulate(size, streaming):
+    loop = VirtualClockLoop()
+    asyncio.set_event_loop(loop)
+    link = Link(loop, random.Random(1), 0.01, 10 ** 9, 0.0)
+    # the exchanges are remembered for 2 s of wall clock instead of 247 s, to see the memory held by the bodies
+    server = Server(loop=loop, exchange_lifetime=2)
+    client = Server(loop=loop, exchange_lifetime=2)
+    log = Log('firmware', size, streaming)
+    server.add_resource('/firmware', log)
+    link.connect(server, SERVER, client, CLIENT)
+    link.connect(client, CLIENT, server, SERVER)
+    body = CHUNK * (size // len(CHUNK))
+    result = []
+
+    async def run():
+        tracemalloc.start()
+        start = time.perf_counter()
+        if streaming:
+            response = await exchange(client, defines.Codes.GET.number, stream=True)
+            received = 0
+            async for block in response.payload:
+                received += len(block)
+        else:
+            response = await exchange(client, defines.Codes.GET.number)
+            received = len(response.payload)
+        assert received == size
+        result.append((time.perf_counter() - start, tracemalloc.get_traced_memory()[1]))
+        tracemalloc.reset_peak()
+
+        start = time.perf_counter()
+        response = await exchange(client, defines.Codes.POST.number, body)
+        assert response.code == defines.Codes.CHANGED.number and log.received == size
+        result.append((time.perf_counter() - start, tracemalloc.get_traced_memory()[1]))
+        tracemalloc.stop()
+        await client.close()
+        await server.close()
+
+    loop.run_until_complete(run())
+    loop.close()
+    return result
+
+
+def main():
+    logging.getLogger('Bubot_CoAP').setLevel(logging.CRITICAL)
+    print(f'{"body":>6}{"mode":>12}{"download":>10}{"peak":>10}{"upload":>10}{"peak":>10}')
+    for megabytes in (1, 4, 8):
+        for streaming in (False, True):
+            (download, download_peak), (upload, upload_peak) = simulate(megabytes << 20, streaming)
+            print(f'{megabytes:>3} MB{"streamed" if streaming else "reassembled":>12}'
+                  f'{download:>9.1f}s{download_peak / 2 ** 20:>7.1f} MB{upload:>9.1f}s{upload_peak / 2 ** 20:>7.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Registration and lookups of 100 000 resources, /dev{i // 100}/res{i % 100}, in the former resource tree, a flat
+dictionary scanned for the prefix matches and sorted for the listing, against the trie of path segments.
+
+Run from the repository root:
+
+    PYTHONPATH=src python benchmarks/bench_tree.py
+"""
+import random
+import time
+
+from Bubot_CoAP.utils import Tree
+
+COUNT = 100000
+LOOKUPS = 100000
+PREFIX_LOOKUPS = 200
+
+
+class DictTree(object):
+    """
+    The former resource tree, the paths in a flat dictionary.
+    """
+
+    def __init__(self):
+        self.tree = {}
+
+    def dump(self):
+        return sorted(list(self.tree.keys()))
+
+    def with_prefix(self, path):
+        ret = []
+        for key in list(self.tree.keys()):
+            if path.startswith(key):
+                ret.append(key)
+        if len(ret) > 0:
+            return ret
+        raise KeyError
+
+    def longest_prefix(self, path):
+        new_path = '/'
+        for tmp in self.with_prefix(path):
+            if len(tmp) > len(new_path):
+                new_path = tmp
+        return new_path, self.tree[new_path]
+
+    def __getitem__(self, item):
+        return self.tree[item]
+
+    def __setitem__(self, key, value):
+        self.tree[key] = value
+
+
+def register(tree, paths):
+    # as Server.add_resource did, every prefix of the path looked up
+    for path in paths:
+        actual_path = ''
+        for segment in path.strip('/').split('/'):
+            actual_path += '/' + segment
+            try:
+                tree[actual_path]
+            except KeyError:
+                tree[actual_path] = path
+
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    function()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    paths = [f'/dev{i // 100}/res{i % 100}' for i in range(COUNT)]
+    rnd = random.Random(1)
+    lookups = [rnd.choice(paths) for _ in range(LOOKUPS)]
+    posts = [path + '/new' for path in lookups[:PREFIX_LOOKUPS]]
+    print(f'{COUNT} resources, microseconds per operation')
+    print(f'{"tree":>10}{"register":>10}{"lookup":>10}{"prefix":>10}{"dump":>12}')
+    for name, tree in (('dict', DictTree()), ('trie', Tree())):
+        tree['/'] = '/'
+        results = [
+            timed(lambda: register(tree, paths), COUNT),
+            timed(lambda: [tree[path] for path in lookups], LOOKUPS),
+            timed(lambda: [tree.longest_prefix(path) for path in posts], PREFIX_LOOKUPS),
+            timed(tree.dump, 1),
+        ]
+        assert tree.longest_prefix(posts[0])[0] == lookups[0]
+        print(f'{name:>10}' + ''.join(f'{value:>10.2f}' for value in results[:3]) + f'{results[3]:>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+import time
+from collections import OrderedDict
+
+from . import defines
+from .messages.response import Response
+from .utils import check_nocachekey
+
+__author__ = 'Mikhail Razgovorov'
+
+# options naming the target of a request: the responses for one URI are invalidated together
+URI_OPTIONS = frozenset(option.number for option in (
+    defines.OptionRegistry.URI_HOST, defines.OptionRegistry.URI_PORT, defines.OptionRegistry.URI_PATH,
+    defines.OptionRegistry.URI_QUERY, defines.OptionRegistry.PROXY_URI, defines.OptionRegistry.PROXY_SCHEME))
+
+# options of the transfer of a representation, not of the representation itself
+TRANSFER_OPTIONS = frozenset(option.number for option in (
+    defines.OptionRegistry.OBSERVE, defines.OptionRegistry.BLOCK1, defines.OptionRegistry.BLOCK2,
+    defines.OptionRegistry.Q_BLOCK1, defines.OptionRegistry.Q_BLOCK2, defines.OptionRegistry.SIZE1,
+    defines.OptionRegistry.SIZE2))
+
+
+class CacheElement(object):
+    """
+    A response kept by the cache.
+    """
+    __slots__ = ('key', 'uri', 'code', 'options', 'payload', 'etag', 'size', 'expires')
+
+    def __init__(self, key, uri, response, expires):
+        """
+        Keep a response, without its transfer options.
+
+        :param key: the cache key of the request
+        :param uri: the URI of the request
+        :type response: Response
+        :param response: the response
+        :param expires: when the response stops being fresh
+        """
+        self.key = key
+        self.uri = uri
+        self.code = response.code
+        self.options = response.options.copy()
+        for number in TRANSFER_OPTIONS:
+            self.options.pop_number(number)
+        payload = response.payload
+        if isinstance(payload, (bytearray, memoryview)):
+            payload = bytes(payload)
+        self.payload = payload
+        self.etag = self.options.first(defines.OptionRegistry.ETAG.number)
+        if payload is None:
+            self.size = 0
+        elif isinstance(payload, str):
+            self.size = len(payload.encode('utf-8'))
+        else:
+            self.size = len(payload)
+        self.expires = expires
+
+    def answer(self, request, now):
+        """
+        Build the response to a request from the element, its Max-Age is the time left to the freshness.
+
+        :type request: Request
+        :param request: the request
+        :param now: the current time
+        :rtype: Response
+        """
+        response = Response.init_cached(request, self.code, self.options.copy(), self.payload)
+        response.max_age = max(int(self.expires - now), 0)
+        return response
+
+
+class Cache(object):
+    """
+    Bounded LRU cache of responses, keyed on the cache key of RFC 7252 section 5.6: the options of the GET
+    requests, except the NoCacheKey ones and the ETags. The requests sent by a client are keyed on their
+    destination too, the requests received by a proxy on the URI they name.
+
+    The least recently used responses are dropped once more than max_entries of them or more than max_bytes of
+    payload are kept. The responses for a URI are indexed together and dropped together when it is changed.
+    """
+
+    def __init__(self, mode=defines.CLIENT_CACHE, max_entries=defines.CACHE_MAX_ENTRIES,
+                 max_bytes=defines.CACHE_MAX_BYTES, clock=time.monotonic):
+        """
+        Initialize an empty cache.
+
+        :param mode: defines.FORWARD_PROXY, defines.REVERSE_PROXY or defines.CLIENT_CACHE
+        :param max_entries: the number of responses kept
+        :param max_bytes: the number of bytes of payload kept
+        :param clock: the function returning the current time in seconds
+        """
+        self.mode = mode
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.validations = 0
+        self.evictions = 0
+        self._elements = OrderedDict()  # type: OrderedDict[tuple, CacheElement]
+        self._by_uri = {}  # type: dict[tuple, set]
+
+    def __len__(self):
+        return len(self._elements)
+
+    def uri(self, request):
+        """
+        Return the URI of a request, the responses kept for it are invalidated together.
+
+        :type request: Request
+        :param request: the request
+        :rtype: tuple
+        """
+        uri = [request.destination] if self.mode == defines.CLIENT_CACHE else []
+        for option in request.options:
+            if option.number in URI_OPTIONS:
+                uri.append((option.number, option.value))
+        return tuple(uri)
+
+    def key(self, request):
+        """
+        Return the cache key and the URI of a request.
+
+        :type request: Request
+        :param request: the request
+        :return: (key, uri), or None if the responses to the request are not cached
+        """
+        if request.code != defines.Codes.GET.number or request.multicast:
+            return None
+        uri = [request.destination] if self.mode == defines.CLIENT_CACHE else []
+        options = []
+        for option in request.options:
+            number = option.number
+            if number in URI_OPTIONS:
+                uri.append((number, option.value))
+            elif number == defines.OptionRegistry.OBSERVE.number:
+                return None
+            elif number not in TRANSFER_OPTIONS and not check_nocachekey(option):
+                options.append((number, option.value))
+        uri = tuple(uri)
+        return (uri, tuple(options)), uri
+
+    def search(self, key):
+        """
+        Return the response kept for a cache key, fresh or not, as the most recently used.
+
+        :param key: the cache key
+        :rtype: CacheElement
+        """
+        element = self._elements.get(key)
+        if element is not None:
+            self._elements.move_to_end(key)
+        return element
+
+    def store(self, key, uri, response):
+        """
+        Keep a response, in place of the one kept for the same cache key.
+
+        Only 2.05 Content and the error responses are kept, for their Max-Age. A response larger than the cache
+        is not kept.
+
+        :param key: the cache key of the request
+        :param uri: the URI of the request
+        :type response: Response
+        :param response: the response
+        :rtype: CacheElement
+        :return: the element, or None if the response is not kept
+        """
+        self.remove(key)
+        code = response.code
+        if code != defines.Codes.CONTENT.number and not defines.Codes.is_error(code):
+            return None
+        if hasattr(response.payload, '__aiter__'):
+            return None
+        max_age = response.max_age
+        if not max_age:
+            return None
+        element = CacheElement(key, uri, response, self.clock() + max_age)
+        if element.size > self.max_bytes:
+            return None
+        self._elements[key] = element
+        self._by_uri.setdefault(uri, set()).add(key)
+        self.size += element.size
+        while len(self._elements) > self.max_entries or self.size > self.max_bytes:
+            self._discard(self._elements.popitem(last=False)[1])
+            self.evictions += 1
+        return element
+
+    def validate(self, element, response):
+        """
+        Make a response fresh again, as a 2.03 Valid response confirmed it: its options are replaced by the ones
+        of the 2.03 response.
+
+        :type element: CacheElement
+        :param element: the element
+        :type response: Response
+        :param response: the 2.03 Valid response
+        """
+        for option in response.options:
+            if option.number not in TRANSFER_OPTIONS:
+                element.options.pop_number(option.number)
+        for option in response.options:
+            if option.number not in TRANSFER_OPTIONS:
+                element.options.append(option)
+        element.expires = self.clock() + response.max_age
+        self.validations += 1
+
+    def remove(self, key):
+        """
+        Drop the response kept for a cache key.
+
+        :param key: the cache key
+        """
+        element = self._elements.pop(key, None)
+        if element is not None:
+            self._discard(element)
+
+    def invalidate(self, uri):
+        """
+        Drop the responses kept for a URI, for every variant of the request.
+
+        :param uri: the URI
+        :return: the number of responses dropped
+        """
+        keys = self._by_uri.pop(uri, ())
+        for key in keys:
+            element = self._elements.pop(key)
+            self.size -= element.size
+        return len(keys)
+
+    def clear(self):
+        """
+        Drop all the responses.
+        """
+        self._elements.clear()
+        self._by_uri.clear()
+        self.size = 0
+
+    def _discard(self, element):
+        self.size -= element.size
+        keys = self._by_uri[element.uri]
+        keys.discard(element.key)
+        if not keys:
+            del self._by_uri[element.uri]
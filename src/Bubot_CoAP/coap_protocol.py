@@ -50,7 +50,7 @@ class CoapProtocol:
         if transaction.request.duplicated and transaction.completed:
             logger.debug("message duplicated, transaction completed")
             if transaction.response is not None:
-                self.server.send_datagram(transaction.response)
+                await self.server.send_datagram(transaction.response)
             return
         elif transaction.request.duplicated and not transaction.completed:
             logger.debug("message duplicated, transaction NOT completed")
@@ -62,7 +62,6 @@ class CoapProtocol:
         transaction, send_ack = self.server.message_layer.receive_response(message)
         if transaction is None:  # pragma: no cover
             return
-        await self.server.wait_for_retransmit_thread(transaction)
         if send_ack:
             await self.server.send_ack(transaction, transaction.response)
         self.server.block_layer.receive_response(transaction)
@@ -77,7 +76,7 @@ class CoapProtocol:
             ack = Message()
             ack.type = defines.Types['ACK']
             ack = self.server.message_layer.send_empty(transaction, transaction.response, ack)
-            self.server.send_datagram(ack)
+            await self.server.send_datagram(ack)
             self.server.callback_layer.set_result(transaction.response)
         else:
             self.server.callback_layer.set_result(transaction.response)
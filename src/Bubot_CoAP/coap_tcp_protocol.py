@@ -3,7 +3,6 @@ from asyncio import Protocol
 
 from Bubot_CoAP.messages.option import Option
 from . import defines
-from . import utils
 from .coap_protocol import CoapProtocol
 from .messages.message import Message
 from .serializer_tcp import SerializerTcp
@@ -191,12 +190,22 @@ logger = logging.getLogger('Bubot_CoAP')
 
 
 class CoapTcpProtocol(CoapProtocol, Protocol):
+    """
+    CoAP over TCP (RFC 8323) connection.
+
+    Incoming bytes are collected in a bytearray and every complete frame is decoded as soon as it is
+    received, so requests pipelined by the peer in one segment are all dispatched. Frames announcing more
+    than max_message_size bytes (the Max-Message-Size sent in our CSM) abort the connection.
+    """
+
     def __init__(self, server, endpoint, *, is_server=False, **kwargs):
         super(CoapTcpProtocol, self).__init__(server, endpoint)
         self._transport = None
         self.is_server = is_server
         self.remote_address = None
-        self._spool = b""
+        self._spool = bytearray()
+        self.max_message_size = endpoint.params.get('max_message_size',
+                                                    defines.OptionRegistry.MAX_MESSAGE_SIZE.default)
         self.id = None
         if not is_server:
             self.endpoint.protocol = self
@@ -230,7 +239,7 @@ class CoapTcpProtocol(CoapProtocol, Protocol):
     def connection_made(self, transport):
         self.endpoint.address = transport.get_extra_info('sockname')[:2]
         self.remote_address = transport.get_extra_info('peername')[:2]
-        self.id = utils.str_append_hash(self.remote_address[0], self.remote_address[1])
+        self.id = (self.remote_address[0], self.remote_address[1])
         self.endpoint.pool[self.id] = self
 
         if self.is_server:
@@ -287,8 +296,7 @@ class CoapTcpProtocol(CoapProtocol, Protocol):
         # were designed under the assumption that the option space is constant
         # for all message codes.
         message.code = defines.Codes.CSM.number
-        message.add_option(
-            Option(defines.OptionRegistry.MAX_MESSAGE_SIZE, defines.OptionRegistry.MAX_MESSAGE_SIZE.default))
+        message.add_option(Option(defines.OptionRegistry.MAX_MESSAGE_SIZE, self.max_message_size))
         # block_length = optiontypes.UintOption(2, self._my_max_message_size)
         # my_csm.opt.add_option(block_length)
         # supports_block = optiontypes.UintOption(4, 0)
@@ -302,52 +310,70 @@ class CoapTcpProtocol(CoapProtocol, Protocol):
 
     def data_received(self, data):
         try:
-            ...
-            # A rope would be more efficient here, but the expected case is that
-            # _spool is b"" and spool gets emptied soon -- most messages will just
-            # fit in a single TCP package and not be nagled together.
-            #
-            # (If this does become a bottleneck, say self._spool = SomeRope(b"")
-            # and barely change anything else).
             logger.debug(f"Recv TCP {len(data)} bytes From {self.remote_address[0]}: {self.remote_address[1]} "
                          f"To  {self.endpoint.address[0]}: {self.endpoint.address[1]} ")
             self._spool += data
-
-            while True:
-                msg_header = _extract_message_size(self._spool)
-                if msg_header is None:
-                    break
-                msg_size = sum(msg_header)
-                # if msg_size > self._my_max_message_size:
-                #     self.abort("Overly large message announced") TODO
-                #     return
-
-                if msg_size > len(self._spool):
-                    break
-
-                data = self._spool[:msg_size]
-
-                serializer = SerializerTcp()
-                message = serializer.deserialize(data, self.remote_address)
-                # msg.remote = self
-
-                self._spool = self._spool[msg_size:]
-
-                if isinstance(message, int):  # todo переделать в try catch
-                    # if data[0] == b'\x16':  # client hello
-                    return self.datagram_received_bad_message(message, self.remote_address)
-
+            messages, error = self._extract_messages()
+            for message in messages:
                 message.destination = self.endpoint.address
                 message.multicast = False
-                # message.endpoint = self.endpoint
                 if self.is_server:
                     message.scheme = self.endpoint.scheme
                     message.family = self.endpoint.family
                 self.message_received(message)
-                return
+            if error is not None:
+                self.abort(error)
         except RuntimeError:
             logger.exception("Exception with Executor")
 
+    def _extract_messages(self):
+        """
+        Decode all the complete frames in the receive buffer and remove them from it.
+
+        :return: the decoded messages and the reason to abort the connection or None
+        """
+        messages = []
+        error = None
+        pos = 0
+        with memoryview(self._spool) as spool:
+            end = len(spool)
+            while pos < end:
+                msg_header = _extract_message_size(spool[pos:])
+                if msg_header is None:
+                    break
+                msg_size = sum(msg_header)
+                if msg_size > self.max_message_size:
+                    error = "Message size %s exceeds Max-Message-Size %s" % (msg_size, self.max_message_size)
+                    break
+                if pos + msg_size > end:
+                    break
+                message = SerializerTcp.deserialize(bytes(spool[pos:pos + msg_size]), self.remote_address)
+                pos += msg_size
+                if isinstance(message, int):
+                    error = "Malformed message"
+                    break
+                messages.append(message)
+        if error is not None:
+            self._spool.clear()
+        elif pos:
+            # bytearray drops a prefix without moving the rest of the data
+            del self._spool[:pos]
+        return messages, error
+
+    def abort(self, diagnostic):
+        """
+        Send an Abort signaling message and close the connection.
+
+        :param diagnostic: the diagnostic payload
+        """
+        logger.warning(f"Abort TCP connection from {self.remote_address[0]}: {self.remote_address[1]}: {diagnostic}")
+        message = Message()
+        message.code = defines.Codes.ABORT.number
+        message.payload = diagnostic.encode('utf-8')
+        if self._transport is not None:
+            self.send(SerializerTcp.serialize(message))
+        self.close()
+
     async def update_res(self, href, data, **kwargs):
         ...
 
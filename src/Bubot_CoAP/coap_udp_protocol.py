@@ -3,10 +3,10 @@ import logging
 
 from . import defines
 
+from .messages.lazy_message import LazyOptions
 from .messages.message import Message
 from .messages.request import Request
 from .messages.response import Response
-from .serializer_udp import Serializer
 
 logger = logging.getLogger('Bubot_CoAP')
 
@@ -25,7 +25,7 @@ class CoapDatagramProtocol(DatagramProtocol):
         try:
             client_address = (client_address[0], client_address[1])
             # logger.debug("receive_datagram - " + str(client_address))
-            serializer = Serializer()
+            serializer = self.endpoint.serializer()
             message = serializer.deserialize(data, client_address)
 
             if isinstance(message, int):  # todo переделать в try catch
@@ -37,7 +37,7 @@ class CoapDatagramProtocol(DatagramProtocol):
             message.scheme = self.endpoint.scheme
             message.family = self.endpoint.family
 
-            logger.debug("receive_datagram - " + str(message))
+            logger.debug("receive_datagram - %s", message)
             if isinstance(message, Request):
                 self.server.loop.create_task(self.datagram_received_request(message))
             elif isinstance(message, Response):
@@ -71,27 +71,47 @@ class CoapDatagramProtocol(DatagramProtocol):
         rst.code = message
         rst.mid = self.server.message_layer.fetch_mid()
         rst.source = self.endpoint.address
-        self.server.send_datagram(rst)
+        self.server.loop.create_task(self.server.send_datagram(rst))
         return
 
+    def decode_failed(self, message):
+        """
+        Finish decoding of a lazily parsed message, answer with a RST if its options are malformed.
+
+        :param message: the received message
+        :return: True, if the message is malformed
+        """
+        if isinstance(message, LazyOptions):
+            code = message.decode()
+            if code is not None:
+                self.datagram_received_bad_message(code, message.source)
+                return True
+        return False
+
     async def datagram_received_request(self, message):
         transaction = await self.server.message_layer.receive_request(message)
-        if transaction.request.duplicated and transaction.completed:
+        if message.duplicated and transaction.completed:
             logger.debug("message duplicated, transaction completed")
-            if transaction.response is not None:
-                await self.server.send_datagram(transaction.response)
+            # the response of a block-wise exchange may be in the making
+            async with transaction.lock:
+                response = transaction.response
+            if response is not None:
+                await self.server.send_datagram(response)
             return
-        elif transaction.request.duplicated and not transaction.completed:
+        elif message.duplicated and not transaction.completed:
             logger.debug("message duplicated, transaction NOT completed")
             await self.server.send_ack(transaction)
             return
-        await self.server.receive_request(transaction)
+        if self.decode_failed(message):
+            return
+        await self.server.receive_request(transaction, message)
 
     async def datagram_received_response(self, message):
         transaction, send_ack = self.server.message_layer.receive_response(message)
         if transaction is None:  # pragma: no cover
             return
-        await self.server.wait_for_retransmit_thread(transaction)
+        if self.decode_failed(message):
+            return
         if send_ack:
             await self.server.send_ack(transaction, transaction.response)
         self.server.block_layer.receive_response(transaction)
@@ -106,7 +126,7 @@ class CoapDatagramProtocol(DatagramProtocol):
             ack = Message()
             ack.type = defines.Types['ACK']
             ack = self.server.message_layer.send_empty(transaction, transaction.response, ack)
-            self.server.send_datagram(ack)
+            await self.server.send_datagram(ack)
             self.server.callback_layer.set_result(transaction.response)
         else:
             self.server.callback_layer.set_result(transaction.response)
@@ -50,6 +50,14 @@ ACK_RANDOM_FACTOR = 1.5
 
 MAX_RETRANSMIT = 4
 
+MIN_RTO = 0.1  # bounds of the adaptive per-peer RTO
+
+MAX_RTO = 60
+
+NSTART = 1
+
+PROBING_RATE = 1  # bytes per second
+
 MAX_TRANSMIT_SPAN = ACK_TIMEOUT * (pow(2, (MAX_RETRANSMIT + 1)) - 1) * ACK_RANDOM_FACTOR
 
 MAX_LATENCY = 120  # 2 minutes
@@ -62,6 +70,8 @@ EXCHANGE_LIFETIME = MAX_TRANSMIT_SPAN + (2 * MAX_LATENCY) + PROCESSING_DELAY
 
 DISCOVERY_URL = "/.well-known/core"
 
+DISCOVERY_MAX_QUERIES = 64  # answers to the queries of .well-known/core kept until the resources change
+
 ALL_COAP_NODES = "224.0.1.187"
 
 ALL_COAP_NODES_IPV6 = "FF00::FD"
@@ -70,8 +80,23 @@ MAX_PAYLOAD = 1024
 
 MAX_NON_NOTIFICATIONS = 10
 
+NOTIFY_CONCURRENCY = 8
+
+NOTIFY_MAX_PENDING = 100000
+
+NOTIFY_BATCH_SIZE = 1024
+
 BLOCKWISE_SIZE = 1024
 
+MAX_REASSEMBLY = 16 * 1024 * 1024  # bytes held by the block-wise transfers being reassembled
+
+STREAM_DEPTH = 4  # blocks of a streamed body queued ahead of its reader
+
+# RFC9177 Block-Wise Transfer Options Supporting Robust Transmission
+MAX_PAYLOADS = 10  # blocks of the first burst of a Q-Block transfer
+
+MAX_BURST = 64  # blocks a Q-Block burst may grow to
+
 """  Message Format """
 
 # number of bits used for the encoding of the CoAP version field.
@@ -133,6 +158,10 @@ UNKNOWN = 3
 # Cache modes
 FORWARD_PROXY = 0
 REVERSE_PROXY = 1
+CLIENT_CACHE = 2
+
+CACHE_MAX_ENTRIES = 2048  # responses kept by a cache
+CACHE_MAX_BYTES = 4 * 1024 * 1024  # bytes of payload kept by a cache
 
 OptionItem = collections.namedtuple('OptionItem', 'number name value_type repeatable default')
 
@@ -161,6 +190,8 @@ class OptionRegistry(object):
     LOCATION_QUERY = OptionItem(20, "Location-Query", STRING, True, None)
     BLOCK2 = OptionItem(23, "Block2", INTEGER, False, None)
     BLOCK1 = OptionItem(27, "Block1", INTEGER, False, None)
+    Q_BLOCK1 = OptionItem(19, "Q-Block1", INTEGER, False, None)
+    Q_BLOCK2 = OptionItem(31, "Q-Block2", INTEGER, True, None)
     SIZE2 = OptionItem(28, "Size2", INTEGER, False, 0)
     PROXY_URI = OptionItem(35, "Proxy-Uri", STRING, False, None)
     PROXY_SCHEME = OptionItem(39, "Proxy-Schema", STRING, False, None)
@@ -189,10 +220,12 @@ class OptionRegistry(object):
         14: MAX_AGE,
         15: URI_QUERY,
         17: ACCEPT,
+        19: Q_BLOCK1,
         20: LOCATION_QUERY,
         23: BLOCK2,
         27: BLOCK1,
         28: SIZE2,
+        31: Q_BLOCK2,
         35: PROXY_URI,
         39: PROXY_SCHEME,
         60: SIZE1,
@@ -267,6 +300,7 @@ class Codes(object):
     CONTINUE = CodeItem(95, 'CONTINUE')
 
     BAD_REQUEST = CodeItem(128, 'BAD_REQUEST')
+    BAD_OPTION = CodeItem(130, 'BAD_OPTION')
     FORBIDDEN = CodeItem(131, 'FORBIDDEN')
     NOT_FOUND = CodeItem(132, 'NOT_FOUND')
     METHOD_NOT_ALLOWED = CodeItem(133, 'METHOD_NOT_ALLOWED')
@@ -305,6 +339,7 @@ class Codes(object):
         95: CONTINUE,
 
         128: BAD_REQUEST,
+        130: BAD_OPTION,
         131: FORBIDDEN,
         132: NOT_FOUND,
         133: METHOD_NOT_ALLOWED,
@@ -347,6 +382,7 @@ Content_types = {
     "application/exi": 47,
     "application/json": 50,
     "application/cbor": 60,
+    "application/missing-blocks+cbor-seq": 272,
     "application/vnd.ocf+cbor": 10000
     #                 0: 'text/plain;charset=utf-8',
     #                16: 'application/cose;cose-type="cose-encrypt0"',
@@ -0,0 +1,109 @@
+import logging
+
+from . import defines
+from .layers.resource_layer import ResourceLayer
+
+__author__ = 'Mikhail Razgovorov'
+logger = logging.getLogger('Bubot_CoAP')
+
+
+class Discovery(object):
+    """
+    The CoRE Link Format document of the resources of a server, served at /.well-known/core.
+
+    The links of the visible resources are rendered once, in the order of the tree, and kept with the whole
+    document and an inverted index of the positions of the links by attribute and value. They are rendered again
+    when the tree or the attributes of a resource changed since. A query is answered from the index without
+    visiting the resources, the answers to the last queries are kept until the next change. The document is
+    bytes, the block layer slices the transfers of a large answer from them.
+    """
+
+    def __init__(self, server, max_queries=defines.DISCOVERY_MAX_QUERIES):
+        """
+        Initialize the document of the resources of a server.
+
+        :param server: the server owning the resources
+        :param max_queries: the number of answers to queries kept
+        """
+        self._server = server
+        self.max_queries = max_queries
+        self._version = None
+        self._links = []  # type: list[bytes]
+        self._document = b''
+        self._index = {}  # type: dict[str, dict[str, list[int]]]
+        self._queries = {}  # type: dict[str, bytes]
+
+    def _refresh(self):
+        root = self._server.root
+        version = (root, root.version)
+        if version == self._version:
+            return
+        links = []
+        index = {}
+        for path, resource in root.items():
+            if path == '/' or not resource.visible:
+                continue
+            position = len(links)
+            links.append(ResourceLayer.corelinkformat(resource).encode('utf-8'))
+            for key, value in resource.attributes.items():
+                # a query value is a string, the other values never match
+                if isinstance(value, str):
+                    index.setdefault(key, {}).setdefault(value, []).append(position)
+        self._links = links
+        self._document = b''.join(links)
+        self._index = index
+        self._queries = {}
+        self._version = version
+
+    @staticmethod
+    def _terms(query):
+        terms = []
+        for q in query.split('&'):
+            tmp = q.split('=')
+            if len(tmp) > 1:
+                terms.append((tmp[0], tmp[1]))
+        return terms
+
+    def render(self, query=''):
+        """
+        Render the links of the resources matching a query, those with the value of every attribute of the query.
+
+        :param query: the query, the terms joined by &, the terms without a value are ignored
+        :return: the links in link-format
+        """
+        self._refresh()
+        if not query:
+            return self._document
+        payload = self._queries.get(query)
+        if payload is not None:
+            return payload
+        terms = self._terms(query)
+        if not terms:
+            payload = self._document
+        else:
+            postings = [self._index.get(key, {}).get(value, ()) for key, value in terms]
+            postings.sort(key=len)
+            if len(postings) == 1:
+                positions = postings[0]
+            else:
+                matched = set(postings[0])
+                for posting in postings[1:]:
+                    matched.intersection_update(posting)
+                positions = sorted(matched)
+            payload = b''.join([self._links[position] for position in positions])
+        if len(self._queries) >= self.max_queries:
+            self._queries.clear()
+        self._queries[query] = payload
+        return payload
+
+    def discover(self, transaction):
+        """
+        Answer a GET request to the .well-known/core link.
+
+        :param transaction: the transaction
+        :return: the transaction
+        """
+        transaction.response.code = defines.Codes.CONTENT.number
+        transaction.response.payload = self.render(transaction.request.uri_query)
+        transaction.response.content_type = defines.Content_types["application/link-format"]
+        return transaction
@@ -11,6 +11,8 @@ class Endpoint:
 
     def __init__(self, **kwargs):
         self.params = kwargs
+        if kwargs.get('serializer') is not None:
+            self.serializer = kwargs['serializer']
         self._multicast = None
         self._address = None
         self._family = None
@@ -6,7 +6,6 @@ import socket
 from ..utils import calc_family_by_address
 from .endpoint import Endpoint
 from ..coap_tcp_protocol import CoapTcpProtocol
-from ..utils import str_append_hash
 from ..serializer_tcp import SerializerTcp
 
 logger = logging.getLogger(__name__)
@@ -90,8 +89,7 @@ class TcpCoapEndpoint(Endpoint):
         return self
 
     def send(self, data, address, **kwargs):
-        pool_id = str_append_hash(address[0], address[1])
-        protocol = self.pool[pool_id]
+        protocol = self.pool[(address[0], address[1])]
         protocol.send(data)
 
     def _init_unicast(self, address):
@@ -154,7 +152,7 @@ class TcpCoapEndpoint(Endpoint):
         if self.is_client:
             if self._transport:
                 self._transport.close()
-            self.pool.pop(str_append_hash(self.address[0], self.address[1]), None)
+            self.pool.pop((self.address[0], self.address[1]), None)
         else:
             connections = list(self.pool.keys())
             for elem in connections:
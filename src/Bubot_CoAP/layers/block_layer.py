@@ -1,9 +1,16 @@
+import asyncio
 import logging
+import mmap
+from io import BytesIO
+
+import cbor2
 
 from .. import defines
-from .. import utils
 from ..messages.request import Request
 from ..messages.response import Response
+from ..reassembly import ReassemblyBudget, ReassemblyBuffer
+from ..streaming import BlockSource, BlockStream
+from ..transaction import Transaction
 
 logger = logging.getLogger('Bubot_CoAP')
 
@@ -28,18 +35,142 @@ class BlockItem(object):
         self.size = size
         self.payload = payload
         self.content_type = content_type
+        self.wanted = None
+
+
+class BurstWindow(object):
+    __slots__ = ('size', 'threshold')
+
+    def __init__(self, size=defines.MAX_PAYLOADS):
+        """
+        Number of blocks sent or asked for at once in the Q-Block transfers with a peer, it grows while the
+        bursts arrive whole and halves when blocks are lost.
+
+        :param size: the initial number of blocks of a burst
+        """
+        self.size = size
+        self.threshold = defines.MAX_BURST
+
+    def grow(self):
+        """
+        Widen the window after a burst arrived whole: doubled up to the threshold, then by one block.
+
+        """
+        self.size = min(self.size * 2 if self.size < self.threshold else self.size + 1, defines.MAX_BURST)
+
+    def shrink(self):
+        """
+        Halve the window after blocks of a burst were lost.
+
+        """
+        self.threshold = max(self.size // 2, 1)
+        self.size = self.threshold
+
+
+class QBlockItem(BlockItem):
+    def __init__(self, request, size, window, payload=None):
+        """
+        State of a Q-Block1 upload or a Q-Block2 download of a sent request.
+
+        :param request: the request, whose options are copied into the requests of the following blocks
+        :param size: the block size
+        :param window: the burst window of the peer
+        :param payload: the body of an upload
+        """
+        super(QBlockItem, self).__init__(0, 0, 1, size, payload, request.content_type)
+        self.request = request
+        self.window = window
+        self.last = None
+        self.wanted = set()
+        self.outgoing = []
+        self.closer = None
+        self.timer = None
+        self.timeouts = 0
+
+
+class UploadItem(BlockItem):
+    def __init__(self, exchange, size, stream):
+        """
+        State of a Block1 upload streamed to a resource.
+
+        :param exchange: the transaction rendering the upload, owning its first request
+        :param size: the size of the blocks
+        :param stream: the BlockStream the blocks are queued to
+        """
+        super().__init__(0, 0, 1, size, stream, exchange.request.content_type)
+        self.exchange = exchange
+        self.task = None
+
+
+class Block2Snapshot(object):
+    __slots__ = ('key', 'payload', 'view', 'transfers')
+
+    def __init__(self, key, payload):
+        """
+        Immutable body served block-wise, shared by the transfers of the same representation.
+
+        :param key: the (resource, ETag, Content-Format) of the representation or None if it is not shared
+        :param payload: the body, bytes or a read-only memory-mapped file
+        """
+        self.key = key
+        self.payload = payload
+        self.view = memoryview(payload)
+        self.transfers = 1
 
 
 class BlockLayer(object):
     """
     Handle the Blockwise options. Hides all the exchange to both servers and clients.
+
+    The bodies of the uploads received and of the downloads requested are reassembled in ReassemblyBuffer,
+    preallocated from Size1 or Size2 and sharing one memory budget.
+
+    The bodies served block-wise are kept once per resource, ETag and Content-Format in a Block2Snapshot and
+    sliced with memoryview, a transfer only keeps its cursor. The snapshot is forgotten with its last transfer,
+    finished or purged.
+
+    Q-Block1 and Q-Block2 (RFC 9177) are always served. With q_block the requests with a large body or
+    asking for a resource offer them too, unless the peer refused them before with 4.02 Bad Option:
+
+    - Q-Block1: the blocks are sent in bursts of NON requests closed by a CON one. The server answers the
+      closing request with 2.31 Continue, or with 4.08 listing the blocks missing so far that are sent again,
+      and with the response once the body is complete.
+    - Q-Block2: the server answers with the first block and sends the next ones of the first burst as NON
+      responses. Every following request asks for the next burst, listing its blocks, and blocks missing for
+      the RTO of the server are asked for again.
+
+    The bursts are sized by a BurstWindow per peer.
+
+    Bodies may also be streamed, one block in memory at a time:
+
+    - a resource created with streaming receives the body of a PUT or POST as a BlockStream, the rendering
+      starts with the first block of a Block1 upload and every next block is acknowledged with 2.31 Continue
+      once the resource has room for it.
+    - a response whose payload is an async iterator of bytes is read block by block as the Block2 requests
+      ask for them. Q-Block2 is refused with 4.02 Bad Option for such bodies, as their blocks are not kept.
+    - a request sent with stream gets a response whose payload is a BlockStream, the next Block2 request is
+      sent once the reader has room for the block.
     """
 
-    def __init__(self):
+    def __init__(self, max_reassembly=defines.MAX_REASSEMBLY, server=None, q_block=False):
+        """
+        Initialize the layer.
+
+        :param max_reassembly: the number of bytes held by all the bodies being reassembled
+        :param server: the server that sends the bursts of the Q-Block transfers
+        :param q_block: offer Q-Block1 and Q-Block2 in the requests sent
+        """
+        self.server = server
+        self.q_block = q_block
         self._block1_sent = {}  # type: dict[hash, BlockItem]
         self._block2_sent = {}  # type: dict[hash, BlockItem]
         self._block1_receive = {}  # type: dict[hash, BlockItem]
         self._block2_receive = {}  # type: dict[hash, BlockItem]
+        self._snapshots = {}  # type: dict[tuple, Block2Snapshot]
+        self._windows = {}  # type: dict[tuple, BurstWindow]
+        self._refused = set()
+        self._downloads = {}  # type: dict[hash, BlockStream]
+        self.budget = ReassemblyBudget(max_reassembly)
 
     def receive_request(self, transaction):
         """
@@ -50,15 +181,19 @@ class BlockLayer(object):
         :rtype : Transaction
         :return: the edited transaction
         """
-        if transaction.request.block2 is not None:
-            host, port = transaction.request.source
-            key_token = utils.str_append_hash(host, port, transaction.request.token)
+        if transaction.request.q_block2 is not None:
+            self._receive_q_block2_request(transaction)
+        elif transaction.request.q_block1 is not None:
+            return self._receive_q_block1_request(transaction)
+        elif transaction.request.block2 is not None:
+            key_token = (transaction.request.source, transaction.request.token)
             num, m, size = transaction.request.block2
             if key_token in self._block2_receive:
+                self._block2_receive[key_token].wanted = None
                 self._block2_receive[key_token].num = num
                 self._block2_receive[key_token].size = size
                 self._block2_receive[key_token].m = m
-                if self._block2_receive[key_token].payload:
+                if self._block2_receive[key_token].payload is not None:
                     transaction.completed = True
                 del transaction.request.block2
             else:
@@ -69,52 +204,186 @@ class BlockLayer(object):
 
         elif transaction.request.block1 is not None:
             # POST or PUT
-            host, port = transaction.request.source
-            key_token = utils.str_append_hash(host, port, transaction.request.token)
-            num, m, size = transaction.request.block1
-            if transaction.request.size1 is not None:
-                # What to do if the size1 is larger than the maximum resource size or the maxium server buffer
-                pass
-            if key_token in self._block1_receive:
-                # n-th block
-                content_type = transaction.request.content_type
-                if num != self._block1_receive[key_token].num \
-                        or content_type != self._block1_receive[key_token].content_type:
-                    # Error Incomplete
-                    return self.incomplete(transaction)
-                self._block1_receive[key_token].payload += transaction.request.payload
-            else:
-                # first block
-                if num != 0:
-                    # Error Incomplete
-                    return self.incomplete(transaction)
-                content_type = transaction.request.content_type
-                self._block1_receive[key_token] = BlockItem(size, num, m, size, transaction.request.payload,
-                                                            content_type)
+            request = transaction.request
+            key_token = (request.source, request.token)
+            num, m, size = request.block1
+            content_type = request.content_type
+            item = self._block1_receive.get(key_token)
+            if item is None:
+                buffer = ReassemblyBuffer(self.budget)
+                if request.size1 and not buffer.reserve(request.size1):
+                    return self.too_large(transaction)
+                item = BlockItem(0, num, m, size, buffer, content_type)
+                self._block1_receive[key_token] = item
+            elif content_type != item.content_type:
+                # Error Incomplete
+                return self.incomplete(transaction)
+            if not item.payload.write(num * size, request.payload or b'', m == 0):
+                self._forget(self._block1_receive, key_token)
+                return self.too_large(transaction)
 
-            if m == 0:
-                transaction.request.payload = self._block1_receive[key_token].payload
+            if item.payload.complete:
+                request.payload = item.payload.getvalue()
                 # end of blockwise
-                del transaction.request.block1
+                del request.block1
                 transaction.block_transfer = False
                 del self._block1_receive[key_token]
                 return transaction
-            else:
-                # Continue
-                transaction.block_transfer = True
-                transaction.response = Response.init_from_request(transaction.request)
-                transaction.response.code = defines.Codes.CONTINUE.number
-                transaction.response.block1 = (num, m, size)
+            if m == 0:
+                # the last block arrived before some of the previous ones
+                return self.incomplete(transaction)
+
+            # Continue
+            transaction.block_transfer = True
+            transaction.response = Response.init_from_request(request)
+            transaction.response.code = defines.Codes.CONTINUE.number
+            transaction.response.block1 = (num, m, size)
 
-            num += 1
-            byte = size
-            self._block1_receive[key_token].byte = byte
-            self._block1_receive[key_token].num = num
-            self._block1_receive[key_token].size = size
-            self._block1_receive[key_token].m = m
+            item.num = num + 1
+            item.byte = item.num * size
+            item.size = size
+            item.m = m
 
         return transaction
 
+    async def receive_stream(self, transaction):
+        """
+        Hand the blocks of a Block1 upload to a streaming resource while they arrive.
+
+        The first block starts the rendering with a BlockStream as payload of the request, the next ones are queued
+        to it and answered with 2.31 Continue once the resource has room for them. The last block is answered with
+        the response of the rendering, that may also end the upload early.
+
+        :type transaction: Transaction
+        :param transaction: the transaction that owns the request
+        :return: True, if the request is a block of a streamed upload
+        """
+        request = transaction.request
+        if request.block1 is None:
+            return False
+        key_token = (request.source, request.token)
+        num, m, size = request.block1
+        item = self._block1_receive.get(key_token)
+        if item is None:
+            if num != 0 or not m or self.server is None \
+                    or request.code not in (defines.Codes.POST.number, defines.Codes.PUT.number):
+                return False
+            try:
+                resource = self.server.root["/" + request.uri_path]
+            except KeyError:
+                return False
+            if not getattr(resource, 'streaming', False):
+                return False
+            payload = request.payload
+            del request.block1
+            request.payload = BlockStream(request.size1)
+            item = UploadItem(Transaction(request=request), size, request.payload)
+            self._block1_receive[key_token] = item
+            item.task = self.server.loop.create_task(self.server.request_layer.receive_request(item.exchange))
+            item.task.add_done_callback(lambda task: item.payload.close())
+        elif not isinstance(item, UploadItem):
+            return False
+        else:
+            payload = request.payload
+            if num < item.num:
+                # a block already queued, asked again with a new MID
+                return self._continue(transaction, num, m, size)
+            if num > item.num or request.content_type != item.content_type:
+                self._forget(self._block1_receive, key_token)
+                self.incomplete(transaction)
+                return True
+
+        await item.payload.put(payload or b'', m == 0)
+        item.num = num + 1
+        if m and not item.task.done():
+            return self._continue(transaction, num, m, size)
+
+        # the last block, or the resource answered before the end of the upload
+        del self._block1_receive[key_token]
+        transaction.block_transfer = False
+        try:
+            await item.task
+        except Exception as err:
+            logger.exception(err)
+            transaction.response = Response.init_from_request(request)
+            transaction.response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
+            return True
+        transaction.resource = item.exchange.resource
+        transaction.response = item.exchange.response
+        if transaction.response is not None and not m:
+            transaction.response.block1 = (num, 0, size)
+        return True
+
+    @staticmethod
+    def _continue(transaction, num, m, size):
+        transaction.block_transfer = True
+        transaction.response = Response.init_from_request(transaction.request)
+        transaction.response.code = defines.Codes.CONTINUE.number
+        transaction.response.block1 = (num, m, size)
+        return True
+
+    def _receive_q_block2_request(self, transaction):
+        request = transaction.request
+        key_token = (request.source, request.token)
+        blocks = request.q_block2
+        del request.q_block2
+        size = blocks[0][2]
+        wanted = []
+        item = self._block2_receive.get(key_token)
+        if item is None or item.wanted is None:
+            if item is not None:
+                self._release(item)
+            item = BlockItem(0, blocks[0][0], 0, size)
+            self._block2_receive[key_token] = item
+            # the first burst
+            blocks = [(blocks[0][0], 1, size)]
+        elif item.payload is not None:
+            transaction.completed = True
+        for num, m, size in blocks:
+            # M asks for the blocks from num on
+            wanted.extend(range(num, num + defines.MAX_PAYLOADS) if m else (num,))
+        item.wanted = wanted
+        item.size = size
+
+    def _receive_q_block1_request(self, transaction):
+        request = transaction.request
+        key_token = (request.source, request.token)
+        num, m, size = request.q_block1
+        item = self._block1_receive.get(key_token)
+        if item is None:
+            buffer = ReassemblyBuffer(self.budget)
+            if request.size1 and not buffer.reserve(request.size1):
+                return self.too_large(transaction)
+            item = BlockItem(0, num, m, size, buffer, request.content_type)
+            self._block1_receive[key_token] = item
+        elif request.content_type != item.content_type:
+            return self.incomplete(transaction)
+        if not item.payload.write(num * size, request.payload or b'', m == 0):
+            self._forget(self._block1_receive, key_token)
+            return self.too_large(transaction)
+        if item.payload.complete:
+            request.payload = item.payload.getvalue()
+            del request.q_block1
+            transaction.block_transfer = False
+            del self._block1_receive[key_token]
+            return transaction
+
+        transaction.block_transfer = True
+        if request.type != defines.Types["CON"]:
+            # the blocks of a burst but the last one are not answered
+            transaction.response = None
+            return transaction
+        missing = item.payload.missing(size, num)
+        transaction.response = Response.init_from_request(request)
+        if missing or m == 0:
+            transaction.response.code = defines.Codes.REQUEST_ENTITY_INCOMPLETE.number
+            transaction.response.content_type = defines.Content_types["application/missing-blocks+cbor-seq"]
+            transaction.response.payload = b''.join(cbor2.dumps(num) for num in missing)
+        else:
+            transaction.response.code = defines.Codes.CONTINUE.number
+            transaction.response.q_block1 = (num, m, size)
+        return transaction
+
     def receive_response(self, transaction):
         """
         Handles the Blocks option in a incoming response.
@@ -124,15 +393,27 @@ class BlockLayer(object):
         :rtype : Transaction
         :return: the edited transaction
         """
-        host, port = transaction.response.source
-        key_token = utils.str_append_hash(host, port, transaction.response.token)
+        key_token = (transaction.response.source, transaction.response.token)
+        item = self._block1_sent.get(key_token)
+        if isinstance(item, QBlockItem):
+            return self._receive_q_block1_response(transaction, key_token, item)
+        item = self._block2_sent.get(key_token)
+        if isinstance(item, QBlockItem):
+            if transaction.response.q_block2 is not None:
+                return self._receive_q_block2_response(transaction, key_token, item)
+            if transaction.response.code == defines.Codes.BAD_OPTION.number:
+                # kept for q_block_refused
+                transaction.block_transfer = False
+                return transaction
+            # answered without Q-Block2
+            self._forget(self._block2_sent, key_token)
         if key_token in self._block1_sent and transaction.response.block1 is not None:
             item = self._block1_sent[key_token]
             transaction.block_transfer = True
             if item.m == 0:
                 transaction.block_transfer = False
                 del transaction.request.block1
-                return transaction
+                return self._receive_whole(transaction, key_token)
             n_num, n_m, n_size = transaction.response.block1
             if n_num != item.num:  # pragma: no cover
                 logger.warning("Blockwise num acknowledged error, expected " + str(item.num) + " received " +
@@ -154,48 +435,402 @@ class BlockLayer(object):
             request.block1 = (item.num, item.m, item.size)
             # The original request already has this option set
             # request.size1 = len(item.payload)
+        elif transaction.response.block2 is not None and key_token in self._downloads:
+            return self._receive_download(transaction, key_token)
         elif transaction.response.block2 is not None:
 
-            num, m, size = transaction.response.block2
+            response = transaction.response
+            num, m, size = response.block2
             logger.debug(f"response block2 num:{num} m:{m} token:{key_token}")
-            if m == 1:
-                transaction.block_transfer = True
-                if key_token in self._block2_sent:
-                    item = self._block2_sent[key_token]
-                    if num != item.num:  # pragma: no cover
-                        logger.error("Receive unwanted block")
-                        return self.error(transaction, defines.Codes.REQUEST_ENTITY_INCOMPLETE.number)
-                    if item.content_type is None:
-                        item.content_type = transaction.response.content_type
-                    if item.content_type != transaction.response.content_type:  # pragma: no cover
-                        logger.error("Content-type Error")
-                        return self.error(transaction, defines.Codes.UNSUPPORTED_CONTENT_FORMAT.number)
-                    item.byte += size
-                    item.num = num + 1
-                    item.size = size
-                    item.m = m
-                    item.payload += transaction.response.payload
-                else:
-                    item = BlockItem(size, num + 1, m, size, transaction.response.payload,
-                                     transaction.response.content_type)
+            item = self._block2_sent.get(key_token)
+            if item is None or item.payload is None:
+                if m == 0 and num == 0:
+                    # the whole body in one block
+                    self._block2_sent.pop(key_token, None)
+                    transaction.block_transfer = False
+                    return transaction
+                buffer = ReassemblyBuffer(self.budget)
+                if item is None:
+                    item = BlockItem(0, num, m, size, buffer, response.content_type)
                     self._block2_sent[key_token] = item
+                else:
+                    item.payload = buffer
+                if response.size2 and not buffer.reserve(response.size2):
+                    logger.error("Body too large")
+                    self._forget(self._block2_sent, key_token)
+                    return self.error(transaction, defines.Codes.REQUEST_ENTITY_TOO_LARGE.number)
+            if item.content_type is None:
+                item.content_type = response.content_type
+            if item.content_type != response.content_type:  # pragma: no cover
+                logger.error("Content-type Error")
+                self._forget(self._block2_sent, key_token)
+                return self.error(transaction, defines.Codes.UNSUPPORTED_CONTENT_FORMAT.number)
+            if not item.payload.write(num * size, response.payload or b'', m == 0):
+                logger.error("Body too large")
+                self._forget(self._block2_sent, key_token)
+                return self.error(transaction, defines.Codes.REQUEST_ENTITY_TOO_LARGE.number)
+            if item.payload.complete:
+                transaction.block_transfer = False
+                response.payload = item.payload.getvalue()
+                del self._block2_sent[key_token]
+            else:
+                # ask for the first block still missing
+                transaction.block_transfer = True
+                item.num = item.payload.contiguous // size
+                item.byte = item.num * size
+                item.size = size
+                item.m = m
                 request = transaction.request
                 del request.mid
                 del request.block2
                 request.block2 = (item.num, 0, item.size)
-            else:
-                transaction.block_transfer = False
-                if key_token in self._block2_sent:
-                    if self._block2_sent[
-                        key_token].content_type != transaction.response.content_type:  # pragma: no cover
-                        logger.error("Content-type Error")
-                        return self.error(transaction, defines.Codes.UNSUPPORTED_CONTENT_FORMAT.number)
-                    transaction.response.payload = self._block2_sent[key_token].payload + transaction.response.payload
-                    del self._block2_sent[key_token]
         else:
             transaction.block_transfer = False
+            return self._receive_whole(transaction, key_token)
+        return transaction
+
+    def _receive_download(self, transaction, key_token):
+        """
+        Queue a block of a streamed download to its BlockStream and ask for the next one.
+
+        The first response is handed over with the stream as payload, the next block is asked for once the reader
+        has room for it, by send_block_request.
+        """
+        response = transaction.response
+        stream = self._downloads[key_token]
+        num, m, size = response.block2
+        first = not stream.count
+        if first and response.size2:
+            stream.size = response.size2
+        stream.feed(response.payload or b'', m == 0)
+        if m:
+            request = transaction.request
+            del request.mid
+            del request.block2
+            request.block2 = (num + 1, 0, size)
+        if not first:
+            transaction.block_transfer = True
+            return transaction
+        response.payload = stream
+        transaction.block_transfer = False
+        if m:
+            self.server.loop.create_task(self.server.send_block_request(transaction))
+        else:
+            del self._downloads[key_token]
+        return transaction
+
+    def _receive_whole(self, transaction, key_token):
+        """
+        End a streamed download answered without Block2.
+        """
+        stream = self._downloads.pop(key_token, None)
+        if stream is None:
+            return transaction
+        response = transaction.response
+        if stream.count:
+            # the transfer failed after its first block, send_block_request finds the stream ended
+            stream.abort(asyncio.IncompleteReadError(b'', stream.size))
+            self._downloads[key_token] = stream
+            transaction.block_transfer = True
+            return transaction
+        stream.feed(response.payload or b'', True)
+        response.payload = stream
+        return transaction
+
+    async def stream_ready(self, request):
+        """
+        Wait until the reader of a streamed download has room for the next block of a request.
+
+        :param request: the request asking for the next block
+        :return: False, if the next block is not wanted: the download ended or its reader closed the stream
+        """
+        key_token = (request.destination, request.token)
+        stream = self._downloads.get(key_token)
+        if stream is None:
+            return True
+        if await stream.wait_room():
+            return True
+        if self._downloads.get(key_token) is stream:
+            del self._downloads[key_token]
+        return False
+
+    def give_up(self, request):
+        """
+        End the streamed download of a request that was not answered.
+
+        :param request: the request given up by the retransmission
+        """
+        stream = self._downloads.pop((request.destination, request.token), None)
+        if stream is not None:
+            stream.abort(asyncio.TimeoutError())
+
+    def _receive_q_block1_response(self, transaction, key_token, item):
+        response = transaction.response
+        if response.code in (defines.Codes.CONTINUE.number, defines.Codes.REQUEST_ENTITY_INCOMPLETE.number) \
+                and response.mid != item.closer.mid:
+            # the answer to a former burst, replayed for a retransmission
+            transaction.block_transfer = True
+            return transaction
+        if response.code == defines.Codes.CONTINUE.number:
+            item.window.grow()
+            nums = range(item.num, min(item.num + item.window.size, item.last + 1))
+            item.num = max(item.num, nums.stop)
+            # nothing left to send, the last block asks for the response again
+            self._burst(item, nums or (item.last,))
+            transaction.block_transfer = True
+        elif response.code == defines.Codes.REQUEST_ENTITY_INCOMPLETE.number and response.content_type == \
+                defines.Content_types["application/missing-blocks+cbor-seq"]:
+            item.window.shrink()
+            missing = [num for num in self._missing_blocks(response.payload) if num <= item.last]
+            self._burst(item, missing[:item.window.size] or (item.last,))
+            transaction.block_transfer = True
+        else:
+            if response.code != defines.Codes.BAD_OPTION.number:
+                # else kept for q_block_refused
+                del self._block1_sent[key_token]
+            transaction.block_transfer = False
         return transaction
 
+    def _receive_q_block2_response(self, transaction, key_token, item):
+        response = transaction.response
+        num, m, size = response.q_block2[0]
+        if item.payload is None:
+            if num == 0 and m == 0:
+                # the whole body in one block
+                self._forget(self._block2_sent, key_token)
+                transaction.block_transfer = False
+                return transaction
+            item.payload = ReassemblyBuffer(self.budget)
+            item.content_type = response.content_type
+            if response.size2 and not item.payload.reserve(response.size2):
+                logger.error("Body too large")
+                self._forget(self._block2_sent, key_token)
+                return self.error(transaction, defines.Codes.REQUEST_ENTITY_TOO_LARGE.number)
+        elif item.content_type != response.content_type:  # pragma: no cover
+            logger.error("Content-type Error")
+            self._forget(self._block2_sent, key_token)
+            return self.error(transaction, defines.Codes.UNSUPPORTED_CONTENT_FORMAT.number)
+        if not item.payload.write(num * size, response.payload or b'', m == 0):
+            logger.error("Body too large")
+            self._forget(self._block2_sent, key_token)
+            return self.error(transaction, defines.Codes.REQUEST_ENTITY_TOO_LARGE.number)
+        if item.payload.complete:
+            response.payload = item.payload.getvalue()
+            self._forget(self._block2_sent, key_token)
+            transaction.block_transfer = False
+            return transaction
+
+        transaction.block_transfer = True
+        item.size = size
+        item.num = max(item.num, num + 1)
+        item.timeouts = 0
+        if m == 0:
+            item.last = num
+        elif response.size2:
+            item.last = (response.size2 - 1) // size
+        item.wanted.discard(num)
+        if item.last is not None:
+            item.wanted = {num for num in item.wanted if num <= item.last}
+        if item.wanted:
+            self._wait(key_token, item)
+        else:
+            # the burst arrived whole
+            item.window.grow()
+            self._ask(key_token, item)
+        return transaction
+
+    def _ask(self, key_token, item):
+        """
+        Ask for the next burst of a Q-Block2 download, the blocks missing first.
+
+        :param key_token: the (peer, token) key of the exchange
+        :param item: the state of the download
+        """
+        count = item.last + 1 if item.last is not None else item.num + item.window.size
+        nums = item.payload.missing(item.size, count)[:item.window.size]
+        if not nums:
+            return
+        item.wanted = set(nums)
+        request = self._next_request(item)
+        request.q_block2 = [(num, 0, item.size) for num in nums]
+        item.outgoing.append(request)
+        self._wait(key_token, item)
+
+    def _wait(self, key_token, item):
+        if self.server is None:
+            return
+        if item.timer is not None:
+            item.timer.cancel()
+        item.timer = self.server.loop.call_later(self._timeout(key_token[0]), self._lost, key_token)
+
+    def _timeout(self, peer):
+        retransmission = self.server.retransmission
+        if retransmission.estimator is None:
+            return retransmission.ack_timeout
+        return retransmission.estimator.rto(peer, self.server.loop.time())
+
+    def _lost(self, key_token):
+        """
+        Ask again for the blocks of a Q-Block2 download that did not arrive in time.
+
+        :param key_token: the (peer, token) key of the exchange
+        """
+        item = self._block2_sent.get(key_token)
+        if not isinstance(item, QBlockItem):
+            return
+        item.timer = None
+        item.timeouts += 1
+        if item.timeouts > self.server.max_retransmit:
+            logger.warning("Q-Block2 transfer lost %s", key_token)
+            self._forget(self._block2_sent, key_token)
+            return
+        item.window.shrink()
+        self._ask(key_token, item)
+        self.server.loop.create_task(self.server.send_q_blocks(self._take(item)))
+
+    def _burst(self, item, nums):
+        """
+        Queue the requests of a burst of a Q-Block1 upload, the last one confirmable.
+
+        :param item: the state of the upload
+        :param nums: the numbers of the blocks
+        """
+        size = item.size
+        for num in nums:
+            request = self._next_request(item)
+            request.type = defines.Types["CON"] if num == nums[-1] else defines.Types["NON"]
+            request.q_block1 = (num, 1 if num < item.last else 0, size)
+            request.payload = item.payload[num * size:(num + 1) * size]
+            item.outgoing.append(request)
+        item.closer = item.outgoing[-1]
+
+    @staticmethod
+    def _next_request(item):
+        """
+        Return a request with the options of the first request of a Q-Block transfer.
+
+        :param item: the state of the transfer
+        :rtype: Request
+        """
+        first = item.request
+        request = Request()
+        request._destination = first.destination
+        request._source = first.source
+        request._scheme = first.scheme
+        request._family = first.family
+        request.type = first.type
+        request.token = first.token
+        request.code = first.code
+        request._options = first.options.copy()
+        del request.q_block1
+        del request.q_block2
+        return request
+
+    @staticmethod
+    def _missing_blocks(payload):
+        """
+        Decode the numbers of the missing blocks of a 4.08 Request Entity Incomplete, a CBOR sequence.
+
+        :param payload: the payload of the response
+        :rtype: list[int]
+        """
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        payload = payload or b''
+        stream = BytesIO(payload)
+        decoder = cbor2.CBORDecoder(stream)
+        nums = []
+        try:
+            while stream.tell() < len(payload):
+                nums.append(decoder.decode())
+        except cbor2.CBORDecodeError:
+            logger.warning("Malformed missing blocks")
+        return nums
+
+    @staticmethod
+    def _take(item):
+        outgoing = item.outgoing
+        item.outgoing = []
+        return outgoing
+
+    def q_block_requests(self, request):
+        """
+        Return the requests queued by a Q-Block transfer, to send once a request of the transfer is sent or
+        when one of its responses is received.
+
+        :param request: a request of the transfer
+        :return: the list of requests or None, if the request is not part of a Q-Block transfer
+        """
+        key_token = (request.destination, request.token)
+        item = self._block1_sent.get(key_token)
+        if not isinstance(item, QBlockItem):
+            item = self._block2_sent.get(key_token)
+            if not isinstance(item, QBlockItem):
+                return None
+        return self._take(item)
+
+    def q_block_burst(self, transaction):
+        """
+        Return the further responses of a Q-Block2 burst, whose first block is the response of the transaction.
+
+        :type transaction: Transaction
+        :param transaction: the transaction that owns the response
+        :rtype: list[Response]
+        """
+        key_token = (transaction.request.source, transaction.request.token)
+        item = self._block2_receive.get(key_token)
+        if item is None or not item.wanted or item.payload is None:
+            return []
+        first = transaction.response
+        view = item.payload.view
+        size = item.size
+        total = len(view)
+        responses = []
+        for num in item.wanted:
+            byte = num * size
+            if byte >= total:
+                continue
+            response = Response()
+            response._destination = first.destination
+            response._source = first.source
+            response._scheme = first.scheme
+            response._family = first.family
+            response.type = defines.Types["NON"]
+            response.token = first.token
+            response.code = first.code
+            response._options = first.options.copy()
+            response.q_block2 = (num, 0 if byte + size >= total else 1, size)
+            response.payload = view[byte:byte + size]
+            responses.append(response)
+        item.wanted = []
+        return responses
+
+    def q_block_refused(self, request):
+        """
+        Restore a request whose Q-Block options were refused with 4.02 Bad Option, to be sent again with Block1
+        and Block2. The peer is not offered Q-Block anymore.
+
+        :param request: the request
+        :return: True, if the request offered Q-Block
+        """
+        key_token = (request.destination, request.token)
+        item = self._block1_sent.get(key_token)
+        if isinstance(item, QBlockItem):
+            del self._block1_sent[key_token]
+            request.type = defines.Types["CON"]
+            request.payload = item.payload
+            del request.size1
+        else:
+            item = self._block2_sent.get(key_token)
+            if not isinstance(item, QBlockItem):
+                return False
+            self._forget(self._block2_sent, key_token)
+        self._refused.add(request.destination)
+        del request.q_block1
+        del request.q_block2
+        del request.mid
+        return True
+
     def receive_empty(self, empty, transaction):
         """
         Dummy function. Used to do not broke the layered architecture.
@@ -218,69 +853,232 @@ class BlockLayer(object):
         :rtype : Transaction
         :return: the edited transaction
         """
-        host, port = transaction.request.source
-        key_token = utils.str_append_hash(host, port, transaction.request.token)
-        if (key_token in self._block2_receive and self._block2_receive[key_token].payload is not None) or (
-                transaction.response is not None and transaction.response.payload is not None and (
-                key_token in self._block2_receive or len(transaction.response.payload) > defines.MAX_PAYLOAD)):
-            if key_token in self._block2_receive:
-                byte = self._block2_receive[key_token].byte
-                size = self._block2_receive[key_token].size
-                num = self._block2_receive[key_token].num
-                if self._block2_receive[key_token].payload is None and transaction.response.payload is not None:
-                    self._block2_receive[key_token].payload = transaction.response.payload
-                    self._block2_receive[key_token].content_type = transaction.response.content_type
-            else:
-                byte = 0
-                num = 0
-                size = defines.MAX_PAYLOAD
-                m = 1
-                self._block2_receive[key_token] = BlockItem(byte, num, m, size, transaction.response.payload,
-                                                            transaction.response.content_type)
+        key_token = (transaction.request.source, transaction.request.token)
+        response = transaction.response
+        if response is None:
+            return transaction
+        item = self._block2_receive.get(key_token)
+        if item is None:
+            if response.payload is None or len(response.payload) <= defines.MAX_PAYLOAD:
+                return transaction
+            item = BlockItem(0, 0, 1, defines.MAX_PAYLOAD)
+            self._block2_receive[key_token] = item
+        snapshot = item.payload
+        payload = response.payload
+        if snapshot is None or (payload is not None and not (
+                isinstance(payload, memoryview) and payload.obj is snapshot.payload) and not (
+                transaction.resource is None and payload is snapshot.payload)):
+            # a new rendering, not the block of a previous one nor the same cached document of .well-known/core
+            # answered again to the request of the next block
+            if payload is None:
+                return transaction
+            if snapshot is not None:
+                # a newer representation, as in a notification, starts from the first block
+                self._release(item)
+                item.num = 0
+            item.payload = snapshot = self._snapshot(transaction.resource, response)
+            item.content_type = response.content_type
 
-            # correct m
-            m = 0 if ((num * size) + size) > len(self._block2_receive[key_token].payload) else 1
-            # add size2 if requested or if payload is bigger than one datagram
-            if transaction.response is not None:
-                del transaction.response.size2
-            if (transaction.request.size2 is not None and transaction.request.size2 == 0) or \
-                    (self._block2_receive[key_token].payload is not None and len(
-                        self._block2_receive[key_token].payload) > defines.MAX_PAYLOAD):
-                transaction.response.size2 = len(self._block2_receive[key_token].payload)
-
-            transaction.response.payload = self._block2_receive[key_token].payload[byte:byte + size]
-            del transaction.response.block2
-            transaction.response.block2 = (num, m, size)
-
-            self._block2_receive[key_token].byte += size
-            self._block2_receive[key_token].num += 1
-            # if m == 0:
-            #     del self._block2_receive[key_token]
+        size = item.size
+        total = len(snapshot.payload)
+        if item.wanted is not None:
+            # Q-Block2, the first block asked for is the response, the others follow it
+            last = max(total - 1, 0) // size
+            wanted = [num for num in item.wanted if num <= last] or [last]
+            num = wanted[0]
+            item.wanted = wanted[1:]
+        else:
+            num = item.num
+        byte = num * size
+        m = 0 if byte + size >= total else 1
+        # add size2 if requested or if payload is bigger than one datagram
+        del response.size2
+        if (transaction.request.size2 is not None and transaction.request.size2 == 0) or total > defines.MAX_PAYLOAD:
+            response.size2 = total
+
+        response.payload = snapshot.view[byte:byte + size]
+        if item.wanted is not None:
+            # the transfer is kept for the blocks asked for again, until the exchange is purged
+            del response.q_block2
+            response.q_block2 = (num, m, size)
+            return transaction
+        del response.block2
+        response.block2 = (num, m, size)
+
+        item.num = num + 1
+        item.byte = byte + size
+        if m == 0:
+            self._release(item)
+            del self._block2_receive[key_token]
 
         return transaction
 
-    def purge_sent(self, key_token):
-        pass
-        # del self._block2_receive[key_token]
+    async def send_stream(self, transaction):
+        """
+        Handles the Block2 option in an outgoing response whose body is an async iterator of bytes, reading the
+        block asked for.
 
-    def purge(self, key_token):
+        :type transaction: Transaction
+        :param transaction: the transaction that owns the response
+        :return: True, if the body of the response is streamed
+        """
+        response = transaction.response
+        if response is None:
+            return False
+        key_token = (transaction.request.source, transaction.request.token)
+        item = self._block2_receive.get(key_token)
+        if hasattr(response.payload, '__aiter__'):
+            # a new rendering
+            if item is not None and item.wanted is not None:
+                self._release(item)
+                del self._block2_receive[key_token]
+                BlockSource(response.payload).close()
+                response.code = defines.Codes.BAD_OPTION.number
+                response.payload = None
+                return True
+            if item is None:
+                item = BlockItem(0, 0, 1, defines.MAX_PAYLOAD)
+                self._block2_receive[key_token] = item
+            elif item.payload is not None:
+                self._release(item)
+                item.num = 0
+            item.payload = BlockSource(response.payload)
+            item.content_type = response.content_type
+        elif item is None or not isinstance(item.payload, BlockSource):
+            return False
+
+        num = item.num
         try:
+            payload, more = await item.payload.read(num, item.size)
+        except ValueError as err:
+            logger.warning(err)
+            self._release(item)
+            del self._block2_receive[key_token]
+            response.code = defines.Codes.BAD_REQUEST.number
+            response.payload = None
+            return True
+        except Exception as err:
+            logger.exception(err)
+            self._release(item)
             del self._block2_receive[key_token]
-        except KeyError:
-            pass
+            response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
+            response.payload = None
+            return True
+        response.payload = payload
+        del response.block2
+        if num or more:
+            response.block2 = (num, 1 if more else 0, item.size)
+        item.num = num + 1
+        if not more:
+            self._release(item)
+            del self._block2_receive[key_token]
+        return True
+
+    def _snapshot(self, resource, response):
+        """
+        Return the snapshot of a rendered body, shared by the transfers of the same resource, ETag and
+        Content-Format.
+
+        :param resource: the rendered resource
+        :param response: the response with the whole body
+        :rtype: Block2Snapshot
+        """
+        payload = response.payload
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        key = None
+        etag = response.etag
+        if resource is not None and etag:
+            key = (resource, etag[0], response.content_type)
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None:
+                snapshot.transfers += 1
+                return snapshot
+        if not isinstance(payload, mmap.mmap):
+            # a memory-mapped file is sliced in place, the other bodies are frozen
+            payload = bytes(payload)
+        snapshot = Block2Snapshot(key, payload)
+        if key is not None:
+            self._snapshots[key] = snapshot
+        return snapshot
+
+    def _release(self, item):
+        """
+        Detach a transfer from its snapshot, the last transfer forgets the snapshot.
 
-    def send_request(self, request):
+        :param item: the state of the transfer
+        """
+        snapshot = item.payload
+        item.payload = None
+        if snapshot is None:
+            return
+        if isinstance(snapshot, BlockSource):
+            snapshot.close()
+            return
+        snapshot.transfers -= 1
+        if not snapshot.transfers and snapshot.key is not None and self._snapshots.get(snapshot.key) is snapshot:
+            del self._snapshots[snapshot.key]
+
+    def purge_sent(self, key_token):
+        """
+        Forget the state of the block-wise transfers of a sent request.
+
+        :param key_token: the (peer, token) key of the exchange
+        """
+        self._forget(self._block1_sent, key_token)
+        self._forget(self._block2_sent, key_token)
+
+    def purge(self, key_token):
+        """
+        Forget the state of the block-wise transfers of a received request.
+
+        :param key_token: the (peer, token) key of the exchange
+        """
+        self._forget(self._block1_receive, key_token)
+        item = self._block2_receive.pop(key_token, None)
+        if item is not None:
+            self._release(item)
+
+    @staticmethod
+    def _forget(items, key_token):
+        item = items.pop(key_token, None)
+        if item is None:
+            return
+        if isinstance(item.payload, ReassemblyBuffer):
+            item.payload.release()
+        if isinstance(item, QBlockItem) and item.timer is not None:
+            item.timer.cancel()
+        if isinstance(item, UploadItem):
+            item.task.cancel()
+
+    def send_request(self, request, stream=False):
         """
         Handles the Blocks option in a outgoing request.
 
         :type request: Request
         :param request: the outgoing request
+        :param stream: hand the body of the response over block by block, as a BlockStream payload
         :return: the edited request
         """
         assert isinstance(request, Request)
+        if stream:
+            self._downloads[(request.destination, request.token)] = BlockStream()
+        if self._offer_q_block(request):
+            if request.block1 is None and request.payload is not None and len(request.payload) > defines.MAX_PAYLOAD \
+                    and request.type in (None, defines.Types["CON"]):
+                return self._send_q_block1(request)
+            if request.code == defines.Codes.GET.number and request.block2 is None and request.observe is None \
+                    and not stream:
+                key_token = (request.destination, request.token)
+                self._forget(self._block2_sent, key_token)
+                item = QBlockItem(request, defines.MAX_PAYLOAD, self._window(request.destination))
+                # the first burst sent by the server
+                item.wanted = set(range(defines.MAX_PAYLOADS))
+                self._block2_sent[key_token] = item
+                request.q_block2 = (0, 0, defines.MAX_PAYLOAD)
+                return request
         if request.block1 or (request.payload is not None and len(request.payload) > defines.MAX_PAYLOAD):
-            host, port = request.destination
-            key_token = utils.str_append_hash(host, port, request.token)
+            key_token = (request.destination, request.token)
             if request.block1:
                 num, m, size = request.block1
             else:
@@ -295,15 +1093,53 @@ class BlockLayer(object):
             request.payload = request.payload[0:size]
             del request.block1
             request.block1 = (num, m, size)
-        elif request.block2:
-            host, port = request.destination
-            key_token = utils.str_append_hash(host, port, request.token)
+        elif request.block2 and not stream:
+            key_token = (request.destination, request.token)
             num, m, size = request.block2
-            item = BlockItem(size, num, m, size, "", None)
-            self._block2_sent[key_token] = item
+            self._forget(self._block2_sent, key_token)
+            self._block2_sent[key_token] = BlockItem(size, num, m, size)
             return request
         return request
 
+    def _offer_q_block(self, request):
+        return self.q_block and not request.multicast and not (request.scheme or '').endswith('tcp') \
+            and request.destination not in self._refused
+
+    def _window(self, peer):
+        window = self._windows.get(peer)
+        if window is None:
+            window = self._windows[peer] = BurstWindow()
+        return window
+
+    def _send_q_block1(self, request):
+        """
+        Start a Q-Block1 upload: the request carries the first block, the other blocks of the first burst are
+        queued.
+
+        :param request: the outgoing request
+        :return: the edited request
+        """
+        payload = request.payload
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        size = defines.MAX_PAYLOAD
+        key_token = (request.destination, request.token)
+        item = QBlockItem(request, size, self._window(request.destination), payload)
+        item.last = (len(payload) - 1) // size
+        item.num = min(item.window.size, item.last + 1)
+        self._block1_sent[key_token] = item
+        del request.size1
+        request.size1 = len(payload)
+        if item.num > 1:
+            self._burst(item, range(1, item.num))
+            request.type = defines.Types["NON"]
+        else:
+            item.closer = request
+            request.type = defines.Types["CON"]
+        request.q_block1 = (0, 1, size)
+        request.payload = payload[:size]
+        return request
+
     @staticmethod
     def incomplete(transaction):
         """
@@ -319,6 +1155,21 @@ class BlockLayer(object):
         transaction.response.code = defines.Codes.REQUEST_ENTITY_INCOMPLETE.number
         return transaction
 
+    def too_large(self, transaction):
+        """
+        Notifies a blockwise upload larger than the reassembly budget.
+
+        :type transaction: Transaction
+        :param transaction: the transaction that owns the response
+        :rtype : Transaction
+        :return: the edited transaction
+        """
+        transaction.block_transfer = True
+        transaction.response = Response.init_from_request(transaction.request)
+        transaction.response.code = defines.Codes.REQUEST_ENTITY_TOO_LARGE.number
+        transaction.response.size1 = self.budget.limit
+        return transaction
+
     @staticmethod
     def error(transaction, code):  # pragma: no cover
         """
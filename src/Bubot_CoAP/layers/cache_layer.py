@@ -1,6 +1,8 @@
 import logging
 import time
 
+from .. import defines
+from ..cache import Cache
 from ..defines import Codes
 
 __author__ = 'Emilio Vallati'
@@ -9,102 +11,130 @@ logger = logging.getLogger('Bubot_CoAP')
 
 
 class CacheLayer(object):
+    """
+    Answer GET requests from the responses kept in a cache.
 
-    def __init__(self, mode, max_dim=2048):
+    A fresh response is answered at once, with 2.03 Valid if the request carries its ETag. A stale one is
+    validated: its ETag is added to the request, and the 2.03 Valid response makes it fresh again. The responses
+    2.01 Created, 2.02 Deleted and 2.04 Changed drop the responses kept for the URI of the request.
+
+    Proxies call receive_request and send_response with the transaction of the request being forwarded, clients
+    call send_request and receive_response with the request they send.
+    """
+
+    def __init__(self, mode, max_dim=defines.CACHE_MAX_ENTRIES, max_bytes=defines.CACHE_MAX_BYTES,
+                 clock=time.monotonic):
         """
+        Initialize the layer.
 
-        :param max_dim:
+        :param mode: defines.FORWARD_PROXY, defines.REVERSE_PROXY or defines.CLIENT_CACHE
+        :param max_dim: the number of responses kept
+        :param max_bytes: the number of bytes of payload kept
+        :param clock: the function returning the current time in seconds
         """
-        self.cache = Cache(mode, max_dim)
+        self.cache = Cache(mode, max_dim, max_bytes, clock)
 
-    def receive_request(self, transaction):
+    @property
+    def hits(self):
         """
-        checks the cache for a response to the request
+        Return the number of requests answered from the cache.
+        """
+        return self.cache.hits
 
-        :param transaction:
-        :return:
+    @property
+    def misses(self):
+        """
+        Return the number of requests sent on, for a response not kept or stale.
         """
+        return self.cache.misses
 
-        transaction.cached_element = self.cache.search_response(transaction.request)
-        if transaction.cached_element is None:
-            transaction.cacheHit = False
-        else:
-            transaction.response = transaction.cached_element.cached_response
-            transaction.response.mid = transaction.request.mid
-            transaction.cacheHit = True
-
-            age = transaction.cached_element.creation_time + transaction.cached_element.max_age - time.time()
-            if transaction.cached_element.freshness is True:
-                if age <= 0:
-                    logger.debug("resource not fresh")
-                    """
-                    if the resource is not fresh, its Etag must be added to the request so that the server might validate it instead of sending a new one
-                    """
-                    transaction.cached_element.freshness = False
-                    """
-                    ensuring that the request goes to the server
-                    """
-                    transaction.cacheHit = False
-                    logger.debug("requesting etag %s", transaction.response.etag)
-                    transaction.request.etag = transaction.response.etag
-                else:
-                    transaction.response.max_age = age
-            else:
-                transaction.cacheHit = False
+    def receive_request(self, transaction):
+        """
+        Check the cache for a response to the request received by a proxy.
+
+        :param transaction: the transaction
+        :return: the transaction, its response set if the request was answered from the cache
+        """
+        response, transaction.cached_element = self.send_request(transaction.request)
+        transaction.cacheHit = response is not None
+        if response is not None:
+            transaction.response = response
         return transaction
 
     def send_response(self, transaction):
         """
-        updates the cache with the response if there was a cache miss
+        Update the cache with the response forwarded by a proxy, if the request was not answered from the cache.
 
-        :param transaction:
-        :return:
+        :param transaction: the transaction
+        :return: the transaction
         """
-        if transaction.cacheHit is False:
-            """
-            handling response based on the code
-            """
-            logger.debug("handling response")
-            self._handle_response(transaction)
+        if not transaction.cacheHit and transaction.response is not None:
+            transaction.response = self.receive_response(transaction.request, transaction.response,
+                                                         transaction.cached_element)
         return transaction
 
-    def _handle_response(self, transaction):
+    def send_request(self, request):
         """
-        handles responses based on their type
+        Check the cache for a response to a request.
 
-        :param transaction:
-        :return:
+        :type request: Request
+        :param request: the request
+        :return: (response, None) if the request is answered from the cache, else (None, the element being
+            validated by the request, if any)
         """
-        code = transaction.response.code
-        utils.check_code(code)
+        cache = self.cache
+        found = cache.key(request)
+        if found is None:
+            return None, None
+        element = cache.search(found[0])
+        if element is None:
+            cache.misses += 1
+            return None, None
+        now = cache.clock()
+        etags = request.etag
+        if now < element.expires:
+            cache.hits += 1
+            response = element.answer(request, now)
+            if element.etag is not None and element.etag in etags:
+                # the client holds the representation already
+                response.code = Codes.VALID.number
+                response.payload = None
+            return response, None
+        cache.misses += 1
+        if element.etag is None or etags:
+            return None, None
+        logger.debug("validating etag %s", element.etag)
+        request.etag = element.etag
+        return None, element
+
+    def receive_response(self, request, response, validated=None):
         """
-        VALID response:
-        change the current cache value by switching the option set with the one provided
-        also resets the timestamp
-        if the request etag is different from the response, send the cached response
+        Update the cache with the response to a request.
+
+        :type request: Request
+        :param request: the request
+        :type response: Response
+        :param response: the response
+        :param validated: the element whose ETag was added to the request by send_request
+        :return: the response, or the response kept if the request validated it
         """
+        cache = self.cache
+        if validated is not None:
+            del request.etag
+        code = response.code
+        if code in (Codes.CREATED.number, Codes.DELETED.number, Codes.CHANGED.number):
+            cache.invalidate(cache.uri(request))
+            return response
+        found = cache.key(request)
+        if found is None:
+            return response
+        key, uri = found
         if code == Codes.VALID.number:
-            logger.debug("received VALID")
-            self.cache.validate(transaction.request, transaction.response)
-            if transaction.request.etag != transaction.response.etag:
-                element = self.cache.search_response(transaction.request)
-                transaction.response = element.cached_response
-            return transaction
-
-        """
-        CHANGED, CREATED or DELETED response:
-        mark the requested resource as not fresh
-        """
-        if code == Codes.CHANGED.number or code == Codes.CREATED.number or code == Codes.DELETED.number:
-            target = self.cache.search_related(transaction.request)
-            if target is not None:
-                for element in target:
-                    self.cache.mark(element)
-            return transaction
-
-        """
-        any other response code can be cached normally
-        """
-        self.cache.cache_add(transaction.request, transaction.response)
-        return transaction
-
+            element = cache.search(key)
+            if element is not None and element.etag is not None and element.etag in response.etag:
+                cache.validate(element, response)
+                if validated is element:
+                    return element.answer(request, cache.clock())
+            return response
+        cache.store(key, uri, response)
+        return response
@@ -1,7 +1,9 @@
 import asyncio
 import logging
+from collections import deque
 
 from bubot_helpers.ExtException import ExtException
+from .. import defines
 from ..messages.request import Request
 from ..messages.response import Response
 
@@ -9,22 +11,83 @@ logger = logging.getLogger('Bubot_CoAP')
 from ..defines import MULTICAST_TIMEOUT
 
 
+class PeerQueue:
+    """
+    Requests outstanding to a peer and the requests waiting for their turn.
+    """
+    __slots__ = ('outstanding', 'waiters', 'responsive', 'next_send')
+
+    def __init__(self):
+        self.outstanding = 0
+        self.waiters = deque()  # type: deque[asyncio.Future]
+        self.responsive = True
+        self.next_send = 0
+
+    @property
+    def depth(self):
+        return len(self.waiters)
+
+
 class CallbackLayer:
+    """
+    Pair responses with the requests awaiting them.
+
+    Unicast requests over UDP are admitted per destination: at most nstart of them are outstanding, the
+    others wait in FIFO order. Once a request to a peer timed out, and until the peer responds again, the
+    requests to it are also spaced so that the bytes sent stay under probing_rate per second. A request
+    cancelled by its caller or failing to be sent does not mark the peer. The time spent waiting counts
+    against the timeout of the request. The state of a peer is dropped once nothing is outstanding to it
+    and its next send is due.
+    """
+
     def __init__(self, server):
         self.server = server
         self._waited_answer = {}
+        self.nstart = server.nstart if server is not None else defines.NSTART
+        self.probing_rate = server.probing_rate if server is not None else defines.PROBING_RATE
+        self._queues = {}  # type: dict[tuple, PeerQueue]
+        self.queued_total = 0
+        self.wait_time_total = 0
+        self.wait_time_max = 0
+
+    async def wait(self, request: Request, *, timeout=None, send=None, **kwargs):
+        """
+        Wait for the response to a request.
 
-    async def wait(self, request: Request, *, timeout=None, **kwargs):
+        :param request: the request
+        :param timeout: the time to wait for a free slot and then the response
+        :param send: coroutine function sending the request, called once the request is admitted
+        :return: the response, or the list of responses of a multicast request
+        """
         # timeout = kwargs.get('timeout')
         try:
             if not timeout:
                 timeout = MULTICAST_TIMEOUT
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            queue = None
+            if self.nstart and not request.multicast and not request.scheme.endswith('tcp'):
+                queue = await self._acquire(request, deadline)
             waiter = Waiter(request, **kwargs)
             self._waited_answer[waiter.key] = waiter
+            sent = loop.time()
+            timed_out = False
             try:
-                result = await asyncio.wait_for(waiter.future, timeout)
+                if send is not None:
+                    await send()
+                    sent = loop.time()
+                if queue is not None and not queue.responsive:
+                    queue.next_send = loop.time() + self.probe_size(request) / self.probing_rate
+                result = await asyncio.wait_for(waiter.future, deadline - loop.time())
                 return result
-            except (asyncio.TimeoutError, asyncio.CancelledError) as err:
+            except asyncio.TimeoutError as err:
+                # no response in time, the retransmission of the request gave up meanwhile
+                timed_out = True
+                if request.multicast:
+                    return waiter.result
+                else:
+                    raise err
+            except asyncio.CancelledError as err:
                 if request.multicast:
                     return waiter.result
                 else:
@@ -33,13 +96,125 @@ class CallbackLayer:
                 raise err
             finally:
                 self._waited_answer.pop(waiter.key, None)
+                if queue is not None:
+                    # a request cancelled by the caller or not sent tells nothing about the peer
+                    if timed_out and queue.responsive:
+                        # the requests that follow are spaced from the one not answered
+                        queue.responsive = False
+                        queue.next_send = sent + self.probe_size(request) / self.probing_rate
+                    self._release(request.destination, queue)
             pass
         except (asyncio.TimeoutError, asyncio.CancelledError) as err:
             raise err
         except Exception as err:
             raise ExtException(parent=err)
 
+    async def _acquire(self, request, deadline):
+        """
+        Wait for a free slot to the destination of a request.
+
+        :param request: the request
+        :param deadline: the loop time at which to give up
+        :raise asyncio.TimeoutError: if the deadline passes first
+        :rtype: PeerQueue
+        :return: the queue of the destination
+        """
+        peer = request.destination
+        queue = self._queues.get(peer)
+        if queue is None:
+            queue = self._queues[peer] = PeerQueue()
+        loop = asyncio.get_running_loop()
+        if queue.outstanding < self.nstart and not queue.waiters:
+            queue.outstanding += 1
+        else:
+            future = loop.create_future()
+            queue.waiters.append(future)
+            start = loop.time()
+            try:
+                await asyncio.wait_for(future, deadline - start)
+            except BaseException:
+                if future.done() and not future.cancelled():
+                    self._release(peer, queue)
+                else:
+                    queue.waiters.remove(future)
+                raise
+            finally:
+                waited = loop.time() - start
+                self.queued_total += 1
+                self.wait_time_total += waited
+                self.wait_time_max = max(self.wait_time_max, waited)
+        if not queue.responsive:
+            delay = queue.next_send - loop.time()
+            if delay > 0:
+                if loop.time() + delay > deadline:
+                    self._release(peer, queue)
+                    raise asyncio.TimeoutError()
+                await asyncio.sleep(delay)
+        return queue
+
+    def _release(self, peer, queue):
+        while queue.waiters:
+            future = queue.waiters.popleft()
+            if not future.done():
+                # hand the slot over
+                future.set_result(None)
+                return
+        queue.outstanding -= 1
+        if queue.outstanding:
+            return
+        if queue.responsive:
+            self._queues.pop(peer, None)
+            return
+        # the pacing of an idle unresponsive peer is kept only until its next send is due
+        loop = asyncio.get_running_loop()
+        if queue.next_send <= loop.time():
+            self._queues.pop(peer, None)
+        else:
+            loop.call_at(queue.next_send, self._expire, peer, queue)
+
+    def _expire(self, peer, queue):
+        if self._queues.get(peer) is queue and not queue.outstanding and not queue.waiters:
+            del self._queues[peer]
+
+    @staticmethod
+    def probe_size(request):
+        """
+        Estimate the size of a request on the wire, to pace the requests to an unresponsive peer.
+
+        :param request: the request
+        :return: the size in bytes
+        """
+        size = 4 + len(request.token or b'') + len(request.payload or b'')
+        for option in request.options:
+            size += 1 + option.length
+        return size
+
+    def queue(self, peer):
+        """
+        Return the admission state of a peer.
+
+        :param peer: the (host, port) of the peer
+        :rtype: PeerQueue
+        :return: the queue or None if nothing is outstanding to the peer nor paced
+        """
+        return self._queues.get(peer)
+
+    def queue_depth(self, peer=None):
+        """
+        Return the number of requests waiting for a free slot.
+
+        :param peer: the (host, port) of a peer, by default all of them
+        :return: the number of waiting requests
+        """
+        if peer is not None:
+            queue = self._queues.get(peer)
+            return queue.depth if queue is not None else 0
+        return sum(queue.depth for queue in self._queues.values())
+
     def set_result(self, response: Response):
+        queue = self._queues.get(response.source)
+        if queue is not None:
+            queue.responsive = True
         try:
             waiter = self._waited_answer[response.token]
         except KeyError:
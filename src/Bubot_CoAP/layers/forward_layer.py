@@ -53,15 +53,11 @@ class ForwardLayer(object):
         path = str("/" + transaction.request.uri_path)
         transaction.response = Response.init_from_request(transaction.request)
         if path == defines.DISCOVERY_URL and not wkc_resource_is_defined:
-            transaction = self._server.resource_layer.discover(transaction)
+            transaction = self._server.discovery.discover(transaction)
         else:
             new = False
             if transaction.request.code == defines.Codes.POST.number:
-                new_paths = self._server.root.with_prefix(path)
-                new_path = "/"
-                for tmp in new_paths:
-                    if len(tmp) > len(new_path):
-                        new_path = tmp
+                new_path = self._server.root.longest_prefix(path)[0]
                 if path != new_path:
                     new = True
                 path = new_path
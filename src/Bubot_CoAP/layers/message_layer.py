@@ -1,13 +1,12 @@
 import logging
 import random
-import socket
 import time
+from collections import deque
 
 from .. import defines
-from .. import utils
 from ..messages.request import Request
 from ..transaction import Transaction
-from ..utils import generate_random_token
+from ..utils import generate_random_token, TimerWheel
 
 # import asyncio
 
@@ -19,6 +18,13 @@ logger = logging.getLogger('Bubot_CoAP')
 class MessageLayer(object):
     """
     Handles matching between messages (Message ID) and request/response (Token)
+
+    Exchanges are indexed by tuple keys built from the peer address, (peer, mid) and (peer, token), in
+    separate dictionaries for received and sent messages, so every incoming message is matched with
+    dictionary lookups.
+
+    Every entry expires exchange_lifetime seconds after the message that created or last used it, the
+    deadlines are kept in timer wheels advanced by purge() once per tick.
     """
 
     def __init__(self, server, starting_mid):
@@ -29,10 +35,20 @@ class MessageLayer(object):
         """
         # self.lock = asyncio.Lock()
         self.server = server
+        # received requests: (peer, mid) -> transaction, (peer, token) -> transaction
         self._transactions = {}
         self._transactions_token = {}
+        # sent requests: (peer, mid) -> transaction, (peer, token) -> transaction
         self._transactions_sent = {}
         self._transactions_sent_token = {}
+        self.exchange_lifetime = server.exchange_lifetime if server is not None else defines.EXCHANGE_LIFETIME
+        self._expiry_mid = TimerWheel(self._expire_mid)
+        self._expiry_token = TimerWheel(self._expire_token)
+        self._expiry_sent_mid = TimerWheel(self._expire_sent_mid)
+        self._expiry_sent_token = TimerWheel(self.purge_sent)
+        self.purge_interval = self._expiry_mid.tick
+        self.expired_total = 0
+        self.expired_per_tick = deque(maxlen=60)
         if starting_mid is not None:
             self._current_mid = starting_mid
         else:
@@ -54,23 +70,36 @@ class MessageLayer(object):
         return current_mid
 
     def purge_sent(self, k):
-        del self._transactions_sent_token[k]
-        self.server.block_layer.purge_sent(k)
-
-    def purge(self, timeout_time=defines.EXCHANGE_LIFETIME):
-        for k in list(self._transactions.keys()):
-            now = time.time()
-            transaction = self._transactions[k]
-            if transaction.timestamp + timeout_time < now or transaction.completed:
-                logger.debug("Delete transaction")
-                del self._transactions[k]
-        for k in list(self._transactions_token.keys()):
-            now = time.time()
-            transaction = self._transactions_token[k]
-            if transaction.timestamp + timeout_time < now or transaction.completed:
-                logger.debug("Delete transaction")
-                del self._transactions_token[k]
-                self.server.block_layer.purge(k)
+        self._expiry_sent_token.cancel(k)
+        self._transactions_sent_token.pop(k, None)
+        if self.server is not None:
+            self.server.block_layer.purge_sent(k)
+
+    def purge(self, now=None):
+        """
+        Expire the transactions whose exchange lifetime has passed.
+
+        :param now: the current monotonic time, by default read from the clock
+        :return: the number of expired entries
+        """
+        expired = self._expiry_mid.advance(now) + self._expiry_token.advance(now) \
+            + self._expiry_sent_mid.advance(now) + self._expiry_sent_token.advance(now)
+        if expired:
+            logger.debug("Expired %s transactions", expired)
+        self.expired_total += expired
+        self.expired_per_tick.append(expired)
+        return expired
+
+    def _expire_mid(self, key):
+        self._transactions.pop(key, None)
+
+    def _expire_token(self, key):
+        self._transactions_token.pop(key, None)
+        if self.server is not None:
+            self.server.block_layer.purge(key)
+
+    def _expire_sent_mid(self, key):
+        self._transactions_sent.pop(key, None)
 
     async def receive_request(self, request):
         """
@@ -81,26 +110,30 @@ class MessageLayer(object):
         :rtype : Transaction
         :return: the edited transaction
         """
-        logger.info("Receive request  - " + str(request))
-        try:
-            host, port = request.source
-        except AttributeError:
+        logger.info("Receive request  - %s", request)
+        peer = request.source
+        if peer is None:
             return
         if request.multicast:
             key_mid = request.mid
             key_token = request.token  # skip duplicated from net interfaces
-            if key_token in list(self._transactions_token.keys()):
+            transaction = self._transactions_token.get(key_token)
+            if transaction is not None:
                 # Duplicated multicast request
-                self._transactions_token[key_token].request.duplicated = True
-                return self._transactions_token[key_token]
+                request.duplicated = True
+                transaction.request.duplicated = True
+                return transaction
         else:
-            key_mid = utils.str_append_hash(host, port, request.mid)
-            key_token = utils.str_append_hash(host, port, request.token)
-
-            if request.mid and key_mid in list(self._transactions.keys()):
-                # Duplicated
-                self._transactions[key_mid].request.duplicated = True
-                return self._transactions[key_mid]
+            key_mid = (peer, request.mid)
+            key_token = (peer, request.token)
+
+            if request.mid:
+                transaction = self._transactions.get(key_mid)
+                if transaction is not None:
+                    # Duplicated
+                    request.duplicated = True
+                    transaction.request.duplicated = True
+                    return transaction
         request.timestamp = time.time()
 
         # transaction = Transaction(request=request, timestamp=request.timestamp)
@@ -108,19 +141,40 @@ class MessageLayer(object):
         #     self._transactions[key_mid] = transaction
         #     self._transactions_token[key_token] = transaction
         ## async with self.lock:
-        if key_token in self._transactions_token \
-                and self._transactions_token[key_token].response is not None:  # вычитываем результат
-            transaction = self._transactions_token[key_token]
+        transaction = self._transactions_token.get(key_token)
+        # the blocks of a Q-Block1 burst are not answered one by one
+        if transaction is not None and (transaction.response is not None or request.q_block1 is not None) \
+                and self._is_block_continuation(request):  # вычитываем результат
             async with transaction.lock:
-                self._transactions_token[key_token].request = request
+                transaction.request = request
                 self._transactions[key_mid] = transaction
         else:
+            if transaction is not None and self.server is not None:
+                # the token is reused for a new exchange
+                self.server.block_layer.purge(key_token)
             transaction = Transaction(request=request, timestamp=request.timestamp)
             async with transaction.lock:
                 self._transactions_token[key_token] = transaction
                 self._transactions[key_mid] = transaction
+        self._expiry_mid.schedule(key_mid, self.exchange_lifetime)
+        self._expiry_token.schedule(key_token, self.exchange_lifetime)
         return transaction
 
+    @staticmethod
+    def _is_block_continuation(request):
+        """
+        Check if a request asks for a further block of a block-wise exchange.
+
+        :param request: the request
+        :return: True, if Block1, Block2, Q-Block1 or Q-Block2 with a block number greater than 0 is present
+        """
+        block = request.block2 or request.block1 or request.q_block1
+        if block is None:
+            blocks = request.q_block2
+            # Q-Block2 lists the missing blocks, the first one may be block 0
+            return blocks is not None and (blocks[0][0] > 0 or len(blocks) > 1)
+        return block[0] > 0
+
     def receive_response(self, response):
         """
         Pair responses with requests.
@@ -130,33 +184,23 @@ class MessageLayer(object):
         :rtype : Transaction
         :return: the transaction to which the response belongs to
         """
-        logger.info("Receive response - " + str(response))
-        try:
-            host, port = response.source
-        except AttributeError:
+        logger.info("Receive response - %s", response)
+        peer = response.source
+        if peer is None:
             return
-        # all_coap_nodes = defines.ALL_COAP_NODES_IPV6 if socket.getaddrinfo(host, None)[0][0] == socket.AF_INET6 else defines.ALL_COAP_NODES
-        key_mid = utils.str_append_hash(host, port, response.mid)
-        # key_mid_multicast = utils.str_append_hash(all_coap_nodes, port, response.mid)
-        key_token = utils.str_append_hash(host, port, response.token)
-        key_token_multicast = utils.str_append_hash(response.destination[0], response.destination[1], response.token)
-        if response.type in [defines.Types["ACK"], defines.Types["RST"]] and key_mid in list(self._transactions_sent.keys()):
-            transaction = self._transactions_sent[key_mid]
-            if response.token != transaction.request.token:
-                logger.warning("Tokens does not match -  response message " + str(host) + ":" + str(port))
+        transaction = None
+        if response.type == defines.Types["ACK"] or response.type == defines.Types["RST"]:
+            transaction = self._transactions_sent.get((peer, response.mid))
+            if transaction is not None and response.token != transaction.request.token:
+                logger.warning("Tokens does not match -  response message %s:%s", peer[0], peer[1])
                 return None, False
-        elif key_token in self._transactions_sent_token:
-            transaction = self._transactions_sent_token[key_token]
-        # elif key_mid_multicast in list(self._transactions_sent.keys()):
-        #     transaction = self._transactions_sent[key_mid_multicast]
-        elif key_token_multicast in self._transactions_sent_token:
-            transaction = self._transactions_sent_token[key_token_multicast]
-            if response.token != transaction.request.token:
-                logger.warning("Tokens does not match -  response message " + str(host) + ":" + str(port))
+        if transaction is None:
+            transaction = self._transactions_sent_token.get((peer, response.token))
+        if transaction is None:
+            transaction = self._transactions_sent_token.get((response.destination, response.token))
+            if transaction is None:
+                logger.warning("Un-Matched incoming response %s", response)
                 return None, False
-        else:
-            logger.warning(f"Un-Matched incoming response {response}")
-            return None, False
         send_ack = False
         if response.type == defines.Types["CON"]:
             send_ack = True
@@ -164,8 +208,8 @@ class MessageLayer(object):
         transaction.request.acknowledged = True
         transaction.completed = True
         transaction.response = response
-        if transaction.retransmit_stop is not None:
-            transaction.retransmit_stop.set()
+        if transaction.retransmission is not None:
+            self.server.retransmission.stop(transaction)
         return transaction, send_ack
 
     def receive_empty(self, message):
@@ -177,28 +221,22 @@ class MessageLayer(object):
         :rtype : Transaction
         :return: the transaction to which the message belongs to
         """
-        logger.info("Receive empty    - " + str(message))
-        try:
-            host, port = message.source
-        except AttributeError:
+        logger.info("Receive empty    - %s", message)
+        peer = message.source
+        if peer is None:
             return
-        all_coap_nodes = defines.ALL_COAP_NODES_IPV6 if socket.getaddrinfo(host, None)[0][
-                                                            0] == socket.AF_INET6 else defines.ALL_COAP_NODES
-        key_mid = utils.str_append_hash(host, port, message.mid)
-        key_mid_multicast = utils.str_append_hash(all_coap_nodes, port, message.mid)
-        key_token = utils.str_append_hash(host, port, message.token)
-        key_token_multicast = utils.str_append_hash(all_coap_nodes, port, message.token)
-        if key_mid in list(self._transactions.keys()):
-            transaction = self._transactions[key_mid]
-        elif key_token in self._transactions_token:
-            transaction = self._transactions_token[key_token]
-        elif key_mid_multicast in list(self._transactions.keys()):
-            transaction = self._transactions[key_mid_multicast]
-        elif key_token_multicast in self._transactions_token:
-            transaction = self._transactions_token[key_token_multicast]
-        else:
-            logger.warning("Un-Matched incoming empty message " + str(host) + ":" + str(port))
-            return None
+        host, port = peer
+        transaction = self._transactions.get((peer, message.mid))
+        if transaction is None:
+            transaction = self._transactions_token.get((peer, message.token))
+        if transaction is None:
+            all_coap_nodes = (defines.ALL_COAP_NODES_IPV6 if ':' in host else defines.ALL_COAP_NODES, port)
+            transaction = self._transactions.get((all_coap_nodes, message.mid))
+            if transaction is None:
+                transaction = self._transactions_token.get((all_coap_nodes, message.token))
+            if transaction is None:
+                logger.warning("Un-Matched incoming empty message %s:%s", host, port)
+                return None
 
         if message.type == defines.Types["ACK"]:
             if not transaction.request.acknowledged:
@@ -217,8 +255,9 @@ class MessageLayer(object):
         else:
             logger.warning("Unhandled message type...")
 
-        if transaction.retransmit_stop is not None:
-            transaction.retransmit_stop.set()
+        retransmission = transaction.retransmission
+        if retransmission is not None and (retransmission.message.acknowledged or retransmission.message.rejected):
+            self.server.retransmission.stop(transaction)
 
         return transaction
 
@@ -232,9 +271,8 @@ class MessageLayer(object):
         :return: the created transaction
         """
         assert isinstance(request, Request)
-        try:
-            host, port = request.destination
-        except AttributeError:
+        peer = request.destination
+        if peer is None:
             return
         request.timestamp = time.time()
         transaction = Transaction(request=request, timestamp=request.timestamp)
@@ -249,17 +287,19 @@ class MessageLayer(object):
 
         # logger.info("send_request - " + str(request))
         if request.multicast:
-            key_token = utils.str_append_hash(request.source[0], request.source[1], request.token)
-            self._transactions_sent_token[key_token] = transaction
-            return self._transactions_sent_token[key_token]
+            key_token = (request.source, request.token)
         else:
-            key_mid = utils.str_append_hash(host, port, request.mid)
+            key_token = (peer, request.token)
+            key_mid = (peer, request.mid)
             self._transactions_sent[key_mid] = transaction
-
-            key_token = utils.str_append_hash(host, port, request.token)
-            self._transactions_sent_token[key_token] = transaction
-
-            return self._transactions_sent[key_mid]
+            self._expiry_sent_mid.schedule(key_mid, self.exchange_lifetime)
+        self._transactions_sent_token[key_token] = transaction
+        if request.observe == 0:
+            # notifications of an observation are matched by token until it is cancelled
+            self._expiry_sent_token.cancel(key_token)
+        else:
+            self._expiry_sent_token.schedule(key_token, self.exchange_lifetime)
+        return transaction
 
     def send_response(self, transaction):
         """
@@ -287,15 +327,15 @@ class MessageLayer(object):
 
         if transaction.response.mid is None:
             transaction.response.mid = self.fetch_mid()
-            try:
-                host, port = transaction.response.destination
-            except AttributeError:
+            peer = transaction.response.destination
+            if peer is None:
                 return
-            key_mid = utils.str_append_hash(host, port, transaction.response.mid)
+            key_mid = (peer, transaction.response.mid)
             self._transactions[key_mid] = transaction
+            self._expiry_mid.schedule(key_mid, self.exchange_lifetime)
 
         transaction.request.acknowledged = True
-        logger.info("Send response    - " + str(transaction.response))
+        logger.info("Send response    - %s", transaction.response)
         return transaction
 
     def send_empty(self, transaction, related, message):
@@ -309,21 +349,16 @@ class MessageLayer(object):
         :param message: the ACK or RST message to send
         """
         if transaction is None:
-            try:
-                host, port = message.destination
-            except AttributeError:
+            peer = message.destination
+            if peer is None:
                 return
-            key_mid = utils.str_append_hash(host, port, message.mid)
-            key_token = utils.str_append_hash(host, port, message.token)
-            if key_mid in self._transactions:
-                transaction = self._transactions[key_mid]
-                related = transaction.response
-            elif key_token in self._transactions_token:
-                transaction = self._transactions_token[key_token]
-                related = transaction.response
-            else:
-                logger.info("send_empty - " + str(message))
+            transaction = self._transactions.get((peer, message.mid))
+            if transaction is None:
+                transaction = self._transactions_token.get((peer, message.token))
+            if transaction is None:
+                logger.info("send_empty - %s", message)
                 return message
+            related = transaction.response
 
         if message.type == defines.Types["ACK"]:
             if transaction.request == related:
@@ -2,15 +2,89 @@ import logging
 import time
 
 from .. import defines
-from .. import utils
+from ..utils import DeadlineHeap
 
 __author__ = 'Giacomo Tanganelli'
 
 logger = logging.getLogger('Bubot_CoAP')
 
 
+class ObserveConditions(object):
+    """
+    The conditional attributes of an observation (draft-ietf-core-conditional-attributes), given as query
+    parameters of the observe request.
+
+    pmin and pmax bound the period between two notifications in seconds. A change is notified only if the
+    numeric state of the resource crossed gt or lt, or moved by at least st, since the last notification.
+    Without gt, lt and st every change is notified.
+    """
+    __slots__ = ('pmin', 'pmax', 'gt', 'lt', 'st')
+    names = ('pmin', 'pmax', 'gt', 'lt', 'st')
+
+    def __init__(self, pmin=None, pmax=None, gt=None, lt=None, st=None):
+        self.pmin = pmin
+        self.pmax = pmax
+        self.gt = gt
+        self.lt = lt
+        self.st = st
+
+    @classmethod
+    def from_request(cls, request):
+        """
+        Read the conditional attributes from the Uri-Query options of a request.
+
+        :param request: the observe request
+        :return: the conditions or None if the request has none
+        :raise ValueError: if an attribute is not a number or the attributes contradict each other
+        """
+        conditions = None
+        for value in request.options.values(defines.OptionRegistry.URI_QUERY.number):
+            name, _, number = str(value).partition('=')
+            if name in cls.names:
+                if conditions is None:
+                    conditions = cls()
+                setattr(conditions, name, float(number))
+        if conditions is not None:
+            if (conditions.pmin is not None and conditions.pmin < 0) \
+                    or (conditions.pmax is not None and conditions.pmax <= (conditions.pmin or 0)) \
+                    or (conditions.st is not None and conditions.st <= 0):
+                raise ValueError('invalid conditional attributes')
+        return conditions
+
+    @classmethod
+    def is_attribute(cls, query):
+        """
+        Check if a Uri-Query option is a conditional attribute.
+
+        :param query: the value of the option
+        :return: True, if it is a conditional attribute
+        """
+        return str(query).partition('=')[0] in cls.names
+
+    def met(self, last, value):
+        """
+        Check if a change of the state of the resource has to be notified.
+
+        :param last: the state of the last notification
+        :param value: the current state
+        :return: True, if the change has to be notified
+        """
+        if self.gt is None and self.lt is None and self.st is None:
+            return True
+        if last is None or value is None:
+            return True
+        if self.gt is not None and (last > self.gt) != (value > self.gt):
+            return True
+        if self.lt is not None and (last < self.lt) != (value < self.lt):
+            return True
+        return self.st is not None and abs(value - last) >= self.st
+
+
 class ObserveItem(object):
-    def __init__(self, timestamp, non_counter, allowed, transaction):
+    __slots__ = ('timestamp', 'non_counter', 'allowed', 'transaction', 'resource', 'conditions', 'sent', 'value',
+                 'pending', 'deadline', 'index')
+
+    def __init__(self, timestamp, non_counter, allowed, transaction, conditions=None):
         """
         Data structure for the Observe option
 
@@ -18,19 +92,118 @@ class ObserveItem(object):
         :param non_counter: the number of NON notification sent
         :param allowed: if the client is allowed as observer
         :param transaction: the transaction
+        :param conditions: the conditional attributes of the observation
         """
         self.timestamp = timestamp
         self.non_counter = non_counter
         self.allowed = allowed
         self.transaction = transaction
+        self.resource = None
+        self.conditions = conditions
+        self.sent = None
+        self.value = None
+        self.pending = False
+        self.deadline = None
+        self.index = None
 
 
 class ObserveLayer(object):
     """
     Manage the observing feature. It store observing relationships.
+
+    The relations are kept by (peer, token) and, once the observed resource is known, also grouped by
+    resource, so that a notification only visits the observers of the changed resource.
+
+    The changes of a resource observed with conditional attributes are coalesced per relation: a change
+    within pmin of the last notification is held and a relation without notification for pmax gets one
+    anyway. The deadlines of all the relations are kept in one heap, expire returns the notifications due.
     """
-    def __init__(self):
-        self._relations = {}
+    def __init__(self, clock=time.monotonic, wakeup=None):
+        """
+        Initialize the layer.
+
+        :param clock: the function returning the current time of the deadlines
+        :param wakeup: called when the earliest deadline moves ahead
+        """
+        self._relations = {}  # type: dict[tuple, ObserveItem]
+        self._by_resource = {}  # type: dict[Resource, dict[tuple, ObserveItem]]
+        self._by_path = {}  # type: dict[str, Resource]
+        self._timers = DeadlineHeap()
+        self._clock = clock
+        self._wakeup = wakeup
+        self.coalesced_total = 0
+        self.dropped_total = 0
+
+    def _index(self, key_token, item, resource):
+        """
+        Group a relation under the resource it observes.
+
+        :param key_token: the (peer, token) key of the relation
+        :param item: the relation
+        :param resource: the observed resource
+        """
+        if item.resource is resource:
+            return
+        self._unindex(key_token, item)
+        bucket = self._by_resource.get(resource)
+        if bucket is None:
+            bucket = self._by_resource[resource] = {}
+            self._by_path[resource.path] = resource
+        bucket[key_token] = item
+        item.resource = resource
+
+    def _unindex(self, key_token, item):
+        resource = item.resource
+        if resource is None:
+            return
+        item.resource = None
+        bucket = self._by_resource[resource]
+        del bucket[key_token]
+        if not bucket:
+            del self._by_resource[resource]
+            if self._by_path.get(resource.path) is resource:
+                del self._by_path[resource.path]
+
+    def _remove(self, key_token):
+        """
+        Forget a relation.
+
+        :param key_token: the (peer, token) key of the relation
+        :return: the removed relation or None
+        """
+        item = self._relations.pop(key_token, None)
+        if item is not None:
+            self._unindex(key_token, item)
+            self._timers.remove(item)
+        return item
+
+    def _schedule(self, item):
+        """
+        Put a relation with conditional attributes in the heap at the end of pmin if it holds a change, else
+        at the end of pmax.
+
+        :param item: the relation
+        """
+        self._timers.remove(item)
+        conditions = item.conditions
+        if item.pending:
+            item.deadline = item.sent + conditions.pmin
+        elif conditions.pmax is not None:
+            item.deadline = item.sent + conditions.pmax
+        else:
+            return
+        self._timers.push(item)
+        if item.index == 0 and self._wakeup is not None:
+            self._wakeup()
+
+    def next_deadline(self):
+        """
+        Return the earliest deadline of the relations with conditional attributes.
+
+        :return: the deadline or None if no relation waits
+        """
+        head = self._timers.peek()
+        return None if head is None else head.deadline
 
     def send_request(self, request):
         """
@@ -41,9 +214,8 @@ class ObserveLayer(object):
         """
         if request.observe == 0:
             # Observe request
-            host, port = request.destination
-            key_token = utils.str_append_hash(host, port, request.token)
-
+            key_token = (request.destination, request.token)
+            self._remove(key_token)
             self._relations[key_token] = ObserveItem(time.time(), None, True, None)
 
         return request
@@ -57,8 +229,7 @@ class ObserveLayer(object):
         :rtype : Transaction
         :return: the modified transaction
         """
-        host, port = transaction.response.source
-        key_token = utils.str_append_hash(host, port, transaction.response.token)
+        key_token = (transaction.response.source, transaction.response.token)
         if key_token in self._relations and transaction.response.type == defines.Types["CON"]:
             transaction.notification = True
         return transaction
@@ -71,10 +242,9 @@ class ObserveLayer(object):
         :param message: the message
         :return: the message unmodified
         """
-        host, port = message.destination
-        key_token = utils.str_append_hash(host, port, message.token)
-        if key_token in self._relations and message.type == defines.Types["RST"]:
-            del self._relations[key_token]
+        key_token = (message.destination, message.token)
+        if message.type == defines.Types["RST"]:
+            self._remove(key_token)
         return message
 
     async def receive_request(self, transaction):
@@ -89,23 +259,24 @@ class ObserveLayer(object):
         """
         if transaction.request.observe == 0:
             # Observe request
-            host, port = transaction.request.source
-            key_token = utils.str_append_hash(host, port, transaction.request.token)
+            key_token = (transaction.request.source, transaction.request.token)
             non_counter = 0
-            if key_token in self._relations:
+            if self._remove(key_token) is not None:
                 # Renew registration
                 allowed = True
             else:
                 allowed = False
-            self._relations[key_token] = ObserveItem(time.time(), non_counter, allowed, transaction)
+            try:
+                conditions = ObserveConditions.from_request(transaction.request)
+            except ValueError as err:
+                # the resource is served without observation
+                logger.warning("Observe request rejected: %s", err)
+                return transaction
+            self._relations[key_token] = ObserveItem(time.time(), non_counter, allowed, transaction, conditions)
         elif transaction.request.observe == 1:
-            host, port = transaction.request.source
-            key_token = utils.str_append_hash(host, port, transaction.request.token)
+            key_token = (transaction.request.source, transaction.request.token)
             logger.info("Remove Subscriber")
-            try:
-                del self._relations[key_token]
-            except KeyError:
-                pass
+            self._remove(key_token)
 
         return transaction
 
@@ -121,13 +292,9 @@ class ObserveLayer(object):
         :return: the modified transaction
         """
         if empty.type == defines.Types["RST"]:
-            host, port = transaction.request.source
-            key_token = utils.str_append_hash(host, port, transaction.request.token)
+            key_token = (transaction.request.source, transaction.request.token)
             logger.info("Remove Subscriber")
-            try:
-                del self._relations[key_token]
-            except KeyError:
-                pass
+            self._remove(key_token)
             transaction.completed = True
         return transaction
 
@@ -139,51 +306,118 @@ class ObserveLayer(object):
         :param transaction: the transaction that owns the response
         :return: the transaction unmodified
         """
-        host, port = transaction.request.source
-        key_token = utils.str_append_hash(host, port, transaction.request.token)
-        if key_token in self._relations:
+        key_token = (transaction.request.source, transaction.request.token)
+        item = self._relations.get(key_token)
+        if item is not None:
             if transaction.response.code == defines.Codes.CONTENT.number:
                 if transaction.resource is not None and transaction.resource.observable:
 
                     transaction.response.observe = transaction.resource.observe_count
-                    self._relations[key_token].allowed = True
-                    self._relations[key_token].transaction = transaction
-                    self._relations[key_token].timestamp = time.time()
+                    item.allowed = True
+                    item.transaction = transaction
+                    item.timestamp = time.time()
+                    self._index(key_token, item, transaction.resource)
+                    if item.conditions is not None:
+                        item.sent = self._clock()
+                        item.value = transaction.resource.observe_value
+                        item.pending = False
+                        self._schedule(item)
                 else:
-                    del self._relations[key_token]
+                    self._remove(key_token)
             elif transaction.response.code >= defines.Codes.ERROR_LOWER_BOUND:
-                del self._relations[key_token]
+                self._remove(key_token)
         return transaction
 
     def notify(self, resource, root=None):
         """
         Prepare notification for the resource to all interested observers.
 
+        The observers with conditional attributes are notified only of the changes that meet their gt, lt or
+        st condition, a change within pmin of their last notification is held until pmin ends.
+
         :rtype: list
         :param resource: the resource for which send a new notification
-        :param root: deprecated
+        :param root: deprecated, if given the observers of the resources whose path is a prefix of the path
+            of the resource are notified too
         :return: the list of transactions to be notified
         """
         ret = []
         if root is not None:
-            resource_list = root.with_prefix_resource(resource.path)
+            items = []
+            path = resource.path
+            for end in range(1, len(path) + 1):
+                observed = self._by_path.get(path[:end])
+                if observed is not None:
+                    items.extend(self._by_resource[observed].values())
         else:
-            resource_list = [resource]
-        for key in list(self._relations.keys()):
-            if self._relations[key].transaction.resource in resource_list:
-                if self._relations[key].non_counter > defines.MAX_NON_NOTIFICATIONS \
-                        or self._relations[key].transaction.request.type == defines.Types["CON"]:
-                    self._relations[key].transaction.response.type = defines.Types["CON"]
-                    self._relations[key].non_counter = 0
-                elif self._relations[key].transaction.request.type == defines.Types["NON"]:
-                    self._relations[key].non_counter += 1
-                    self._relations[key].transaction.response.type = defines.Types["NON"]
-                self._relations[key].transaction.resource = resource
-                del self._relations[key].transaction.response.mid
-                del self._relations[key].transaction.response.token
-                ret.append(self._relations[key].transaction)
+            bucket = self._by_resource.get(resource)
+            if bucket is None:
+                return ret
+            items = list(bucket.values())
+        now = value = None
+        for item in items:
+            conditions = item.conditions
+            if conditions is None or resource.deleted:
+                ret.append(self._prepare(item, resource))
+                continue
+            if now is None:
+                now = self._clock()
+                value = resource.observe_value
+            if item.pending:
+                self.coalesced_total += 1
+            elif not conditions.met(item.value, value):
+                self.dropped_total += 1
+            elif conditions.pmin is not None and now < item.sent + conditions.pmin:
+                self.coalesced_total += 1
+                item.pending = True
+                self._schedule(item)
+            else:
+                ret.append(self._emit(item, resource, now, value))
+        return ret
+
+    def expire(self):
+        """
+        Prepare the notifications of the relations whose held change reached the end of pmin or that were not
+        notified for pmax.
+
+        :rtype: list
+        :return: the list of transactions to be notified
+        """
+        ret = []
+        now = self._clock()
+        refreshed = set()
+        head = self._timers.peek()
+        while head is not None and head.deadline <= now:
+            self._timers.pop()
+            resource = head.resource
+            if not head.pending and resource not in refreshed:
+                # a notification without change still needs a fresh sequence number
+                resource.observe_count += 1
+                refreshed.add(resource)
+            ret.append(self._emit(head, resource, now, resource.observe_value))
+            head = self._timers.peek()
         return ret
 
+    def _emit(self, item, resource, now, value):
+        item.sent = now
+        item.value = value
+        item.pending = False
+        self._schedule(item)
+        return self._prepare(item, resource)
+
+    @staticmethod
+    def _prepare(item, resource):
+        transaction = item.transaction
+        if item.non_counter > defines.MAX_NON_NOTIFICATIONS \
+                or transaction.request.type == defines.Types["CON"]:
+            transaction.response.type = defines.Types["CON"]
+            item.non_counter = 0
+        elif transaction.request.type == defines.Types["NON"]:
+            item.non_counter += 1
+            transaction.response.type = defines.Types["NON"]
+        transaction.resource = resource
+        return transaction
+
     def remove_subscriber(self, message):
         """
         Remove a subscriber based on token.
@@ -191,11 +425,10 @@ class ObserveLayer(object):
         :param message: the message
         """
         logger.info("Remove Subcriber")
-        host, port = message.destination
-        key_token = utils.str_append_hash(host, port, message.token)
-        try:
-            self._relations[key_token].transaction.completed = True
-            del self._relations[key_token]
-        except KeyError:
+        key_token = (message.destination, message.token)
+        item = self._remove(key_token)
+        if item is None:
             logger.warning("No Subscriber")
+        elif item.transaction is not None:
+            item.transaction.completed = True
 
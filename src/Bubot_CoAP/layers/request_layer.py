@@ -1,4 +1,5 @@
 from ..messages.response import Response
+from ..streaming import BlockStream
 from .. import defines
 
 __author__ = 'Giacomo Tanganelli'
@@ -10,6 +11,12 @@ class RequestLayer(object):
     """
     def __init__(self, server):
         self._server = server
+        self._handlers = {
+            defines.Codes.GET.number: self._handle_get,
+            defines.Codes.POST.number: self._handle_post,
+            defines.Codes.PUT.number: self._handle_put,
+            defines.Codes.DELETE.number: self._handle_delete,
+        }
 
     async def receive_request(self, transaction):
         """
@@ -20,18 +27,11 @@ class RequestLayer(object):
         :rtype : Transaction
         :return: the edited transaction with the response to the request
         """
-        method = transaction.request.code
-        if method == defines.Codes.GET.number:
-            transaction = await self._handle_get(transaction)
-        elif method == defines.Codes.POST.number:
-            transaction = await self._handle_post(transaction)
-        elif method == defines.Codes.PUT.number:
-            transaction = await self._handle_put(transaction)
-        elif method == defines.Codes.DELETE.number:
-            transaction = await self._handle_delete(transaction)
-        else:
+        handler = self._handlers.get(transaction.request.code)
+        if handler is None:
             transaction.response = None
-        return transaction
+            return transaction
+        return await handler(transaction)
 
     def send_request(self, request):
         """
@@ -90,6 +90,7 @@ class RequestLayer(object):
             transaction.response.code = defines.Codes.NOT_FOUND.number
         else:
             transaction.resource = resource
+            self._stream_payload(transaction.request, resource)
             # Update request
             transaction = await self._server.resource_layer.update_resource(transaction)
         return transaction
@@ -106,11 +107,26 @@ class RequestLayer(object):
         path = str("/" + transaction.request.uri_path)
         transaction.response = Response.init_from_request(transaction.request)
         transaction.response.source = transaction.request.destination
+        try:
+            self._stream_payload(transaction.request, self._server.root[path])
+        except KeyError:
+            pass
 
         # Create request
         transaction = await self._server.resource_layer.create_resource(path, transaction)
         return transaction
 
+    @staticmethod
+    def _stream_payload(request, resource):
+        """
+        Hand a body received whole to a streaming resource as a BlockStream, as the bodies uploaded block-wise.
+
+        :param request: the request
+        :param resource: the resource rendering the request
+        """
+        if resource.streaming and not isinstance(request.payload, BlockStream):
+            request.payload = BlockStream.of(request.payload)
+
     async def _handle_delete(self, transaction):
         """
         Handle DELETE requests
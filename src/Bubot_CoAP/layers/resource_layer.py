@@ -8,6 +8,10 @@ __author__ = 'Giacomo Tanganelli'
 class ResourceLayer(object):
     """
     Handles the Resources.
+
+    The handler of the method of a request is looked up in the method table of the class of the resource, resolved
+    when the class was defined with its calling convention, and called directly. A GET request carrying the
+    current ETag of the resource is answered 2.03 Valid before its handler is called.
     """
     def __init__(self, parent):
         """
@@ -18,6 +22,70 @@ class ResourceLayer(object):
         """
         self._parent = parent
 
+    @staticmethod
+    def _not_allowed(transaction):
+        transaction.response.code = defines.Codes.METHOD_NOT_ALLOWED.number
+        return transaction
+
+    @staticmethod
+    def _validate(transaction, etags):
+        """
+        Answer 2.03 Valid to a GET request carrying the current ETag of the resource, without rendering it.
+
+        Observe registrations and the blocks after the first one are always rendered.
+
+        :param transaction: the transaction
+        :param etags: the ETags of the request
+        :return: True if the request was answered
+        """
+        request = transaction.request
+        if request.observe is not None:
+            return False
+        block2 = request.block2
+        if block2 is not None and block2[0] > 0:
+            return False
+        resource = transaction.resource
+        etag = resource.current_etag(request)
+        if etag is None or etag not in etags:
+            return False
+        response = transaction.response
+        response.code = defines.Codes.VALID.number
+        response.etag = etag
+        if resource.max_age is not None:
+            response.max_age = resource.max_age
+        return True
+
+    async def _separate(self, transaction, handler, ret, kind=Resource):
+        """
+        Wait for the separate response of a handler.
+
+        :param transaction: the transaction
+        :param handler: the handler
+        :param ret: what the handler returned
+        :param kind: the type of the result of a basic handler, bool for DELETE
+        :return: the result, (resource, response) for an advanced handler, None if the request failed and the
+            response code is set
+        """
+        if handler.advanced:
+            if not isinstance(ret, tuple) or len(ret) != 3:
+                self._not_allowed(transaction)
+                return None
+            # Advanced handler separate
+            ret = await self._handle_separate_advanced(transaction, ret[2])
+            if not isinstance(ret, tuple) or len(ret) != 2 or not isinstance(ret[1], Response):  # pragma: no cover
+                transaction.response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
+                return None
+            return ret
+        if len(ret) != 2:  # pragma: no cover
+            transaction.response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
+            return None
+        # Basic handler separate
+        ret = await self._handle_separate(transaction, ret[1])
+        if not isinstance(ret, kind):  # pragma: no cover
+            transaction.response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
+            return None
+        return ret
+
     async def edit_resource(self, transaction, path):
         """
         Render a POST on an already created resource.
@@ -35,85 +103,62 @@ class ResourceLayer(object):
                 transaction.response.code = defines.Codes.PRECONDITION_FAILED.number
                 return transaction
 
-        method = getattr(resource_node, "render_POST", None)
-
+        handler = resource_node.methods.get(transaction.request.code)
+        if handler is None:
+            return self._not_allowed(transaction)
         try:
-            ret = await method(request=transaction.request, response=transaction.response)
-            if isinstance(ret, tuple) and len(ret) == 2 and isinstance(ret[1], Response) \
-                    and isinstance(ret[0], Resource):
-                # Advanced handler
-                resource, response = ret
-                resource.changed = True
-                resource.observe_count += 1
-                transaction.resource = resource
-                transaction.response = response
-                if transaction.response.code is None:
-                    transaction.response.code = defines.Codes.CREATED.number
-                return transaction
-            elif isinstance(ret, tuple) and len(ret) == 3 and isinstance(ret[1], Response) \
-                    and isinstance(ret[0], Resource):
-                # Advanced handler separate
-                resource, response, callback = ret
-                ret = await self._handle_separate_advanced(transaction, callback)
-                if not isinstance(ret, tuple) or \
-                        not (isinstance(ret[0], Resource) and isinstance(ret[1], Response)):  # pragma: no cover
-                    transaction.response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
-                    return transaction
-                resource, response = ret
-                resource.changed = True
-                resource.observe_count += 1
-                transaction.resource = resource
-                transaction.response = response
-                if transaction.response.code is None:
-                    transaction.response.code = defines.Codes.CREATED.number
-                return transaction
+            if handler.advanced:
+                ret = await handler.call(resource_node, transaction.request, transaction.response)
             else:
-                raise NotImplementedError
+                ret = await handler.call(resource_node, transaction.request)
         except NotImplementedError:
-            transaction.response.code = defines.Codes.METHOD_NOT_ALLOWED.number
+            return self._not_allowed(transaction)
+        if handler.advanced:
+            if type(ret) is not tuple or len(ret) != 2:
+                ret = await self._separate(transaction, handler, ret)
+                if ret is None:
+                    return transaction
+            resource, response = ret
+            resource.changed = True
+            resource.observe_count += 1
+            transaction.resource = resource
+            transaction.response = response
+            if transaction.response.code is None:
+                transaction.response.code = defines.Codes.CREATED.number
             return transaction
 
-        # if isinstance(resource, Resource):
-        #     pass
-        # elif isinstance(resource, tuple) and len(resource) == 2:
-        #     resource, callback = resource
-        #     resource = await self._handle_separate(transaction, callback)
-        #     if not isinstance(resource, Resource):  # pragma: no cover
-        #         transaction.response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
-        #         return transaction
-        # else:  # pragma: no cover
-        #     # Handle error
-        #     transaction.response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
-        #     return transaction
-        #
-        # if resource.path is None:
-        #     resource.path = path
-        # resource.observe_count = resource_node.observe_count
-        #
-        # if resource is resource_node:
-        #     transaction.response.code = defines.Codes.CHANGED.number
-        # else:
-        #     transaction.response.code = defines.Codes.CREATED.number
-        # resource.changed = True
-        # resource.observe_count += 1
-        # transaction.resource = resource
-        #
-        # assert(isinstance(resource, Resource))
-        # if resource.etag is not None:
-        #     transaction.response.etag = resource.etag
-        #
-        # if transaction.response.code == defines.Codes.CREATED.number:
-        #     # Only on CREATED according to RFC 7252 Chapter 5.8.2 POST
-        #     transaction.response.location_path = resource.path
-        #
-        #     if resource.location_query is not None and len(resource.location_query) > 0:
-        #         transaction.response.location_query = resource.location_query
-        #
-        # transaction.response.payload = None
-        #
-        # self._parent.root[resource.path] = resource
-        #
-        # return transaction
+        if type(ret) is tuple:
+            ret = await self._separate(transaction, handler, ret)
+            if ret is None:
+                return transaction
+        resource = ret
+        if resource.path is None:
+            resource.path = path
+        resource.observe_count = resource_node.observe_count
+
+        if resource is resource_node:
+            transaction.response.code = defines.Codes.CHANGED.number
+        else:
+            transaction.response.code = defines.Codes.CREATED.number
+        resource.changed = True
+        resource.observe_count += 1
+        transaction.resource = resource
+
+        if resource.etag is not None:
+            transaction.response.etag = resource.etag
+
+        if transaction.response.code == defines.Codes.CREATED.number:
+            # Only on CREATED according to RFC 7252 Chapter 5.8.2 POST
+            transaction.response.location_path = resource.path
+
+            if resource.location_query is not None and len(resource.location_query) > 0:
+                transaction.response.location_query = resource.location_query
+
+        transaction.response.payload = None
+
+        self._parent.root[resource.path] = resource
+
+        return transaction
 
     async def add_resource(self, transaction, parent_resource, lp):
         """
@@ -124,83 +169,58 @@ class ResourceLayer(object):
         :param lp: the location_path attribute of the resource
         :return: the response
         """
-        method = getattr(parent_resource, "render_POST", None)
+        handler = parent_resource.methods.get(transaction.request.code)
+        if handler is None:
+            return self._not_allowed(transaction)
         try:
-            ret = method(request=transaction.request, response=transaction.response)
-            if isinstance(ret, tuple) and len(ret) == 2 and isinstance(ret[1], Response) \
-                    and isinstance(ret[0], Resource):
-                # Advanced handler
-                resource, response = ret
-                resource.path = lp
-                resource.changed = True
-                self._parent.root[resource.path] = resource
-                transaction.resource = resource
-                transaction.response = response
-                if transaction.response.code is None:
-                    transaction.response.code = defines.Codes.CREATED.number
-                return transaction
-            elif isinstance(ret, tuple) and len(ret) == 3 and isinstance(ret[1], Response) \
-                    and isinstance(ret[0], Resource):
-                # Advanced handler separate
-                resource, response, callback = ret
-                ret = await self._handle_separate_advanced(transaction, callback)
-                if not isinstance(ret, tuple) or \
-                        not (isinstance(ret[0], Resource) and isinstance(ret[1], Response)):  # pragma: no cover
-                    transaction.response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
-                    return transaction
-                resource, response = ret
-                resource.path = lp
-                resource.changed = True
-                self._parent.root[resource.path] = resource
-                transaction.resource = resource
-                transaction.response = response
-                if transaction.response.code is None:
-                    transaction.response.code = defines.Codes.CREATED.number
-                return transaction
+            if handler.advanced:
+                ret = await handler.call(parent_resource, transaction.request, transaction.response)
             else:
-                raise NotImplementedError
+                ret = await handler.call(parent_resource, transaction.request)
         except NotImplementedError:
-            transaction.response.code = defines.Codes.METHOD_NOT_ALLOWED.number
+            return self._not_allowed(transaction)
+        if handler.advanced:
+            if type(ret) is not tuple or len(ret) != 2:
+                ret = await self._separate(transaction, handler, ret)
+                if ret is None:
+                    return transaction
+            resource, response = ret
+            resource.path = lp
+            resource.changed = True
+            self._parent.root[resource.path] = resource
+            transaction.resource = resource
+            transaction.response = response
+            if transaction.response.code is None:
+                transaction.response.code = defines.Codes.CREATED.number
             return transaction
-        # if isinstance(resource, Resource):
-        #     pass
-        # elif isinstance(resource, tuple) and len(resource) == 2:
-        #     resource, callback = resource
-        #     resource = await self._handle_separate(transaction, callback)
-        #     if not isinstance(resource, Resource):  # pragma: no cover
-        #         transaction.response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
-        #         return transaction
-        # else:  # pragma: no cover
-        #     # Handle error
-        #     transaction.response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
-        #     return transaction
-        #
-        # resource.path = lp
-        #
-        # if resource.etag is not None:
-        #     transaction.response.etag = resource.etag
-        #
-        # transaction.response.location_path = resource.path
-        #
-        # if resource.location_query is not None and len(resource.location_query) > 0:
-        #     transaction.response.location_query = resource.location_query
-        #
-        # transaction.response.code = defines.Codes.CREATED.number
-        # transaction.response.payload = None
-        #
-        # assert (isinstance(resource, Resource))
-        # if resource.etag is not None:
-        #     transaction.response.etag = resource.etag
-        # if resource.max_age is not None:
-        #     transaction.response.max_age = resource.max_age
-        #
-        # resource.changed = True
-        #
-        # transaction.resource = resource
-        #
-        # self._parent.root[resource.path] = resource
-        #
-        # return transaction
+
+        if type(ret) is tuple:
+            ret = await self._separate(transaction, handler, ret)
+            if ret is None:
+                return transaction
+        resource = ret
+        resource.path = lp
+
+        transaction.response.location_path = resource.path
+
+        if resource.location_query is not None and len(resource.location_query) > 0:
+            transaction.response.location_query = resource.location_query
+
+        transaction.response.code = defines.Codes.CREATED.number
+        transaction.response.payload = None
+
+        if resource.etag is not None:
+            transaction.response.etag = resource.etag
+        if resource.max_age is not None:
+            transaction.response.max_age = resource.max_age
+
+        resource.changed = True
+
+        transaction.resource = resource
+
+        self._parent.root[resource.path] = resource
+
+        return transaction
 
     async def create_resource(self, path, transaction):
         """
@@ -210,19 +230,12 @@ class ResourceLayer(object):
         :param transaction: the transaction
         :return: the response
         """
-        t = self._parent.root.with_prefix(path)
-        max_len = 0
-        imax = None
-        for i in t:
-            if i == path:
-                # Resource already present
-                return await self.edit_resource(transaction, path)
-            elif len(i) > max_len:
-                imax = i
-                max_len = len(i)
+        prefix, parent_resource = self._parent.root.longest_prefix(path)
+        if prefix == path:
+            # Resource already present
+            return await self.edit_resource(transaction, path)
 
         lp = path
-        parent_resource = self._parent.root[imax]
         if parent_resource.allow_children:
             return await self.add_resource(transaction, parent_resource, lp)
         else:
@@ -247,69 +260,40 @@ class ResourceLayer(object):
             transaction.response.code = defines.Codes.PRECONDITION_FAILED.number
             return transaction
 
-        method = getattr(transaction.resource, "render_PUT", None)
-
+        handler = transaction.resource.methods.get(transaction.request.code)
+        if handler is None:
+            return self._not_allowed(transaction)
         try:
-            resource = await method(request=transaction.request)
+            if handler.advanced:
+                ret = await handler.call(transaction.resource, transaction.request, transaction.response)
+            else:
+                ret = await handler.call(transaction.resource, transaction.request)
         except NotImplementedError:
-            try:
-                method = getattr(transaction.resource, "render_PUT_advanced", None)
-                ret = await method(request=transaction.request, response=transaction.response)
-                if isinstance(ret, tuple) and len(ret) == 2 and isinstance(ret[1], Response) \
-                        and isinstance(ret[0], Resource):
-                    # Advanced handler
-                    resource, response = ret
-                    resource.changed = True
-                    resource.observe_count += 1
-                    transaction.resource = resource
-                    transaction.response = response
-                    if transaction.response.code is None:
-                        transaction.response.code = defines.Codes.CHANGED.number
-                    return transaction
-                elif isinstance(ret, tuple) and len(ret) == 3 and isinstance(ret[1], Response) \
-                        and isinstance(ret[0], Resource):
-                    # Advanced handler separate
-                    resource, response, callback = ret
-                    ret = await self._handle_separate_advanced(transaction, callback)
-                    if not isinstance(ret, tuple) or \
-                            not (isinstance(ret[0], Resource) and isinstance(ret[1], Response)):  # pragma: no cover
-                        transaction.response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
-                        return transaction
-                    resource, response = ret
-                    resource.changed = True
-                    resource.observe_count += 1
-                    transaction.resource = resource
-                    transaction.response = response
-                    if transaction.response.code is None:
-                        transaction.response.code = defines.Codes.CHANGED.number
+            return self._not_allowed(transaction)
+        if handler.advanced:
+            if type(ret) is not tuple or len(ret) != 2:
+                ret = await self._separate(transaction, handler, ret)
+                if ret is None:
                     return transaction
-                else:
-                    raise NotImplementedError
-            except NotImplementedError:
-                transaction.response.code = defines.Codes.METHOD_NOT_ALLOWED.number
-                return transaction
-
-        if isinstance(resource, Resource):
-            pass
-        elif isinstance(resource, tuple) and len(resource) == 2:
-            resource, callback = resource
-            resource = await self._handle_separate(transaction, callback)
-            if not isinstance(resource, Resource):  # pragma: no cover
-                transaction.response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
-                return transaction
-        else:  # pragma: no cover
-            # Handle error
-            transaction.response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
+            resource, response = ret
+            resource.changed = True
+            resource.observe_count += 1
+            transaction.resource = resource
+            transaction.response = response
+            if transaction.response.code is None:
+                transaction.response.code = defines.Codes.CHANGED.number
             return transaction
 
-        if resource.etag is not None:
-            transaction.response.etag = resource.etag
+        if type(ret) is tuple:
+            ret = await self._separate(transaction, handler, ret)
+            if ret is None:
+                return transaction
+        resource = ret
 
         transaction.response.code = defines.Codes.CHANGED.number
 
         transaction.response.payload = None
 
-        assert (isinstance(resource, Resource))
         if resource.etag is not None:
             transaction.response.etag = resource.etag
         if resource.max_age is not None:
@@ -324,7 +308,7 @@ class ResourceLayer(object):
     async def _handle_separate(self, transaction, callback):
         # Handle separate
         if not transaction.request.acknowledged:
-            await self._parent.send_ack(transaction)
+            await self._parent.send_ack(transaction, locked=True)
             transaction.request.acknowledged = True
         resource = await callback(request=transaction.request)
         return resource
@@ -332,7 +316,7 @@ class ResourceLayer(object):
     async def _handle_separate_advanced(self, transaction, callback):
         # Handle separate
         if not transaction.request.acknowledged:
-            await self._parent.send_ack(transaction)
+            await self._parent.send_ack(transaction, locked=True)
             transaction.request.acknowledged = True
         return await callback(request=transaction.request, response=transaction.response)
 
@@ -344,56 +328,33 @@ class ResourceLayer(object):
         :param path: the path
         :return: the response
         """
-
-        resource = transaction.resource
-        method = getattr(transaction.resource, "render_DELETE", None)
-
+        handler = transaction.resource.methods.get(transaction.request.code)
+        if handler is None:
+            return self._not_allowed(transaction)
         try:
-            ret = await method(request=transaction.request, response=transaction.response)
-            if isinstance(ret, tuple) and len(ret) == 2 and isinstance(ret[1], Response) \
-                    and isinstance(ret[0], bool):
-                # Advanced handler
-                delete, response = ret
-                if delete:
-                    del self._parent.root[path]
-                transaction.response = response
-                if transaction.response.code is None:
-                    transaction.response.code = defines.Codes.DELETED.number
-                return transaction
-            elif isinstance(ret, tuple) and len(ret) == 3 and isinstance(ret[1], Response) \
-                    and isinstance(ret[0], Resource):
-                # Advanced handler separate
-                resource, response, callback = ret
-                ret = await self._handle_separate_advanced(transaction, callback)
-                if not isinstance(ret, tuple) or \
-                        not (isinstance(ret[0], bool) and isinstance(ret[1], Response)):  # pragma: no cover
-                    transaction.response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
-                    return transaction
-                delete, response = ret
-                if delete:
-                    del self._parent.root[path]
-                transaction.response = response
-                if transaction.response.code is None:
-                    transaction.response.code = defines.Codes.DELETED.number
-                return transaction
+            if handler.advanced:
+                ret = await handler.call(transaction.resource, transaction.request, transaction.response)
             else:
-                raise NotImplementedError
+                ret = await handler.call(transaction.resource, transaction.request)
         except NotImplementedError:
-            transaction.response.code = defines.Codes.METHOD_NOT_ALLOWED.number
+            return self._not_allowed(transaction)
+        if handler.advanced:
+            if type(ret) is not tuple or len(ret) != 2:
+                ret = await self._separate(transaction, handler, ret)
+                if ret is None:
+                    return transaction
+            delete, response = ret
+            if delete:
+                del self._parent.root[path]
+            transaction.response = response
+            if transaction.response.code is None:
+                transaction.response.code = defines.Codes.DELETED.number
             return transaction
 
-        if isinstance(ret, bool):
-            pass
-        elif isinstance(ret, tuple) and len(ret) == 2:
-            resource, callback = ret
-            ret = await self._handle_separate(transaction, callback)
-            if not isinstance(ret, bool):  # pragma: no cover
-                transaction.response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
+        if type(ret) is tuple:
+            ret = await self._separate(transaction, handler, ret, bool)
+            if ret is None:
                 return transaction
-        else:  # pragma: no cover
-            # Handle error
-            transaction.response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
-            return transaction
         if ret:
             del self._parent.root[path]
             transaction.response.code = defines.Codes.DELETED.number
@@ -411,81 +372,59 @@ class ResourceLayer(object):
         :param transaction: the transaction
         :return: the transaction
         """
-        method = getattr(transaction.resource, "render_GET", None)
+        handler = transaction.resource.methods.get(transaction.request.code)
+        if handler is None:
+            return self._not_allowed(transaction)
+        etags = transaction.request.etag
+        if etags and self._validate(transaction, etags):
+            return transaction
         try:
-            ret = await method(request=transaction.request, response=transaction.response)
-            if isinstance(ret, tuple) and len(ret) == 2 and isinstance(ret[0], Resource) \
-                    and (isinstance(ret[1], Response) or ret[1] is None):
-                # Advanced handler
-                resource, response = ret
-                transaction.resource = resource
-                transaction.response = response
-                if transaction.response and transaction.response.code is None:
-                    transaction.response.code = defines.Codes.CONTENT.number
-                return transaction
-            elif isinstance(ret, tuple) and len(ret) == 3 and isinstance(ret[1], Response) \
-                    and isinstance(ret[0], Resource):
-                # Advanced handler separate
-                resource, response, callback = ret
-                ret = await self._handle_separate_advanced(transaction, callback)
-                if not isinstance(ret, tuple) or \
-                        not (isinstance(ret[0], Resource) and isinstance(ret[1], Response)):  # pragma: no cover
-                    transaction.response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
+            if handler.advanced:
+                ret = await handler.call(transaction.resource, transaction.request, transaction.response)
+            else:
+                ret = await handler.call(transaction.resource, transaction.request)
+        except NotImplementedError:
+            return self._not_allowed(transaction)
+        if handler.advanced:
+            if type(ret) is not tuple or len(ret) != 2:
+                ret = await self._separate(transaction, handler, ret)
+                if ret is None:
                     return transaction
-                resource, response = ret
-                transaction.resource = resource
-                transaction.response = response
-                if transaction.response.code is None:
-                    transaction.response.code = defines.Codes.CONTENT.number
+            transaction.resource, transaction.response = ret
+            if transaction.response and transaction.response.code is None:
+                transaction.response.code = defines.Codes.CONTENT.number
+            return transaction
+
+        if type(ret) is tuple:
+            ret = await self._separate(transaction, handler, ret)
+            if ret is None:
                 return transaction
+        resource = ret
+        transaction.response.code = defines.Codes.CONTENT.number
+
+        try:
+            if resource.actual_content_type is not None \
+                    and resource.actual_content_type != defines.Content_types["text/plain"]:
+                transaction.response.content_type = resource.actual_content_type
+            payload = resource.payload
+            if type(payload) is tuple:
+                transaction.response.content_type, payload = payload
+            if payload is None or isinstance(payload, (bytes, bytearray, memoryview)):
+                transaction.response.payload = payload
             else:
-                raise NotImplementedError
-        except NotImplementedError:
-            transaction.response.code = defines.Codes.METHOD_NOT_ALLOWED.number
+                transaction.response.encode_payload(payload)
+        except KeyError:
+            transaction.response.code = defines.Codes.NOT_ACCEPTABLE.number
             return transaction
 
-        # if isinstance(resource, Resource):
-        #     pass
-        # elif isinstance(resource, tuple) and len(resource) == 2:
-        #     resource, callback = resource
-        #     resource = await self._handle_separate(transaction, callback)
-        #     if not isinstance(resource, Resource):  # pragma: no cover
-        #         transaction.response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
-        #         return transaction
-        # else:  # pragma: no cover
-        #     # Handle error
-        #     transaction.response.code = defines.Codes.INTERNAL_SERVER_ERROR.number
-        #     return transaction.response
-        #
-        # if resource.etag in transaction.request.etag:
-        #     transaction.response.code = defines.Codes.VALID.number
-        # else:
-        #     transaction.response.code = defines.Codes.CONTENT.number
-        #
-        # try:
-        #     if resource.actual_content_type is not None \
-        #             and resource.actual_content_type != defines.Content_types["text/plain"]:
-        #         transaction.response.content_type = resource.actual_content_type
-        #     if isinstance(resource.payload, bytes):
-        #         transaction.response.payload = resource.payload
-        #     else:
-        #         transaction.response.encode_payload(resource.payload)
-        #     # if resource.actual_content_type is not None \
-        #     #         and resource.actual_content_type != defines.Content_types["text/plain"]:
-        #     #     transaction.response.content_type = resource.actual_content_type
-        # except KeyError:
-        #     transaction.response.code = defines.Codes.NOT_ACCEPTABLE.number
-        #     return transaction.response
-        #
-        # assert(isinstance(resource, Resource))
-        # if resource.etag is not None:
-        #     transaction.response.etag = resource.etag
-        # if resource.max_age is not None:
-        #     transaction.response.max_age = resource.max_age
-        #
-        # transaction.resource = resource
-        #
-        # return transaction
+        if resource.etag is not None:
+            transaction.response.etag = resource.etag
+        if resource.max_age is not None:
+            transaction.response.max_age = resource.max_age
+
+        transaction.resource = resource
+
+        return transaction
 
     async def discover(self, transaction):
         """
@@ -494,20 +433,7 @@ class ResourceLayer(object):
         :param transaction: the transaction
         :return: the transaction
         """
-        transaction.response.code = defines.Codes.CONTENT.number
-        payload = ""
-        for i in self._parent.root.dump():
-            if i == "/":
-                continue
-            resource = self._parent.root[i]
-            if resource.visible:
-                ret = self.valid(transaction.request.uri_query, resource.attributes)
-                if ret:
-                    payload += self.corelinkformat(resource)
-
-        transaction.response.payload = payload
-        transaction.response.content_type = defines.Content_types["application/link-format"]
-        return transaction
+        return self._parent.discovery.discover(transaction)
 
     @staticmethod
     def valid(query, attributes):
@@ -535,16 +461,17 @@ class ResourceLayer(object):
 
         :return: the string
         """
-        msg = "<" + resource.path + ">;"
         assert(isinstance(resource, Resource))
-        keys = sorted(list(resource.attributes.keys()))
-        for k in keys:
-            method = getattr(resource, defines.corelinkformat[k], None)
+        attributes = resource.attributes
+        msg = ["<", resource.path, ">"]
+        for k in sorted(attributes):
+            name = defines.corelinkformat.get(k)
+            method = getattr(resource, name, None) if name is not None else None
             if method is not None and method != "":
-                v = method
-                msg = msg[:-1] + ";" + str(v) + ","
+                msg += (";", str(method))
             else:
-                v = resource.attributes[k]
+                v = attributes[k]
                 if v is not None:
-                    msg = msg[:-1] + ";" + k + "=" + v + ","
-        return msg
+                    msg += (";", k, "=", str(v))
+        msg.append("," if len(msg) > 3 else ";")
+        return "".join(msg)
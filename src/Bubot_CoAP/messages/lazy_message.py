@@ -0,0 +1,179 @@
+import logging
+
+from .. import defines
+from ..messages.message import Message
+from ..messages.option import Option
+from ..messages.option_list import OptionList
+from ..messages.request import Request
+from ..messages.response import Response
+
+__author__ = 'Mikhail Razgovorov'
+
+logger = logging.getLogger(__name__)
+
+
+class LazyOptions(object):
+    """
+    Mixin for messages whose options and payload are decoded on first access.
+
+    The serializer parses only the fixed header and the token; the rest of the datagram is kept as a
+    memoryview and decoded the first time the options or the payload are read (uri_path, observe,
+    block2, ...). Matching duplicates and ACK/RST messages therefore never builds Option objects.
+
+    The concrete classes declare the '_raw', '_lazy_options', '_lazy_payload' and '_decode_error' slots. The error
+    code of malformed options is kept, every call of decode reports it, whatever accessed the options first.
+    """
+    __slots__ = ()
+
+    def __init__(self, raw=None):
+        """
+        Initialize a lazily decoded message.
+
+        :type raw: memoryview
+        :param raw: the part of the datagram following the token (options and payload)
+        """
+        self._raw = None
+        self._decode_error = None
+        super(LazyOptions, self).__init__()
+        self._raw = raw if raw else None
+
+    @property
+    def decoded(self):
+        """
+        Check if the options and the payload have been decoded.
+
+        :return: True, if decoded
+        """
+        return self._raw is None
+
+    @property
+    def _options(self):
+        if self._raw is not None:
+            self.decode()
+        return self._lazy_options
+
+    @_options.setter
+    def _options(self, value):
+        if self._raw is not None:
+            self.decode()
+        self._lazy_options = value
+
+    @property
+    def _payload(self):
+        if self._raw is not None:
+            self.decode()
+        return self._lazy_payload
+
+    @_payload.setter
+    def _payload(self, value):
+        if self._raw is not None:
+            self.decode()
+        self._lazy_payload = value
+
+    def decode(self):
+        """
+        Decode the options and the payload kept in the datagram.
+
+        :return: None, or the error code if the options are malformed
+        """
+        raw = self._raw
+        if raw is None:
+            return self._decode_error
+        self._raw = None
+        try:
+            self._lazy_payload = self._decode_options(raw)
+        except (AttributeError, IndexError, TypeError, UnicodeDecodeError) as err:
+            logger.debug("malformed options: %s", err)
+            self._lazy_options = OptionList()
+            self._lazy_payload = None
+            self._decode_error = defines.Codes.BAD_REQUEST.number
+            return self._decode_error
+        return None
+
+    def _decode_options(self, raw):
+        """
+        Decode the options into the message.
+
+        :type raw: memoryview
+        :param raw: options and payload
+        :return: the payload
+        """
+        length_packet = len(raw)
+        pos = 0
+        current_option = 0
+        while pos < length_packet:
+            next_byte = raw[pos]
+            pos += 1
+            if next_byte == defines.PAYLOAD_MARKER:
+                if length_packet <= pos:
+                    raise AttributeError("Packet length %s, pos %s" % (length_packet, pos))
+                return bytes(raw[pos:])
+
+            delta = next_byte >> 4
+            option_length = next_byte & 0x0F
+            if delta == 13:
+                delta = raw[pos] + 13
+                pos += 1
+            elif delta == 14:
+                delta = ((raw[pos] << 8) | raw[pos + 1]) + 269
+                pos += 2
+            elif delta == 15:
+                raise AttributeError("Unsupported option number nibble 15")
+            if option_length == 13:
+                option_length = raw[pos] + 13
+                pos += 1
+            elif option_length == 14:
+                option_length = ((raw[pos] << 8) | raw[pos + 1]) + 269
+                pos += 2
+            elif option_length == 15:
+                raise AttributeError("Unsupported option length nibble 15")
+            current_option += delta
+            end = pos + option_length
+            if end > length_packet:
+                raise AttributeError("Option %s exceeds the packet" % current_option)
+
+            option_item = defines.OptionRegistry.LIST.get(current_option)
+            if option_item is None:
+                (opt_critical, _, _) = defines.OptionRegistry.get_option_flags(current_option)
+                if opt_critical:
+                    raise AttributeError("Critical option %s unknown" % current_option)
+                # If the non-critical option is unknown
+                # (vendor-specific, proprietary) - just skip it
+                logger.warning("unrecognized option %d", current_option)
+            else:
+                if option_item.value_type == defines.INTEGER:
+                    value = int.from_bytes(raw[pos:end], "big")
+                elif option_item.value_type == defines.STRING:
+                    value = str(raw[pos:end], "utf-8")
+                else:
+                    value = bytes(raw[pos:end])
+                option = Option()
+                option.number = current_option
+                option.value = value
+                self.add_option(option)
+            pos = end
+        return None
+
+
+_LAZY_SLOTS = ('_raw', '_lazy_options', '_lazy_payload', '_decode_error')
+
+
+class LazyMessage(LazyOptions, Message):
+    """
+    Lazily decoded empty message (ACK, RST, ping).
+    """
+    __slots__ = _LAZY_SLOTS
+
+
+class LazyRequest(LazyOptions, Request):
+    """
+    Lazily decoded request.
+    """
+    __slots__ = _LAZY_SLOTS
+
+
+class LazyResponse(LazyOptions, Response):
+    """
+    Lazily decoded response.
+    """
+    __slots__ = _LAZY_SLOTS
@@ -7,6 +7,7 @@ import socket
 from .. import defines
 from .. import utils
 from ..messages.option import Option
+from ..messages.option_list import OptionList
 from ..messages.options import Options
 from ..utils import generate_random_token
 
@@ -17,6 +18,9 @@ class Message(object):
     """
     Class to handle the Messages.
     """
+    __slots__ = ('_type', '_mid', '_token', '_family', '_options', '_payload', '_destination', '_source', '_code',
+                 '_acknowledged', '_rejected', '_timeouted', '_cancelled', '_multicast', '_duplicated', '_completed',
+                 '_timestamp', '_version', '_opt', '_scheme', 'endpoint')
 
     def __init__(self):
         """
@@ -26,7 +30,7 @@ class Message(object):
         self._mid = None
         self._token = None
         self._family = None
-        self._options = []
+        self._options = OptionList()
         self._payload = None
         self._destination = None
         self._source = None
@@ -40,7 +44,7 @@ class Message(object):
         self._completed = False
         self._timestamp = None
         self._version = 1
-        self._opt = Options()
+        self._opt = None
         self._scheme = None
         self.endpoint = None
 
@@ -65,6 +69,27 @@ class Message(object):
             raise AttributeError
         self._version = v
 
+    @property
+    def opt(self):
+        """
+        Return the aiocoap-style options helper, created on first access.
+
+        :rtype: Options
+        :return: the options helper
+        """
+        if self._opt is None:
+            self._opt = Options()
+        return self._opt
+
+    @property
+    def payload_type(self):
+        """
+        Return the Content-Format of the payload.
+
+        :return: the Content-Format
+        """
+        return self.content_type
+
     @property
     def multicast(self):
         """
@@ -129,6 +154,13 @@ class Message(object):
             raise AttributeError
         self._type = value
 
+    @type.deleter
+    def type(self):
+        """
+        Unset the type of the message.
+        """
+        self._type = None
+
     @property
     def mid(self):
         """
@@ -236,9 +268,9 @@ class Message(object):
     @property
     def options(self):
         """
-        Return the options of the CoAP message.
+        Return the options of the CoAP message sorted by option number.
 
-        :rtype: list
+        :rtype: OptionList
         :return: the options
         """
         return self._options
@@ -253,8 +285,8 @@ class Message(object):
         """
         if value is None:
             value = []
-        assert isinstance(value, list)
-        self._options = value
+        assert isinstance(value, (list, OptionList))
+        self._options = OptionList(value)
 
     @property
     def payload(self):
@@ -347,7 +379,7 @@ class Message(object):
         :param value: the code
         :raise AttributeError: if value is not a valid code
         """
-        if value not in list(defines.Codes.LIST.keys()) and value is not None:
+        if value is not None and value not in defines.Codes.LIST:
             raise AttributeError
         self._code = value
 
@@ -470,10 +502,7 @@ class Message(object):
         :param option: the option to be checked
         :return: True if already present, False otherwise
         """
-        for opt in self._options:
-            if option.number == opt.number:
-                return True
-        return False
+        return self._options.has(option.number)
 
     def add_option(self, option):
         """
@@ -485,20 +514,14 @@ class Message(object):
         """
         assert isinstance(option, Option)
         repeatable = defines.OptionRegistry.LIST[option.number].repeatable
-        if not repeatable:
-            ret = self._already_in(option)
-            if ret:
-                raise TypeError("Option : %s is not repeatable", option.name)
-            else:
-                self._options.append(option)
-        else:
-            self._options.append(option)
+        if not repeatable and self._already_in(option):
+            raise TypeError("Option : %s is not repeatable", option.name)
+        self._options.append(option)
 
     def get_option(self, option: Option, *args):
-        for o in list(self._options):
-            assert isinstance(o, Option)
-            if o.name == option.name:
-                return o.value
+        options = self._options.get(option.number)
+        if options:
+            return options[0].value
         if args:
             return args[0]
         raise KeyError(option.name)
@@ -511,7 +534,7 @@ class Message(object):
         :param option: the option
         """
         assert isinstance(option, Option)
-        while option in list(self._options):
+        while option in self._options:
             self._options.remove(option)
 
     def del_option_by_name(self, name):
@@ -521,10 +544,8 @@ class Message(object):
         :type name: String
         :param name: option name
         """
-        for o in list(self._options):
-            assert isinstance(o, Option)
-            if o.name == name:
-                self._options.remove(o)
+        for number in [o.number for o in self._options if o.name == name]:
+            self._options.pop_number(number)
 
     def del_option_by_number(self, number):
         """
@@ -533,10 +554,7 @@ class Message(object):
         :type number: Integer
         :param number: option naumber
         """
-        for o in list(self._options):
-            assert isinstance(o, Option)
-            if o.number == number:
-                self._options.remove(o)
+        self._options.pop_number(number)
 
     @property
     def etag(self):
@@ -546,11 +564,7 @@ class Message(object):
         :rtype: list
         :return: the ETag values or [] if not specified by the request
         """
-        value = []
-        for option in self.options:
-            if option.number == defines.OptionRegistry.ETAG.number:
-                value.append(option.value)
-        return value
+        return self._options.values(defines.OptionRegistry.ETAG.number)
 
     @etag.setter
     def etag(self, etag):
@@ -612,14 +626,13 @@ class Message(object):
 
         :return: 0, if the request is an observing request
         """
-        for option in self.options:
-            if option.number == defines.OptionRegistry.OBSERVE.number:
-                # if option.value is None:
-                #    return 0
-                if option.value is None:
-                    return 0
-                return option.value
-        return None
+        options = self._options.get(defines.OptionRegistry.OBSERVE.number)
+        if not options:
+            return None
+        value = options[0].value
+        if value is None:
+            return 0
+        return value
 
     @observe.setter
     def observe(self, ob):
@@ -648,11 +661,10 @@ class Message(object):
 
         :return: the Block1 value
         """
-        value = None
-        for option in self.options:
-            if option.number == defines.OptionRegistry.BLOCK1.number:
-                value = utils.parse_blockwise(option.value)
-        return value
+        options = self._options.get(defines.OptionRegistry.BLOCK1.number)
+        if not options:
+            return None
+        return utils.parse_blockwise(options[-1].value)
 
     @block1.setter
     def block1(self, value):
@@ -700,11 +712,10 @@ class Message(object):
 
         :return: the Block2 value
         """
-        value = None
-        for option in self.options:
-            if option.number == defines.OptionRegistry.BLOCK2.number:
-                value = utils.parse_blockwise(option.value)
-        return value
+        options = self._options.get(defines.OptionRegistry.BLOCK2.number)
+        if not options:
+            return None
+        return utils.parse_blockwise(options[-1].value)
 
     @block2.setter
     def block2(self, value):
@@ -745,13 +756,74 @@ class Message(object):
         """
         self.del_option_by_number(defines.OptionRegistry.BLOCK2.number)
 
+    @property
+    def q_block1(self):
+        """
+        Get the Q-Block1 option.
+
+        :return: the Q-Block1 value
+        """
+        options = self._options.get(defines.OptionRegistry.Q_BLOCK1.number)
+        if not options:
+            return None
+        return utils.parse_blockwise(options[-1].value)
+
+    @q_block1.setter
+    def q_block1(self, value):
+        """
+        Set the Q-Block1 option.
+
+        :param value: the Q-Block1 value
+        """
+        self.del_option_by_number(defines.OptionRegistry.Q_BLOCK1.number)
+        self.add_option(Option(defines.OptionRegistry.Q_BLOCK1, utils.blockwise_value(*value)))
+
+    @q_block1.deleter
+    def q_block1(self):
+        """
+        Delete the Q-Block1 option.
+        """
+        self.del_option_by_number(defines.OptionRegistry.Q_BLOCK1.number)
+
+    @property
+    def q_block2(self):
+        """
+        Get the Q-Block2 options, a request asks for several blocks with one option each.
+
+        :return: the list of Q-Block2 values or None
+        """
+        options = self._options.get(defines.OptionRegistry.Q_BLOCK2.number)
+        if not options:
+            return None
+        return [utils.parse_blockwise(option.value) for option in options]
+
+    @q_block2.setter
+    def q_block2(self, value):
+        """
+        Set the Q-Block2 options.
+
+        :param value: a Q-Block2 value or a list of them
+        """
+        self.del_option_by_number(defines.OptionRegistry.Q_BLOCK2.number)
+        if isinstance(value, tuple):
+            value = [value]
+        for block in value:
+            self.add_option(Option(defines.OptionRegistry.Q_BLOCK2, utils.blockwise_value(*block)))
+
+    @q_block2.deleter
+    def q_block2(self):
+        """
+        Delete the Q-Block2 options.
+        """
+        self.del_option_by_number(defines.OptionRegistry.Q_BLOCK2.number)
+
     @property
     def size1(self):
-        value = None
-        for option in self.options:
-            if option.number == defines.OptionRegistry.SIZE1.number:
-                value = option.value if option.value is not None else 0
-        return value
+        options = self._options.get(defines.OptionRegistry.SIZE1.number)
+        if not options:
+            return None
+        value = options[-1].value
+        return value if value is not None else 0
 
     @size1.setter
     def size1(self, value):
@@ -816,7 +888,9 @@ class Message(object):
                 msg += "{name}: {value}, ".format(name=opt.name, value=opt.value)
         msg += "]"
         if self.payload is not None:
-            if block:
+            if not hasattr(self.payload, '__len__'):
+                msg += " payload streamed"
+            elif block:
                 msg += " payload block {length} bytes".format(length=len(self.payload))
             else:
                 if isinstance(self.payload, dict):
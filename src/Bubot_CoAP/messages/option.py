@@ -8,6 +8,8 @@ class Option(object):
     """
     Class to handle the CoAP Options.
     """
+    __slots__ = ('_number', '_value')
+
     def __init__(self, option=None, value=None):
         """
         Data structure to store options.
@@ -136,4 +138,6 @@ class Option(object):
         :rtype : Boolean
         :return: True, if option are equal
         """
-        return self.__dict__ == other.__dict__
+        if not isinstance(other, Option):
+            return NotImplemented
+        return self._number == other._number and self._value == other._value
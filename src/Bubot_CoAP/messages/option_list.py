@@ -0,0 +1,186 @@
+from bisect import insort
+
+__author__ = 'Mikhail Razgovorov'
+
+
+class OptionList(object):
+    """
+    Options of a message indexed by option number.
+
+    Every option number maps to the list of its options in insertion order, so repeatable options keep their
+    order (Uri-Path, Uri-Query, ETag, ...). Option numbers are kept sorted, iteration therefore yields the
+    options in the order required on the wire and the serializers do not have to sort them.
+
+    It behaves as the former list of options for iteration, len(), indexing, append(), remove(), membership
+    and equality.
+    """
+    __slots__ = ('_by_number', '_numbers')
+
+    def __init__(self, options=None):
+        """
+        Initialize the option list.
+
+        :param options: optional iterable of options
+        """
+        self._by_number = {}
+        self._numbers = []
+        if options:
+            self.extend(options)
+
+    def append(self, option):
+        """
+        Add an option after the options with the same number.
+
+        :type option: Option
+        :param option: the option
+        """
+        number = option.number
+        items = self._by_number.get(number)
+        if items is None:
+            self._by_number[number] = [option]
+            insort(self._numbers, number)
+        else:
+            items.append(option)
+
+    def extend(self, options):
+        """
+        Add options.
+
+        :param options: iterable of options
+        """
+        for option in options:
+            self.append(option)
+
+    def remove(self, option):
+        """
+        Remove the first occurrence of an option.
+
+        :type option: Option
+        :param option: the option
+        :raise ValueError: if the option is not present
+        """
+        items = self._by_number.get(option.number)
+        if items is None:
+            raise ValueError("option not in list")
+        items.remove(option)
+        if not items:
+            self._discard(option.number)
+
+    def get(self, number):
+        """
+        Return the options with the given number.
+
+        :param number: the option number
+        :rtype: list
+        :return: the options, empty if not present
+        """
+        return self._by_number.get(number, ())
+
+    def first(self, number, default=None):
+        """
+        Return the value of the first option with the given number.
+
+        :param number: the option number
+        :param default: value returned if the option is not present
+        :return: the option value
+        """
+        items = self._by_number.get(number)
+        if items is None:
+            return default
+        return items[0].value
+
+    def last(self, number, default=None):
+        """
+        Return the value of the last option with the given number.
+
+        :param number: the option number
+        :param default: value returned if the option is not present
+        :return: the option value
+        """
+        items = self._by_number.get(number)
+        if items is None:
+            return default
+        return items[-1].value
+
+    def values(self, number):
+        """
+        Return the values of the options with the given number.
+
+        :param number: the option number
+        :rtype: list
+        :return: the option values in insertion order
+        """
+        items = self._by_number.get(number)
+        if items is None:
+            return []
+        return [option.value for option in items]
+
+    def has(self, number):
+        """
+        Check if an option with the given number is present.
+
+        :param number: the option number
+        :return: True, if present
+        """
+        return number in self._by_number
+
+    def pop_number(self, number):
+        """
+        Remove all the options with the given number.
+
+        :param number: the option number
+        :rtype: list
+        :return: the removed options
+        """
+        items = self._by_number.get(number)
+        if items is None:
+            return []
+        self._discard(number)
+        return items
+
+    def clear(self):
+        """
+        Remove all the options.
+        """
+        self._by_number.clear()
+        del self._numbers[:]
+
+    def copy(self):
+        """
+        Return a shallow copy.
+
+        :rtype: OptionList
+        """
+        result = OptionList()
+        result._by_number = {number: list(items) for number, items in self._by_number.items()}
+        result._numbers = list(self._numbers)
+        return result
+
+    def _discard(self, number):
+        del self._by_number[number]
+        self._numbers.remove(number)
+
+    def __iter__(self):
+        by_number = self._by_number
+        for number in self._numbers:
+            yield from by_number[number]
+
+    def __len__(self):
+        return sum(len(items) for items in self._by_number.values())
+
+    def __bool__(self):
+        return bool(self._numbers)
+
+    def __contains__(self, option):
+        return option in self._by_number.get(option.number, ())
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    def __eq__(self, other):
+        if isinstance(other, (OptionList, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return "OptionList(%r)" % list(self)
@@ -9,6 +9,8 @@ class Request(Message):
     """
     Class to handle the Requests.
     """
+    __slots__ = ()
+
     def __init__(self):
         """
         Initialize a Request message.
@@ -24,13 +26,7 @@ class Request(Message):
         :rtype : String
         :return: the Uri-Path
         """
-        value = []
-        for option in self.options:
-            if option.number == defines.OptionRegistry.URI_PATH.number:
-                value.append(str(option.value) + '/')
-        value = "".join(value)
-        value = value[:-1]
-        return value
+        return "/".join(str(value) for value in self._options.values(defines.OptionRegistry.URI_PATH.number))
 
     @uri_path.setter
     def uri_path(self, path):
@@ -65,11 +61,7 @@ class Request(Message):
         :rtype : String
         :return: the Uri-Query string
         """
-        value = []
-        for option in self.options:
-            if option.number == defines.OptionRegistry.URI_QUERY.number:
-                value.append(str(option.value))
-        return "&".join(value)
+        return "&".join(str(value) for value in self._options.values(defines.OptionRegistry.URI_QUERY.number))
 
     @uri_query.setter
     def uri_query(self, value):
@@ -98,10 +90,7 @@ class Request(Message):
         :return: the Accept value or None if not specified by the request
         :rtype : String
         """
-        for option in self.options:
-            if option.number == defines.OptionRegistry.ACCEPT.number:
-                return option.value
-        return None
+        return self._options.first(defines.OptionRegistry.ACCEPT.number)
 
     @accept.setter
     def accept(self, value):
@@ -131,11 +120,7 @@ class Request(Message):
         :return: the If-Match values or [] if not specified by the request
         :rtype : list
         """
-        value = []
-        for option in self.options:
-            if option.number == defines.OptionRegistry.IF_MATCH.number:
-                value.append(option.value)
-        return value
+        return self._options.values(defines.OptionRegistry.IF_MATCH.number)
 
     @if_match.setter
     def if_match(self, values):
@@ -167,10 +152,7 @@ class Request(Message):
         :return: True, if if-none-match is present
         :rtype : bool
         """
-        for option in self.options:
-            if option.number == defines.OptionRegistry.IF_NONE_MATCH.number:
-                return True
-        return False
+        return self._options.has(defines.OptionRegistry.IF_NONE_MATCH.number)
 
     @if_none_match.setter
     def if_none_match(self, value):
@@ -220,10 +202,7 @@ class Request(Message):
         :return: the Proxy-Uri values or None if not specified by the request
         :rtype : String
         """
-        for option in self.options:
-            if option.number == defines.OptionRegistry.PROXY_URI.number:
-                return option.value
-        return None
+        return self._options.first(defines.OptionRegistry.PROXY_URI.number)
 
     @proxy_uri.setter
     def proxy_uri(self, value):
@@ -252,10 +231,7 @@ class Request(Message):
         :return: the Proxy-Schema values or None if not specified by the request
         :rtype : String
         """
-        for option in self.options:
-            if option.number == defines.OptionRegistry.PROXY_SCHEME.number:
-                return option.value
-        return None
+        return self._options.first(defines.OptionRegistry.PROXY_SCHEME.number)
 
     @proxy_schema.setter
     def proxy_schema(self, value):
@@ -286,12 +262,11 @@ class Request(Message):
         :return: the Uri-Query string
         """
         result = {}
-        for option in self.options:
-            if option.number == defines.OptionRegistry.URI_QUERY.number:
-                key, value = str(option.value).split('=')
-                if key not in value:
-                    result[key] = []
-                result[key].append(value)
+        for option in self._options.get(defines.OptionRegistry.URI_QUERY.number):
+            key, value = str(option.value).split('=')
+            if key not in value:
+                result[key] = []
+            result[key].append(value)
 
         return result
 
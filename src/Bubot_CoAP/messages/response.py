@@ -9,6 +9,7 @@ class Response(Message):
     """
     Class to handle the Responses.
     """
+    __slots__ = ()
 
     @property
     def location_path(self):
@@ -18,11 +19,7 @@ class Response(Message):
         :rtype : String
         :return: the Location-Path option
         """
-        value = []
-        for option in self.options:
-            if option.number == defines.OptionRegistry.LOCATION_PATH.number:
-                value.append(str(option.value))
-        return "/".join(value)
+        return "/".join(str(value) for value in self._options.values(defines.OptionRegistry.LOCATION_PATH.number))
 
     @location_path.setter
     def location_path(self, path):
@@ -60,11 +57,7 @@ class Response(Message):
         :rtype : String
         :return: the Location-Query option
         """
-        value = []
-        for option in self.options:
-            if option.number == defines.OptionRegistry.LOCATION_QUERY.number:
-                value.append(option.value)
-        return value
+        return self._options.values(defines.OptionRegistry.LOCATION_QUERY.number)
 
     @location_query.setter
     def location_query(self, value):
@@ -97,11 +90,11 @@ class Response(Message):
         :rtype : int
         :return: the MaxAge option
         """
-        value = defines.OptionRegistry.MAX_AGE.default
-        for option in self.options:
-            if option.number == defines.OptionRegistry.MAX_AGE.number:
-                value = int(option.value)
-        return value
+        options = self._options.get(defines.OptionRegistry.MAX_AGE.number)
+        if not options:
+            return defines.OptionRegistry.MAX_AGE.default
+        # a Max-Age of 0 is sent empty, it is not the default
+        return int(options[-1].value) if options[-1].length else 0
 
     @max_age.setter
     def max_age(self, value):
@@ -136,5 +129,58 @@ class Response(Message):
         self.token = request.token
         return self
 
+    @classmethod
+    def init_notification(cls, request, notification):
+        """
+        Create the notification for an observer from the one rendered for another observer of the same resource.
+        The options and the payload are shared with the rendered notification, not copied.
+
+        :type request: Request
+        :param request: the observe request of the observer
+        :type notification: Response
+        :param notification: the rendered notification
+        :rtype: Response
+        :return: the notification of the observer
+        """
+        self = cls()
+        self._destination = request.source
+        self._family = request.family
+        if request.multicast:
+            self._source = (request.destination[0], 0)
+        else:
+            self._source = request.destination
+        self._scheme = request.scheme
+        self._token = request.token
+        self._code = notification.code
+        self._options = notification.options
+        self._payload = notification.payload
+        return self
+
+    @classmethod
+    def init_cached(cls, request, code, options, payload):
+        """
+        Create the response to a request from a response kept by a cache. The payload is shared with the response
+        kept, not copied.
+
+        :type request: Request
+        :param request: the request
+        :param code: the code of the response kept
+        :type options: OptionList
+        :param options: the options of the response, owned by the new response
+        :param payload: the payload of the response kept
+        :rtype: Response
+        :return: the response
+        """
+        self = cls()
+        self._destination = request.source
+        self._family = request.family
+        self._source = request.destination
+        self._scheme = request.scheme
+        self._token = request.token
+        self._code = code
+        self._options = options
+        self._payload = payload
+        return self
+
     def is_error(self):
         return defines.Codes.is_error(self.code)
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+
+from . import defines
+
+__author__ = 'Mikhail Razgovorov'
+logger = logging.getLogger('Bubot_CoAP')
+
+
+class NotificationDispatcher:
+    """
+    Deliver the notifications of a server in the background, so that the request that changed a resource
+    does not wait for its observers.
+
+    The observers waiting for a notification are queued in submission order, at most once each: a newer
+    notification of an observer still queued supersedes the older one, which would be stale by the time it
+    is rendered. When max_pending observers are queued the oldest one is dropped. Up to concurrency tasks
+    take batches of the queue and hand them to the fan-out of the server. An observer is never in two
+    batches at once, so its notifications leave in order.
+    """
+
+    def __init__(self, server, concurrency=defines.NOTIFY_CONCURRENCY, max_pending=defines.NOTIFY_MAX_PENDING,
+                 batch_size=defines.NOTIFY_BATCH_SIZE):
+        """
+        Initialize the dispatcher.
+
+        :param server: the server that sends the notifications
+        :param concurrency: the number of batches delivered at once
+        :param max_pending: the number of observers queued before dropping the oldest
+        :param batch_size: the number of observers of a batch
+        """
+        self._server = server
+        self._pending = {}  # type: dict[Transaction, int]
+        self._active = set()
+        self._tasks = set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.delivered_total = 0
+        self.superseded_total = 0
+        self.dropped_total = 0
+
+    def submit(self, observers):
+        """
+        Queue the notifications prepared by the observe layer.
+
+        :param observers: the transactions of the observers, with the type of the notification in their response
+        """
+        pending = self._pending
+        for transaction in observers:
+            notification_type = transaction.response.type
+            previous = pending.get(transaction)
+            if previous is not None:
+                self.superseded_total += 1
+                if previous == defines.Types["CON"]:
+                    # keep the confirmable notification the observe layer asked for
+                    notification_type = previous
+            elif len(pending) >= self.max_pending:
+                oldest = next(iter(pending))
+                del pending[oldest]
+                self.dropped_total += 1
+                logger.warning("Notification queue full, drop notification of %s", oldest.request.source)
+            pending[transaction] = notification_type
+        if pending:
+            self._idle.clear()
+            while len(self._tasks) < self.concurrency and len(self._tasks) * self.batch_size < len(pending):
+                task = self._server.loop.create_task(self._work())
+                self._tasks.add(task)
+                task.add_done_callback(self._done)
+
+    def _take(self):
+        batch = []
+        active = self._active
+        for transaction in self._pending:
+            if transaction not in active:
+                batch.append(transaction)
+                if len(batch) == self.batch_size:
+                    break
+        pending = self._pending
+        for index, transaction in enumerate(batch):
+            active.add(transaction)
+            batch[index] = (transaction, pending.pop(transaction))
+        return batch
+
+    async def _work(self):
+        while True:
+            batch = self._take()
+            if not batch:
+                break
+            try:
+                await self._server.fan_out(batch)
+            except Exception as err:
+                logger.exception(err)
+            finally:
+                for transaction, _ in batch:
+                    self._active.discard(transaction)
+                self.delivered_total += len(batch)
+
+    def _done(self, task):
+        self._tasks.discard(task)
+        if not self._tasks:
+            if self._pending:
+                # left behind by a cancelled task
+                self.submit(())
+            else:
+                self._idle.set()
+
+    async def join(self):
+        """
+        Wait until every queued notification is delivered.
+
+        """
+        await self._idle.wait()
+
+    def close(self):
+        """
+        Forget the queued notifications and stop the delivery.
+
+        """
+        self._pending.clear()
+        for task in list(self._tasks):
+            task.cancel()
+
+    def __len__(self):
+        return len(self._pending)
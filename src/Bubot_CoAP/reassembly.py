@@ -0,0 +1,172 @@
+from bisect import bisect_left
+
+from . import defines
+
+__author__ = 'Mikhail Razgovorov'
+
+
+class ReassemblyBudget:
+    """
+    Memory shared by the reassembly buffers of the block-wise transfers of a block layer.
+    """
+
+    def __init__(self, limit=defines.MAX_REASSEMBLY):
+        """
+        Initialize the budget.
+
+        :param limit: the number of bytes all the buffers may hold together
+        """
+        self.limit = limit
+        self.used = 0
+        self.rejected_total = 0
+
+    def reserve(self, size):
+        """
+        Take bytes from the budget.
+
+        :param size: the number of bytes
+        :return: True, if the bytes are available
+        """
+        if self.used + size > self.limit:
+            self.rejected_total += 1
+            return False
+        self.used += size
+        return True
+
+    def release(self, size):
+        """
+        Give bytes back to the budget.
+
+        :param size: the number of bytes
+        """
+        self.used -= size
+
+
+class ReassemblyBuffer:
+    """
+    Body of a block-wise transfer, every block written at its offset into one bytearray.
+
+    The bytearray is preallocated to the size announced by Size1 or Size2 when known and grows as blocks
+    beyond it arrive, its bytes are taken from the budget. Blocks may arrive out of order or more than
+    once: the received byte ranges are kept sorted and merged, the body is complete once the last block
+    arrived and the ranges cover it.
+    """
+    __slots__ = ('_budget', '_data', '_ranges', 'total')
+
+    def __init__(self, budget):
+        """
+        Initialize an empty buffer.
+
+        :type budget: ReassemblyBudget
+        :param budget: the budget of the buffer
+        """
+        self._budget = budget
+        self._data = bytearray()
+        self._ranges = []  # type: list[list[int]]
+        self.total = None
+
+    def reserve(self, size):
+        """
+        Grow the buffer to hold at least size bytes.
+
+        :param size: the number of bytes
+        :return: False, if the budget is exhausted
+        """
+        grow = size - len(self._data)
+        if grow > 0:
+            if not self._budget.reserve(grow):
+                return False
+            self._data += bytes(grow)
+        return True
+
+    def write(self, offset, data, last=False):
+        """
+        Store a block.
+
+        :param offset: the offset of the block in the body
+        :param data: the payload of the block
+        :param last: True, if it is the last block of the body
+        :return: False, if the budget is exhausted
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        end = offset + len(data)
+        if end > len(self._data) and not self.reserve(end):
+            return False
+        self._data[offset:end] = data
+        if last:
+            self.total = end
+        if end > offset:
+            self._add_range(offset, end)
+        return True
+
+    def _add_range(self, start, end):
+        ranges = self._ranges
+        low = bisect_left(ranges, [start])
+        if low and ranges[low - 1][1] >= start:
+            low -= 1
+        high = low
+        while high < len(ranges) and ranges[high][0] <= end:
+            high += 1
+        if low < high:
+            start = min(start, ranges[low][0])
+            end = max(end, ranges[high - 1][1])
+        ranges[low:high] = [[start, end]]
+
+    @property
+    def contiguous(self):
+        """
+        Return the number of bytes received without gap from the start of the body.
+
+        """
+        ranges = self._ranges
+        return ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+
+    @property
+    def complete(self):
+        """
+        Check if every block of the body arrived.
+
+        """
+        return self.total is not None and (self.total == 0 or self.contiguous >= self.total)
+
+    def missing(self, size, count):
+        """
+        Return the numbers of the blocks, among the first count ones, that did not arrive.
+
+        :param size: the block size
+        :param count: the number of blocks
+        :rtype: list[int]
+        """
+        ranges = self._ranges
+        nums = []
+        index = 0
+        for num in range(count):
+            offset = num * size
+            while index < len(ranges) and ranges[index][1] <= offset:
+                index += 1
+            if index == len(ranges) or ranges[index][0] > offset:
+                nums.append(num)
+        return nums
+
+    def getvalue(self):
+        """
+        Return the body and release the buffer.
+
+        :rtype: bytes
+        """
+        value = bytes(memoryview(self._data)[:self.total])
+        self.release()
+        return value
+
+    def release(self):
+        """
+        Give the memory of the buffer back to the budget.
+
+        """
+        self._budget.release(len(self._data))
+        self._data = bytearray()
+        self._ranges = []
+
+    def __len__(self):
+        return len(self._data)
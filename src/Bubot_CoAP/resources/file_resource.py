@@ -0,0 +1,110 @@
+import hashlib
+import logging
+import mmap
+import os
+
+from .. import defines
+from .resource import Resource
+
+__author__ = 'Mikhail Razgovorov'
+logger = logging.getLogger('Bubot_CoAP')
+
+
+class FileResource(Resource):
+    """
+    Resource serving the content of a file, memory-mapped.
+
+    The blocks are sliced from the map by the block layer, so the content is read through the page cache and
+    shared by all the downloads: it is never copied in the memory of the process. The ETag is derived from the
+    device, inode, size and modification time of the file, which is mapped again when they change. A new
+    content is published by renaming a new file over the old one: the transfers in progress keep the old map.
+    """
+
+    def __init__(self, name, file_path, content_type=defines.Content_types["application/octet-stream"],
+                 coap_server=None, visible=True, observable=False):
+        """
+        Initialize a new FileResource.
+
+        :param name: the name of the resource
+        :param file_path: the path of the file served
+        :param content_type: the Content-Format of the file
+        :param coap_server: the server that own the resource
+        :param visible: if the resource is visible
+        :param observable: if the resource is observable
+        """
+        super().__init__(name, coap_server, visible=visible, observable=observable, allow_children=False)
+        self.file_path = file_path
+        self.file_content_type = content_type
+        self._stat = None
+        self._content = None
+        self._file_etag = None
+
+    @staticmethod
+    def etag_of(stat):
+        """
+        Derive an ETag from the metadata of a file.
+
+        :param stat: the (device, inode, size, modification time) of the file
+        :return: the ETag, 8 bytes
+        """
+        return hashlib.blake2b(repr(stat).encode(), digest_size=8).digest()
+
+    def open(self):
+        """
+        Map the file, again if its metadata changed since it was mapped.
+
+        :raise OSError: if the file cannot be read
+        :return: the content and its ETag
+        """
+        stat = os.stat(self.file_path)
+        key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if key != self._stat:
+            if stat.st_size:
+                with open(self.file_path, 'rb') as file:
+                    content = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    # the blocks are read in order, the kernel reads ahead
+                    content.madvise(mmap.MADV_SEQUENTIAL)
+            else:
+                content = b''
+            # the former map is closed with the last transfer using it
+            self._content = content
+            self._stat = key
+            self._file_etag = self.etag_of(key)
+        return self._content, self._file_etag
+
+    def current_etag(self, request):
+        """
+        Return the ETag of the file, mapped again if it changed.
+
+        :param request: the request
+        :return: the ETag, or None if the file cannot be read
+        """
+        try:
+            return self.open()[1]
+        except OSError:
+            return None
+
+    async def render_GET(self, request, response):
+        """
+        Render the content of the file.
+
+        :param request: the request
+        :param response: the partially filled response
+        :return: a tuple with (the resource, the response)
+        """
+        try:
+            content, etag = self.open()
+        except OSError as err:
+            logger.error(f'file resource {self.path}: {err}')
+            response.code = defines.Codes.NOT_FOUND.number
+            return self, response
+        size = len(content)
+        if size <= defines.MAX_PAYLOAD:
+            # sent in one datagram
+            content = bytes(content)
+        response.payload = (self.file_content_type, content)
+        response.etag = etag
+        if request.size2 is not None:
+            response.size2 = size
+        return self, response
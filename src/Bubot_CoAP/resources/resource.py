@@ -1,13 +1,150 @@
+import inspect
+
 from .. import defines
 
 __author__ = 'Giacomo Tanganelli'
 
 
+class Handler(object):
+    """
+    The handler of a request method on a class of resources and its calling convention, resolved once.
+
+    An advanced handler is called with the request and the partially filled response and returns (resource,
+    response), or (resource, response, callback) for a separate response. A basic handler is called with the request
+    only and returns the resource, or (resource, callback). DELETE handlers return a boolean in place of the
+    resource. The call of an advanced handler takes the resource, the request and the response, the one of a basic
+    handler the resource and the request, and returns an awaitable: it is the rendering function itself when its
+    parameters allow it.
+    """
+    __slots__ = ('function', 'advanced', 'coroutine', 'call')
+
+    def __init__(self, function, advanced, coroutine):
+        """
+        Initialize a handler.
+
+        :param function: the unbound rendering function
+        :param advanced: if the function is called with the response too
+        :param coroutine: if the function is a coroutine function
+        """
+        self.function = function
+        self.advanced = advanced
+        self.coroutine = coroutine
+        names = list(inspect.signature(function).parameters)[1:3]
+        if advanced:
+            if names == ['request', 'response']:
+                call = function
+            else:
+                def call(resource, request, response):
+                    return function(resource, request=request, response=response)
+        elif names == ['request']:
+            call = function
+        else:
+            def call(resource, request):
+                return function(resource, request=request)
+        if not coroutine:
+            rendered = call
+
+            async def call(*args):
+                return rendered(*args)
+        self.call = call
+
+    @classmethod
+    def resolve(cls, function, advanced=None):
+        """
+        Resolve the calling convention of a rendering function.
+
+        :param function: the unbound rendering function
+        :param advanced: if the function is advanced, or None to tell it from its response parameter
+        :rtype: Handler
+        """
+        if advanced is None:
+            parameters = inspect.signature(function).parameters
+            advanced = 'response' in parameters or any(
+                parameter.kind == parameter.VAR_KEYWORD for parameter in parameters.values())
+        return cls(function, advanced, inspect.iscoroutinefunction(function))
+
+
+def method_table(cls):
+    """
+    Resolve the handlers of the request methods of a class of resources: render_<METHOD>, else
+    render_<METHOD>_advanced. The methods left to the ones of Resource, which are not implemented, have no handler.
+
+    :param cls: the class of resources
+    :return: the handlers by method code
+    """
+    table = {}
+    for code in (defines.Codes.GET, defines.Codes.POST, defines.Codes.PUT, defines.Codes.DELETE):
+        for name, advanced in (('render_' + code.name, None), ('render_' + code.name + '_advanced', True)):
+            function = getattr(cls, name, None)
+            if function is not None and function is not getattr(Resource, name, None):
+                table[code.number] = Handler.resolve(function, advanced)
+                break
+    return table
+
+
+class Attributes(dict):
+    """
+    The CoRE Link Format attributes of a resource.
+
+    Every change of the attributes increments the version of the tree owning the resource, the last one it was stored
+    in: the link-format document cached by its server is rendered again when it moved. The tree is referenced
+    weakly.
+    """
+    __slots__ = ('owner',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # the weak reference to the tree owning the resource, set by the tree
+        self.owner = None
+
+    def changed(self):
+        if self.owner is not None:
+            tree = self.owner()
+            if tree is not None:
+                tree.version += 1
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.changed()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.changed()
+
+    def clear(self):
+        super().clear()
+        self.changed()
+
+    def pop(self, *args):
+        self.changed()
+        return super().pop(*args)
+
+    def popitem(self):
+        self.changed()
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        self.changed()
+        return super().setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.changed()
+
+
 class Resource(object):
     """
     The Resource class. Represents the base class for all resources.
+
+    The handlers of the request methods of a class are resolved when the class is defined, in its method table.
     """
-    def __init__(self, name, coap_server=None, visible=True, observable=True, allow_children=True):
+    methods = {}  # type: dict[int, Handler]
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.methods = method_table(cls)
+
+    def __init__(self, name, coap_server=None, visible=True, observable=True, allow_children=True, streaming=False):
         """
         Initialize a new Resource.
 
@@ -16,9 +153,10 @@ class Resource(object):
         :param visible: if the resource is visible
         :param observable: if the resource is observable
         :param allow_children: if the resource could has children
+        :param streaming: if the body of a PUT or POST is handed to the resource as a BlockStream of its blocks
         """
         # The attributes of this resource.
-        self._attributes = {}
+        self._attributes = Attributes()
 
         # The resource name.
         self.name = name
@@ -36,6 +174,8 @@ class Resource(object):
 
         self._allow_children = allow_children
 
+        self._streaming = streaming
+
         self._observe_count = 1
 
         self._payload = {}
@@ -216,7 +356,10 @@ class Resource(object):
 
         :param att: the attributes
         """
-        self._attributes = att
+        attributes = Attributes(att)
+        attributes.owner = self._attributes.owner
+        self._attributes = attributes
+        attributes.changed()
 
     @property
     def visible(self):
@@ -245,6 +388,15 @@ class Resource(object):
         """
         return self._allow_children
 
+    @property
+    def streaming(self):
+        """
+        Get if the resource receives the bodies as a BlockStream.
+
+        :return: True, if streaming
+        """
+        return self._streaming
+
     @property
     def observe_count(self):
         """
@@ -264,6 +416,15 @@ class Resource(object):
         assert isinstance(v, int)
         self._observe_count = (v % 65000)
 
+    @property
+    def observe_value(self):
+        """
+        Get the numeric state of the resource, checked against the gt, lt and st conditions of its observers.
+
+        :return: the number or None if the state of the resource is not numeric
+        """
+        return None
+
     @property
     def actual_content_type(self):
         """
@@ -440,6 +601,16 @@ class Resource(object):
         self.location_query = request.uri_query
         self.payload = (request.content_type, request.payload)
 
+    def current_etag(self, request):
+        """
+        Return the ETag of the representation a GET request would be rendered with. A request carrying it is
+        answered 2.03 Valid without rendering the resource, to be redefined when render_GET sets its own ETag.
+
+        :param request: the request
+        :return: the ETag, or None if the resource is always rendered
+        """
+        return self.etag
+
     def render_GET(self, request, response):
         """
         Method to be redefined to render a GET request on the resource.
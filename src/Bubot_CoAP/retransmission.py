@@ -0,0 +1,323 @@
+import asyncio
+import logging
+import random
+
+from . import defines
+from .messages.request import Request
+from .utils import DeadlineHeap
+
+__author__ = 'Mikhail Razgovorov'
+logger = logging.getLogger('Bubot_CoAP')
+
+
+class PeerRto:
+    """
+    Round-trip time estimators and retransmission timeout of a peer.
+    """
+    __slots__ = ('rto', 'strong_srtt', 'strong_rttvar', 'strong_samples', 'weak_srtt', 'weak_rttvar',
+                 'weak_samples', 'updated')
+
+    def __init__(self, rto, now):
+        """
+        Data structure to store the RTO state of a peer
+
+        :param rto: the initial retransmission timeout
+        :param now: the loop time of the creation
+        """
+        self.rto = rto
+        self.strong_srtt = None
+        self.strong_rttvar = None
+        self.strong_samples = 0
+        self.weak_srtt = None
+        self.weak_rttvar = None
+        self.weak_samples = 0
+        self.updated = now
+
+    def __repr__(self):
+        return (f'PeerRto(rto={self.rto:.3f}, strong_srtt={self.strong_srtt}, strong_rttvar={self.strong_rttvar}, '
+                f'strong_samples={self.strong_samples}, weak_srtt={self.weak_srtt}, '
+                f'weak_rttvar={self.weak_rttvar}, weak_samples={self.weak_samples})')
+
+
+class RtoEstimator:
+    """
+    Per-peer retransmission timeout estimation in the style of CoCoA (draft-ietf-core-cocoa, RFC 8961).
+
+    The strong estimator (K = 4) is fed with the round-trip times of exchanges acknowledged without any
+    retransmission, the weak estimator (K = 1) with the ones acknowledged after one or two retransmissions,
+    measured from the first transmission and not longer than the current RTO. Every new estimate is blended into the RTO of the peer, by 1/2 for
+    strong and by 1/4 for weak ones. An RTO that has not been updated for a while ages back towards the
+    initial value. The least recently updated peers are forgotten beyond max_peers.
+    """
+    alpha = 0.25
+    beta = 0.125
+    strong_k = 4
+    weak_k = 1
+
+    def __init__(self, initial_rto=defines.ACK_TIMEOUT, max_peers=1024):
+        """
+        Initialize the estimator.
+
+        :param initial_rto: the RTO of the peers without measurements
+        :param max_peers: the number of peers whose state is kept
+        """
+        self.initial_rto = initial_rto
+        self.max_peers = max_peers
+        self._peers = {}  # type: dict[tuple, PeerRto]
+
+    def rto(self, peer, now):
+        """
+        Return the current retransmission timeout of a peer.
+
+        :param peer: the (host, port) of the peer
+        :param now: the loop time
+        :return: the RTO in seconds
+        """
+        state = self._peers.get(peer)
+        if state is None:
+            return self.initial_rto
+        rto = state.rto
+        if rto < 1 and now - state.updated > 16 * rto:
+            state.rto = 2 * rto
+            state.updated = now
+        elif rto > 3 and now - state.updated > 4 * rto:
+            state.rto = (self.initial_rto + rto) / 2
+            state.updated = now
+        return state.rto
+
+    @staticmethod
+    def backoff_factor(rto):
+        """
+        Return the variable back-off factor of an initial RTO.
+
+        :param rto: the RTO the exchange started with
+        :return: the factor applied to the timeout after every retransmission
+        """
+        if rto < 1:
+            return 3
+        if rto > 3:
+            return 1.5
+        return 2
+
+    def sample(self, peer, rtt, transmissions, now):
+        """
+        Update the estimators of a peer with the round-trip time of an acknowledged exchange.
+
+        :param peer: the (host, port) of the peer
+        :param rtt: the time from the first transmission to the acknowledgement
+        :param transmissions: the number of transmissions of the message
+        :param now: the loop time
+        """
+        if transmissions > 3:
+            return
+        state = self._peers.get(peer)
+        # a weak sample longer than the RTO mostly measures the timeout waited before the retransmission
+        if transmissions > 1 and rtt > (self.initial_rto if state is None else state.rto):
+            return
+        state = self._peers.pop(peer, None)
+        if state is None:
+            state = PeerRto(self.initial_rto, now)
+            if len(self._peers) >= self.max_peers:
+                del self._peers[next(iter(self._peers))]
+        self._peers[peer] = state
+        if transmissions == 1:
+            if state.strong_samples:
+                state.strong_rttvar = (1 - self.beta) * state.strong_rttvar + self.beta * abs(state.strong_srtt - rtt)
+                state.strong_srtt = (1 - self.alpha) * state.strong_srtt + self.alpha * rtt
+            else:
+                state.strong_srtt = rtt
+                state.strong_rttvar = rtt / 2
+            state.strong_samples += 1
+            rto = 0.5 * (state.strong_srtt + self.strong_k * state.strong_rttvar) + 0.5 * state.rto
+        else:
+            if state.weak_samples:
+                state.weak_rttvar = (1 - self.beta) * state.weak_rttvar + self.beta * abs(state.weak_srtt - rtt)
+                state.weak_srtt = (1 - self.alpha) * state.weak_srtt + self.alpha * rtt
+            else:
+                state.weak_srtt = rtt
+                state.weak_rttvar = rtt / 2
+            state.weak_samples += 1
+            rto = 0.25 * (state.weak_srtt + self.weak_k * state.weak_rttvar) + 0.75 * state.rto
+        state.rto = min(max(rto, defines.MIN_RTO), defines.MAX_RTO)
+        state.updated = now
+
+    def get(self, peer):
+        """
+        Return the RTO state of a peer.
+
+        :param peer: the (host, port) of the peer
+        :rtype: PeerRto
+        :return: the state or None if the peer has no measurements
+        """
+        return self._peers.get(peer)
+
+    def items(self):
+        return self._peers.items()
+
+    def __len__(self):
+        return len(self._peers)
+
+
+class Retransmission:
+    """
+    Pending confirmable message waiting for its acknowledgement.
+    """
+    __slots__ = ('deadline', 'index', 'transaction', 'message', 'timeout', 'factor', 'count', 'sent')
+
+    def __init__(self, deadline, transaction, message, timeout, factor, sent):
+        """
+        Data structure to store the retransmission state of a message
+
+        :param deadline: the loop time of the next attempt
+        :param transaction: the transaction that owns the message
+        :param message: the confirmable message
+        :param timeout: the current timeout, multiplied by factor on every retransmission
+        :param factor: the back-off factor
+        :param sent: the loop time of the first transmission
+        """
+        self.deadline = deadline
+        self.index = None
+        self.transaction = transaction
+        self.message = message
+        self.timeout = timeout
+        self.factor = factor
+        self.count = 0
+        self.sent = sent
+
+
+class RetransmissionScheduler:
+    """
+    Retransmit the confirmable messages of a server with exponential back-off.
+
+    The pending messages are kept in one deadline heap and served by a single task woken up by a loop
+    timer armed at the earliest deadline, starting or stopping a retransmission allocates no task, event
+    or timer. The initial timeout and the back-off factor are ack_timeout and 2, or with adaptive the ones
+    of the RTO estimated for the destination. The adaptive RTO is opt-in: it shortens the exchanges on
+    links faster than ack_timeout, but over slow and jittery links, such as cellular or NB-IoT, its wider
+    margin delays the recovery of lost messages (see benchmarks/bench_rto.py).
+    """
+
+    def __init__(self, server, max_retransmit=defines.MAX_RETRANSMIT, ack_timeout=defines.ACK_TIMEOUT,
+                 adaptive=False):
+        """
+        Initialize the scheduler.
+
+        :param server: the server that sends the messages
+        :param max_retransmit: the number of retransmissions before giving up
+        :param ack_timeout: the initial RTO
+        :param adaptive: estimate the RTO of every peer
+        """
+        self._server = server
+        self._heap = DeadlineHeap()
+        self._wakeup = asyncio.Event()
+        self._timer = None
+        self.max_retransmit = max_retransmit
+        self.ack_timeout = ack_timeout
+        self.estimator = RtoEstimator(ack_timeout) if adaptive else None
+        self.retransmitted_total = 0
+        self.given_up_total = 0
+
+    def start(self, transaction, message):
+        """
+        Schedule the retransmission of a message just sent, replacing the pending one of the transaction.
+
+        :type transaction: Transaction
+        :param transaction: the transaction that owns the message
+        :type message: Message
+        :param message: the confirmable message
+        """
+        self.stop(transaction)
+        now = self._server.loop.time()
+        if self.estimator is None:
+            rto = self.ack_timeout
+            factor = 2
+        else:
+            rto = self.estimator.rto(message.destination, now)
+            factor = self.estimator.backoff_factor(rto)
+        timeout = random.uniform(rto, rto * defines.ACK_RANDOM_FACTOR)
+        entry = Retransmission(now + timeout, transaction, message, timeout, factor, now)
+        transaction.retransmission = entry
+        self._heap.push(entry)
+        if entry.index == 0:
+            self._arm()
+
+    def stop(self, transaction):
+        """
+        Cancel the pending retransmission of a transaction, if any. The round-trip time of an acknowledged
+        message updates the RTO of its destination.
+
+        :type transaction: Transaction
+        :param transaction: the transaction
+        """
+        entry = transaction.retransmission
+        if entry is not None:
+            transaction.retransmission = None
+            self._heap.remove(entry)
+            if self.estimator is not None and entry.message.acknowledged:
+                now = self._server.loop.time()
+                self.estimator.sample(entry.message.destination, now - entry.sent, entry.count + 1, now)
+
+    def _arm(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        head = self._heap.peek()
+        self._timer = None if head is None else self._server.loop.call_at(head.deadline, self._wakeup.set)
+
+    async def run(self):
+        """
+        Send the retransmissions as their deadlines pass, until the server is stopped.
+
+        """
+        loop = self._server.loop
+        heap = self._heap
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if self._server.stopped.is_set():
+                break
+            head = heap.peek()
+            while head is not None and head.deadline <= loop.time():
+                heap.pop()
+                await self._expire(head)
+                head = heap.peek()
+            self._arm()
+
+    async def _expire(self, entry):
+        transaction = entry.transaction
+        message = entry.message
+        if message.acknowledged or message.rejected:
+            transaction.retransmission = None
+            return
+        if entry.count < self.max_retransmit:
+            entry.count += 1
+            entry.timeout = min(entry.timeout * entry.factor, defines.MAX_RTO)
+            entry.deadline = self._server.loop.time() + entry.timeout
+            self._heap.push(entry)
+            self.retransmitted_total += 1
+            logger.debug("retransmit %s", message)
+            try:
+                await self._server.send_datagram(message)
+            except Exception as err:
+                logger.error(err)
+        else:
+            transaction.retransmission = None
+            self.given_up_total += 1
+            logger.warning("Give up on message %s", message.line_print)
+            message.timeouted = True
+            if message.observe is not None:
+                self._server.observe_layer.remove_subscriber(message)
+            if isinstance(message, Request):
+                self._server.block_layer.give_up(message)
+
+    def close(self):
+        """
+        Stop the scheduler task.
+
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._wakeup.set()
+
+    def __len__(self):
+        return len(self._heap)
@@ -5,6 +5,7 @@ import ctypes
 from .messages.request import Request
 from .messages.response import Response
 from .messages.option import Option
+from .messages.option_list import OptionList
 from .import defines
 from .messages.message import Message
 import cbor2
@@ -102,8 +103,6 @@ class Serializer(object):
                         option.value = Serializer.convert_to_raw(current_option, value, option_length)
 
                         message.add_option(option)
-                        if option.number == defines.OptionRegistry.CONTENT_TYPE.number:
-                            message.payload_type = option.value
                     finally:
                         pos += option_length
                 else:
@@ -341,9 +340,12 @@ class Serializer(object):
     def as_sorted_list(options):
         """
         Returns all options in a list sorted according to their option numbers.
+        An OptionList is already sorted and is returned as is.
 
         :return: the sorted list
         """
+        if isinstance(options, OptionList):
+            return options
         if len(options) > 0:
             options = sorted(options, key=lambda o: o.number)
         return options
@@ -7,6 +7,7 @@ import cbor2
 from . import defines
 from .messages.message import Message
 from .messages.option import Option
+from .messages.option_list import OptionList
 from .messages.request import Request
 from .messages.response import Response
 from .serializer import Serializer
@@ -189,8 +190,6 @@ class SerializerTcp(Serializer):
                         option.value = Serializer.convert_to_raw(current_option, value, option_length)
 
                         message.add_option(option)
-                        if option.number == defines.OptionRegistry.CONTENT_TYPE.number:
-                            message.payload_type = option.value
                     finally:
                         pos += option_length
                 else:
@@ -306,6 +305,10 @@ class SerializerTcp(Serializer):
                 fmt += str(len(payload)) + "s"
                 values.append(payload)
 
+            elif isinstance(payload, (bytearray, memoryview)):
+                fmt += str(len(payload)) + "s"
+                values.append(bytes(payload))
+
             else:
                 # raise ValueError('Not bytes payload')
                 # try:
@@ -441,9 +444,12 @@ class SerializerTcp(Serializer):
     def as_sorted_list(options):
         """
         Returns all options in a list sorted according to their option numbers.
+        An OptionList is already sorted and is returned as is.
 
         :return: the sorted list
         """
+        if isinstance(options, OptionList):
+            return options
         if len(options) > 0:
             options = sorted(options, key=lambda o: o.number)
         return options
@@ -5,6 +5,7 @@ import ctypes
 from .messages.request import Request
 from .messages.response import Response
 from .messages.option import Option
+from .messages.option_list import OptionList
 from .import defines
 from .messages.message import Message
 import cbor2
@@ -103,8 +104,6 @@ class SerializerUdp(Serializer):
                         option.value = Serializer.convert_to_raw(current_option, value, option_length)
 
                         message.add_option(option)
-                        if option.number == defines.OptionRegistry.CONTENT_TYPE.number:
-                            message.payload_type = option.value
                     finally:
                         pos += option_length
                 else:
@@ -219,6 +218,10 @@ class SerializerUdp(Serializer):
                 fmt += str(len(payload)) + "s"
                 values.append(payload)
 
+            elif isinstance(payload, (bytearray, memoryview)):
+                fmt += str(len(payload)) + "s"
+                values.append(bytes(payload))
+
             else:
                 # raise ValueError('Not bytes payload')
                 # try:
@@ -247,6 +250,39 @@ class SerializerUdp(Serializer):
 
         return datagram
 
+    @classmethod
+    def serialize_body(cls, message):
+        """
+        Serialize the options and the payload of a message, the part of the datagram after the token.
+
+        :type message: Message
+        :param message: the message to be serialized
+        :rtype: bytes
+        :return: the options and the payload serialized
+        """
+        token = message.token
+        return bytes(cls.serialize(message))[4 + (len(token) if token else 0):]
+
+    @staticmethod
+    def serialize_header(message, body):
+        """
+        Serialize a message whose options and payload were already serialized by serialize_body.
+
+        :type message: Message
+        :param message: the message, only its type, code, mid and token are read
+        :param body: the serialized options and payload
+        :rtype: bytearray
+        :return: the message serialized
+        """
+        token = message.token or b''
+        tkl = len(token)
+        datagram = bytearray(4 + tkl + len(body))
+        struct.pack_into("!BBH", datagram, 0, (((defines.VERSION << 2) | message.type) << 4) | tkl, message.code,
+                         message.mid)
+        datagram[4:4 + tkl] = token
+        datagram[4 + tkl:] = body
+        return datagram
+
     @staticmethod
     def is_request(code):
         """
@@ -342,9 +378,12 @@ class SerializerUdp(Serializer):
     def as_sorted_list(options):
         """
         Returns all options in a list sorted according to their option numbers.
+        An OptionList is already sorted and is returned as is.
 
         :return: the sorted list
         """
+        if isinstance(options, OptionList):
+            return options
         if len(options) > 0:
             options = sorted(options, key=lambda o: o.number)
         return options
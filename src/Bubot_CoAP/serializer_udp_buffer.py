@@ -0,0 +1,160 @@
+import logging
+import struct
+
+from . import defines
+from .messages.lazy_message import LazyMessage, LazyRequest, LazyResponse
+from .serializer_udp import SerializerUdp, string_encode
+
+__author__ = 'Mikhail Razgovorov'
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("!BBH")
+_UINT8 = struct.Struct("!B")
+_UINT16 = struct.Struct("!H")
+
+
+def _extended_field(value):
+    """
+    Encode an option delta or an option length.
+
+    :param value: the option delta or option length
+    :return: the 4-bit nibble and the extended field bytes (0 - 2 bytes)
+    """
+    if value < 13:
+        return value, b''
+    elif value < 269:
+        return 13, _UINT8.pack(value - 13)
+    elif value < 65805:
+        return 14, _UINT16.pack(value - 269)
+    raise AttributeError("Unsupported option delta or length " + str(value))
+
+
+# nibble and extended bytes for every delta/length that fits in one extended byte
+_EXTENDED_FIELDS = tuple(_extended_field(value) for value in range(269))
+
+
+def _option_header(delta, length):
+    """
+    Build the option header: delta/length nibbles followed by the extended fields.
+
+    :param delta: the option delta
+    :param length: the option value length
+    :return: the option header bytes
+    """
+    delta_nibble, delta_ext = _EXTENDED_FIELDS[delta] if delta < 269 else _extended_field(delta)
+    length_nibble, length_ext = _EXTENDED_FIELDS[length] if length < 269 else _extended_field(length)
+    return _UINT8.pack((delta_nibble << defines.OPTION_DELTA_BITS) | length_nibble) + delta_ext + length_ext
+
+
+class SerializerUdpBuffer(SerializerUdp):
+    """
+    Serializer that encodes a CoAP message into a single preallocated buffer and decodes it lazily.
+
+    Option values are converted to bytes once, the size of the datagram is computed from them and header,
+    token, options and payload are written straight into one bytearray. Incoming datagrams are parsed
+    only up to the token, options and payload are decoded from a memoryview on first access.
+
+    Select it per endpoint: server.add_endpoint('coap://...', serializer=SerializerUdpBuffer)
+    """
+
+    @staticmethod
+    def deserialize(datagram, source):
+        """
+        De-serialize the header and the token of a datagram, options and payload are decoded on demand.
+
+        :param datagram: the incoming udp message
+        :param source: the source address and port (ip, port)
+        :return: the message or the error code
+        :rtype: LazyOptions
+        """
+        view = memoryview(datagram)
+        try:
+            first, code, mid = _HEADER.unpack_from(view)
+            token_length = first & 0x0F
+            pos = _HEADER.size + token_length
+            if token_length > 8 or pos > len(view):
+                raise AttributeError("Token length %s" % token_length)
+            raw = view[pos:]
+            if SerializerUdpBuffer.is_response(code):
+                message = LazyResponse(raw)
+                message.code = code
+            elif SerializerUdpBuffer.is_request(code):
+                message = LazyRequest(raw)
+                message.code = code
+            else:
+                message = LazyMessage(raw)
+            message.source = source
+            message.destination = None
+            message.version = first >> 6
+            message.type = (first & 0x30) >> 4
+            message.mid = mid
+            message.token = bytes(view[_HEADER.size:pos]) if token_length else None
+            return message
+        except AttributeError:
+            return defines.Codes.BAD_REQUEST.number
+        except struct.error:
+            return defines.Codes.BAD_REQUEST.number
+
+    @staticmethod
+    def serialize(message):
+        """
+        Serialize a message to a udp packet
+
+        :type message: Message
+        :param message: the message to be serialized
+        :rtype: bytearray
+        :return: the message serialized
+        """
+        token = message.token
+        tkl = len(token) if token is not None else 0
+
+        chunks = []
+        size = _HEADER.size + tkl
+        last_number = 0
+        for option in SerializerUdpBuffer.as_sorted_list(message.options):
+            number = option.number
+            length = option.length
+            if length > 0:
+                opt_type = defines.OptionRegistry.LIST[number].value_type
+                if opt_type == defines.INTEGER:
+                    value = option.value.to_bytes(length, "big")
+                elif opt_type == defines.STRING:
+                    value = option.value.encode("utf-8")
+                    length = len(value)
+                else:  # OPAQUE
+                    value = option.value
+            else:
+                value = b''
+            chunk = _option_header(number - last_number, length) + value
+            chunks.append(chunk)
+            size += len(chunk)
+            last_number = number
+
+        payload = message.payload
+        if payload is not None and len(payload) > 0:
+            # if payload is present and of non-zero length, it is prefixed by
+            # an one-byte Payload Marker (0xFF) which indicates the end of
+            # options and the start of the payload
+            if not isinstance(payload, (bytes, bytearray, memoryview)):
+                payload = string_encode(payload)
+            size += 1 + len(payload)
+        else:
+            payload = None
+
+        datagram = bytearray(size)
+        code = message.code if message.code is not None else 0
+        mid = message.mid if message.mid is not None else 0
+        _HEADER.pack_into(datagram, 0, (((defines.VERSION << 2) | message.type) << 4) | tkl, code, mid)
+        pos = _HEADER.size
+        if tkl:
+            datagram[pos:pos + tkl] = token
+            pos += tkl
+        for chunk in chunks:
+            end = pos + len(chunk)
+            datagram[pos:end] = chunk
+            pos = end
+        if payload is not None:
+            datagram[pos] = defines.PAYLOAD_MARKER
+            datagram[pos + 1:] = payload
+        return datagram
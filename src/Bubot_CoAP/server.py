@@ -1,4 +1,5 @@
 import asyncio
+import gc
 import logging
 import random
 from socket import AF_INET, AF_INET6
@@ -7,16 +8,21 @@ from aio_dtls.connection_manager.connection_manager import ConnectionManager
 
 from bubot_helpers.ExtException import ExtException
 from . import defines
+from .discovery import Discovery
 from .layers.block_layer import BlockLayer
+from .layers.cache_layer import CacheLayer
 from .layers.callback_layer import CallbackLayer
 from .layers.endpoint_layer import EndpointLayer
 from .layers.message_layer import MessageLayer
-from .layers.observe_layer import ObserveLayer
+from .layers.observe_layer import ObserveConditions, ObserveLayer
 from .layers.request_layer import RequestLayer
 from .layers.resource_layer import ResourceLayer
 from .messages.message import Message
 from .messages.request import Request
+from .messages.response import Response
 from .resources.resource import Resource
+from .notification import NotificationDispatcher
+from .retransmission import RetransmissionScheduler
 from .utils import Tree, Timer
 
 __author__ = 'Giacomo Tanganelli'
@@ -34,10 +40,26 @@ class Server:
 
         :param starting_mid: used for testing purposes
         :param cb_ignore_listen_exception: Callback function to handle exception raised during the socket listen operation
+        :param max_retransmit: the number of retransmissions of a confirmable message before giving up
+        :param ask_timeout: the initial retransmission timeout
+        :param adaptive_rto: estimate the retransmission timeout of every peer, else always use ask_timeout. Off by
+            default, it is slower than ask_timeout over links with long and jittery round trips
+        :param nstart: the number of requests outstanding to a peer, 0 for no limit
+        :param probing_rate: the rate in bytes per second of the requests to a peer that does not respond
+        :param max_reassembly: the number of bytes held by all the block-wise bodies being reassembled
+        :param q_block: offer Q-Block1 and Q-Block2 (RFC 9177) in the requests sent
+        :param notify_concurrency: the number of batches of notifications delivered at once
+        :param notify_max_pending: the number of observers waiting for a notification before dropping the oldest
+        :param cache: keep the responses to the GET requests sent, and answer the same requests from them while
+            they are fresh
+        :param cache_max_entries: the number of responses kept
+        :param cache_max_bytes: the number of bytes of payload kept
         """
         self.max_retransmit = kwargs.get('max_retransmit', defines.MAX_RETRANSMIT)
         self.ask_timeout = kwargs.get('ask_timeout', defines.ACK_TIMEOUT)
         self.exchange_lifetime = kwargs.get('exchange_lifetime', defines.EXCHANGE_LIFETIME)
+        self.nstart = kwargs.get('nstart', defines.NSTART)
+        self.probing_rate = kwargs.get('probing_rate', defines.PROBING_RATE)
         self.loop = kwargs.get('loop', asyncio.get_event_loop())
 
         self.stopped = asyncio.Event()
@@ -47,15 +69,26 @@ class Server:
             AF_INET6: kwargs.get('multicast_ipv6', [defines.ALL_COAP_NODES_IPV6])
         }
         self.multicast_port = kwargs.get('multicast_port', defines.COAP_DEFAULT_PORT)
-        self.to_be_stopped = []
         self.loop.create_task(self.purge())
+        self.retransmission = RetransmissionScheduler(self, self.max_retransmit, self.ask_timeout,
+                                                      kwargs.get('adaptive_rto', False))
+        self.loop.create_task(self.retransmission.run())
         self.endpoint_layer = EndpointLayer(self)
         self.message_layer = MessageLayer(self, starting_mid)
-        self.block_layer = BlockLayer()
-        self.observe_layer = ObserveLayer()
+        self.block_layer = BlockLayer(kwargs.get('max_reassembly', defines.MAX_REASSEMBLY), self,
+                                      kwargs.get('q_block', False))
+        self._observe_wakeup = asyncio.Event()
+        self._observe_timer = None
+        self.observe_layer = ObserveLayer(self.loop.time, self._arm_observe)
+        self.loop.create_task(self.observe_timers())
+        self.notifications = NotificationDispatcher(self, kwargs.get('notify_concurrency', defines.NOTIFY_CONCURRENCY),
+                                                    kwargs.get('notify_max_pending', defines.NOTIFY_MAX_PENDING))
         self.request_layer = RequestLayer(self)
         self.resource_layer = ResourceLayer(self)
         self.callback_layer = CallbackLayer(self)
+        self.cache_layer = CacheLayer(
+            defines.CLIENT_CACHE, kwargs.get('cache_max_entries', defines.CACHE_MAX_ENTRIES),
+            kwargs.get('cache_max_bytes', defines.CACHE_MAX_BYTES)) if kwargs.get('cache', False) else None
         self.dtls_connection_manager = ConnectionManager(secret='test')
         # Resource directory
         root = Resource('root', self, visible=False, observable=False, allow_children=False)
@@ -63,21 +96,45 @@ class Server:
         self.client_manager = client_manager
         self.root = Tree()
         self.root["/"] = root
+        self.discovery = Discovery(self, kwargs.get('discovery_max_queries', defines.DISCOVERY_MAX_QUERIES))
         self._serializer = None
         self._cb_ignore_listen_exception = cb_ignore_listen_exception
 
     async def purge(self):
         """
-        Clean old and complete transactions
+        Expire transactions once per tick of the message layer timer wheels
 
         """
         while not self.stopped.is_set():
             try:
-                await asyncio.wait_for(self.stopped.wait(), 15)  # defines.EXCHANGE_LIFETIME)
+                await asyncio.wait_for(self.stopped.wait(), self.message_layer.purge_interval)
             except asyncio.TimeoutError:
                 pass
             self.message_layer.purge()
 
+    def _arm_observe(self):
+        if self._observe_timer is not None:
+            self._observe_timer.cancel()
+        deadline = self.observe_layer.next_deadline()
+        self._observe_timer = None if deadline is None else self.loop.call_at(deadline, self._observe_wakeup.set)
+
+    async def observe_timers(self):
+        """
+        Send the notifications held by pmin and the ones due by pmax of the conditional observations, until the
+        server is stopped.
+
+        """
+        while True:
+            await self._observe_wakeup.wait()
+            self._observe_wakeup.clear()
+            if self.stopped.is_set():
+                break
+            try:
+                self.notifications.submit(self.observe_layer.expire())
+            except Exception as err:
+                logger.exception(err)
+            self._arm_observe()
+
     async def close(self):
         """
         Stop the server.
@@ -86,34 +143,47 @@ class Server:
         try:
             logger.info("Stop server")
             self.stopped.set()
-            for event in self.to_be_stopped:
-                event.set()
+            self.retransmission.close()
+            if self._observe_timer is not None:
+                self._observe_timer.cancel()
+            self._observe_wakeup.set()
+            self.notifications.close()
             await asyncio.sleep(0.001)
             self.endpoint_layer.close()
         except Exception as err:
             raise ExtException(parent=err, action='coap server closing')
 
-    async def receive_request(self, transaction):
+    async def receive_request(self, transaction, request=None):
         """
         Handle requests coming from the udp socket.
 
         :param transaction: the transaction created to manage the request
+        :param request: the received request, when further requests of the exchange may arrive meanwhile
         """
 
         async with transaction.lock:
+            if request is not None:
+                transaction.request = request
+                if transaction.response is not None:
+                    # a further request of a block-wise exchange, the response is sent again for it
+                    del transaction.response.type
+                    del transaction.response.mid
 
             transaction.separate_timer = await self._start_separate_timer(transaction)
 
-            self.block_layer.receive_request(transaction)
+            streamed = await self.block_layer.receive_stream(transaction)
+            if not streamed:
+                self.block_layer.receive_request(transaction)
 
             if transaction.block_transfer:
                 await self._stop_separate_timer(transaction.separate_timer)
                 self.message_layer.send_response(transaction)
-                await self.send_datagram(transaction.response)
+                if transaction.response is not None:
+                    await self.send_datagram(transaction.response)
                 return
 
             await self.observe_layer.receive_request(transaction)
-            if transaction.resource is None:
+            if transaction.resource is None and not streamed:
                 await self.request_layer.receive_request(transaction)
 
             if transaction.resource is not None and transaction.resource.changed:
@@ -125,7 +195,8 @@ class Server:
 
             self.observe_layer.send_response(transaction)
 
-            self.block_layer.send_response(transaction)
+            if not await self.block_layer.send_stream(transaction):
+                self.block_layer.send_response(transaction)
 
             await self._stop_separate_timer(transaction.separate_timer)
 
@@ -138,29 +209,62 @@ class Server:
                     await asyncio.sleep(random.uniform(0, 10))
                     transaction.response.source = (transaction.response.source[0], None)
                 await self.send_datagram(transaction.response)
+                for response in self.block_layer.q_block_burst(transaction):
+                    response.mid = self.message_layer.fetch_mid()
+                    await self.send_datagram(response)
         await asyncio.sleep(0)
 
-    async def send_message(self, message, no_response=False, endpoint=None, **kwargs):
+    async def send_message(self, message, no_response=False, endpoint=None, stream=False, **kwargs):
+        """
+        Send a message, a request is answered with its response.
+
+        :param message: the request or the empty message
+        :param no_response: do not wait for the response
+        :param endpoint: the endpoint to send from, by default the one of the source of the message
+        :param stream: hand the body of the response over block by block: the payload of the response is a
+            BlockStream iterating over the blocks as they arrive
+        :return: the response
+        """
         try:
             if isinstance(message, Request):
                 if message.token is None:
                     message.token = self.message_layer.fetch_token()
 
+                validated = None
+                if self.cache_layer is not None and not no_response and not stream:
+                    response, validated = self.cache_layer.send_request(message)
+                    if response is not None:
+                        return response
+
                 request = self.request_layer.send_request(message)
                 request = self.observe_layer.send_request(request)
-                request = self.block_layer.send_request(request)
+                request = self.block_layer.send_request(request, stream=stream and not no_response)
                 if no_response:
                     # don't add the send message to the message layer transactions
                     await self.send_datagram(request, **kwargs)
                     logger.debug(f'Send no response request {request}')
                     return
-                transaction = self.message_layer.send_request(request)
-                await self.send_datagram(transaction.request, endpoint=endpoint, **kwargs)
-                logger.info("Send request     - " + str(request))
 
-                if transaction.request.type == defines.Types["CON"]:
-                    await self.start_retransmission(transaction, transaction.request)
-                response = await self.callback_layer.wait(request, **kwargs)
+                async def send():
+                    transaction = self.message_layer.send_request(request)
+                    await self.send_datagram(transaction.request, endpoint=endpoint, **kwargs)
+                    logger.info("Send request     - " + str(request))
+
+                    if transaction.request.type == defines.Types["CON"]:
+                        await self.start_retransmission(transaction, transaction.request)
+                    burst = self.block_layer.q_block_requests(request)
+                    if burst:
+                        await self.send_q_blocks(burst)
+
+                response = await self.callback_layer.wait(request, send=send, **kwargs)
+                if response is not None and response.code == defines.Codes.BAD_OPTION.number \
+                        and self.block_layer.q_block_refused(request):
+                    # the peer does not support Q-Block
+                    if validated is not None:
+                        del request.etag
+                    return await self.send_message(request, endpoint=endpoint, stream=stream, **kwargs)
+                if self.cache_layer is not None and response is not None and not stream and not request.multicast:
+                    response = self.cache_layer.receive_response(request, response, validated)
                 return response
 
             elif isinstance(message, Message):
@@ -168,6 +272,8 @@ class Server:
                 message = self.message_layer.send_empty(None, None, message)
                 await self.send_datagram(message, endpoint=endpoint, **kwargs)
         except (asyncio.TimeoutError, asyncio.CancelledError) as err:
+            if stream and isinstance(message, Request):
+                self.block_layer.give_up(message)
             raise err
         except Exception as err:
             raise ExtException(parent=err)
@@ -205,22 +311,44 @@ class Server:
         """
 
         assert isinstance(resource, Resource)
-        path = path.strip("/")
-        paths = path.split("/")
-        actual_path = ""
-        i = 0
-        for p in paths:
-            i += 1
-            actual_path += "/" + p
-            try:
-                res = self.root[actual_path]
-            except KeyError:
-                res = None
-            if res is None:
-                resource.path = actual_path
-                self.root[actual_path] = resource
+        # the missing parents of the path are registered with the resource too
+        path = self.root.fill(path, resource)
+        if path is not None:
+            resource.path = path
         return True
 
+    def add_resources(self, resources):
+        """
+        Add resources to the resource directory in one pass, as add_resource does for each of them.
+
+        The resources are checked as they are inserted, nothing is added if one of them is invalid. The document
+        of .well-known/core is invalidated once, for the whole batch, and rendered again by the next discovery.
+        The cyclic garbage collector is paused meanwhile: the nodes of the tree are long-lived, scanning them again
+        and again as the tree grows would take longer than inserting them.
+
+        :param resources: the (path, resource) pairs, sorted by path to share the lookups of their parents
+        :raise TypeError: if a resource is not a Resource
+        :raise ValueError: if a path has an empty segment
+        :return: the number of resources added
+        """
+
+        def checked():
+            for path, resource in resources:
+                if not isinstance(resource, Resource):
+                    raise TypeError(f'not a resource at {path}')
+                yield path, resource
+
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            filled = self.root.fill_many(checked())
+            for path, resource in filled:
+                resource.path = path
+        finally:
+            if collecting:
+                gc.enable()
+        return len(filled)
+
     def remove_resource(self, path):
         """
         Helper function to remove resources.
@@ -229,19 +357,9 @@ class Server:
         :rtype : the removed object
         """
 
-        path = path.strip("/")
-        paths = path.split("/")
-        actual_path = ""
-        i = 0
-        for p in paths:
-            i += 1
-            actual_path += "/" + p
-        try:
-            res = self.root[actual_path]
-        except KeyError:
-            res = None
+        res = self.root.get(path)
         if res is not None:
-            del (self.root[actual_path])
+            del self.root[path]
         return res
 
     async def start_client(self, url, **kwargs):
@@ -261,18 +379,6 @@ class Server:
     #     return self.endpoint_layer.remove(**kwargs)
     #     pass
 
-    @staticmethod
-    async def wait_for_retransmit_thread(transaction):
-        """
-        Only one retransmit thread at a time, wait for other to finish
-
-        """
-        if hasattr(transaction, 'retransmit_thread'):
-            while transaction.retransmit_thread is not None:
-                logger.debug("Waiting for retransmit thread to finish ...")
-                await asyncio.sleep(0.01)
-                continue
-
     async def send_block_request(self, transaction):
         """
         A former request resulted in a block wise transfer. With this method, the block wise transfer
@@ -280,6 +386,12 @@ class Server:
 
         :param transaction: The former transaction including the request which should be continued.
         """
+        if not await self.block_layer.stream_ready(transaction.request):
+            return
+        requests = self.block_layer.q_block_requests(transaction.request)
+        if requests is not None:
+            await self.send_q_blocks(requests)
+            return
         transaction = self.message_layer.send_request(transaction.request)
         # ... but don't forget to reset the acknowledge flag
         transaction.request.acknowledged = False
@@ -291,68 +403,33 @@ class Server:
         if transaction.request.type == defines.Types["CON"]:
             await self.start_retransmission(transaction, transaction.request)
 
-    async def start_retransmission(self, transaction, message):
+    async def send_q_blocks(self, requests):
         """
-        Start the retransmission task.
+        Send the requests of a Q-Block transfer, the confirmable ones are retransmitted.
 
-        :type transaction: Transaction
-        :param transaction: the transaction that owns the message that needs retransmission
-        :type message: Message
-        :param message: the message that needs the retransmission task
-        """
-        # async with transaction.lock:
-        if message.type == defines.Types['CON'] and message.acknowledged and not transaction.over_tcp:
-            future_time = random.uniform(defines.ACK_TIMEOUT, (defines.ACK_TIMEOUT * defines.ACK_RANDOM_FACTOR))
-            transaction.retransmit_thread = self.loop.create_task(
-                self._retransmit(transaction, message, future_time, 0))
-            transaction.retransmit_stop = asyncio.Event()
-            self.to_be_stopped.append(transaction.retransmit_stop)
-            await asyncio.sleep(0.001)
+        :param requests: the requests
+        """
+        for request in requests:
+            transaction = self.message_layer.send_request(request)
+            try:
+                await self.send_datagram(request)
+            except Exception as err:
+                logger.error(err)
+                return
+            if request.type == defines.Types["CON"]:
+                await self.start_retransmission(transaction, request)
 
-    async def _retransmit(self, transaction, message, future_time, retransmit_count):
+    async def start_retransmission(self, transaction, message):
         """
-        Thread function to retransmit the message in the future
+        Schedule the retransmission of a confirmable message.
 
+        :type transaction: Transaction
         :param transaction: the transaction that owns the message that needs retransmission
-        :param message: the message that needs the retransmission task
-        :param future_time: the amount of time to wait before a new attempt
-        :param retransmit_count: the number of retransmissions
+        :type message: Message
+        :param message: the message that needs the retransmission
         """
-        async with transaction.lock:
-            logger.debug("retransmit loop ... enter")
-            while retransmit_count < defines.MAX_RETRANSMIT and (not message.acknowledged and not message.rejected) \
-                    and not self.stopped.is_set():
-                if transaction.retransmit_stop is not None:
-                    try:
-                        await asyncio.wait_for(transaction.retransmit_stop.wait(), future_time)
-                    except asyncio.TimeoutError:
-                        pass
-                if not message.acknowledged and not message.rejected and not self.stopped.is_set():
-                    retransmit_count += 1
-                    future_time *= 2
-                    if retransmit_count < defines.MAX_RETRANSMIT:
-                        logger.debug("retransmit loop ... retransmit Request")
-                        await self.send_datagram(message)
-
-            if message.acknowledged or message.rejected:
-                message.timeouted = False
-            else:
-                logger.warning("Give up on message {message}".format(message=message.line_print))
-                message.timeouted = True
-                if message.observe is not None:
-                    self.observe_layer.remove_subscriber(message)
-
-                # Inform the user, that nothing was received
-                # self._callback(None)
-                a = 1
-
-            try:
-                self.to_be_stopped.remove(transaction.retransmit_stop)
-            except ValueError:
-                pass
-            transaction.retransmit_stop = None
-            transaction.retransmit_thread = None
-            logger.debug("retransmit loop ... exit")
+        if message.type == defines.Types['CON'] and not message.acknowledged and not transaction.over_tcp:
+            self.retransmission.start(transaction, message)
 
     async def _start_separate_timer(self, transaction):
         """
@@ -375,39 +452,137 @@ class Server:
         """
         await timer.cancel()
 
-    async def send_ack(self, transaction, message=None):
+    async def send_ack(self, transaction, message=None, locked=False):
         """
         Sends an ACK message for the request.
 
         :param transaction: the transaction that owns the request
+        :param message: the message acknowledged, the request by default
+        :param locked: True if the caller holds the lock of the transaction, as the resource handlers do
         """
         if message is None:
             message = transaction.request
-        ack = Message()
-        ack.type = defines.Types['ACK']
-        async with transaction.lock:
-            if not message.acknowledged and message.type == defines.Types["CON"]:
-                ack = self.message_layer.send_empty(transaction, message, ack)
-                if ack.type is not None and ack.mid is not None:
-                    await self.send_datagram(ack)
+        if locked:
+            await self._send_ack(transaction, message)
+        else:
+            async with transaction.lock:
+                await self._send_ack(transaction, message)
+
+    async def _send_ack(self, transaction, message):
+        if not message.acknowledged and message.type == defines.Types["CON"]:
+            ack = Message()
+            ack.type = defines.Types['ACK']
+            ack = self.message_layer.send_empty(transaction, message, ack)
+            if ack.type is not None and ack.mid is not None:
+                await self.send_datagram(ack)
 
     async def notify(self, resource):
         """
         Notifies the observers of a certain resource.
 
+        The notifications are queued to the notification dispatcher and sent in the background, the caller does
+        not wait for the observers.
+
         :param resource: the resource
         """
-        observers = self.observe_layer.notify(resource)
         logger.debug("Notify")
-        for transaction in observers:
-            with transaction:
+        self.notifications.submit(self.observe_layer.notify(resource))
+
+    async def fan_out(self, observers):
+        """
+        Send notifications, one rendering per resource and equivalent requests.
+
+        The observers whose requests ask for the same representation share one rendering. Over UDP the options and
+        the payload of that rendering are serialized once, only the header and the token are written for every
+        observer.
+
+        :param observers: the (transaction, notification type) of the observers
+        """
+        groups = {}
+        observe = defines.OptionRegistry.OBSERVE.number
+        uri_query = defines.OptionRegistry.URI_QUERY.number
+        is_attribute = ObserveConditions.is_attribute
+        for transaction, notification_type in observers:
+            request = transaction.request
+            key = (transaction.resource, request.code, request.scheme,
+                   tuple((option.number, option.value) for option in request.options
+                         if option.number != observe
+                         and (option.number != uri_query or not is_attribute(option.value))))
+            group = groups.get(key)
+            if group is None:
+                groups[key] = ([transaction], [notification_type])
+            else:
+                group[0].append(transaction)
+                group[1].append(notification_type)
+        for group, types in groups.values():
+            await self._notify_group(group, types)
+
+    async def _notify_group(self, group, types):
+        """
+        Render a notification once and send it to a group of observers with equivalent requests.
+
+        :param group: the transactions of the observers
+        :param types: the message type of the notification of every observer
+        """
+        first = group[0]
+        first.response = None
+        await self.request_layer.receive_request(first)
+        self.observe_layer.send_response(first)
+        rendered = first.response
+        if rendered is None or rendered.code != defines.Codes.CONTENT.number or hasattr(rendered.payload, '__aiter__') \
+                or (rendered.payload is not None and len(rendered.payload) > defines.MAX_PAYLOAD):
+            # errors end the observations and large representations are sent block-wise, observer by observer
+            await self._send_notification(first, types[0])
+            for transaction, notification_type in zip(group[1:], types[1:]):
                 transaction.response = None
-                transaction = self.request_layer.receive_request(transaction)
-                transaction = self.observe_layer.send_response(transaction)
-                transaction = self.block_layer.send_response(transaction)
-                transaction = self.message_layer.send_response(transaction)
-                if transaction.response is not None:
-                    if transaction.response.type == defines.Types["CON"]:
-                        await self.start_retransmission(transaction, transaction.response)
+                await self.request_layer.receive_request(transaction)
+                self.observe_layer.send_response(transaction)
+                await self._send_notification(transaction, notification_type)
+            return
+
+        bodies = {}
+        endpoints = {}
+        for transaction, notification_type in zip(group, types):
+            request = transaction.request
+            if transaction is first:
+                response = rendered
+            else:
+                response = Response.init_notification(request, rendered)
+                transaction.response = response
+                transaction.resource = first.resource
+            response.type = notification_type
+            self.message_layer.send_response(transaction)
+            if notification_type == defines.Types["CON"]:
+                await self.start_retransmission(transaction, response)
 
-                    await self.send_datagram(transaction.response)
+            key = (request.scheme, request.destination, request.family)
+            endpoint = endpoints.get(key)
+            if endpoint is None:
+                endpoint = endpoints[key] = self.endpoint_layer.find_sending_endpoint(response)
+            serialize_body = getattr(endpoint.serializer, 'serialize_body', None) if endpoint else None
+            if serialize_body is None:
+                await self.send_datagram(response)
+                continue
+            body = bodies.get(endpoint.serializer)
+            if body is None:
+                body = bodies[endpoint.serializer] = serialize_body(rendered)
+            response.source = endpoint.address
+            endpoint.send(bytes(endpoint.serializer.serialize_header(response, body)), response.destination)
+
+    async def _send_notification(self, transaction, notification_type):
+        """
+        Send the notification rendered for one observer.
+
+        :param transaction: the transaction of the observer
+        :param notification_type: the message type of the notification
+        """
+        if not await self.block_layer.send_stream(transaction):
+            self.block_layer.send_response(transaction)
+        if transaction.response is not None:
+            transaction.response.type = notification_type
+        self.message_layer.send_response(transaction)
+        if transaction.response is not None:
+            if transaction.response.type == defines.Types["CON"]:
+                await self.start_retransmission(transaction, transaction.response)
+
+            await self.send_datagram(transaction.response)
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+from collections import deque
+
+from . import defines
+
+__author__ = 'Mikhail Razgovorov'
+logger = logging.getLogger('Bubot_CoAP')
+
+
+class BlockStream:
+    """
+    Body of a block-wise transfer handed over block by block while it arrives, as an async iterator of bytes.
+
+    The writer waits while depth blocks are queued, so that the body held at once is at most depth blocks
+    whatever its size. The transfer is stopped when the reader closes the stream, and an error ending the
+    transfer is raised by the reader once the blocks received before it are read.
+    """
+    __slots__ = ('size', 'depth', 'count', 'received', 'ended', 'closed', 'error', '_blocks', '_readable', '_room')
+
+    def __init__(self, size=None, depth=defines.STREAM_DEPTH):
+        """
+        Initialize the stream.
+
+        :param size: the size of the body if known, from Size1 or Size2
+        :param depth: the number of blocks queued before the writer waits for the reader
+        """
+        self.size = size
+        self.depth = depth
+        self.count = 0
+        self.received = 0
+        self.ended = False
+        self.closed = False
+        self.error = None
+        self._blocks = deque()
+        self._readable = asyncio.Event()
+        self._room = asyncio.Event()
+        self._room.set()
+
+    @classmethod
+    def of(cls, payload):
+        """
+        Return the stream of a body received whole.
+
+        :param payload: the body
+        :rtype: BlockStream
+        """
+        stream = cls(len(payload) if payload is not None else 0)
+        stream.feed(payload or b'', True)
+        return stream
+
+    def feed(self, data, last=False):
+        """
+        Queue a block without waiting for the reader.
+
+        :param data: the payload of the block
+        :param last: True, if the block ends the body
+        """
+        if self.closed or self.ended:
+            return
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if data:
+            self._blocks.append(bytes(data))
+        self.count += 1
+        self.received += len(data)
+        self.ended = last
+        self._readable.set()
+        if len(self._blocks) >= self.depth:
+            self._room.clear()
+
+    async def put(self, data, last=False):
+        """
+        Queue a block once the reader has room for it.
+
+        :param data: the payload of the block
+        :param last: True, if the block ends the body
+        """
+        await self._room.wait()
+        self.feed(data, last)
+
+    async def wait_room(self):
+        """
+        Wait until the reader has room for a further block.
+
+        :return: False, if no further block is wanted: the body ended or the reader closed the stream
+        """
+        await self._room.wait()
+        return not (self.closed or self.ended)
+
+    def abort(self, error):
+        """
+        End the body with an error, raised to the reader after the blocks already queued.
+
+        :param error: the exception
+        """
+        if self.closed or self.ended:
+            return
+        self.error = error
+        self.ended = True
+        self._readable.set()
+
+    def close(self):
+        """
+        Stop reading: the blocks queued are dropped and the writer is released.
+
+        """
+        self.closed = True
+        self._blocks.clear()
+        self._room.set()
+        self._readable.set()
+
+    async def read(self):
+        """
+        Read the rest of the body at once.
+
+        :return: the bytes not read yet
+        """
+        return b''.join([block async for block in self])
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._blocks:
+            if self.ended or self.closed:
+                if self.error is not None and not self.closed:
+                    raise self.error
+                raise StopAsyncIteration
+            self._readable.clear()
+            await self._readable.wait()
+        data = self._blocks.popleft()
+        if len(self._blocks) < self.depth:
+            self._room.set()
+        return data
+
+
+class BlockSource:
+    """
+    Body served block-wise from an async iterator of bytes, read when its blocks are asked for.
+
+    Only the block asked for and the bytes read ahead of it are held: the blocks are asked for in order, the
+    last one may be asked for again.
+    """
+    __slots__ = ('_chunks', '_buffer', '_offset', '_ended')
+
+    def __init__(self, chunks):
+        """
+        Initialize the source.
+
+        :param chunks: the async iterator of the bytes of the body
+        """
+        self._chunks = chunks.__aiter__()
+        self._buffer = bytearray()
+        self._offset = 0
+        self._ended = False
+
+    async def read(self, num, size):
+        """
+        Read a block of the body.
+
+        :param num: the number of the block
+        :param size: the size of the blocks
+        :raise ValueError: if the block was dropped already
+        :return: the payload of the block and True, if further blocks follow it
+        """
+        start = num * size
+        if start < self._offset:
+            raise ValueError(f'block {num} is no longer available')
+        while True:
+            # the bytes before the block are dropped as soon as they are read
+            skip = min(start - self._offset, len(self._buffer))
+            if skip:
+                del self._buffer[:skip]
+                self._offset += skip
+            if self._ended or self._offset + len(self._buffer) > start + size:
+                break
+            try:
+                chunk = await self._chunks.__anext__()
+            except StopAsyncIteration:
+                self._ended = True
+                continue
+            self._buffer += chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+        begin = start - self._offset
+        return bytes(self._buffer[begin:begin + size]), len(self._buffer) > begin + size
+
+    def close(self):
+        """
+        Close the async iterator of the body, if the transfer stops before its end.
+
+        """
+        self._buffer = bytearray()
+        aclose = getattr(self._chunks, 'aclose', None)
+        if aclose is not None and not self._ended:
+            try:
+                asyncio.get_running_loop().create_task(aclose())
+            except RuntimeError:
+                logger.debug('no running loop to close a streamed body')
+        self._ended = True
@@ -8,6 +8,10 @@ class Transaction(object):
     """
     Transaction object to bind together a request, a response and a resource.
     """
+    __slots__ = ('_response', '_request', '_resource', '_timestamp', '_completed', '_block_transfer', 'notification',
+                 'separate_timer', 'retransmission', '_lock', 'over_tcp', 'cacheHit',
+                 'cached_element')
+
     def __init__(self, request=None, response=None, resource=None, timestamp=None):
         """
         Initialize a Transaction object.
@@ -25,14 +29,24 @@ class Transaction(object):
         self._block_transfer = False
         self.notification = False
         self.separate_timer = None
-        self.retransmit_thread = None
-        self.retransmit_stop = None
-        self.lock = asyncio.Lock()
+        self.retransmission = None
+        self._lock = None
         self.over_tcp = request.scheme.endswith('tcp')
         # self.timer = None
         self.cacheHit = False
         self.cached_element = None
 
+    @property
+    def lock(self):
+        """
+        Return the lock of the transaction, created on first use.
+
+        :rtype: asyncio.Lock
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
     @property
     def response(self):
         """
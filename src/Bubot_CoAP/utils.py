@@ -2,6 +2,9 @@
 import asyncio
 import binascii
 import random
+import time
+import weakref
+from collections import deque
 from socket import AF_INET, AF_INET6, getaddrinfo
 from urllib.parse import urlparse, SplitResult
 
@@ -114,6 +117,21 @@ def parse_blockwise(value):
     return num, int(m), pow(2, (size + 4))
 
 
+def blockwise_value(num, m, size):
+    """
+    Encode the value of a block option.
+
+    :param num: the number of the block
+    :param m: the more flag
+    :param size: the size of the block, rounded up to a power of two from 16 to 1024
+    :return: the option value
+    """
+    szx = 0
+    while szx < 6 and 16 << szx < size:
+        szx += 1
+    return (num << 4) | (m << 3) | szx
+
+
 def byte_len(int_type):
     """
     Get the number of byte needed to encode the int passed.
@@ -121,16 +139,7 @@ def byte_len(int_type):
     :param int_type: the int to be converted
     :return: the number of bits needed to encode the int passed.
     """
-    length = 0
-    while int_type:
-        int_type >>= 1
-        length += 1
-    if length > 0:
-        if length % 8 != 0:
-            length = int(length / 8) + 1
-        else:
-            length = int(length / 8)
-    return length
+    return (int_type.bit_length() + 7) >> 3
 
 
 def host_port_join(host, port=None):
@@ -238,9 +247,76 @@ def create_logging():  # pragma: no cover
         f.writelines("datefmt=")
 
 
+_MISSING = object()
+
+
+class TreeNode(object):
+    """
+    Node of a Tree, one segment of a path.
+    """
+    __slots__ = ('key', 'value', 'children', 'order')
+
+    def __init__(self, key):
+        self.key = key
+        self.value = _MISSING
+        self.children = None  # type: dict[str, TreeNode]
+        self.order = None  # type: list[str]
+
+    def child(self, segment):
+        """
+        Get the child of a segment, created if missing.
+
+        :param segment: the segment
+        :rtype: TreeNode
+        """
+        children = self.children
+        if children is None:
+            children = self.children = {}
+        node = children.get(segment)
+        if node is None:
+            node = children[segment] = TreeNode(('' if self.key == '/' else self.key) + '/' + segment)
+            self.order = None
+        return node
+
+
 class Tree(object):
+    """
+    Paths of the resources of a server, as a trie of path segments with the dictionary API of the paths.
+
+    An exact lookup, a prefix match and an insertion visit one node per segment of the path, whatever the number of
+    paths. The children of a node are kept in a dictionary, their order is sorted again only when it is iterated
+    after a change, so the paths are listed in order without sorting them all. Removing a subtree only detaches its
+    node. The paths are matched by segments, the leading and trailing slashes are ignored. The version is incremented
+    by every change of the paths or of their values, and by the resources held when their attributes change.
+    """
+
     def __init__(self):
-        self.tree = {}
+        self._root = TreeNode('/')
+        self.version = 0
+        self._ref = weakref.ref(self)
+
+    @staticmethod
+    def _segments(key):
+        key = key.strip('/')
+        return key.split('/') if key else ()
+
+    def _hold(self, value):
+        # a resource held increments the version when its attributes change
+        try:
+            value.attributes.owner = self._ref
+        except AttributeError:
+            pass
+
+    def _find(self, key):
+        node = self._root
+        for segment in self._segments(key):
+            children = node.children
+            if children is None:
+                return None
+            node = children.get(segment)
+            if node is None:
+                return None
+        return node
 
     def dump(self):
         """
@@ -248,39 +324,233 @@ class Tree(object):
 
         :return: registered resources.
         """
-        return sorted(list(self.tree.keys()))
+        return [key for key, _ in self.items()]
+
+    def items(self, key='/'):
+        """
+        Iterate over the paths of a subtree and their values, a path before its children and the children in
+        the order of their segments.
+
+        :param key: the path of the subtree
+        :return: the (path, value) pairs
+        """
+        node = self._find(key)
+        if node is None:
+            return
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node.value is not _MISSING:
+                yield node.key, node.value
+            children = node.children
+            if children:
+                if node.order is None:
+                    node.order = sorted(children)
+                stack.extend(children[segment] for segment in reversed(node.order))
+
+    def _prefixes(self, path):
+        node = self._root
+        if node.value is not _MISSING:
+            yield node
+        for segment in self._segments(path):
+            children = node.children
+            if children is None:
+                return
+            node = children.get(segment)
+            if node is None:
+                return
+            if node.value is not _MISSING:
+                yield node
 
     def with_prefix(self, path):
-        ret = []
-        for key in list(self.tree.keys()):
-            if path.startswith(key):
-                ret.append(key)
+        """
+        Get the registered paths that are a prefix of a path.
 
-        if len(ret) > 0:
+        :param path: the path
+        :raise KeyError: if none is
+        :return: the paths, the shortest first
+        """
+        ret = [node.key for node in self._prefixes(path)]
+        if ret:
             return ret
-        raise KeyError
+        raise KeyError(path)
 
     def with_prefix_resource(self, path):
-        ret = []
-        for key, value in self.tree.items():
-            if path.startswith(key):
-                ret.append(value)
+        """
+        Get the values of the registered paths that are a prefix of a path.
 
-        if len(ret) > 0:
+        :param path: the path
+        :raise KeyError: if none is
+        :return: the values, of the shortest path first
+        """
+        ret = [node.value for node in self._prefixes(path)]
+        if ret:
             return ret
-        raise KeyError
+        raise KeyError(path)
+
+    def longest_prefix(self, path):
+        """
+        Get the longest registered path that is a prefix of a path.
+
+        :param path: the path
+        :raise KeyError: if none is
+        :return: the path and its value
+        """
+        found = None
+        for found in self._prefixes(path):
+            pass
+        if found is None:
+            raise KeyError(path)
+        return found.key, found.value
+
+    def fill(self, key, value):
+        """
+        Set a value at a path and at its prefixes without value, the paths with a value are kept.
+
+        :param key: the path
+        :param value: the value
+        :return: the longest path set or None if all of them had a value
+        """
+        node = self._root
+        filled = None
+        for segment in self._segments(key):
+            node = node.child(segment)
+            if node.value is _MISSING:
+                node.value = value
+                filled = node.key
+        if filled is not None:
+            self._hold(value)
+            self.version += 1
+        return filled
+
+    def fill_many(self, items):
+        """
+        Fill the paths of (path, value) pairs as fill does, in one pass. The parent of a path is not looked up again
+        when it is the parent of the previous path, so the siblings sorted together are inserted with a single
+        dictionary lookup each. The version is incremented once. Nothing is filled if a path is invalid or the
+        iteration of the pairs raises.
+
+        :param items: the (path, value) pairs
+        :raise ValueError: if a path has an empty segment
+        :return: the (longest path set, value) of the pairs setting one
+        """
+        filled = []
+        created = []
+        previous = None
+        parent = None
+        try:
+            for key, value in items:
+                path = key.strip('/')
+                if '//' in path:
+                    raise ValueError(f'empty segment in path {key}')
+                if not path:
+                    continue
+                head, _, leaf = path.rpartition('/')
+                last = None
+                if head != previous:
+                    parent = self._root
+                    for segment in self._segments(head):
+                        parent = parent.child(segment)
+                        if parent.value is _MISSING:
+                            parent.value = value
+                            last = parent.key
+                            created.append(last)
+                    previous = head
+                node = parent.child(leaf)
+                if node.value is _MISSING:
+                    node.value = value
+                    last = node.key
+                    created.append(last)
+                if last is not None:
+                    self._hold(value)
+                    filled.append((last, value))
+        except BaseException:
+            for key in reversed(created):
+                del self[key]
+            raise
+        if created:
+            self.version += 1
+        return filled
+
+    def get(self, key, default=None):
+        """
+        Get the value of a path.
+
+        :param key: the path
+        :param default: the value returned if the path is not registered
+        :return: the value
+        """
+        node = self._find(key)
+        if node is None or node.value is _MISSING:
+            return default
+        return node.value
+
+    def remove_subtree(self, key):
+        """
+        Remove a path and all the paths below it.
+
+        :param key: the path
+        :raise KeyError: if nothing is registered at or below the path
+        """
+        segments = self._segments(key)
+        if not segments:
+            if self._root.value is _MISSING and not self._root.children:
+                raise KeyError(key)
+            self._root = TreeNode('/')
+            self.version += 1
+            return
+        parent = self._find('/'.join(segments[:-1]))
+        if parent is None or parent.children is None or segments[-1] not in parent.children:
+            raise KeyError(key)
+        del parent.children[segments[-1]]
+        parent.order = None
+        self.version += 1
 
     def __getitem__(self, item):
-        return self.tree[item]
+        node = self._find(item)
+        if node is None or node.value is _MISSING:
+            raise KeyError(item)
+        return node.value
 
     def __setitem__(self, key, value):
-        self.tree[key] = value
+        node = self._root
+        for segment in self._segments(key):
+            node = node.child(segment)
+        if node.value is not value:
+            # storing the same value again, as a POST to an existing resource does, changes nothing
+            node.value = value
+            self._hold(value)
+            self.version += 1
 
     def __delitem__(self, key):
-        del self.tree[key]
+        segments = self._segments(key)
+        path = [self._root]
+        for segment in segments:
+            children = path[-1].children
+            node = children.get(segment) if children is not None else None
+            if node is None:
+                raise KeyError(key)
+            path.append(node)
+        node = path[-1]
+        if node.value is _MISSING:
+            raise KeyError(key)
+        node.value = _MISSING
+        self.version += 1
+        # the nodes left without value nor children are pruned
+        for index in range(len(path) - 1, 0, -1):
+            node = path[index]
+            if node.value is not _MISSING or node.children:
+                break
+            parent = path[index - 1]
+            del parent.children[segments[index - 1]]
+            parent.order = None
 
     def __contains__(self, item):
-        return item in self.tree
+        node = self._find(item)
+        return node is not None and node.value is not _MISSING
+
+    def __iter__(self):
+        return (key for key, _ in self.items())
 
 
 # This file is part of the Python aiocoap library project.
@@ -363,3 +633,192 @@ class Timer:
         self._ok = False
         self._task.cancel()
         await self._task
+
+
+class TimerWheel:
+    """
+    Hashed timing wheel that expires keys after a delay.
+
+    Deadlines are rounded up to the next tick and keys are kept in one bucket per tick, advancing the wheel
+    only visits the buckets of the elapsed ticks. Scheduling, rescheduling, cancelling and expiring a key
+    are O(1): a rescheduled or cancelled key stays in its old bucket and is skipped when that bucket is
+    reached, because its deadline no longer matches.
+    """
+
+    def __init__(self, on_expire, tick=1.0, clock=time.monotonic, history=60):
+        """
+        Initialize the wheel.
+
+        :param on_expire: callback called with the key of every expired entry
+        :param tick: the resolution of the wheel in seconds
+        :param clock: the time source
+        :param history: the number of ticks kept in expired_per_tick
+        """
+        self.tick = tick
+        self._on_expire = on_expire
+        self._clock = clock
+        self._deadlines = {}
+        self._buckets = {}
+        self._current = int(clock() // tick)
+        self.expired_total = 0
+        self.expired_per_tick = deque(maxlen=history)
+
+    def schedule(self, key, delay):
+        """
+        Expire a key after a delay, replacing its previous deadline.
+
+        :param key: the key
+        :param delay: the delay in seconds
+        """
+        deadline = -int(-(self._clock() + delay) // self.tick)
+        if deadline <= self._current:
+            deadline = self._current + 1
+        self._deadlines[key] = deadline
+        bucket = self._buckets.get(deadline)
+        if bucket is None:
+            self._buckets[deadline] = [key]
+        else:
+            bucket.append(key)
+
+    def cancel(self, key):
+        """
+        Forget a key without expiring it.
+
+        :param key: the key
+        """
+        self._deadlines.pop(key, None)
+
+    def advance(self, now=None):
+        """
+        Expire the keys whose deadline has passed.
+
+        :param now: the current time, by default read from the clock
+        :return: the number of expired keys
+        """
+        if now is None:
+            now = self._clock()
+        target = int(now // self.tick)
+        expired = 0
+        deadlines = self._deadlines
+        while self._current < target:
+            self._current += 1
+            bucket = self._buckets.pop(self._current, None)
+            if bucket is None:
+                continue
+            for key in bucket:
+                if deadlines.get(key) == self._current:
+                    del deadlines[key]
+                    expired += 1
+                    self._on_expire(key)
+        self.expired_total += expired
+        self.expired_per_tick.append(expired)
+        return expired
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, key):
+        return key in self._deadlines
+
+
+class DeadlineHeap:
+    """
+    Binary min-heap of entries ordered by their deadline attribute.
+
+    Every entry keeps its own position in the heap in its index attribute, so an entry can be removed
+    from the middle of the heap in O(log n) without searching for it. The index of an entry that is not
+    in the heap is None.
+    """
+
+    def __init__(self):
+        self._heap = []
+
+    def push(self, entry):
+        """
+        Add an entry.
+
+        :param entry: an object with deadline and index attributes
+        """
+        entry.index = len(self._heap)
+        self._heap.append(entry)
+        self._sift_up(entry.index)
+
+    def peek(self):
+        """
+        Return the entry with the earliest deadline without removing it.
+
+        :return: the entry or None if the heap is empty
+        """
+        return self._heap[0] if self._heap else None
+
+    def pop(self):
+        """
+        Remove and return the entry with the earliest deadline.
+
+        :return: the entry
+        """
+        entry = self._heap[0]
+        self.remove(entry)
+        return entry
+
+    def remove(self, entry):
+        """
+        Remove an entry, do nothing if it is not in the heap.
+
+        :param entry: the entry
+        """
+        index = entry.index
+        if index is None:
+            return
+        heap = self._heap
+        last = heap.pop()
+        entry.index = None
+        if last is entry:
+            return
+        heap[index] = last
+        last.index = index
+        if index and last.deadline < heap[(index - 1) >> 1].deadline:
+            self._sift_up(index)
+        else:
+            self._sift_down(index)
+
+    def _sift_up(self, index):
+        heap = self._heap
+        entry = heap[index]
+        while index:
+            parent_index = (index - 1) >> 1
+            parent = heap[parent_index]
+            if entry.deadline >= parent.deadline:
+                break
+            heap[index] = parent
+            parent.index = index
+            index = parent_index
+        heap[index] = entry
+        entry.index = index
+
+    def _sift_down(self, index):
+        heap = self._heap
+        size = len(heap)
+        entry = heap[index]
+        while True:
+            child_index = 2 * index + 1
+            if child_index >= size:
+                break
+            child = heap[child_index]
+            right_index = child_index + 1
+            if right_index < size and heap[right_index].deadline < child.deadline:
+                child_index = right_index
+                child = heap[right_index]
+            if entry.deadline <= child.deadline:
+                break
+            heap[index] = child
+            child.index = index
+            index = child_index
+        heap[index] = entry
+        entry.index = index
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __bool__(self):
+        return bool(self._heap)
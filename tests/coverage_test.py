@@ -1306,7 +1306,8 @@ class Tests(unittest.IsolatedAsyncioTestCase):
         expected._mid = self.current_mid
         expected.code = defines.Codes.VALID.number
         #  expected.token = None
-        expected.payload = b"test"
+        # 2.03 Valid is answered before rendering, without the representation
+        expected.payload = None
         expected.etag = bytes("1", "utf-8")
 
         exchange3 = (req, expected)
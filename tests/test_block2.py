@@ -0,0 +1,80 @@
+import unittest
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.layers.block_layer import BlockLayer
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.messages.response import Response
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.transaction import Transaction
+
+BODY = bytes(range(256)) * 10
+
+
+def get(layer, resource, port, num=None, body=BODY, transaction=None):
+    request = Request()
+    request.type = defines.Types['CON']
+    request.code = defines.Codes.GET.number
+    request.token = b'\x01'
+    request._source = ('127.0.0.1', port)
+    request._destination = ('127.0.0.1', 5683)
+    request.scheme = 'coap'
+    if num is not None:
+        request.block2 = (num, 0, 1024)
+    if transaction is None:
+        transaction = Transaction(request=request, resource=resource)
+        layer.receive_request(transaction)
+        transaction.response = Response.init_from_request(request)
+        transaction.response.code = defines.Codes.CONTENT.number
+        transaction.response.etag = b'v1'
+        transaction.response.payload = body
+    else:
+        # continuation of the transfer on the same exchange
+        transaction.request = request
+        layer.receive_request(transaction)
+    layer.send_response(transaction)
+    return transaction
+
+
+class TestBlock2(unittest.TestCase):
+
+    def test_shared_snapshot(self):
+        layer = BlockLayer()
+        resource = Resource('big')
+        first = get(layer, resource, 1)
+        second = get(layer, resource, 2)
+        self.assertEqual(len(layer._snapshots), 1)
+        self.assertIsInstance(first.response.payload, memoryview)
+        self.assertIs(first.response.payload.obj, second.response.payload.obj)
+        self.assertEqual(first.response.block2, (0, 1, 1024))
+        self.assertEqual(first.response.size2, len(BODY))
+
+        received = bytes(first.response.payload)
+        for num in (1, 2):
+            get(layer, resource, 1, num, transaction=first)
+            received += bytes(first.response.payload)
+        self.assertEqual(first.response.block2, (2, 0, 1024))
+        self.assertEqual(received, BODY)
+        # the finished transfer is forgotten, the snapshot lives on with the other one
+        self.assertNotIn((('127.0.0.1', 1), b'\x01'), layer._block2_receive)
+        self.assertEqual(len(layer._snapshots), 1)
+
+        # a block asked again out of order
+        get(layer, resource, 2, 0, transaction=second)
+        self.assertEqual(bytes(second.response.payload), BODY[:1024])
+        layer.purge((('127.0.0.1', 2), b'\x01'))
+        self.assertEqual(layer._snapshots, {})
+        self.assertEqual(layer._block2_receive, {})
+
+    def test_new_rendering(self):
+        layer = BlockLayer()
+        resource = Resource('big')
+        transaction = get(layer, resource, 1)
+        get(layer, resource, 1, 1, transaction=transaction)
+        # a notification renders the resource again on the same exchange
+        transaction.response = Response.init_from_request(transaction.request)
+        transaction.response.etag = b'v2'
+        transaction.response.payload = BODY[::-1]
+        layer.send_response(transaction)
+        self.assertEqual(transaction.response.block2, (0, 1, 1024))
+        self.assertEqual(bytes(transaction.response.payload), BODY[::-1][:1024])
+        self.assertEqual([key[1] for key in layer._snapshots], [b'v2'])
@@ -0,0 +1,189 @@
+import asyncio
+import unittest
+from socket import AF_INET
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.cache import Cache
+from Bubot_CoAP.layers.cache_layer import CacheLayer
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.messages.response import Response
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.server import Server
+from Bubot_CoAP.transaction import Transaction
+
+SERVER_PORT = 25851
+CLIENT_PORT = 25852
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def request(path, code=defines.Codes.GET.number, payload=None, port=SERVER_PORT):
+    message = Request()
+    message.type = defines.Types['CON']
+    message.code = code
+    message.uri_path = path
+    message._destination = ('127.0.0.1', port)
+    message._source = ('127.0.0.1', CLIENT_PORT)
+    message.family = AF_INET
+    message.scheme = 'coap'
+    message.payload = payload
+    return message
+
+
+def response(code=defines.Codes.CONTENT.number, payload=None, etag=None, max_age=None):
+    message = Response()
+    message.code = code
+    message.payload = payload
+    if etag is not None:
+        message.etag = etag
+    if max_age is not None:
+        message.max_age = max_age
+    return message
+
+
+class Counter(Resource):
+    def __init__(self, name='counter'):
+        super().__init__(name, observable=False)
+        self.payload = b'value'
+        self.etag = b'1'
+        self.max_age = 60
+        self.rendered = 0
+
+    def render_GET(self, request):
+        self.rendered += 1
+        return self
+
+    def render_PUT(self, request):
+        self.payload = request.payload
+        self.etag = b'2'
+        return self
+
+
+class TestCache(unittest.TestCase):
+
+    def test_key(self):
+        cache = Cache(defines.CLIENT_CACHE)
+        first = request('a/b')
+        second = request('a/b')
+        second.etag = b'x'
+        self.assertEqual(cache.key(first), cache.key(second))
+        second.accept = defines.Content_types['application/json']
+        self.assertNotEqual(cache.key(first)[0], cache.key(second)[0])
+        self.assertEqual(cache.key(first)[1], cache.key(second)[1])
+        self.assertNotEqual(cache.key(first), cache.key(request('a/b', port=SERVER_PORT + 10)))
+        self.assertEqual(Cache(defines.FORWARD_PROXY).key(first),
+                         Cache(defines.FORWARD_PROXY).key(request('a/b', port=SERVER_PORT + 10)))
+        self.assertIsNone(cache.key(request('a/b', defines.Codes.PUT.number)))
+        first.observe = 0
+        self.assertIsNone(cache.key(first))
+
+    def test_lru(self):
+        cache = Cache(defines.CLIENT_CACHE, max_entries=2, max_bytes=10)
+        keys = [cache.key(request(f'r{index}')) for index in range(4)]
+        cache.store(*keys[0], response(payload=b'1234'))
+        cache.store(*keys[1], response(payload=b'1234'))
+        cache.search(keys[0][0])
+        cache.store(*keys[2], response(payload=b'12'))
+        # the least recently used one is dropped for the entries
+        self.assertIsNone(cache.search(keys[1][0]))
+        self.assertEqual(len(cache), 2)
+        cache.store(*keys[3], response(payload=b'123456'))
+        # and for the bytes
+        self.assertIsNone(cache.search(keys[0][0]))
+        self.assertEqual(cache.size, 8)
+        self.assertEqual(cache.evictions, 2)
+        self.assertIsNone(cache.store(*keys[0], response(payload=b'12345678901')))
+        self.assertIsNone(cache.store(*keys[0], response(payload=b'1', max_age=0)))
+        self.assertIsNone(cache.store(*keys[0], response(defines.Codes.CHANGED.number)))
+        self.assertEqual(cache.invalidate(keys[3][1]), 1)
+        self.assertEqual((len(cache), cache.size), (1, 2))
+
+    def test_layer(self):
+        clock = Clock()
+        layer = CacheLayer(defines.CLIENT_CACHE, clock=clock)
+        first = request('res')
+        self.assertEqual(layer.send_request(first), (None, None))
+        self.assertIs(layer.receive_response(first, response(payload=b'v1', etag=b'1', max_age=10)).payload, b'v1')
+
+        # fresh
+        clock.now += 4
+        second = request('res')
+        cached, validated = layer.send_request(second)
+        self.assertEqual((cached.code, cached.payload, cached.max_age), (defines.Codes.CONTENT.number, b'v1', 6))
+        self.assertEqual(cached.destination, second.source)
+        third = request('res')
+        third.etag = b'1'
+        cached, validated = layer.send_request(third)
+        self.assertEqual((cached.code, cached.payload), (defines.Codes.VALID.number, None))
+        self.assertEqual((layer.hits, layer.misses), (2, 1))
+
+        # stale, validated with its ETag
+        clock.now += 10
+        fourth = request('res')
+        cached, validated = layer.send_request(fourth)
+        self.assertIsNone(cached)
+        self.assertIsNotNone(validated)
+        self.assertEqual(fourth.etag, [b'1'])
+        answer = layer.receive_response(fourth, response(defines.Codes.VALID.number, etag=b'1', max_age=30), validated)
+        self.assertEqual((answer.code, answer.payload, answer.max_age), (defines.Codes.CONTENT.number, b'v1', 30))
+        self.assertEqual(fourth.etag, [])
+        self.assertEqual(layer.cache.validations, 1)
+        clock.now += 20
+        self.assertEqual(layer.send_request(request('res'))[0].payload, b'v1')
+
+        # changed
+        layer.receive_response(request('res', defines.Codes.PUT.number), response(defines.Codes.CHANGED.number))
+        self.assertEqual(len(layer.cache), 0)
+        self.assertEqual(layer.send_request(request('res')), (None, None))
+
+    def test_proxy(self):
+        layer = CacheLayer(defines.FORWARD_PROXY, clock=Clock())
+        transaction = Transaction(request=request('res'))
+        transaction.request.token = b'\x01'
+        layer.receive_request(transaction)
+        self.assertFalse(transaction.cacheHit)
+        transaction.response = Response.init_from_request(transaction.request)
+        transaction.response.code = defines.Codes.CONTENT.number
+        transaction.response.payload = b'v1'
+        layer.send_response(transaction)
+        transaction = Transaction(request=request('res'))
+        transaction.request.token = b'\x02'
+        layer.receive_request(transaction)
+        self.assertTrue(transaction.cacheHit)
+        self.assertEqual(transaction.response.payload, b'v1')
+        self.assertEqual(transaction.response.token, b'\x02')
+
+    def test_client(self):
+        async def main():
+            server = Server()
+            client = Server(cache=True)
+            await server.add_endpoint(f'coap://127.0.0.1:{SERVER_PORT}')
+            await client.add_endpoint(f'coap://127.0.0.1:{CLIENT_PORT}')
+            resource = Counter()
+            server.add_resource('/counter', resource)
+
+            for _ in range(3):
+                answer = await client.send_message(request('counter'), timeout=10)
+                self.assertEqual((answer.code, answer.payload), (defines.Codes.CONTENT.number, b'value'))
+            self.assertEqual(resource.rendered, 1)
+            self.assertEqual((client.cache_layer.hits, client.cache_layer.misses), (2, 1))
+
+            answer = await client.send_message(request('counter', defines.Codes.PUT.number, b'changed'), timeout=10)
+            self.assertEqual(answer.code, defines.Codes.CHANGED.number)
+            answer = await client.send_message(request('counter'), timeout=10)
+            self.assertEqual(answer.payload, b'changed')
+            self.assertEqual(resource.rendered, 2)
+            await client.close()
+            await server.close()
+
+        asyncio.run(main())
+
+
+if __name__ == '__main__':
+    unittest.main()
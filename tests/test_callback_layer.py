@@ -0,0 +1,158 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from bubot_helpers.ExtException import ExtException
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.layers.callback_layer import CallbackLayer
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.messages.response import Response
+
+PEER = ('127.0.0.1', 5683)
+OTHER = ('127.0.0.1', 5684)
+
+
+def request(token, destination=PEER):
+    message = Request()
+    message.type = defines.Types['CON']
+    message.code = defines.Codes.GET.number
+    message.token = token
+    message.destination = destination
+    return message
+
+
+def response(token, source=PEER):
+    message = Response()
+    message.code = defines.Codes.CONTENT.number
+    message.token = token
+    message.source = source
+    return message
+
+
+class TestCallbackLayer(unittest.TestCase):
+
+    def test_nstart(self):
+        async def main():
+            layer = CallbackLayer(SimpleNamespace(nstart=1, probing_rate=defines.PROBING_RATE))
+            sent = []
+
+            def call(token, destination=PEER):
+                async def send():
+                    sent.append(token)
+                return asyncio.create_task(layer.wait(request(token, destination), timeout=1, send=send))
+
+            first, second, third = call(b'1'), call(b'2'), call(b'3')
+            other = call(b'4', OTHER)
+            await asyncio.sleep(0.01)
+            self.assertEqual(sent, [b'1', b'4'])
+            self.assertEqual(layer.queue_depth(PEER), 2)
+            self.assertEqual(layer.queue_depth(), 2)
+
+            layer.set_result(response(b'1'))
+            await asyncio.sleep(0.01)
+            self.assertEqual(first.result().token, b'1')
+            self.assertEqual(sent, [b'1', b'4', b'2'])
+            self.assertEqual(layer.queue_depth(PEER), 1)
+
+            for token, source in ((b'2', PEER), (b'3', PEER), (b'4', OTHER)):
+                await asyncio.sleep(0.01)
+                layer.set_result(response(token, source))
+            await asyncio.gather(second, third, other)
+            self.assertEqual(sent, [b'1', b'4', b'2', b'3'])
+            self.assertEqual(layer.queued_total, 2)
+            self.assertGreater(layer.wait_time_max, 0)
+            self.assertIsNone(layer.queue(PEER))
+        asyncio.run(main())
+
+    def test_timeout_while_queued(self):
+        async def main():
+            layer = CallbackLayer(SimpleNamespace(nstart=1, probing_rate=defines.PROBING_RATE))
+            sent = []
+
+            async def send():
+                sent.append(True)
+            first = asyncio.create_task(layer.wait(request(b'1'), timeout=1, send=send))
+            await asyncio.sleep(0)
+            with self.assertRaises(asyncio.TimeoutError):
+                await layer.wait(request(b'2'), timeout=0.02, send=send)
+            self.assertEqual(sent, [True])
+            self.assertEqual(layer.queue_depth(PEER), 0)
+            layer.set_result(response(b'1'))
+            await first
+            self.assertIsNone(layer.queue(PEER))
+        asyncio.run(main())
+
+    def test_probing_rate(self):
+        async def main():
+            layer = CallbackLayer(SimpleNamespace(nstart=1, probing_rate=100))
+            loop = asyncio.get_running_loop()
+            sent = []
+
+            async def send():
+                sent.append(loop.time())
+            with self.assertRaises(asyncio.TimeoutError):
+                await layer.wait(request(b'1'), timeout=0.01, send=send)
+            self.assertFalse(layer.queue(PEER).responsive)
+
+            probe = request(b'2')
+            task = asyncio.create_task(layer.wait(probe, timeout=1, send=send))
+            await asyncio.sleep(0.1)
+            layer.set_result(response(b'2'))
+            await task
+            self.assertGreaterEqual(sent[1] - sent[0], layer.probe_size(probe) / 100)
+            self.assertIsNone(layer.queue(PEER))
+        asyncio.run(main())
+
+    def test_unresponsive_peers_dropped(self):
+        async def main():
+            layer = CallbackLayer(SimpleNamespace(nstart=1, probing_rate=100))
+            peers = [('127.0.0.1', 6000 + index) for index in range(50)]
+
+            async def send():
+                pass
+            for peer in peers:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await layer.wait(request(b'1', peer), timeout=0.01, send=send)
+            # the pacing of the last ones is still due
+            self.assertFalse(layer.queue(peers[-1]).responsive)
+            await asyncio.sleep(0.1)
+            self.assertEqual([peer for peer in peers if layer.queue(peer) is not None], [])
+
+            # a pacing already due when the request times out is not kept
+            layer.probing_rate = 1e9
+            with self.assertRaises(asyncio.TimeoutError):
+                await layer.wait(request(b'2'), timeout=0.01, send=send)
+            self.assertIsNone(layer.queue(PEER))
+        asyncio.run(main())
+
+    def test_cancel_keeps_peer_responsive(self):
+        async def main():
+            layer = CallbackLayer(SimpleNamespace(nstart=1, probing_rate=defines.PROBING_RATE))
+            loop = asyncio.get_running_loop()
+            sent = []
+
+            async def send():
+                sent.append(loop.time())
+
+            async def fail():
+                raise OSError('network unreachable')
+            task = asyncio.create_task(layer.wait(request(b'1'), timeout=5, send=send))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertIsNone(layer.queue(PEER))
+            with self.assertRaises(ExtException):
+                await layer.wait(request(b'2'), timeout=5, send=fail)
+            self.assertIsNone(layer.queue(PEER))
+
+            # the next request is sent at once, not paced at the probing rate
+            start = loop.time()
+            task = asyncio.create_task(layer.wait(request(b'3'), timeout=5, send=send))
+            await asyncio.sleep(0.01)
+            self.assertEqual(len(sent), 2)
+            self.assertLess(sent[1] - start, 0.01)
+            layer.set_result(response(b'3'))
+            await task
+        asyncio.run(main())
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from socket import AF_INET
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.resources.file_resource import FileResource
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.server import Server
+from Bubot_CoAP.transaction import Transaction
+
+SERVER_PORT = 25871
+CLIENT_PORT = 25872
+
+
+class Counter(Resource):
+    def __init__(self, name='counter'):
+        super().__init__(name)
+        self.payload = b'value'
+        self.etag = b'1'
+        self.max_age = 30
+        self.rendered = 0
+
+    def render_GET(self, request):
+        self.rendered += 1
+        return self
+
+
+class Computed(Resource):
+    def __init__(self, name='computed'):
+        super().__init__(name)
+        self.version = 1
+        self.rendered = 0
+
+    def current_etag(self, request):
+        return self.version.to_bytes(2, 'big')
+
+    async def render_GET(self, request, response):
+        self.rendered += 1
+        response.payload = b'v%d' % self.version
+        response.etag = self.current_etag(request)
+        return self, response
+
+
+def request(path, etag=None):
+    message = Request()
+    message.type = defines.Types['CON']
+    message.code = defines.Codes.GET.number
+    message.token = b'\x01'
+    message.uri_path = path
+    message._destination = ('127.0.0.1', SERVER_PORT)
+    message._source = ('127.0.0.1', CLIENT_PORT)
+    message.family = AF_INET
+    message.scheme = 'coap'
+    message.acknowledged = True
+    if etag is not None:
+        message.etag = etag
+    return message
+
+
+class TestConditional(unittest.TestCase):
+
+    def test_valid(self):
+        async def main():
+            server = Server()
+            counter = Counter()
+            computed = Computed()
+            server.add_resource('/counter', counter)
+            server.add_resource('/computed', computed)
+
+            async def send(message):
+                return (await server.request_layer.receive_request(Transaction(request=message))).response
+
+            response = await send(request('counter', b'1'))
+            self.assertEqual((response.code, response.payload), (defines.Codes.VALID.number, None))
+            self.assertEqual((response.etag, response.max_age), ([b'1'], 30))
+            self.assertEqual(counter.rendered, 0)
+            message = request('counter', b'0')
+            message.etag = b'1'
+            self.assertEqual((await send(message)).code, defines.Codes.VALID.number)
+            response = await send(request('counter', b'0'))
+            self.assertEqual((response.code, response.payload), (defines.Codes.CONTENT.number, b'value'))
+            self.assertEqual(counter.rendered, 1)
+
+            # the registrations and the blocks after the first are rendered
+            message = request('counter', b'1')
+            message.observe = 0
+            self.assertEqual((await send(message)).code, defines.Codes.CONTENT.number)
+            message = request('counter', b'1')
+            message.block2 = (1, 0, 16)
+            self.assertEqual((await send(message)).code, defines.Codes.CONTENT.number)
+            self.assertEqual(counter.rendered, 3)
+
+            response = await send(request('computed', b'\x00\x01'))
+            self.assertEqual(response.code, defines.Codes.VALID.number)
+            computed.version = 2
+            response = await send(request('computed', b'\x00\x01'))
+            self.assertEqual((response.code, response.payload), (defines.Codes.CONTENT.number, b'v2'))
+            self.assertEqual(computed.rendered, 1)
+            await server.close()
+
+        asyncio.run(main())
+
+    def test_file(self):
+        async def main():
+            with tempfile.TemporaryDirectory() as directory:
+                file_path = os.path.join(directory, 'firmware.bin')
+                with open(file_path, 'wb') as file:
+                    file.write(b'firmware')
+                server = Server()
+                client = Server()
+                await server.add_endpoint(f'coap://127.0.0.1:{SERVER_PORT}')
+                await client.add_endpoint(f'coap://127.0.0.1:{CLIENT_PORT}')
+                resource = FileResource('firmware', file_path)
+                server.add_resource('/firmware', resource)
+
+                response = await client.send_message(request('firmware'), timeout=10)
+                self.assertEqual((response.code, response.payload), (defines.Codes.CONTENT.number, b'firmware'))
+                etag = response.etag[0]
+                response = await client.send_message(request('firmware', etag), timeout=10)
+                self.assertEqual((response.code, response.payload), (defines.Codes.VALID.number, None))
+                self.assertEqual(response.etag, [etag])
+
+                os.remove(file_path)
+                self.assertIsNone(resource.current_etag(None))
+                response = await client.send_message(request('firmware', etag), timeout=10)
+                self.assertEqual(response.code, defines.Codes.NOT_FOUND.number)
+                await client.close()
+                await server.close()
+
+        asyncio.run(main())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import asyncio
+import unittest
+from socket import AF_INET
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.server import Server
+
+SERVER_PORT = 25841
+CLIENT_PORT = 25842
+
+
+def request(query=None):
+    message = Request()
+    message.type = defines.Types['CON']
+    message.code = defines.Codes.GET.number
+    message.uri_path = '.well-known/core'
+    message._destination = ('127.0.0.1', SERVER_PORT)
+    message._source = ('127.0.0.1', CLIENT_PORT)
+    message.family = AF_INET
+    message.scheme = 'coap'
+    if query is not None:
+        message.uri_query = query
+    return message
+
+
+def sensor(name, rt, interface='oic.if.s'):
+    resource = Resource(name, observable=False)
+    resource.resource_type = rt
+    resource.interface_type = interface
+    return resource
+
+
+class TestDiscovery(unittest.TestCase):
+
+    def test_render(self):
+        async def main():
+            server = Server()
+            server.add_resource('/light', sensor('light', 'oic.r.light'))
+            server.add_resource('/temp', sensor('temp', 'oic.r.temperature', 'oic.if.a'))
+            server.add_resource('/hidden', Resource('hidden', visible=False))
+            server.add_resource('/obs', Resource('obs'))
+            discovery = server.discovery
+            self.assertEqual(discovery.render(), b'</light>;if="oic.if.s";rt="oic.r.light",</obs>;obs,'
+                                                 b'</temp>;if="oic.if.a";rt="oic.r.temperature",')
+            self.assertIs(discovery.render(''), discovery.render())
+            self.assertEqual(discovery.render('rt=oic.r.light'), b'</light>;if="oic.if.s";rt="oic.r.light",')
+            self.assertEqual(discovery.render('if=oic.if.a&rt=oic.r.temperature'),
+                             b'</temp>;if="oic.if.a";rt="oic.r.temperature",')
+            self.assertEqual(discovery.render('if=oic.if.a&rt=oic.r.light'), b'')
+            self.assertEqual(discovery.render('rt=oic.r.none'), b'')
+            self.assertEqual(discovery.render('rt'), discovery.render())
+
+            # the attributes changed, set or in place, and the resources removed are seen by the next query
+            server.root['/light'].resource_type = 'oic.r.temperature'
+            self.assertEqual(discovery.render('rt=oic.r.temperature').count(b'<'), 2)
+            server.root['/temp'].attributes['title'] = 'kitchen'
+            self.assertEqual(discovery.render('title=kitchen'),
+                             b'</temp>;if="oic.if.a";rt="oic.r.temperature";title=kitchen,')
+            server.remove_resource('/temp')
+            self.assertEqual(discovery.render('title=kitchen'), b'')
+            self.assertEqual(discovery.render('rt=oic.r.temperature').count(b'<'), 1)
+            await server.close()
+
+        asyncio.run(main())
+
+    def test_invalidation(self):
+        async def main():
+            first = Server()
+            second = Server()
+            light = sensor('light', 'oic.r.light')
+            first.add_resource('/light', light)
+            second.add_resource('/temp', sensor('temp', 'oic.r.temperature'))
+            document = second.discovery.render()
+            version = second.root.version
+
+            # the attributes of a resource only invalidate the document of the servers holding it
+            light.resource_type = 'oic.r.switch'
+            self.assertIn(b'oic.r.switch', first.discovery.render())
+            self.assertEqual(second.root.version, version)
+            self.assertIs(second.discovery.render(), document)
+
+            # storing the same resource again, as a POST to it does, keeps the document
+            version = first.root.version
+            first.root['/light'] = light
+            self.assertEqual(first.root.version, version)
+            light.attributes = {'rt': 'oic.r.light'}
+            self.assertEqual(first.discovery.render(), b'</light>;rt="oic.r.light",')
+            await first.close()
+            await second.close()
+
+        asyncio.run(main())
+
+    def test_block2(self):
+        async def main():
+            server = Server()
+            client = Server()
+            await server.add_endpoint(f'coap://127.0.0.1:{SERVER_PORT}')
+            await client.add_endpoint(f'coap://127.0.0.1:{CLIENT_PORT}')
+            for index in range(100):
+                server.add_resource(f'/dev/{index}', sensor(str(index), f'oic.r.type{index % 4}'))
+            document = server.discovery.render()
+            self.assertGreater(len(document), 4 * defines.MAX_PAYLOAD)
+
+            response = await client.send_message(request(), timeout=20)
+            self.assertEqual(response.content_type, defines.Content_types['application/link-format'])
+            self.assertEqual(response.payload, document)
+            response = await client.send_message(request('rt=oic.r.type1'), timeout=20)
+            self.assertEqual(response.payload, server.discovery.render('rt=oic.r.type1'))
+            self.assertEqual(response.payload.count(b'<'), 25)
+            await client.close()
+            await server.close()
+
+        asyncio.run(main())
+
+
+if __name__ == '__main__':
+    unittest.main()
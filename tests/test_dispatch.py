@@ -0,0 +1,128 @@
+import asyncio
+import unittest
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.serializer import Serializer
+from Bubot_CoAP.server import Server
+from Bubot_CoAP.transaction import Transaction
+
+
+class Basic(Resource):
+    def __init__(self, name='basic'):
+        super().__init__(name)
+        self.payload = 'basic'
+
+    def render_GET(self, request):
+        return self
+
+    async def render_PUT(self, request):
+        self.payload = request.payload
+        return self
+
+    async def render_POST(self, request):
+        resource = Basic('child')
+        resource.payload = request.payload
+        return resource
+
+    async def render_DELETE(self, request):
+        return self, self.render_DELETE_separate
+
+    async def render_DELETE_separate(self, request):
+        return True
+
+
+class Advanced(Resource):
+    def __init__(self, name='advanced'):
+        super().__init__(name)
+        self.data = b'advanced'
+
+    async def render_GET(self, request, response):
+        response.payload = self.data
+        return self, response
+
+    async def render_PUT_advanced(self, request, response):
+        return self, response, self.render_PUT_separate
+
+    async def render_PUT_separate(self, request, response):
+        self.data = request.payload
+        return self, response
+
+
+def request(code, path, payload=None):
+    message = Request()
+    message.type = defines.Types['CON']
+    message.code = code
+    message.token = b'\x01'
+    message.uri_path = path
+    message._source = ('127.0.0.1', 5684)
+    message._destination = ('127.0.0.1', 5683)
+    message.scheme = 'coap'
+    message.payload = payload
+    message.acknowledged = True
+    return message
+
+
+class TestDispatch(unittest.TestCase):
+
+    def test_method_table(self):
+        get, post, put, delete = (code.number for code in (
+            defines.Codes.GET, defines.Codes.POST, defines.Codes.PUT, defines.Codes.DELETE))
+        self.assertEqual(Resource.methods, {})
+        self.assertEqual(set(Basic.methods), {get, post, put, delete})
+        self.assertFalse(Basic.methods[get].advanced)
+        self.assertFalse(Basic.methods[get].coroutine)
+        self.assertTrue(Basic.methods[put].coroutine)
+        self.assertEqual(set(Advanced.methods), {get, put})
+        self.assertTrue(Advanced.methods[get].advanced)
+        self.assertIs(Advanced.methods[put].function, Advanced.render_PUT_advanced)
+        self.assertIs(Advanced().methods, Advanced.methods)
+
+    def test_dispatch(self):
+        async def main():
+            server = Server()
+            server.add_resource('/basic', Basic())
+            server.add_resource('/advanced', Advanced())
+
+            async def send(code, path, payload=None):
+                transaction = Transaction(request=request(code, path, payload))
+                return await server.request_layer.receive_request(transaction)
+
+            transaction = await send(defines.Codes.GET.number, 'basic')
+            self.assertEqual(transaction.response.code, defines.Codes.CONTENT.number)
+            # the payload of a basic resource is encoded, the response is logged and sent as it is
+            self.assertEqual(transaction.response.payload, b'basic')
+            transaction.response.type = defines.Types['ACK']
+            transaction.response.mid = 1
+            self.assertTrue(transaction.response.line_print.endswith('basic...5 bytes'))
+            self.assertTrue(Serializer.serialize(transaction.response).raw.endswith(b'\xffbasic'))
+            transaction = await send(defines.Codes.PUT.number, 'basic', 'changed')
+            self.assertEqual(transaction.response.code, defines.Codes.CHANGED.number)
+            self.assertEqual(server.root['/basic'].payload, 'changed')
+            transaction = await send(defines.Codes.POST.number, 'basic/child', 'created')
+            self.assertEqual(transaction.response.code, defines.Codes.CREATED.number)
+            self.assertEqual(transaction.response.location_path, 'basic/child')
+            self.assertEqual(server.root['/basic/child'].payload, 'created')
+            transaction = await send(defines.Codes.DELETE.number, 'basic/child')
+            self.assertEqual(transaction.response.code, defines.Codes.DELETED.number)
+            self.assertNotIn('/basic/child', server.root)
+
+            transaction = await send(defines.Codes.GET.number, 'advanced')
+            self.assertEqual(transaction.response.code, defines.Codes.CONTENT.number)
+            self.assertEqual(transaction.response.payload, b'advanced')
+            transaction = await send(defines.Codes.PUT.number, 'advanced', b'changed')
+            self.assertEqual(transaction.response.code, defines.Codes.CHANGED.number)
+            self.assertEqual(server.root['/advanced'].data, b'changed')
+            # the methods without a handler are not allowed
+            transaction = await send(defines.Codes.DELETE.number, 'advanced')
+            self.assertEqual(transaction.response.code, defines.Codes.METHOD_NOT_ALLOWED.number)
+            transaction = await send(defines.Codes.POST.number, 'advanced')
+            self.assertEqual(transaction.response.code, defines.Codes.METHOD_NOT_ALLOWED.number)
+            await server.close()
+
+        asyncio.run(main())
+
+
+if __name__ == '__main__':
+    unittest.main()
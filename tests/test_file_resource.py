@@ -0,0 +1,101 @@
+import asyncio
+import mmap
+import os
+import tempfile
+import unittest
+from socket import AF_INET
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.resources.file_resource import FileResource
+from Bubot_CoAP.server import Server
+
+SERVER_PORT = 25831
+CLIENT_PORT = 25832
+BODY = bytes(range(256)) * 40
+
+
+def request(size2=None):
+    message = Request()
+    message.type = defines.Types['CON']
+    message.code = defines.Codes.GET.number
+    message.uri_path = 'firmware'
+    message._destination = ('127.0.0.1', SERVER_PORT)
+    message._source = ('127.0.0.1', CLIENT_PORT)
+    message.family = AF_INET
+    message.scheme = 'coap'
+    if size2 is not None:
+        message.size2 = size2
+    return message
+
+
+class TestFileResource(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.file_path = os.path.join(directory.name, 'firmware.bin')
+        self.write(BODY)
+
+    def write(self, body):
+        # a new content is renamed over the old one
+        with open(self.file_path + '.new', 'wb') as file:
+            file.write(body)
+        os.replace(self.file_path + '.new', self.file_path)
+
+    def test_open(self):
+        resource = FileResource('firmware', self.file_path)
+        content, etag = resource.open()
+        self.assertIsInstance(content, mmap.mmap)
+        self.assertEqual(content[:], BODY)
+        self.assertEqual(len(etag), 8)
+        self.assertIs(resource.open()[0], content)
+
+        self.write(b'small')
+        content, changed = resource.open()
+        self.assertEqual(content[:], b'small')
+        self.assertNotEqual(changed, etag)
+
+        self.write(b'')
+        self.assertEqual(resource.open()[0], b'')
+
+    def test_download(self):
+        async def main():
+            server = Server()
+            client = Server()
+            await server.add_endpoint(f'coap://127.0.0.1:{SERVER_PORT}')
+            await client.add_endpoint(f'coap://127.0.0.1:{CLIENT_PORT}')
+            resource = FileResource('firmware', self.file_path)
+            server.add_resource('/firmware', resource)
+
+            response = await client.send_message(request(), timeout=20)
+            self.assertEqual(response.payload, BODY)
+            self.assertEqual(response.size2, len(BODY))
+            etag = response.etag
+
+            # the blocks are sliced from the map, shared by the transfers
+            transfers = [await client.send_message(request(), stream=True, timeout=20) for _ in range(3)]
+            snapshot = next(iter(server.block_layer._snapshots.values()))
+            self.assertIs(snapshot.payload, resource.open()[0])
+            self.assertEqual(snapshot.transfers, 3)
+            for response in transfers:
+                self.assertEqual(await response.payload.read(), BODY)
+            self.assertFalse(server.block_layer._snapshots)
+
+            self.write(b'small')
+            response = await client.send_message(request(0), timeout=20)
+            self.assertEqual(response.payload, b'small')
+            self.assertEqual(response.size2, 5)
+            self.assertNotEqual(response.etag, etag)
+
+            os.remove(self.file_path)
+            response = await client.send_message(request(), timeout=20)
+            self.assertEqual(response.code, defines.Codes.NOT_FOUND.number)
+            await client.close()
+            await server.close()
+
+        asyncio.run(main())
+
+
+if __name__ == '__main__':
+    unittest.main()
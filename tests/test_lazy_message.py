@@ -0,0 +1,89 @@
+import unittest
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.coap_udp_protocol import CoapDatagramProtocol
+from Bubot_CoAP.messages.lazy_message import LazyMessage, LazyRequest, LazyResponse
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.messages.response import Response
+from Bubot_CoAP.serializer_udp import SerializerUdp
+from Bubot_CoAP.serializer_udp_buffer import SerializerUdpBuffer
+
+SOURCE = ('127.0.0.1', 5683)
+
+
+class TestLazyMessage(unittest.TestCase):
+
+    def test_request(self):
+        request = Request()
+        request.type = defines.Types['CON']
+        request.code = defines.Codes.GET.number
+        request.mid = 10
+        request.token = b'\x01\x02\x03'
+        request.uri_path = '/oic/res'
+        request.uri_query = 'rt=oic.wk.d'
+        request.observe = 0
+        request.block2 = (0, 0, 512)
+        datagram = bytes(SerializerUdpBuffer.serialize(request))
+
+        message = SerializerUdpBuffer.deserialize(datagram, SOURCE)
+        self.assertIsInstance(message, LazyRequest)
+        self.assertEqual(message.mid, 10)
+        self.assertEqual(message.token, b'\x01\x02\x03')
+        self.assertEqual(message.type, defines.Types['CON'])
+        self.assertFalse(message.decoded)
+
+        self.assertEqual(message.uri_path, 'oic/res')
+        self.assertTrue(message.decoded)
+        self.assertEqual(message.uri_query, 'rt=oic.wk.d')
+        self.assertEqual(message.observe, 0)
+        self.assertEqual(message.block2, (0, 0, 512))
+
+        eager = SerializerUdp.deserialize(datagram, SOURCE)
+        self.assertEqual([(o.number, o.value) for o in message.options],
+                         [(o.number, o.value) for o in eager.options])
+
+    def test_response_payload(self):
+        response = Response()
+        response.type = defines.Types['NON']
+        response.code = defines.Codes.CONTENT.number
+        response.mid = 11
+        response.token = b'\x05'
+        response.content_type = 10000
+        response.payload = b'\xa1\x61\x76\x01'
+        message = SerializerUdpBuffer.deserialize(bytes(SerializerUdpBuffer.serialize(response)), SOURCE)
+        self.assertIsInstance(message, LazyResponse)
+        self.assertEqual(message.payload, b'\xa1\x61\x76\x01')
+        self.assertEqual(message.content_type, 10000)
+
+    def test_empty(self):
+        message = SerializerUdpBuffer.deserialize(b'\x60\x00\x00\x07', SOURCE)
+        self.assertIsInstance(message, LazyMessage)
+        self.assertEqual(message.type, defines.Types['ACK'])
+        self.assertEqual(message.mid, 7)
+        self.assertTrue(message.decoded)
+        self.assertEqual(message.options, [])
+        self.assertIsNone(message.payload)
+
+    def test_malformed(self):
+        self.assertEqual(SerializerUdpBuffer.deserialize(b'\x40\x01', SOURCE), defines.Codes.BAD_REQUEST.number)
+        # option length runs past the end of the datagram
+        message = SerializerUdpBuffer.deserialize(b'\x40\x01\x00\x01\xb5ab', SOURCE)
+        self.assertEqual(message.mid, 1)
+        self.assertEqual(message.decode(), defines.Codes.BAD_REQUEST.number)
+        self.assertEqual(message.options, [])
+        # payload marker without payload
+        message = SerializerUdpBuffer.deserialize(b'\x40\x01\x00\x01\xff', SOURCE)
+        self.assertEqual(message.decode(), defines.Codes.BAD_REQUEST.number)
+
+    def test_malformed_accessed_first(self):
+        # the layers read block2 and log the request before the protocol checks the decoding
+        protocol = CoapDatagramProtocol(None, None)
+        rejected = []
+        protocol.datagram_received_bad_message = lambda code, source: rejected.append((code, source))
+        for access in (lambda message: message.block2, str):
+            message = SerializerUdpBuffer.deserialize(b'\x40\x01\x00\x01\xb5ab', SOURCE)
+            access(message)
+            self.assertTrue(message.decoded)
+            self.assertTrue(protocol.decode_failed(message))
+            self.assertEqual(message.decode(), defines.Codes.BAD_REQUEST.number)
+        self.assertEqual(rejected, [(defines.Codes.BAD_REQUEST.number, SOURCE)] * 2)
@@ -0,0 +1,113 @@
+import asyncio
+import time
+import unittest
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.layers.message_layer import MessageLayer
+from Bubot_CoAP.messages.message import Message
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.messages.response import Response
+
+LOCAL = ('127.0.0.1', 5683)
+PEER = ('127.0.0.1', 40000)
+
+
+def request(mid, token):
+    message = Request()
+    message.type = defines.Types['CON']
+    message.code = defines.Codes.GET.number
+    message.mid = mid
+    message.token = token
+    return message
+
+
+class TestMessageLayer(unittest.TestCase):
+
+    def test_match_response(self):
+        layer = MessageLayer(None, 1)
+        sent = request(10, b'\x01')
+        sent.destination = PEER
+        transaction = layer.send_request(sent)
+        self.assertEqual(layer._transactions_sent[(PEER, 10)], transaction)
+        self.assertEqual(layer._transactions_sent_token[(PEER, b'\x01')], transaction)
+
+        response = Response()
+        response.type = defines.Types['ACK']
+        response.code = defines.Codes.CONTENT.number
+        response.mid = 10
+        response.token = b'\x02'
+        response.source = PEER
+        response.destination = LOCAL
+        self.assertEqual(layer.receive_response(response), (None, False))
+
+        response.token = b'\x01'
+        self.assertEqual(layer.receive_response(response), (transaction, False))
+        self.assertTrue(transaction.completed)
+
+        other = Response()
+        other.type = defines.Types['CON']
+        other.code = defines.Codes.CONTENT.number
+        other.mid = 99
+        other.token = b'\x01'
+        other.source = ('127.0.0.1', 40001)
+        other.destination = LOCAL
+        self.assertEqual(layer.receive_response(other), (None, False))
+
+    def test_duplicate_and_empty(self):
+        layer = MessageLayer(None, 1)
+        received = request(20, b'\x03')
+        received.source = PEER
+        transaction = asyncio.run(layer.receive_request(received))
+        self.assertFalse(received.duplicated)
+
+        duplicate = request(20, b'\x03')
+        duplicate.source = PEER
+        self.assertIs(asyncio.run(layer.receive_request(duplicate)), transaction)
+        self.assertTrue(transaction.request.duplicated)
+
+        ack = Message()
+        ack.type = defines.Types['ACK']
+        ack.mid = 20
+        ack.source = PEER
+        self.assertIs(layer.receive_empty(ack), transaction)
+        ack.source = ('127.0.0.1', 40001)
+        self.assertIsNone(layer.receive_empty(ack))
+
+    def test_expiry(self):
+        layer = MessageLayer(None, 1)
+        received = request(30, b'\x04')
+        received.source = PEER
+        asyncio.run(layer.receive_request(received))
+        sent = request(31, b'\x05')
+        sent.destination = PEER
+        layer.send_request(sent)
+        observe = request(32, b'\x06')
+        observe.destination = PEER
+        observe.observe = 0
+        layer.send_request(observe)
+
+        now = time.monotonic()
+        self.assertEqual(layer.purge(now + layer.exchange_lifetime - 2), 0)
+        self.assertEqual(layer.purge(now + layer.exchange_lifetime + 2), 5)
+        self.assertEqual(layer.expired_total, 5)
+        self.assertFalse(layer._transactions)
+        self.assertFalse(layer._transactions_token)
+        self.assertFalse(layer._transactions_sent)
+        # observations stay matched by token until cancelled
+        self.assertEqual(list(layer._transactions_sent_token), [(PEER, b'\x06')])
+
+    def test_token_reuse(self):
+        layer = MessageLayer(None, 1)
+        first = request(40, b'')
+        first.source = PEER
+        transaction = asyncio.run(layer.receive_request(first))
+        transaction.response = Response()
+
+        block = request(41, b'')
+        block.source = PEER
+        block.block2 = (1, 0, 1024)
+        self.assertIs(asyncio.run(layer.receive_request(block)), transaction)
+
+        second = request(42, b'')
+        second.source = PEER
+        self.assertIsNot(asyncio.run(layer.receive_request(second)), transaction)
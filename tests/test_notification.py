@@ -0,0 +1,83 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.notification import NotificationDispatcher
+
+CON = defines.Types['CON']
+NON = defines.Types['NON']
+
+
+class Observer:
+    def __init__(self, name, notification_type=NON):
+        self.name = name
+        self.request = SimpleNamespace(source=name)
+        self.response = SimpleNamespace(type=notification_type)
+
+
+class FanOut:
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.batches = []
+        self.running = 0
+        self.max_running = 0
+        self.release = asyncio.Event()
+
+    async def fan_out(self, batch):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        self.batches.append([(transaction.name, notification_type) for transaction, notification_type in batch])
+        await self.release.wait()
+        self.running -= 1
+
+
+class TestNotificationDispatcher(unittest.TestCase):
+
+    def test_batches(self):
+        async def main():
+            server = FanOut()
+            dispatcher = NotificationDispatcher(server, concurrency=2, max_pending=4, batch_size=2)
+            a, b, c, d, e = (Observer(name) for name in 'abcde')
+            dispatcher.submit([a, b, c])
+            await asyncio.sleep(0)
+            self.assertEqual(server.batches, [[('a', NON), ('b', NON)], [('c', NON)]])
+
+            # a is in flight, its new notifications wait for the batch and the newest supersedes the older
+            dispatcher.submit([d])
+            a.response.type = CON
+            dispatcher.submit([a])
+            a.response.type = NON
+            dispatcher.submit([a, e])
+            self.assertEqual(dispatcher.superseded_total, 1)
+            await asyncio.sleep(0)
+            self.assertEqual(len(server.batches), 2)
+            self.assertEqual(len(dispatcher), 3)
+
+            # the queue holds 4, the oldest is dropped
+            dispatcher.submit([Observer('f'), Observer('g')])
+            self.assertEqual(dispatcher.dropped_total, 1)
+            server.release.set()
+            await dispatcher.join()
+            self.assertEqual(server.max_running, 2)
+            delivered = [item for batch in server.batches[2:] for item in batch]
+            self.assertEqual(sorted(delivered), [('a', CON), ('e', NON), ('f', NON), ('g', NON)])
+            self.assertEqual(dispatcher.delivered_total, 7)
+            self.assertEqual(len(dispatcher), 0)
+        asyncio.run(main())
+
+    def test_order_of_observer(self):
+        async def main():
+            server = FanOut()
+            dispatcher = NotificationDispatcher(server, concurrency=4, batch_size=1)
+            a, b = Observer('a', CON), Observer('b')
+            dispatcher.submit([a])
+            await asyncio.sleep(0)
+            dispatcher.submit([a, b])
+            await asyncio.sleep(0)
+            # a new worker takes b, the second notification of a waits for the first
+            self.assertEqual(server.batches, [[('a', CON)], [('b', NON)]])
+            server.release.set()
+            await dispatcher.join()
+            self.assertEqual(server.batches, [[('a', CON)], [('b', NON)], [('a', CON)]])
+        asyncio.run(main())
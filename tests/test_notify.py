@@ -0,0 +1,120 @@
+import asyncio
+import unittest
+from socket import AF_INET
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.messages.response import Response
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.serializer_udp import SerializerUdp
+from Bubot_CoAP.serializer_udp_buffer import SerializerUdpBuffer
+from Bubot_CoAP.server import Server
+from Bubot_CoAP.transaction import Transaction
+
+PORT = 25793
+
+
+class Counter(Resource):
+    def __init__(self, name, server):
+        super().__init__(name, server)
+        self.renders = 0
+
+    async def render_GET(self, request, response):
+        self.renders += 1
+        response.payload = (defines.Content_types['text/plain'], f'{self.renders}:{request.uri_query}')
+        return self, response
+
+
+def observe_request(port, token, query=None):
+    request = Request()
+    request.type = defines.Types['NON']
+    request.code = defines.Codes.GET.number
+    request.uri_path = 'counter'
+    if query:
+        request.uri_query = query
+    request.token = token
+    request.observe = 0
+    request._destination = ('127.0.0.1', PORT)
+    request._source = ('127.0.0.1', port)
+    request.family = AF_INET
+    request.scheme = 'coap'
+    return request
+
+
+class TestNotify(unittest.TestCase):
+
+    def test_serialize_body_and_header(self):
+        response = Response()
+        response.type = defines.Types['CON']
+        response.code = defines.Codes.CONTENT.number
+        response.mid = 7
+        response.token = b'\x01\x02'
+        response.observe = 3
+        response.content_type = defines.Content_types['application/json']
+        response.payload = b'{"a": 1}'
+        for serializer in (SerializerUdp, SerializerUdpBuffer):
+            body = serializer.serialize_body(response)
+            other = Response.init_notification(observe_request(1, b'\x09\x09\x09'), response)
+            other.type = defines.Types['NON']
+            other.mid = 8
+            self.assertIs(other.options, response.options)
+            self.assertEqual(bytes(serializer.serialize_header(response, body)), bytes(serializer.serialize(response)))
+            self.assertEqual(bytes(serializer.serialize_header(other, body)), bytes(serializer.serialize(other)))
+
+    def test_fan_out(self):
+        async def main():
+            server = Server()
+            await server.add_endpoint(f'coap://127.0.0.1:{PORT}', serializer=SerializerUdpBuffer)
+            sent = []
+            for endpoint in server.endpoint_layer.unicast_endpoints['coap'][AF_INET]['127.0.0.1'].values():
+                endpoint.send = lambda data, address, **kwargs: sent.append((address, data))
+            resource = Counter('counter', server)
+            server.add_resource('/counter', resource)
+            for port, token, query in ((1, b'\x01', None), (2, b'\x02', None), (3, b'\x03', 'a=1')):
+                transaction = Transaction(request=observe_request(port, token, query))
+                await server.observe_layer.receive_request(transaction)
+                await server.request_layer.receive_request(transaction)
+                server.observe_layer.send_response(transaction)
+            self.assertEqual(resource.renders, 3)
+
+            resource.observe_count += 1
+            await server.notify(resource)
+            self.assertEqual(sent, [])
+            await server.notifications.join()
+            # one rendering per distinct request
+            self.assertEqual(resource.renders, 5)
+            messages = {address[1]: SerializerUdpBuffer.deserialize(data, address) for address, data in sent}
+            self.assertEqual(sorted(messages), [1, 2, 3])
+            self.assertEqual(messages[1].payload, messages[2].payload)
+            self.assertNotEqual(messages[1].payload, messages[3].payload)
+            self.assertEqual([messages[port].token for port in (1, 2, 3)], [b'\x01', b'\x02', b'\x03'])
+            self.assertEqual(len({messages[port].mid for port in (1, 2, 3)}), 3)
+            self.assertEqual({messages[port].observe for port in (1, 2, 3)}, {resource.observe_count})
+            await server.close()
+        asyncio.run(main())
+
+    def test_pmin_coalescing(self):
+        async def main():
+            server = Server()
+            await server.add_endpoint(f'coap://127.0.0.1:{PORT}', serializer=SerializerUdpBuffer)
+            sent = []
+            for endpoint in server.endpoint_layer.unicast_endpoints['coap'][AF_INET]['127.0.0.1'].values():
+                endpoint.send = lambda data, address, **kwargs: sent.append((address, data))
+            resource = Counter('counter', server)
+            server.add_resource('/counter', resource)
+            transaction = Transaction(request=observe_request(1, b'\x01', 'pmin=0.05'))
+            await server.observe_layer.receive_request(transaction)
+            await server.request_layer.receive_request(transaction)
+            server.observe_layer.send_response(transaction)
+
+            for _ in range(3):
+                resource.observe_count += 1
+                await server.notify(resource)
+            self.assertEqual(sent, [])
+            await asyncio.sleep(0.1)
+            self.assertEqual(len(sent), 1)
+            message = SerializerUdpBuffer.deserialize(sent[0][1], sent[0][0])
+            self.assertEqual(message.observe, resource.observe_count)
+            self.assertEqual(message.payload, b'2:pmin=0.05')
+            await server.close()
+        asyncio.run(main())
@@ -0,0 +1,154 @@
+import asyncio
+import unittest
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.layers.observe_layer import ObserveConditions, ObserveLayer
+from Bubot_CoAP.messages.message import Message
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.messages.response import Response
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.transaction import Transaction
+
+
+def resource(path):
+    item = Resource(path)
+    item.path = path
+    return item
+
+
+class Sensor(Resource):
+    value = 20.0
+
+    @property
+    def observe_value(self):
+        return self.value
+
+
+def register(layer, item, port, observe=0, query=None):
+    request = Request()
+    request.type = defines.Types['CON']
+    request.code = defines.Codes.GET.number
+    request.token = b'\x01'
+    request.source = ('127.0.0.1', port)
+    request.observe = observe
+    if query:
+        request.uri_query = query
+    transaction = Transaction(request=request)
+    asyncio.run(layer.receive_request(transaction))
+    transaction.resource = item
+    transaction.response = Response()
+    transaction.response.code = defines.Codes.CONTENT.number
+    layer.send_response(transaction)
+    return transaction
+
+
+class TestObserveLayer(unittest.TestCase):
+
+    def setUp(self):
+        self.layer = ObserveLayer()
+        self.parent = resource('/a')
+        self.child = resource('/a/b')
+        self.other = resource('/c')
+        # a relation of the client side, without transaction
+        client = Request()
+        client.destination = ('127.0.0.1', 9999)
+        client.token = b'\x09'
+        client.observe = 0
+        self.layer.send_request(client)
+
+    def test_notify_observers_of_resource(self):
+        first = register(self.layer, self.child, 1)
+        second = register(self.layer, self.child, 2)
+        register(self.layer, self.other, 3)
+        self.assertEqual(self.layer.notify(self.child), [first, second])
+        self.assertEqual(first.response.type, defines.Types['CON'])
+        self.assertEqual(self.layer.notify(self.parent), [])
+
+        # re-registration on another resource moves the relation
+        moved = register(self.layer, self.other, 1)
+        self.assertEqual(self.layer.notify(self.child), [second])
+        self.assertEqual(len(self.layer.notify(self.other)), 2)
+        self.assertIsNot(moved, first)
+
+    def test_deregister(self):
+        first = register(self.layer, self.child, 1)
+        register(self.layer, self.child, 2)
+        register(self.layer, self.child, 2, observe=1)
+        self.assertEqual(self.layer.notify(self.child), [first])
+
+        rst = Message()
+        rst.type = defines.Types['RST']
+        self.layer.receive_empty(rst, first)
+        self.assertEqual(self.layer.notify(self.child), [])
+        self.assertEqual(self.layer._by_resource, {})
+        self.assertEqual(self.layer._by_path, {})
+
+        third = register(self.layer, self.child, 3)
+        notification = Message()
+        notification.destination = ('127.0.0.1', 3)
+        notification.token = b'\x01'
+        self.layer.remove_subscriber(notification)
+        self.assertTrue(third.completed)
+        self.assertEqual(self.layer.notify(self.child), [])
+
+    def test_root_prefix(self):
+        parent = register(self.layer, self.parent, 1)
+        child = register(self.layer, self.child, 2)
+        register(self.layer, self.other, 3)
+        notified = self.layer.notify(self.child, root=object())
+        self.assertEqual(notified, [parent, child])
+        self.assertIs(parent.resource, self.child)
+
+    def test_conditions(self):
+        now = [100.0]
+        wakeups = []
+        layer = ObserveLayer(lambda: now[0], lambda: wakeups.append(now[0]))
+        sensor = Sensor('sensor')
+        sensor.path = '/sensor'
+        plain = register(layer, sensor, 1)
+        conditional = register(layer, sensor, 2, query='pmin=1&pmax=10&st=2')
+        self.assertEqual(layer.next_deadline(), 110)
+        self.assertEqual(wakeups, [100])
+
+        # below the step
+        sensor.value = 21
+        self.assertEqual(layer.notify(sensor), [plain])
+        # within pmin, held
+        sensor.value = 23
+        self.assertEqual(layer.notify(sensor), [plain])
+        sensor.value = 24
+        self.assertEqual(layer.notify(sensor), [plain])
+        self.assertEqual((layer.dropped_total, layer.coalesced_total), (1, 2))
+        self.assertEqual(layer.next_deadline(), 101)
+        self.assertEqual(layer.expire(), [])
+        now[0] = 101
+        self.assertEqual(layer.expire(), [conditional])
+        self.assertEqual(layer.next_deadline(), 111)
+
+        # after pmin, at once
+        now[0] = 103
+        sensor.value = 21
+        self.assertEqual(layer.notify(sensor), [plain, conditional])
+        self.assertEqual(layer.next_deadline(), 113)
+
+        # pmax without change
+        count = sensor.observe_count
+        now[0] = 113
+        self.assertEqual(layer.expire(), [conditional])
+        self.assertEqual(sensor.observe_count, count + 1)
+
+        register(layer, sensor, 2, observe=1)
+        self.assertIsNone(layer.next_deadline())
+
+    def test_invalid_conditions(self):
+        register(self.layer, self.child, 1, query='pmin=5&pmax=2')
+        register(self.layer, self.child, 2, query='st=x')
+        self.assertEqual(self.layer.notify(self.child), [])
+        request = Request()
+        request.uri_query = 'gt=30&lt=10&unit=C'
+        conditions = ObserveConditions.from_request(request)
+        self.assertTrue(conditions.met(20, 31))
+        self.assertTrue(conditions.met(31, 20))
+        self.assertTrue(conditions.met(11, 9))
+        self.assertFalse(conditions.met(11, 29))
+        self.assertFalse(ObserveConditions.is_attribute('unit=C'))
@@ -0,0 +1,72 @@
+import copy
+import unittest
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.messages.option import Option
+from Bubot_CoAP.messages.option_list import OptionList
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.serializer_udp import SerializerUdp
+
+
+class TestOptionList(unittest.TestCase):
+
+    def test_sorted_iteration(self):
+        options = OptionList()
+        options.append(Option(defines.OptionRegistry.ACCEPT, 10000))
+        options.append(Option(defines.OptionRegistry.URI_PATH, 'oic'))
+        options.append(Option(defines.OptionRegistry.OBSERVE, 0))
+        options.append(Option(defines.OptionRegistry.URI_PATH, 'res'))
+        self.assertEqual([(o.number, o.value) for o in options],
+                         [(6, 0), (11, 'oic'), (11, 'res'), (17, 10000)])
+        self.assertEqual(len(options), 4)
+        self.assertEqual(options[1].value, 'oic')
+        self.assertEqual(options.values(defines.OptionRegistry.URI_PATH.number), ['oic', 'res'])
+        self.assertEqual(options.first(defines.OptionRegistry.ETAG.number, 'none'), 'none')
+
+    def test_remove(self):
+        path = Option(defines.OptionRegistry.URI_PATH, 'oic')
+        options = OptionList([path, Option(defines.OptionRegistry.URI_QUERY, 'rt=a')])
+        self.assertIn(path, options)
+        options.remove(path)
+        self.assertNotIn(path, options)
+        self.assertFalse(options.has(defines.OptionRegistry.URI_PATH.number))
+        self.assertRaises(ValueError, options.remove, path)
+        self.assertEqual(len(options.pop_number(defines.OptionRegistry.URI_QUERY.number)), 1)
+        self.assertFalse(options)
+        self.assertEqual(options, [])
+
+    def test_message_api(self):
+        request = Request()
+        request.type = defines.Types['CON']
+        request.code = defines.Codes.GET.number
+        request.mid = 1
+        request.token = b'\x01'
+        request.accept = 10000
+        request.uri_path = '/a/b/c?x=1&y=2'
+        request.observe = 0
+        self.assertEqual(request.uri_path, 'a/b/c')
+        self.assertEqual(request.uri_query, 'x=1&y=2')
+        self.assertRaises(TypeError, request.add_option, Option(defines.OptionRegistry.ACCEPT, 60))
+
+        del request.uri_query
+        self.assertEqual(request.uri_query, '')
+        request.del_option_by_name('Uri-Path')
+        self.assertEqual(request.uri_path, '')
+        self.assertEqual(request.observe, 0)
+
+        request.options = [Option(defines.OptionRegistry.URI_PATH, 'x'), Option(defines.OptionRegistry.OBSERVE, 1)]
+        self.assertIsInstance(request.options, OptionList)
+        self.assertEqual([o.number for o in request.options], [6, 11])
+        self.assertEqual(copy.deepcopy(request.options), request.options)
+
+    def test_serialize(self):
+        request = Request()
+        request.type = defines.Types['NON']
+        request.code = defines.Codes.GET.number
+        request.mid = 2
+        request.token = b'\x02'
+        request.accept = 10000
+        request.uri_path = '/oic/res'
+        request.observe = 0
+        message = SerializerUdp.deserialize(bytes(SerializerUdp.serialize(request)), ('127.0.0.1', 5683))
+        self.assertEqual(message.options, request.options)
@@ -0,0 +1,163 @@
+import asyncio
+import unittest
+from socket import AF_INET
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.layers.block_layer import BurstWindow
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.messages.response import Response
+from Bubot_CoAP.reassembly import ReassemblyBudget, ReassemblyBuffer
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.serializer_udp import SerializerUdp
+from Bubot_CoAP.server import Server
+
+SERVER_PORT = 25811
+CLIENT_PORT = 25812
+BODY = bytes(range(256)) * 120
+
+
+class Firmware(Resource):
+    def __init__(self, name):
+        super().__init__(name)
+        self.data = BODY
+
+    async def render_GET(self, request, response):
+        response.payload = (defines.Content_types['application/octet-stream'], self.data)
+        response.etag = b'1'
+        return self, response
+
+    async def render_POST(self, request, response):
+        self.data = request.payload
+        response.code = defines.Codes.CHANGED.number
+        return self, response
+
+
+class Legacy(Server):
+    """
+    Server refusing the Q-Block options, as a peer without RFC 9177.
+    """
+    refused = 0
+
+    async def receive_request(self, transaction, request=None):
+        request = request or transaction.request
+        if request.q_block1 is None and request.q_block2 is None:
+            return await super().receive_request(transaction, request)
+        self.refused += 1
+        transaction.response = Response.init_from_request(request)
+        transaction.response.code = defines.Codes.BAD_OPTION.number
+        self.message_layer.send_response(transaction)
+        await self.send_datagram(transaction.response)
+
+
+def lossy(server, every):
+    """
+    Drop every n-th NON message sent by a server.
+    """
+    send_datagram = server.send_datagram
+    sent = []
+
+    async def send(message, **kwargs):
+        sent.append(message)
+        if message.type == defines.Types['NON'] and len(sent) % every == 0:
+            return
+        await send_datagram(message, **kwargs)
+
+    server.send_datagram = send
+    return sent
+
+
+def request(code, payload=None):
+    message = Request()
+    message.type = defines.Types['CON']
+    message.code = code
+    message.uri_path = 'firmware'
+    message._destination = ('127.0.0.1', SERVER_PORT)
+    message._source = ('127.0.0.1', CLIENT_PORT)
+    message.family = AF_INET
+    message.scheme = 'coap'
+    message.payload = payload
+    return message
+
+
+class TestQBlock(unittest.TestCase):
+
+    def test_options(self):
+        message = request(defines.Codes.GET.number)
+        message.mid = 1
+        message.token = b'\x01'
+        message.q_block2 = [(3, 0, 1024), (7, 0, 1024), (40, 1, 1024)]
+        message.q_block1 = (2, 1, 512)
+        decoded = SerializerUdp.deserialize(SerializerUdp.serialize(message), ('127.0.0.1', CLIENT_PORT))
+        self.assertEqual(decoded.q_block2, [(3, 0, 1024), (7, 0, 1024), (40, 1, 1024)])
+        self.assertEqual(decoded.q_block1, (2, 1, 512))
+        del message.q_block2
+        self.assertIsNone(message.q_block2)
+
+    def test_missing_and_window(self):
+        buffer = ReassemblyBuffer(ReassemblyBudget())
+        for num in (0, 1, 4, 6):
+            buffer.write(num * 16, bytes(16))
+        self.assertEqual(buffer.missing(16, 8), [2, 3, 5, 7])
+
+        window = BurstWindow()
+        window.grow()
+        self.assertEqual(window.size, defines.MAX_PAYLOADS * 2)
+        window.shrink()
+        self.assertEqual(window.size, defines.MAX_PAYLOADS)
+        # beyond the threshold of the last loss the window grows by one block
+        window.grow()
+        self.assertEqual(window.size, defines.MAX_PAYLOADS + 1)
+
+    def test_transfer(self):
+        async def main():
+            server = Server()
+            client = Server(q_block=True)
+            await server.add_endpoint(f'coap://127.0.0.1:{SERVER_PORT}')
+            await client.add_endpoint(f'coap://127.0.0.1:{CLIENT_PORT}')
+            server.add_resource('/firmware', Firmware('firmware'))
+            server_sent = lossy(server, 7)
+            client_sent = lossy(client, 7)
+
+            response = await client.send_message(request(defines.Codes.GET.number), timeout=20)
+            self.assertEqual(response.payload, BODY)
+            self.assertTrue(any(message.q_block2 for message in server_sent))
+
+            response = await client.send_message(request(defines.Codes.POST.number, BODY[::-1]), timeout=20)
+            self.assertEqual(response.code, defines.Codes.CHANGED.number)
+            self.assertEqual(server.root['/firmware'].data, BODY[::-1])
+            self.assertTrue(any(message.q_block1 for message in client_sent))
+
+            self.assertEqual(server.block_layer.budget.used, 0)
+            self.assertEqual(client.block_layer.budget.used, 0)
+            await client.close()
+            await server.close()
+
+        asyncio.run(main())
+
+    def test_fallback(self):
+        async def main():
+            server = Legacy()
+            client = Server(q_block=True)
+            await server.add_endpoint(f'coap://127.0.0.1:{SERVER_PORT}')
+            await client.add_endpoint(f'coap://127.0.0.1:{CLIENT_PORT}')
+            server.add_resource('/firmware', Firmware('firmware'))
+            client_sent = lossy(client, 1000)
+
+            response = await client.send_message(request(defines.Codes.GET.number), timeout=20)
+            self.assertEqual(response.payload, BODY)
+            self.assertEqual(server.refused, 1)
+            self.assertIsNotNone(client_sent[-1].block2)
+
+            # the peer is not offered Q-Block anymore
+            response = await client.send_message(request(defines.Codes.POST.number, BODY[::-1]), timeout=20)
+            self.assertEqual(response.code, defines.Codes.CHANGED.number)
+            self.assertEqual(server.root['/firmware'].data, BODY[::-1])
+            self.assertEqual(server.refused, 1)
+            await client.close()
+            await server.close()
+
+        asyncio.run(main())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.layers.block_layer import BlockLayer
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.reassembly import ReassemblyBudget, ReassemblyBuffer
+from Bubot_CoAP.transaction import Transaction
+
+BODY = bytes(range(256)) * 20
+
+
+def block1_request(num, size=1024, body=BODY, size1=None):
+    request = Request()
+    request.type = defines.Types['CON']
+    request.code = defines.Codes.PUT.number
+    request.token = b'\x01'
+    request._source = ('127.0.0.1', 5683)
+    request._destination = ('127.0.0.1', 5684)
+    request.scheme = 'coap'
+    m = 1 if (num + 1) * size < len(body) else 0
+    request.block1 = (num, m, size)
+    if size1 is not None:
+        request.size1 = size1
+    request.payload = body[num * size:(num + 1) * size]
+    return Transaction(request=request)
+
+
+class TestReassembly(unittest.TestCase):
+
+    def test_buffer(self):
+        budget = ReassemblyBudget(10000)
+        buffer = ReassemblyBuffer(budget)
+        self.assertTrue(buffer.reserve(len(BODY)))
+        self.assertEqual(budget.used, len(BODY))
+        for num in (4, 1, 0, 1, 3):
+            self.assertTrue(buffer.write(num * 1024, BODY[num * 1024:(num + 1) * 1024], num == 4))
+            self.assertFalse(buffer.complete)
+        self.assertEqual(buffer.contiguous, 2048)
+        buffer.write(2048, BODY[2048:3072])
+        self.assertTrue(buffer.complete)
+        self.assertEqual(buffer.getvalue(), BODY)
+        self.assertEqual(budget.used, 0)
+
+        # without size hint the buffer grows, within the budget
+        buffer = ReassemblyBuffer(budget)
+        self.assertTrue(buffer.write(0, BODY))
+        self.assertFalse(buffer.write(len(BODY), BODY))
+        self.assertEqual(budget.rejected_total, 1)
+        buffer.release()
+        self.assertEqual(budget.used, 0)
+
+    def test_block1_out_of_order(self):
+        layer = BlockLayer()
+        for num in (0, 2, 2, 1):
+            transaction = layer.receive_request(block1_request(num, size1=len(BODY)))
+            self.assertTrue(transaction.block_transfer)
+            self.assertEqual(transaction.response.code, defines.Codes.CONTINUE.number)
+        # the last block before the fourth one
+        transaction = layer.receive_request(block1_request(4, size1=len(BODY)))
+        self.assertEqual(transaction.response.code, defines.Codes.REQUEST_ENTITY_INCOMPLETE.number)
+        transaction = layer.receive_request(block1_request(3, size1=len(BODY)))
+        self.assertFalse(transaction.block_transfer)
+        self.assertEqual(transaction.request.payload, BODY)
+        self.assertIsNone(transaction.request.block1)
+        self.assertEqual(layer.budget.used, 0)
+
+    def test_block1_budget(self):
+        layer = BlockLayer(max_reassembly=4096)
+        transaction = layer.receive_request(block1_request(0, size1=len(BODY)))
+        self.assertEqual(transaction.response.code, defines.Codes.REQUEST_ENTITY_TOO_LARGE.number)
+        self.assertEqual(transaction.response.size1, 4096)
+
+        # without Size1 the upload is stopped when it outgrows the budget
+        for num in range(4):
+            transaction = layer.receive_request(block1_request(num))
+            self.assertEqual(transaction.response.code, defines.Codes.CONTINUE.number)
+        transaction = layer.receive_request(block1_request(4))
+        self.assertEqual(transaction.response.code, defines.Codes.REQUEST_ENTITY_TOO_LARGE.number)
+        self.assertEqual(layer.budget.used, 0)
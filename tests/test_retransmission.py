@@ -0,0 +1,154 @@
+import asyncio
+import random
+import unittest
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.layers.block_layer import BlockLayer
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.retransmission import RetransmissionScheduler, RtoEstimator
+from Bubot_CoAP.transaction import Transaction
+from Bubot_CoAP.utils import DeadlineHeap
+
+
+class Entry:
+    __slots__ = ('deadline', 'index')
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.index = None
+
+
+class FakeServer:
+    def __init__(self, loop):
+        self.loop = loop
+        self.stopped = asyncio.Event()
+        self.sent = []
+        self.block_layer = BlockLayer()
+
+    async def send_datagram(self, message):
+        self.sent.append(message.mid)
+
+
+def transaction(mid):
+    request = Request()
+    request.type = defines.Types['CON']
+    request.code = defines.Codes.GET.number
+    request.mid = mid
+    request.destination = ('127.0.0.1', 5683)
+    return Transaction(request=request)
+
+
+class TestDeadlineHeap(unittest.TestCase):
+
+    def test_order_and_remove(self):
+        rnd = random.Random(1)
+        heap = DeadlineHeap()
+        entries = [Entry(rnd.random()) for _ in range(500)]
+        for entry in entries:
+            heap.push(entry)
+        removed = rnd.sample(entries, 200)
+        for entry in removed:
+            heap.remove(entry)
+            self.assertIsNone(entry.index)
+        heap.remove(removed[0])
+        self.assertEqual(len(heap), 300)
+        result = [heap.pop().deadline for _ in range(len(heap))]
+        self.assertEqual(result, sorted(entry.deadline for entry in entries if entry not in removed))
+        self.assertIsNone(heap.peek())
+
+
+class TestRetransmissionScheduler(unittest.TestCase):
+
+    def run_scheduler(self, scenario, **kwargs):
+        async def main():
+            server = FakeServer(asyncio.get_running_loop())
+            scheduler = RetransmissionScheduler(server, **kwargs)
+            task = asyncio.create_task(scheduler.run())
+            await scenario(server, scheduler)
+            server.stopped.set()
+            scheduler.close()
+            await task
+        asyncio.run(main())
+
+    def test_give_up(self):
+        async def scenario(server, scheduler):
+            exchange = transaction(1)
+            scheduler.start(exchange, exchange.request)
+            await asyncio.sleep(0.15)
+            self.assertEqual(server.sent, [1, 1])
+            self.assertTrue(exchange.request.timeouted)
+            self.assertIsNone(exchange.retransmission)
+            self.assertEqual(len(scheduler), 0)
+            self.assertEqual(scheduler.given_up_total, 1)
+        self.run_scheduler(scenario, max_retransmit=2, ack_timeout=0.01, adaptive=False)
+
+    def test_acknowledged(self):
+        async def scenario(server, scheduler):
+            acked = transaction(1)
+            pending = transaction(2)
+            scheduler.start(acked, acked.request)
+            scheduler.start(pending, pending.request)
+            acked.request.acknowledged = True
+            scheduler.stop(acked)
+            await asyncio.sleep(0.045)
+            self.assertEqual(server.sent, [2])
+            self.assertEqual(len(scheduler), 1)
+            pending.request.acknowledged = True
+            scheduler.stop(pending)
+            self.assertEqual(len(scheduler), 0)
+        self.run_scheduler(scenario, ack_timeout=0.02, adaptive=False)
+
+    def test_adaptive(self):
+        async def scenario(server, scheduler):
+            for mid in range(20):
+                exchange = transaction(mid)
+                scheduler.start(exchange, exchange.request)
+                await asyncio.sleep(0.01)
+                exchange.request.acknowledged = True
+                scheduler.stop(exchange)
+            self.assertEqual(server.sent, [])
+            state = scheduler.estimator.get(('127.0.0.1', 5683))
+            self.assertEqual(state.strong_samples, 20)
+            self.assertLess(state.rto, 0.2)
+        self.run_scheduler(scenario, adaptive=True)
+
+
+class TestRtoEstimator(unittest.TestCase):
+    PEER = ('127.0.0.1', 5683)
+
+    def test_strong_and_weak(self):
+        estimator = RtoEstimator(initial_rto=2)
+        self.assertEqual(estimator.rto(self.PEER, 0), 2)
+        estimator.sample(self.PEER, 0.2, 1, 0)
+        # 0.5 * (0.2 + 4 * 0.1) + 0.5 * 2
+        self.assertAlmostEqual(estimator.rto(self.PEER, 0), 1.3)
+        estimator.sample(self.PEER, 0.4, 2, 0)
+        # 0.25 * (0.4 + 0.2) + 0.75 * 1.3
+        self.assertAlmostEqual(estimator.rto(self.PEER, 0), 1.125)
+        # a weak sample longer than the RTO holds the timeout waited before the retransmission
+        estimator.sample(self.PEER, 2, 2, 0)
+        self.assertAlmostEqual(estimator.rto(self.PEER, 0), 1.125)
+        estimator.sample(self.PEER, 9, 4, 0)
+        state = estimator.get(self.PEER)
+        self.assertEqual((state.strong_samples, state.weak_samples), (1, 1))
+        for _ in range(50):
+            estimator.sample(self.PEER, 0.01, 1, 0)
+        self.assertAlmostEqual(estimator.rto(self.PEER, 0), 0.1)
+
+    def test_backoff_and_aging(self):
+        self.assertEqual(RtoEstimator.backoff_factor(0.5), 3)
+        self.assertEqual(RtoEstimator.backoff_factor(2), 2)
+        self.assertEqual(RtoEstimator.backoff_factor(4), 1.5)
+        estimator = RtoEstimator(initial_rto=2)
+        for _ in range(50):
+            estimator.sample(self.PEER, 0.1, 1, 0)
+        rto = estimator.rto(self.PEER, 0)
+        self.assertLess(rto, 1)
+        self.assertEqual(estimator.rto(self.PEER, 16 * rto - 0.01), rto)
+        self.assertEqual(estimator.rto(self.PEER, 16 * rto + 0.01), 2 * rto)
+
+    def test_max_peers(self):
+        estimator = RtoEstimator(max_peers=2)
+        for port in range(3):
+            estimator.sample(('127.0.0.1', port), 0.1, 1, 0)
+        self.assertEqual([peer for peer, state in estimator.items()], [('127.0.0.1', 1), ('127.0.0.1', 2)])
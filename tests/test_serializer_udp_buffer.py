@@ -0,0 +1,74 @@
+import unittest
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.messages.option import Option
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.messages.response import Response
+from Bubot_CoAP.serializer_udp import SerializerUdp
+from Bubot_CoAP.serializer_udp_buffer import SerializerUdpBuffer
+
+
+class TestSerializerUdpBuffer(unittest.TestCase):
+
+    def assertSameDatagram(self, message):
+        expected = bytes(SerializerUdp.serialize(message))
+        self.assertEqual(bytes(SerializerUdpBuffer.serialize(message)), expected)
+
+    def test_request(self):
+        request = Request()
+        request.type = defines.Types['CON']
+        request.code = defines.Codes.GET.number
+        request.mid = 1
+        request.token = b'\x01\x02'
+        request.uri_path = '/oic/res'
+        request.uri_query = 'rt=oic.wk.d&if=oic.if.baseline'
+        request.accept = 10000
+        self.assertSameDatagram(request)
+
+    def test_response(self):
+        response = Response()
+        response.type = defines.Types['NON']
+        response.code = defines.Codes.CONTENT.number
+        response.mid = 65000
+        response.token = b'\xff' * 8
+        response.observe = 300
+        response.etag = b'abcd'
+        response.content_type = 10000
+        response.add_option(Option(defines.OptionRegistry.OCF_CONTENT_FORMAT_VERSION, 2048))
+        response.block2 = (3, 1, 1024)
+        response.payload = bytes(range(256)) * 4
+        self.assertSameDatagram(response)
+
+    def test_extended_fields(self):
+        request = Request()
+        request.type = defines.Types['CON']
+        request.code = defines.Codes.PUT.number
+        request.mid = 7
+        request.token = b'\x10'
+        request.uri_path = 'a' * 20 + '/' + 'b' * 300
+        request.add_option(Option(defines.OptionRegistry.NO_RESPONSE, 26))
+        request.payload = 'text payload'
+        self.assertSameDatagram(request)
+
+    def test_empty(self):
+        response = Response()
+        response.type = defines.Types['ACK']
+        response.code = None
+        response.mid = 12
+        response.token = b''
+        self.assertSameDatagram(response)
+
+    def test_round_trip(self):
+        request = Request()
+        request.type = defines.Types['CON']
+        request.code = defines.Codes.POST.number
+        request.mid = 100
+        request.token = b'\x01\x02\x03\x04'
+        request.uri_path = '/light/1'
+        request.content_type = 60
+        request.payload = b'\xa1\x61\x76\x01'
+        message = SerializerUdpBuffer.deserialize(bytes(SerializerUdpBuffer.serialize(request)), ('127.0.0.1', 5683))
+        self.assertEqual(message.uri_path, 'light/1')
+        self.assertEqual(message.content_type, 60)
+        self.assertEqual(message.payload, b'\xa1\x61\x76\x01')
+        self.assertEqual(message.token, b'\x01\x02\x03\x04')
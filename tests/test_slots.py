@@ -0,0 +1,37 @@
+import asyncio
+import unittest
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.messages.lazy_message import LazyRequest
+from Bubot_CoAP.messages.option import Option
+from Bubot_CoAP.messages.options import Options
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.messages.response import Response
+from Bubot_CoAP.transaction import Transaction
+
+
+class TestSlots(unittest.TestCase):
+
+    def test_no_instance_dict(self):
+        request = Request()
+        request.scheme = 'coap'
+        for obj in (Option(defines.OptionRegistry.URI_PATH, 'a'), request, Response(), LazyRequest(b''),
+                    Transaction(request=request)):
+            self.assertFalse(hasattr(obj, '__dict__'), type(obj).__name__)
+        self.assertRaises(AttributeError, setattr, request, 'unknown', 1)
+
+    def test_lazy_helpers(self):
+        request = Request()
+        self.assertIsNone(request._opt)
+        self.assertIsInstance(request.opt, Options)
+        self.assertIs(request.opt, request.opt)
+
+        transaction = Transaction(request=request)
+        self.assertIsNone(transaction._lock)
+        self.assertIsInstance(transaction.lock, asyncio.Lock)
+        self.assertIs(transaction.lock, transaction.lock)
+
+    def test_option_equality(self):
+        self.assertEqual(Option(defines.OptionRegistry.URI_PATH, 'a'), Option(defines.OptionRegistry.URI_PATH, 'a'))
+        self.assertNotEqual(Option(defines.OptionRegistry.URI_PATH, 'a'), Option(defines.OptionRegistry.URI_PATH, 'b'))
+        self.assertNotEqual(Option(defines.OptionRegistry.URI_PATH, 'a'), Option(defines.OptionRegistry.LOCATION_PATH, 'a'))
@@ -0,0 +1,166 @@
+import asyncio
+import unittest
+from socket import AF_INET
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.server import Server
+from Bubot_CoAP.streaming import BlockSource, BlockStream
+
+SERVER_PORT = 25821
+CLIENT_PORT = 25822
+BODY = bytes(range(256)) * 160
+
+
+class Log(Resource):
+    """
+    Resource served from an async generator and consuming its uploads block by block.
+    """
+
+    def __init__(self, name):
+        super().__init__(name, streaming=True)
+        self.data = BODY
+        self.blocks = []
+        self.read = 0
+
+    async def lines(self):
+        for start in range(0, len(self.data), 4000):
+            self.read = start
+            yield self.data[start:start + 4000]
+
+    async def render_GET(self, request, response):
+        response.payload = (defines.Content_types['application/octet-stream'], self.lines())
+        return self, response
+
+    async def render_POST(self, request, response):
+        self.blocks = [block async for block in request.payload]
+        self.data = b''.join(self.blocks)
+        response.code = defines.Codes.CHANGED.number
+        return self, response
+
+
+def request(code, payload=None):
+    message = Request()
+    message.type = defines.Types['CON']
+    message.code = code
+    message.uri_path = 'log'
+    message._destination = ('127.0.0.1', SERVER_PORT)
+    message._source = ('127.0.0.1', CLIENT_PORT)
+    message.family = AF_INET
+    message.scheme = 'coap'
+    message.payload = payload
+    return message
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+class TestStreaming(unittest.TestCase):
+
+    def test_source(self):
+        async def main():
+            source = BlockSource(chunks(b'abc', b'defgh', b'', 'ij'))
+            self.assertEqual(await source.read(0, 4), (b'abcd', True))
+            # the last block may be asked for again
+            self.assertEqual(await source.read(0, 4), (b'abcd', True))
+            self.assertEqual(await source.read(1, 4), (b'efgh', True))
+            with self.assertRaises(ValueError):
+                await source.read(0, 4)
+            self.assertEqual(await source.read(2, 4), (b'ij', False))
+
+        asyncio.run(main())
+
+    def test_stream(self):
+        async def main():
+            stream = BlockStream(depth=2)
+            await stream.put(b'a')
+            await stream.put(b'b')
+            writer = asyncio.create_task(stream.put(b'c', True))
+            await asyncio.sleep(0)
+            # the writer waits for the reader
+            self.assertFalse(writer.done())
+            self.assertEqual(await stream.__anext__(), b'a')
+            await writer
+            self.assertEqual(await stream.read(), b'bc')
+            self.assertFalse(await stream.wait_room())
+
+            stream = BlockStream()
+            stream.feed(b'a')
+            stream.abort(asyncio.TimeoutError())
+            self.assertEqual(await stream.__anext__(), b'a')
+            with self.assertRaises(asyncio.TimeoutError):
+                await stream.__anext__()
+
+        asyncio.run(main())
+
+    def test_transfer(self):
+        async def main():
+            server = Server()
+            client = Server()
+            await server.add_endpoint(f'coap://127.0.0.1:{SERVER_PORT}')
+            await client.add_endpoint(f'coap://127.0.0.1:{CLIENT_PORT}')
+            log = Log('log')
+            server.add_resource('/log', log)
+
+            # the download is read from the generator as the blocks are asked for
+            response = await client.send_message(request(defines.Codes.GET.number), timeout=20)
+            self.assertEqual(response.payload, BODY)
+            self.assertFalse(server.block_layer._block2_receive)
+
+            response = await client.send_message(request(defines.Codes.GET.number), stream=True, timeout=20)
+            self.assertIsInstance(response.payload, BlockStream)
+            blocks = []
+            async for block in response.payload:
+                self.assertLessEqual(len(response.payload._blocks), defines.STREAM_DEPTH)
+                # the server reads ahead of the block asked for by one chunk at most
+                self.assertLessEqual(log.read, len(blocks) * defines.MAX_PAYLOAD + 4000)
+                blocks.append(block)
+            self.assertEqual(b''.join(blocks), BODY)
+            self.assertEqual(len(blocks), len(BODY) // defines.MAX_PAYLOAD)
+            self.assertFalse(client.block_layer._downloads)
+
+            # the upload is handed over while it arrives
+            response = await client.send_message(request(defines.Codes.POST.number, BODY[::-1]), timeout=20)
+            self.assertEqual(response.code, defines.Codes.CHANGED.number)
+            self.assertEqual(log.data, BODY[::-1])
+            self.assertEqual(len(log.blocks), len(BODY) // defines.MAX_PAYLOAD)
+            self.assertFalse(server.block_layer._block1_receive)
+
+            # a small body is a stream too
+            response = await client.send_message(request(defines.Codes.POST.number, b'tail'), timeout=20)
+            self.assertEqual(response.code, defines.Codes.CHANGED.number)
+            self.assertEqual(log.blocks, [b'tail'])
+            await client.close()
+            await server.close()
+
+        asyncio.run(main())
+
+    def test_close_and_q_block(self):
+        async def main():
+            server = Server()
+            client = Server(q_block=True)
+            await server.add_endpoint(f'coap://127.0.0.1:{SERVER_PORT}')
+            await client.add_endpoint(f'coap://127.0.0.1:{CLIENT_PORT}')
+            server.add_resource('/log', Log('log'))
+
+            response = await client.send_message(request(defines.Codes.GET.number), stream=True, timeout=20)
+            self.assertEqual(await response.payload.__anext__(), BODY[:defines.MAX_PAYLOAD])
+            response.payload.close()
+            await asyncio.sleep(0.1)
+            self.assertFalse(client.block_layer._downloads)
+
+            # the blocks of a streamed body are not kept for Q-Block2
+            response = await client.send_message(request(defines.Codes.GET.number), timeout=20)
+            self.assertEqual(response.payload, BODY)
+            self.assertIn(('127.0.0.1', SERVER_PORT), client.block_layer._refused)
+            await client.close()
+            await server.close()
+
+        asyncio.run(main())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+from Bubot_CoAP import defines
+from Bubot_CoAP.coap_tcp_protocol import CoapTcpProtocol
+from Bubot_CoAP.messages.request import Request
+from Bubot_CoAP.serializer_tcp import SerializerTcp
+
+
+class FakeEndpoint:
+    scheme = 'coap+tcp'
+    family = None
+    address = ('127.0.0.1', 5683)
+
+    def __init__(self, **kwargs):
+        self.params = kwargs
+
+
+class FakeTransport:
+    def __init__(self):
+        self.written = []
+        self.closed = False
+
+    def write(self, data):
+        self.written.append(bytes(data))
+
+    def close(self):
+        self.closed = True
+
+
+class FramingProtocol(CoapTcpProtocol):
+    def __init__(self, **kwargs):
+        super().__init__(None, FakeEndpoint(**kwargs), is_server=True)
+        self.remote_address = ('127.0.0.1', 40000)
+        self._transport = FakeTransport()
+        self.received = []
+
+    def message_received(self, message):
+        self.received.append(message)
+
+
+def frame(mid, payload=None):
+    request = Request()
+    request.code = defines.Codes.GET.number
+    request.token = mid.to_bytes(2, 'big')
+    request.uri_path = '/oic/res'
+    if payload is not None:
+        request.payload = payload
+    return bytes(SerializerTcp.serialize(request))
+
+
+class TestTcpFraming(unittest.TestCase):
+
+    def test_pipelined_frames(self):
+        protocol = FramingProtocol()
+        stream = b''.join(frame(i) for i in range(300))
+        protocol.data_received(stream)
+        self.assertEqual([int.from_bytes(m.token, 'big') for m in protocol.received], list(range(300)))
+        self.assertEqual(len(protocol._spool), 0)
+
+    def test_split_frames(self):
+        protocol = FramingProtocol()
+        stream = frame(1) + frame(2, b'x' * 300) + frame(3)
+        for i in range(0, len(stream), 7):
+            protocol.data_received(stream[i:i + 7])
+        self.assertEqual([m.token for m in protocol.received], [b'\x00\x01', b'\x00\x02', b'\x00\x03'])
+        self.assertEqual(protocol.received[1].payload, b'x' * 300)
+        self.assertEqual(len(protocol._spool), 0)
+
+    def test_max_message_size(self):
+        protocol = FramingProtocol(max_message_size=256)
+        big = frame(2, b'x' * 1000)
+        # the size is checked as soon as the header is received
+        protocol.data_received(frame(1) + big[:8])
+        self.assertEqual(len(protocol.received), 1)
+        self.assertTrue(protocol._transport.closed)
+        abort = SerializerTcp.deserialize(protocol._transport.written[-1], protocol.remote_address)
+        self.assertEqual(abort.code, defines.Codes.ABORT.number)
@@ -0,0 +1,49 @@
+import unittest
+
+from Bubot_CoAP.utils import TimerWheel
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTimerWheel(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.expired = []
+        self.wheel = TimerWheel(self.expired.append, tick=1.0, clock=self.clock)
+
+    def test_expire(self):
+        self.wheel.schedule('a', 2.5)
+        self.wheel.schedule('b', 5)
+        self.assertEqual(len(self.wheel), 2)
+        self.assertEqual(self.wheel.advance(1002.9), 0)
+        self.assertEqual(self.wheel.advance(1003.0), 1)
+        self.assertEqual(self.expired, ['a'])
+        self.assertEqual(self.wheel.advance(1010), 1)
+        self.assertEqual(self.expired, ['a', 'b'])
+        self.assertEqual(self.wheel.expired_total, 2)
+        self.assertEqual(list(self.wheel.expired_per_tick), [0, 1, 1])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_reschedule_and_cancel(self):
+        self.wheel.schedule('a', 2)
+        self.wheel.schedule('b', 2)
+        self.clock.now = 1001.5
+        self.wheel.schedule('a', 2)
+        self.wheel.cancel('b')
+        self.assertNotIn('b', self.wheel)
+        self.wheel.advance(1003)
+        self.assertEqual(self.expired, [])
+        self.wheel.advance(1004)
+        self.assertEqual(self.expired, ['a'])
+
+    def test_never_early(self):
+        self.wheel.schedule('a', 0)
+        self.assertEqual(self.wheel.advance(1000.5), 0)
+        self.assertEqual(self.wheel.advance(1001), 1)
@@ -0,0 +1,90 @@
+import unittest
+
+from Bubot_CoAP.resources.resource import Resource
+from Bubot_CoAP.server import Server
+from Bubot_CoAP.utils import Tree
+
+
+class TestTree(unittest.TestCase):
+
+    def test_dictionary_api(self):
+        tree = Tree()
+        tree['/'] = 'root'
+        tree['/a/b'] = 'b'
+        tree['/a'] = 'a'
+        tree['/ab/'] = 'ab'
+        self.assertEqual(tree['/a/b'], 'b')
+        self.assertEqual(tree['ab'], 'ab')
+        self.assertIn('/a', tree)
+        self.assertNotIn('/a/b/c', tree)
+        self.assertIsNone(tree.get('/b'))
+        with self.assertRaises(KeyError):
+            tree['/b']
+        # the segments are matched whole, /a is not a prefix of /ab
+        self.assertEqual(tree.with_prefix('/ab/c'), ['/', '/ab'])
+        self.assertEqual(tree.with_prefix_resource('/a/b/c'), ['root', 'a', 'b'])
+        self.assertEqual(tree.longest_prefix('/a/c'), ('/a', 'a'))
+        self.assertEqual(tree.dump(), ['/', '/a', '/a/b', '/ab'])
+        self.assertEqual(list(tree.items('/a')), [('/a', 'a'), ('/a/b', 'b')])
+
+        del tree['/a']
+        self.assertEqual(tree['/a/b'], 'b')
+        with self.assertRaises(KeyError):
+            del tree['/a']
+        del tree['/a/b']
+        # the emptied branch is pruned
+        self.assertNotIn('a', tree._root.children)
+        tree['/c/d/e'] = 'e'
+        tree['/c'] = 'c'
+        tree.remove_subtree('/c')
+        self.assertEqual(list(tree), ['/', '/ab'])
+        tree.remove_subtree('/')
+        self.assertEqual(tree.dump(), [])
+        with self.assertRaises(KeyError):
+            tree.longest_prefix('/ab')
+
+    def test_server(self):
+        server = Server.__new__(Server)
+        server.root = Tree()
+        server.root['/'] = Resource('root', visible=False)
+        resource = Resource('temperature')
+        server.add_resource('/sensors/temperature', resource)
+        # the missing parent is registered with the resource
+        self.assertIs(server.root['/sensors'], resource)
+        self.assertEqual(resource.path, '/sensors/temperature')
+        other = Resource('humidity')
+        server.add_resource('sensors/humidity/', other)
+        self.assertIs(server.root['/sensors'], resource)
+        self.assertEqual(other.path, '/sensors/humidity')
+        self.assertIs(server.remove_resource('/sensors/humidity'), other)
+        self.assertIsNone(server.remove_resource('/sensors/humidity'))
+        self.assertEqual(server.root.dump(), ['/', '/sensors', '/sensors/temperature'])
+
+    def test_add_resources(self):
+        server = Server.__new__(Server)
+        server.root = Tree()
+        server.root['/'] = Resource('root', visible=False)
+        server.add_resource('/a', Resource('a'))
+        resources = [(f'/a/{index // 2}/{index % 2}', Resource(str(index))) for index in range(6)]
+        version = server.root.version
+        self.assertEqual(server.add_resources(resources + [('/a', Resource('again'))]), 6)
+        self.assertEqual(server.root.version, version + 1)
+        self.assertEqual(server.root.dump(), ['/', '/a', '/a/0', '/a/0/0', '/a/0/1', '/a/1', '/a/1/0', '/a/1/1',
+                                              '/a/2', '/a/2/0', '/a/2/1'])
+        # the missing parent is registered with the first of its children, as by add_resource
+        self.assertIs(server.root['/a/1'], resources[2][1])
+        self.assertEqual([resource.path for _, resource in resources], [path for path, _ in resources])
+        self.assertEqual(server.root['/a'].name, 'a')
+
+        dump = server.root.dump()
+        with self.assertRaises(TypeError):
+            server.add_resources([('/b/c', Resource('c')), ('/b/d', 'd')])
+        with self.assertRaises(ValueError):
+            server.add_resources([('/b/c', Resource('c')), ('/b//d', Resource('d'))])
+        # nothing of an invalid batch is added
+        self.assertEqual(server.root.dump(), dump)
+        self.assertNotIn('b', server.root._root.children)
+
+
+if __name__ == '__main__':
+    unittest.main()